@@ -21,6 +21,7 @@ __author__ = "julie.smith.1999@gmail.com (Julie Smith)"
 import logging
 import os
 import datetime
+import json
 
 import webapp2
 
@@ -39,6 +40,7 @@ import appversion # appversion.version is set before the upload process to keep
 import shared # Code which is common between tasks-backup.py and worker.py
 import constants
 import host_settings
+import rate_limiter
 
 
 logservice.AUTOFLUSH_EVERY_SECONDS = 5
@@ -108,7 +110,42 @@ class DownloadStatsHandler(webapp2.RequestHandler):
     
     
 
+class ApiUsageHandler(webapp2.RequestHandler):
+    """Returns the recorded Tasks API usage (from all workers) as JSON"""
+
+    def get(self):
+
+        fn_name = "ApiUsageHandler.get(): "
+
+        logging.debug(fn_name + "<Start> (app version %s)" % appversion.version )
+        logservice.flush()
+        
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.headers['Cache-Control'] = 'no-cache, no-store'
+        try:
+            try:
+                num_minutes = int(self.request.get('minutes', 60))
+            except ValueError:
+                num_minutes = 60
+            num_minutes = max(1, min(num_minutes, 24 * 60))
+            
+            usage = rate_limiter.get_usage(num_minutes)
+            usage['max_requests_per_second'] = settings.TASKS_API_MAX_REQUESTS_PER_SECOND
+            self.response.out.write(json.dumps(usage, indent=2))
+            logging.debug(fn_name + "<End>" )
+            logservice.flush()
+            
+        except Exception as ex: # pylint: disable=broad-except
+            logging.exception(fn_name + "Caught top-level exception")
+            self.response.set_status(500)
+            self.response.out.write(json.dumps({'error' : shared.get_exception_msg(ex)}))
+            logging.debug(fn_name + "<End> due to exception" )
+            logservice.flush()
+    
+    
+
 app = webapp2.WSGIApplication( # pylint: disable=invalid-name
     [
         ('/admin/stats', DownloadStatsHandler),
+        ('/admin/api_usage', ApiUsageHandler),
     ], debug=False)        
@@ -223,7 +223,8 @@ def build_from_document(
   document that is it given, as opposed to retrieving one over HTTP.
 
   Args:
-    service: string, discovery document.
+    service: string or object, the JSON discovery document, or the already
+      deserialized discovery document.
     base: string, base URI for all HTTP requests, usually the discovery URI.
       This parameter is no longer used as rootUrl and servicePath are included
       within the discovery document. (deprecated)
@@ -243,7 +244,8 @@ def build_from_document(
   # future is no longer used.
   future = {}
 
-  service = simplejson.loads(service)
+  if isinstance(service, basestring):
+    service = simplejson.loads(service)
   base = urlparse.urljoin(service['rootUrl'], service['servicePath'])
   schema = Schemas(service)
 
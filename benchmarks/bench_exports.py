@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Benchmark every export format of ReturnResultsHandler.post(), outside App Engine.
+
+    For each synthetic account (see synthetic_accounts.py), the tasklists are stored in the (in-memory)
+    datastore using shared.TasklistsDataWriter, in the same way as the worker stores them. Then, for each
+    export format, ReturnResultsHandler.post() is called with a fake request, which loads the tasklists
+    and writes the requested format, exactly as it would on App Engine. As in the worker, the tasks are
+    stored in hierarchy order if settings.WORKER_PRECOMPUTE_TASKS_ORDER is True; otherwise the order
+    is fixed by ReturnResultsHandler.post().
+
+    The time, peak memory and output size are reported for each format. Each format is run in a forked
+    child process (on Linux), so that the peak memory of one format doesn't hide the peak of the next.
+    Each format is then exported a second time, to time returning the cached export (if the format is
+    cached; see settings.EXPORT_CACHE_ENABLED). Both outputs must be identical.
+
+    The output for the 'small' account is compared with the golden files in benchmarks/golden,
+    so that optimisations can't silently change the exported files. The golden files were created by the
+    original (Django template) version of the export code. The 'py' and 'gtb' outputs are compared by the 
+    Python objects they contain, because their bytes depend on how the tasks are stored in memory.
+    After deliberately changing an export format, regenerate the golden files with --update-golden, 
+    and check the differences before committing.
+
+    The app (and therefore this script) requires Python 2.7. Run from the repository directory;
+
+        python benchmarks/bench_exports.py                          # All accounts and formats
+        python benchmarks/bench_exports.py -a small,medium -f raw,ics
+        python benchmarks/bench_exports.py -a small --update-golden
+
+    The exit status is 1 if any output doesn't match its golden file, or if any format fails.
+"""
+
+import sys
+import os
+import gc
+import time
+import logging
+import pickle
+import difflib
+import optparse
+import resource
+import tempfile
+import StringIO
+import traceback
+
+import gae_stubs # pylint: disable=relative-import
+gae_stubs.install()
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import constants # pylint: disable=relative-import,wrong-import-position
+import model # pylint: disable=relative-import,wrong-import-position
+import shared # pylint: disable=relative-import,wrong-import-position
+import tasks_backup # pylint: disable=relative-import,wrong-import-position
+import synthetic_accounts # pylint: disable=relative-import,wrong-import-position
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Accounts whose output is compared with the golden files
+GOLDEN_ACCOUNTS = ['small']
+
+# { export_format : file extension used for the golden file }
+# These are all the export_format values handled by ReturnResultsHandler.post()
+EXPORT_FORMATS = [
+    ('outlook', 'csv'),
+    ('raw', 'csv'),
+    ('raw1', 'csv'),
+    ('raw2', 'csv'),
+    ('log', 'csv'),
+    ('import_export', 'csv'),
+    ('ics', 'ics'),
+    ('py', 'py'),
+    ('tabbed_text', 'txt'),
+    ('spaced_text', 'txt'),
+    ('RTM', 'txt'),
+    ('html_raw', 'html'),
+    ('gtb', 'GTBak'),
+]
+
+# Form values posted by the progress page (html_raw uses the display options, the other formats use the
+# export options)
+_FORM_VALUES = {
+    'job_start_timestamp' : '1583298367',
+    'display_completed_tasks' : 'True',
+    'dim_completed_tasks' : 'True',
+    'display_completed_date_field' : 'True',
+    'display_due_date_field' : 'True',
+    'display_updated_date_field' : 'True',
+    'display_invalid_tasks' : 'True',
+    'display_hidden_tasks' : 'True',
+    'display_deleted_tasks' : 'True',
+    'due_selection' : 'all',
+    'html_sort_order' : '',
+    'export_using_localtime' : '',
+    'export_offset_hours' : '0',
+    'display_using_localtime' : '',
+    'display_offset_hours' : '0',
+}
+
+
+class _ErrorLogHandler(logging.Handler):
+    """ Records the messages logged at ERROR level or above.
+    
+        ReturnResultsHandler.post() catches all exceptions and displays an error page to the user, 
+        so errors are detected by checking what was logged.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+_ERROR_LOG_HANDLER = _ErrorLogHandler()
+
+
+# ------------------------------------
+#   Memory measurement
+# ------------------------------------
+def _proc_status_kb(field):
+    """ Returns the value (in kB) of the field from /proc/self/status, or None if not available """
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """ Reset the process's peak RSS (VmHWM) to the current RSS. Returns True if successful (Linux 4.0+) """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except IOError:
+        return False
+
+
+class _PeakMemory(object):
+    """ Measures the increase in peak RSS while running a block of code """
+    def __init__(self):
+        self.peak_kb = None
+        self._start_kb = None
+        self._use_proc = False
+
+    def __enter__(self):
+        gc.collect()
+        self._use_proc = _reset_peak_rss() and _proc_status_kb('VmHWM') is not None
+        if self._use_proc:
+            self._start_kb = _proc_status_kb('VmRSS')
+        else:
+            # ru_maxrss is the peak for the whole process, so this is only accurate if
+            # the peak hasn't been reached before this point
+            self._start_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._use_proc:
+            self.peak_kb = _proc_status_kb('VmHWM') - self._start_kb
+        else:
+            self.peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - self._start_kb
+        return False
+
+
+# ------------------------------------
+#   Running the exports
+# ------------------------------------
+def _generate_account_data(account_name):
+    """ Generate the synthetic account, and store it in the same way as the worker.
+    
+        Returns (number of tasks, data format, data compression, list of stored TasklistsData blobs)
+    """
+    gae_stubs.clear_datastore()
+    user_email = gae_stubs.USER_EMAIL
+
+    tasklists = synthetic_accounts.generate_tasklists(account_name)
+    num_tasks = sum([len(tasklist.get(u'tasks', [])) for tasklist in tasklists])
+
+    writer = shared.TasklistsDataWriter(user_email, None, settings.BACKUP_DATA_COMPRESSION)
+    tasks_order_stats = shared.new_tasks_order_stats()
+    for tasklist in tasklists:
+        if settings.WORKER_PRECOMPUTE_TASKS_ORDER:
+            shared.fix_tasklist_order(tasklist, tasks_order_stats, keep_unreachable_tasks=True)
+        writer.write_tasklist(tasklist)
+    writer.close()
+    
+    blobs = [rec.pickled_tasks_data for rec in shared.get_tasklists_data_records(user_email)]
+    return num_tasks, writer.data_format, writer.compression, blobs
+
+
+def store_account(account_name):
+    """ Store the synthetic account in the datastore, with a completed ProcessTasksJob.
+    
+        The account is generated in a child process, so that the memory used to generate the account
+        can't be reused by the exports (which would hide some of the memory used by the exports).
+    
+        Returns (number of tasks, number of bytes stored)
+    """
+    num_tasks, data_format, data_compression, blobs = _run_in_child(_generate_account_data, account_name)
+    
+    gae_stubs.clear_datastore()
+    user_email = gae_stubs.USER_EMAIL
+    parent_key = gae_stubs.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, user_email)
+    for idx, blob in enumerate(blobs):
+        tasklist_rec = model.TasklistsData(parent_key)
+        tasklist_rec.pickled_tasks_data = blob
+        tasklist_rec.idx = idx
+        tasklist_rec.put()
+
+    now = gae_stubs.FROZEN_NOW
+    job = model.ProcessTasksJob(key_name=user_email)
+    job.status = constants.ExportJobStatus.EXPORT_COMPLETED
+    job.job_created_timestamp = now
+    job.job_start_timestamp = now
+    job.job_progress_timestamp = now
+    job.total_progress = num_tasks
+    job.include_completed = True
+    job.include_deleted = True
+    job.include_hidden = True
+    job.data_format = data_format
+    job.data_compression = data_compression
+    job.put()
+
+    return num_tasks, sum([len(blob) for blob in blobs])
+
+
+def run_export(export_format):
+    """ Call ReturnResultsHandler.post() for the export format. Returns (output, duration, peak kB) """
+    form_values = dict(_FORM_VALUES)
+    form_values['export_format'] = export_format
+    handler = tasks_backup.ReturnResultsHandler(gae_stubs.Request(form_values))
+    del gae_stubs.SENT_EMAILS[:]
+    del _ERROR_LOG_HANDLER.messages[:]
+
+    with _PeakMemory() as peak_memory:
+        start_time = time.time()
+        handler.post()
+        duration = time.time() - start_time
+
+    if _ERROR_LOG_HANDLER.messages:
+        raise Exception("Error logged by ReturnResultsHandler.post()\n" + '\n'.join(_ERROR_LOG_HANDLER.messages))
+    if handler.response.status != 200:
+        raise Exception("Response status %s %s" % (handler.response.status, handler.response.status_message))
+    if export_format == 'RTM':
+        # The RTM format is emailed to the user, rather than returned in the response
+        if not gae_stubs.SENT_EMAILS:
+            raise Exception("No email was sent")
+        output = gae_stubs.SENT_EMAILS[-1][3]
+        if isinstance(output, unicode):
+            output = output.encode('utf-8')
+    else:
+        output = handler.response.body
+    return output, duration, peak_memory.peak_kb
+
+
+def _run_in_child(fn, *args):
+    """ Run fn(*args) in a forked child process, and return the result (or raise the child's exception) """
+    if not hasattr(os, 'fork'):
+        return fn(*args)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Child
+        os.close(read_fd)
+        try:
+            result = (True, fn(*args))
+        except Exception: # pylint: disable=broad-except
+            result = (False, traceback.format_exc())
+        with os.fdopen(write_fd, 'wb') as pipe:
+            pickle.dump(result, pipe, pickle.HIGHEST_PROTOCOL)
+        os._exit(0) # pylint: disable=protected-access
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    if not data:
+        raise Exception("Child process failed without returning a result")
+    success, result = pickle.loads(data)
+    if not success:
+        raise Exception(result)
+    return result
+
+
+# ------------------------------------
+#   Golden files
+# ------------------------------------
+def _golden_path(account_name, export_format, extension):
+    return os.path.join(GOLDEN_DIR, account_name, "%s.%s" % (export_format, extension))
+
+
+def _load_python_objects(extension, data):
+    """ Returns the Python objects written in a 'py' or 'gtb' export, or None for any other format.
+    
+        The bytes of these formats depend on how the tasks are stored in memory (the order of the keys in 
+        each task dictionary, and which strings are the same object, which pickle only stores once), 
+        so they are compared by the objects that a user would load from the file.
+    """
+    if extension == 'py':
+        namespace = {}
+        exec data in namespace # pylint: disable=exec-used
+        return namespace['tasklists']
+    if extension == 'GTBak':
+        # The file is the pickled version string, followed by the pickled list of tasks
+        data_file = StringIO.StringIO(data)
+        return [pickle.load(data_file), pickle.load(data_file)]
+    return None
+
+
+def compare_with_golden(account_name, export_format, extension, output):
+    """ Returns None if output matches the golden file, otherwise returns a description of the differences """
+    path = _golden_path(account_name, export_format, extension)
+    if not os.path.exists(path):
+        return "No golden file %s (use --update-golden to create it)" % path
+    with open(path, 'rb') as golden_file:
+        golden = golden_file.read()
+    if output == golden:
+        return None
+    golden_objects = _load_python_objects(extension, golden)
+    if golden_objects is not None and _load_python_objects(extension, output) == golden_objects:
+        return None
+
+    # Save the actual output, so that it can be compared with the golden file
+    actual_fd, actual_path = tempfile.mkstemp(prefix='%s_%s_' % (account_name, export_format),
+        suffix='.' + extension)
+    with os.fdopen(actual_fd, 'wb') as actual_file:
+        actual_file.write(output)
+
+    msg = "Output differs from %s (%d bytes, expected %d bytes); actual output saved as %s" % (
+        path, len(output), len(golden), actual_path)
+    if extension != 'GTBak':
+        diff_lines = list(difflib.unified_diff(golden.splitlines(), output.splitlines(),
+            'golden', 'actual', lineterm='', n=1))
+        msg += '\n' + '\n'.join(diff_lines[:20])
+        if len(diff_lines) > 20:
+            msg += "\n... (%d more lines of differences)" % (len(diff_lines) - 20)
+    return msg
+
+
+def update_golden(account_name, export_format, extension, output):
+    path = _golden_path(account_name, export_format, extension)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as golden_file:
+        golden_file.write(output)
+
+
+def _benchmark_format(account_name, export_format, extension, options):
+    """ Run one export format, and compare (or update) the golden file. Runs in the child process. """
+    output, duration, peak_kb = run_export(export_format)
+    repeat_output, repeat_duration, _ = run_export(export_format)
+    if repeat_output != output:
+        raise Exception("Output of repeated export is different")
+    golden_msg = None
+    if account_name in GOLDEN_ACCOUNTS:
+        if options.update_golden:
+            update_golden(account_name, export_format, extension, output)
+            golden_msg = 'updated'
+        else:
+            golden_msg = compare_with_golden(account_name, export_format, extension, output) or 'match'
+    return duration, repeat_duration, peak_kb, len(output), golden_msg
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-a', '--accounts', default=','.join(synthetic_accounts.ACCOUNT_NAMES),
+        help="Comma-separated list of accounts to benchmark (%s)" % ', '.join(synthetic_accounts.ACCOUNT_NAMES))
+    parser.add_option('-f', '--formats', default=','.join([fmt for fmt, _ in EXPORT_FORMATS]),
+        help="Comma-separated list of export formats to benchmark")
+    parser.add_option('--update-golden', action='store_true', default=False,
+        help="Replace the golden files with the current output")
+    options, _ = parser.parse_args()
+
+    account_names = [name for name in options.accounts.split(',') if name]
+    formats = [name for name in options.formats.split(',') if name]
+    extensions = dict(EXPORT_FORMATS)
+    for name in account_names:
+        if name not in synthetic_accounts.ACCOUNTS:
+            parser.error("Unknown account '%s'" % name)
+    for name in formats:
+        if name not in extensions:
+            parser.error("Unknown export format '%s'" % name)
+
+    # Only log errors, so that the time taken to log debug messages isn't included in the results
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger().addHandler(_ERROR_LOG_HANDLER)
+
+    # Freeze time in the application modules, so that the output (e.g. ICS DTSTAMP) is repeatable
+    gae_stubs.freeze_time(tasks_backup, shared)
+
+    num_failures = 0
+    for account_name in account_names:
+        start_time = time.time()
+        num_tasks, num_stored_bytes = store_account(account_name)
+        print
+        print "Account '%s': %d tasks, %d bytes stored (%s compression), generated in %.2f seconds" % (
+            account_name, num_tasks, num_stored_bytes, settings.BACKUP_DATA_COMPRESSION or 'no',
+            time.time() - start_time)
+        print "    %-15s %10s %10s %12s %14s   %s" % ('Format', 'Time (s)', 'Repeat (s)', 'Peak (MB)', 
+            'Output (bytes)', 'Golden')
+
+        for export_format in formats:
+            extension = extensions[export_format]
+            try:
+                duration, repeat_duration, peak_kb, output_size, golden_msg = _run_in_child(
+                    _benchmark_format, account_name, export_format, extension, options)
+            except Exception as ex: # pylint: disable=broad-except
+                num_failures += 1
+                print "    %-15s FAILED: %s" % (export_format, ex)
+                continue
+
+            golden_summary = golden_msg or '-'
+            details = None
+            if golden_msg not in (None, 'match', 'updated'):
+                num_failures += 1
+                golden_summary = 'DIFFERENT'
+                details = golden_msg
+            print "    %-15s %10.3f %10.3f %12.1f %14d   %s" % (
+                export_format, duration, repeat_duration, peak_kb / 1024.0, output_size, golden_summary)
+            if details:
+                print '        ' + details.replace('\n', '\n        ')
+            sys.stdout.flush()
+
+    print
+    if num_failures:
+        print "%d failure(s)" % num_failures
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Benchmark shared.fix_tasks_order(), outside App Engine.
+
+    fix_tasks_order() is run on each synthetic account (see synthetic_accounts.py), and on a 'deep'
+    tasklist in which every task is the parent of the next (plus some orphaned tasks and a cycle of
+    parents). The deep tasklist is much deeper than Python's recursion limit.
+
+    The result is checked; every subtask must follow its parent, with a depth one greater than its parent.
+
+        python benchmarks/bench_fix_tasks_order.py
+        python benchmarks/bench_fix_tasks_order.py -a large -d 200000
+"""
+
+import sys
+import time
+import logging
+import optparse
+
+import gae_stubs # pylint: disable=relative-import
+gae_stubs.install()
+
+import shared # pylint: disable=relative-import,wrong-import-position
+import synthetic_accounts # pylint: disable=relative-import,wrong-import-position
+
+
+def check_order(tasklists):
+    """ Returns an error message if any subtask doesn't follow its parent with the correct depth, else None """
+    for tasklist in tasklists:
+        depth_of_preceding_ancestors = {}
+        previous_depth = -1
+        for task in tasklist.get(u'tasks', []):
+            depth = task[u'depth']
+            parent_id = task.get(u'parent', None)
+            if parent_id and depth_of_preceding_ancestors.get(parent_id) != depth - 1:
+                return "Task '%s' does not follow its parent '%s'" % (task[u'id'], parent_id)
+            if depth > previous_depth + 1:
+                return "Task '%s' has depth %d after a task with depth %d" % (task[u'id'], depth, previous_depth)
+            depth_of_preceding_ancestors[task[u'id']] = depth
+            previous_depth = depth
+    return None
+
+
+def benchmark(name, tasklists):
+    """ Run fix_tasks_order() on the tasklists, and print the time taken and the statistics """
+    num_tasks = sum([len(tasklist.get(u'tasks', [])) for tasklist in tasklists])
+    start_time = time.time()
+    stats = shared.fix_tasks_order(tasklists)
+    duration = time.time() - start_time
+    error_msg = check_order(tasklists)
+    print "    %-10s %8d %10.3f %8d %8d %9d   %s" % (name, num_tasks, duration,
+        max(stats['depth_counts'] or [0]), stats['num_orphaned_tasks'], stats['num_cyclic_tasks'],
+        error_msg or 'OK')
+    sys.stdout.flush()
+    return error_msg is None
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-a', '--accounts', default=','.join(synthetic_accounts.ACCOUNT_NAMES),
+        help="Comma-separated list of accounts to benchmark (%s)" % ', '.join(synthetic_accounts.ACCOUNT_NAMES))
+    parser.add_option('-d', '--depth', type='int', default=100000,
+        help="Number of tasks in the chain of the deep tasklist (0 to skip)")
+    options, _ = parser.parse_args()
+
+    account_names = [name for name in options.accounts.split(',') if name]
+    for name in account_names:
+        if name not in synthetic_accounts.ACCOUNTS:
+            parser.error("Unknown account '%s'" % name)
+
+    # Only log errors, so that the time taken to log messages isn't included in the results
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print "    %-10s %8s %10s %8s %8s %9s   %s" % ('Account', 'Tasks', 'Time (s)', 'Depth', 'Orphans',
+        'In cycle', 'Order')
+    all_ok = True
+    for account_name in account_names:
+        all_ok &= benchmark(account_name, synthetic_accounts.generate_tasklists(account_name))
+    if options.depth:
+        all_ok &= benchmark('deep', [synthetic_accounts.generate_deep_tasklist(options.depth)])
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
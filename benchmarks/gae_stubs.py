@@ -0,0 +1,587 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Minimal stand-ins for the App Engine SDK, webapp2, PyCrypto and oauth2client modules, so that the
+# frontend (tasks_backup.py) and shared.py can be imported and run outside App Engine by the benchmarks.
+#
+# Only the parts used when returning results to the user are implemented;
+#   db              An in-memory datastore (Model, properties, Key.from_path, GqlQuery, put_async, delete)
+#   memcache        An in-memory cache (set MEMCACHE_AVAILABLE[0] = False to simulate memcache being unavailable)
+#   apiproxy_stub_map  Has no urlfetch stub, so httplib2 uses its own connections rather than urlfetch
+#   users           A single fake logged-in user
+#   mail            send_mail() records each email in SENT_EMAILS
+#   template        render() returns an empty string (Django is not available outside App Engine)
+#   webapp2         RequestHandler with a fake request and response (the response body is kept in memory)
+#   settings        Loaded from settings-dummy.py, so that results don't depend on the local settings.py
+#   host_settings   Loaded from host_settings-dummy.py
+# Any other attribute of a stub module is a no-op function (or an exception class, if the name ends in 'Error')
+#
+# CAUTION: install() must be called before importing any of the application modules.
+
+import sys
+import os
+import imp
+import types
+import datetime
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Email address of the fake logged-in user
+USER_EMAIL = u'benchmark.user@example.com'
+
+# Host name of the fake request. Must be one of settings.PRODUCTION_SERVERS, so that the frontend doesn't
+# reject the (non-test) user.
+REQUEST_HOST = 'MY-APP-ID.appspot.com'
+
+# The time returned by datetime.datetime.now() in the application modules (see freeze_time())
+FROZEN_NOW = datetime.datetime(2020, 3, 4, 5, 6, 7)
+
+# (sender, to, subject, body) of each email sent using mail.send_mail()
+SENT_EMAILS = []
+
+
+def _noop(*args, **kwargs): # pylint: disable=unused-argument
+    return None
+
+
+class _StubModule(types.ModuleType):
+    """ A module which returns a no-op function for any attribute which hasn't been explicitly set """
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name.endswith('Error') or name.endswith('Exceeded'):
+            value = type(name, (Exception,), {})
+        else:
+            value = _noop
+        setattr(self, name, value)
+        return value
+
+
+def _add_module(name, **attrs):
+    module = sys.modules.get(name)
+    if module is None:
+        module = _StubModule(name)
+        module.__path__ = []
+        sys.modules[name] = module
+        if '.' in name:
+            parent_name, child_name = name.rsplit('.', 1)
+            setattr(_add_module(parent_name), child_name, module)
+    for attr_name, value in attrs.items():
+        setattr(module, attr_name, value)
+    return module
+
+
+# ------------------------------------
+#   In-memory datastore (db)
+# ------------------------------------
+# { key : entity }
+_DATASTORE = {}
+
+
+class Key(tuple):
+    """ A datastore key; the tuple (parent key, kind, key_name or id) """
+
+    _next_id = [1]
+
+    @classmethod
+    def from_path(cls, kind, key_name, parent=None):
+        return cls((parent, kind, key_name))
+
+    def parent(self):
+        return self[0]
+
+    def kind(self):
+        return self[1]
+
+    def name(self):
+        return self[2]
+
+
+class Property(object):
+    """ A model property. The value is stored in the entity's __dict__ """
+
+    def __init__(self, *args, **kwargs): # pylint: disable=unused-argument
+        self.default = kwargs.get('default')
+        self.name = None
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.name, self.default)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    def get_value_for_datastore(self, model_instance):
+        return self.__get__(model_instance, type(model_instance))
+
+    def validate(self, value): # pylint: disable=no-self-use
+        return value
+
+
+class ListProperty(Property):
+    def __init__(self, *args, **kwargs):
+        Property.__init__(self, *args, **kwargs)
+        if self.default is None:
+            self.default = []
+
+
+class _ModelMeta(type):
+    def __init__(cls, name, bases, attrs):
+        super(_ModelMeta, cls).__init__(name, bases, attrs)
+        for attr_name, value in attrs.items():
+            if isinstance(value, Property):
+                value.name = attr_name
+
+
+class Model(object):
+    """ A datastore model. Entities are stored in memory when put() is called. """
+    __metaclass__ = _ModelMeta
+
+    def __init__(self, parent=None, key_name=None, **kwargs):
+        if key_name is None:
+            key_name = Key._next_id[0] # pylint: disable=protected-access
+            Key._next_id[0] += 1 # pylint: disable=protected-access
+        self._key = Key((parent, type(self).__name__, key_name))
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def key(self):
+        return self._key
+
+    def put(self):
+        _DATASTORE[self._key] = self
+        return self._key
+
+    @classmethod
+    def get_by_key_name(cls, key_name, parent=None):
+        return _DATASTORE.get(Key((parent, cls.__name__, key_name)))
+
+    @classmethod
+    def all(cls, keys_only=False):
+        return _Query(cls.__name__, keys_only)
+
+    @classmethod
+    def kind(cls):
+        return cls.__name__
+
+
+class _Query(object):
+    def __init__(self, kind, keys_only=False):
+        self._kind = kind
+        self._keys_only = keys_only
+        self._ancestor = None
+        self._order = None
+
+    def ancestor(self, ancestor_key):
+        self._ancestor = ancestor_key
+        return self
+
+    def order(self, prop):
+        self._order = prop
+        return self
+
+    def _results(self):
+        results = [entity for key, entity in _DATASTORE.items()
+            if key.kind() == self._kind and (self._ancestor is None or key.parent() == self._ancestor)]
+        if self._order:
+            results.sort(key=lambda entity: getattr(entity, self._order.lstrip('-')),
+                reverse=self._order.startswith('-'))
+        if self._keys_only:
+            return [entity.key() for entity in results]
+        return results
+
+    def __iter__(self):
+        return iter(self._results())
+
+    def fetch(self, limit, offset=0):
+        results = self._results()[offset:]
+        if limit is not None:
+            results = results[:limit]
+        return results
+
+    def count(self, limit=None):
+        return len(self.fetch(limit))
+
+    def get(self):
+        results = self.fetch(1)
+        if results:
+            return results[0]
+        return None
+
+
+def GqlQuery(query_string, *args): # pylint: disable=invalid-name
+    """ Supports the "SELECT * FROM Kind WHERE ANCESTOR IS :1 [ORDER BY prop [ASC|DESC]]" queries used by the app """
+    words = query_string.split()
+    query = _Query(words[words.index('FROM') + 1])
+    if 'ANCESTOR' in words:
+        query.ancestor(args[0])
+    if 'ORDER' in words:
+        prop = words[words.index('ORDER') + 2]
+        if words[-1] == 'DESC':
+            prop = '-' + prop
+        query.order(prop)
+    return query
+
+
+class _CompletedRpc(object): # pylint: disable=too-few-public-methods
+    def __init__(self, result):
+        self._result = result
+
+    def get_result(self):
+        return self._result
+
+
+def put_async(entity):
+    return _CompletedRpc(entity.put())
+
+
+def put(entities):
+    if isinstance(entities, (list, tuple)):
+        return [entity.put() for entity in entities]
+    return entities.put()
+
+
+def get(keys):
+    if isinstance(keys, (list, tuple)):
+        return [_DATASTORE.get(key) for key in keys]
+    return _DATASTORE.get(keys)
+
+
+def delete(keys):
+    if isinstance(keys, Key) or not isinstance(keys, (list, tuple)):
+        keys = [keys]
+    for key in keys:
+        if isinstance(key, Model):
+            key = key.key()
+        _DATASTORE.pop(key, None)
+
+
+def clear_datastore():
+    _DATASTORE.clear()
+
+
+# ------------------------------------
+#   In-memory memcache
+# ------------------------------------
+# { (namespace, key) : value }
+_MEMCACHE = {}
+
+# Set MEMCACHE_AVAILABLE[0] to False to make every memcache call fail, as it does when memcache is unavailable
+MEMCACHE_AVAILABLE = [True]
+
+
+def memcache_get(key, namespace=None):
+    if not MEMCACHE_AVAILABLE[0]:
+        return None
+    return _MEMCACHE.get((namespace, key))
+
+
+def memcache_get_multi(keys, key_prefix='', namespace=None):
+    if not MEMCACHE_AVAILABLE[0]:
+        return {}
+    return dict((key, _MEMCACHE[(namespace, key_prefix + key)]) for key in keys
+        if (namespace, key_prefix + key) in _MEMCACHE)
+
+
+def memcache_set(key, value, time=0, namespace=None): # pylint: disable=redefined-outer-name,unused-argument
+    if not MEMCACHE_AVAILABLE[0]:
+        return False
+    _MEMCACHE[(namespace, key)] = value
+    return True
+
+
+def memcache_add(key, value, time=0, namespace=None): # pylint: disable=redefined-outer-name,unused-argument
+    if not MEMCACHE_AVAILABLE[0] or (namespace, key) in _MEMCACHE:
+        return False
+    _MEMCACHE[(namespace, key)] = value
+    return True
+
+
+def memcache_delete(key, seconds=0, namespace=None): # pylint: disable=unused-argument
+    if not MEMCACHE_AVAILABLE[0]:
+        return 0
+    _MEMCACHE.pop((namespace, key), None)
+    return 2
+
+
+def memcache_offset_multi(mapping, key_prefix='', namespace=None, initial_value=None):
+    """ Returns { key : new value }. As in memcache, a value can't go below zero """
+    if not MEMCACHE_AVAILABLE[0]:
+        return {}
+    results = {}
+    for key, delta in mapping.items():
+        cache_key = (namespace, key_prefix + key)
+        if cache_key not in _MEMCACHE:
+            if initial_value is None:
+                results[key] = None
+                continue
+            _MEMCACHE[cache_key] = initial_value
+        _MEMCACHE[cache_key] = max(0, _MEMCACHE[cache_key] + delta)
+        results[key] = _MEMCACHE[cache_key]
+    return results
+
+
+def memcache_incr(key, delta=1, namespace=None, initial_value=None):
+    return memcache_offset_multi({key : delta}, namespace=namespace, initial_value=initial_value).get(key)
+
+
+def clear_memcache():
+    _MEMCACHE.clear()
+    MEMCACHE_AVAILABLE[0] = True
+
+
+class _ApiProxy(object): # pylint: disable=too-few-public-methods
+    def GetStub(self, service): # pylint: disable=invalid-name,no-self-use,unused-argument
+        return None
+
+
+# ------------------------------------
+#   users, mail, template
+# ------------------------------------
+class User(object):
+    def __init__(self, email):
+        self._email = email
+
+    def email(self):
+        return self._email
+
+    def nickname(self):
+        return self._email.split('@')[0]
+
+    def user_id(self):
+        return str(abs(hash(self._email)))
+
+
+def get_current_user():
+    return User(USER_EMAIL)
+
+
+def create_logout_url(dest_url):
+    return '/_ah/logout?continue=' + dest_url
+
+
+def send_mail(sender, to, subject, body, **kwargs): # pylint: disable=unused-argument
+    SENT_EMAILS.append((sender, to, subject, body))
+
+
+def render(template_path, template_values, debug=False): # pylint: disable=unused-argument
+    return u''
+
+
+# ------------------------------------
+#   webapp2
+# ------------------------------------
+class _Headers(dict):
+    def add_header(self, name, value, **params): # pylint: disable=unused-argument
+        self[name] = value
+
+
+class Response(object):
+    """ Keeps the response body in memory, as a list of the strings written by the handler """
+
+    def __init__(self):
+        self.headers = _Headers()
+        self.status = 200
+        self.status_message = None
+        self.chunks = []
+        self.out = self
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self.chunks.append(text)
+
+    def clear(self):
+        self.chunks = []
+
+    def set_status(self, code, message=None):
+        self.status = code
+        self.status_message = message
+
+    def set_cookie(self, *args, **kwargs):
+        pass
+
+    def delete_cookie(self, *args, **kwargs):
+        pass
+
+    @property
+    def body(self):
+        return ''.join(self.chunks)
+
+    @property
+    def app_iter(self):
+        return self.chunks
+
+
+class Request(object):
+    def __init__(self, params=None, cookies=None, host=REQUEST_HOST):
+        self.params = params or {}
+        self.cookies = cookies or {}
+        self.host = host
+        self.headers = {}
+        self.url = 'https://' + host + '/'
+        self.remote_addr = '127.0.0.1'
+
+    def get(self, name, default_value=''):
+        return self.params.get(name, default_value)
+
+
+class RequestHandler(object):
+    def __init__(self, request=None, response=None):
+        self.request = request or Request()
+        self.response = response or Response()
+        self.redirected_to = None
+
+    def redirect(self, uri, *args, **kwargs): # pylint: disable=unused-argument
+        self.redirected_to = uri
+        self.response.set_status(302)
+
+    def error(self, code):
+        self.response.set_status(code)
+
+
+class WSGIApplication(object): # pylint: disable=too-few-public-methods
+    def __init__(self, routes=None, debug=False, config=None):
+        self.routes = routes
+        self.debug = debug
+        self.config = config
+
+
+# ------------------------------------
+#   oauth2client
+# ------------------------------------
+class OAuth2Decorator(object):
+    """ The benchmarks call the handlers directly, so the decorated methods are called as-is """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def oauth_required(self, method): # pylint: disable=no-self-use
+        return method
+
+    def oauth_aware(self, method): # pylint: disable=no-self-use
+        return method
+
+    def has_credentials(self): # pylint: disable=no-self-use
+        return True
+
+    def http(self, *args, **kwargs):
+        return None
+
+    callback_path = '/oauth2callback'
+
+    def callback_handler(self):
+        return RequestHandler
+
+
+# ------------------------------------
+#   Frozen time
+# ------------------------------------
+class _FrozenDatetimeType(type):
+    """ Real datetime objects (e.g. the task timestamps) are also instances of _FrozenDatetime """
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, datetime.datetime)
+
+
+class _FrozenDatetime(datetime.datetime):
+    __metaclass__ = _FrozenDatetimeType
+
+    def __new__(cls, *args, **kwargs):
+        # Any datetime created by the application (e.g. by strptime) is a real datetime object, 
+        # so that it is the same as on App Engine (e.g. its repr() in the 'py' export format)
+        return datetime.datetime(*args, **kwargs)
+
+    @classmethod
+    def now(cls, tz=None): # pylint: disable=arguments-differ,unused-argument
+        return FROZEN_NOW
+
+    @classmethod
+    def utcnow(cls):
+        return FROZEN_NOW
+
+    @classmethod
+    def today(cls):
+        return FROZEN_NOW
+
+
+def _frozen_datetime_module():
+    module = types.ModuleType('datetime')
+    module.__dict__.update(datetime.__dict__)
+    module.datetime = _FrozenDatetime
+    return module
+
+
+def freeze_time(*modules):
+    """ Make datetime.datetime.now() return FROZEN_NOW in each of the modules, so that output is repeatable """
+    frozen_module = _frozen_datetime_module()
+    for module in modules:
+        module.datetime = frozen_module
+
+
+# ------------------------------------
+#   Install
+# ------------------------------------
+def _load_settings(module_name, filename):
+    return imp.load_source(module_name, os.path.join(REPO_DIR, filename))
+
+
+def install():
+    """ Install the stub modules, and add the repository to sys.path """
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    _add_module('google.appengine.api.logservice')
+    _add_module('google.appengine.api.mail', send_mail=send_mail)
+    _add_module('google.appengine.api.mail_errors')
+    _add_module('google.appengine.api.taskqueue')
+    _add_module('google.appengine.api.urlfetch')
+    _add_module('google.appengine.api.urlfetch_errors')
+    _add_module('google.appengine.api.apiproxy_stub_map', apiproxy=_ApiProxy())
+    _add_module('google.appengine.api.memcache', get=memcache_get, get_multi=memcache_get_multi,
+        set=memcache_set, add=memcache_add, delete=memcache_delete, offset_multi=memcache_offset_multi,
+        incr=memcache_incr)
+    _add_module('google.appengine.api.users', get_current_user=get_current_user,
+        create_logout_url=create_logout_url, create_login_url=create_logout_url,
+        is_current_user_admin=lambda: False, User=User)
+    _add_module('google.appengine.api.app_identity', get_application_id=lambda: 'benchmark-app')
+    _add_module('google.appengine.runtime.apiproxy_errors')
+    _add_module('google.appengine.runtime')
+    _add_module('google.appengine.ext.db', Model=Model, Key=Key, GqlQuery=GqlQuery, Blob=str,
+        put_async=put_async, put=put, get=get, delete=delete,
+        Property=Property, StringProperty=Property, TextProperty=Property, BlobProperty=Property,
+        ByteStringProperty=Property,
+        IntegerProperty=Property, FloatProperty=Property, BooleanProperty=Property,
+        DateTimeProperty=Property, UserProperty=Property, ListProperty=ListProperty,
+        ReferenceProperty=Property, BadValueError=ValueError)
+    _add_module('google.appengine.ext.webapp.template', render=render)
+    _add_module('webapp2', RequestHandler=RequestHandler, WSGIApplication=WSGIApplication,
+        Request=Request, Response=Response)
+    _add_module('Crypto.PublicKey.RSA')
+    _add_module('Crypto.Cipher.PKCS1_OAEP')
+    _add_module('Crypto.Cipher.AES')
+    _add_module('Crypto.Util.Counter')
+    _add_module('Crypto.Random')
+
+    # Use the vendored oauth2client package, but replace the App Engine specific module
+    import oauth2client # pylint: disable=unused-variable
+    _add_module('oauth2client.appengine', OAuth2Decorator=OAuth2Decorator, CredentialsProperty=Property,
+        StorageByKeyName=_noop, CredentialsModel=Model)
+
+    if 'settings' not in sys.modules:
+        sys.modules['settings'] = _load_settings('settings', 'settings-dummy.py')
+    if 'host_settings' not in sys.modules:
+        sys.modules['host_settings'] = _load_settings('host_settings', 'host_settings-dummy.py')
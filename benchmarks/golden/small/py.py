@@ -0,0 +1,5 @@
+
+import datetime
+
+tasklists = [{u'tasks': [{u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'buy', u'deleted': True, u'updated': datetime.datetime(2019, 11, 4, 1, 45, 39), u'depth': 0, u'etag': u'"etag-788723351"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-11-04T01:45:39.000Z', u'id': u'list00-task-0000000', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000000'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'buy buy comma,separated 50% report fix meeting buy', u'notes': u'fix fix fix "quoted" the buy\r\nback\\slash Mum tab\there &amp; call car \u65e5\u672c', u'updated': datetime.datetime(2020, 2, 6, 12, 50, 13), u'depth': 0, u'etag': u'"etag-945270696"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-02-06T12:50:13.000Z', u'id': u'list00-task-0000001', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000001'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000001', u'title': u'<html> comma,separated semi;colon buy fix na\xefve meeting Mum', u'updated': datetime.datetime(2020, 1, 19, 17, 53, 18), u'depth': 1, u'etag': u'"etag-587580606"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-01-19T17:53:18.000Z', u'id': u'list00-task-0000002', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000002'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000001', u'title': u'"quoted" buy buy \u65e5\u672c', u'updated': datetime.datetime(2019, 11, 24, 12, 53, 46), u'depth': 1, u'etag': u'"etag-520938418"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-11-24T12:53:46.000Z', u'id': u'list00-task-0000003', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000003'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2020, 5, 6, 23, 59, 46), u'parent': u'list00-task-0000001', u'title': u'fix comma,separated tab\there semi;colon "quoted" the comma,separated', u'due': datetime.date(2020, 6, 16), u'depth': 1, u'etag': u'"etag-539617448"', 'due_RFC3339': u'2020-06-16T00:00:00.000Z', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-05-06T23:59:46.000Z', u'id': u'list00-task-0000004', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000004'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000004', u'title': u'milk &amp; semi;colon Mum', u'updated': datetime.datetime(2020, 3, 7, 22, 50, 31), u'depth': 2, u'etag': u'"etag-561357865"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-03-07T22:50:31.000Z', u'id': u'list00-task-0000005', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000005'}, {u'status': u'needsAction', u'updated': datetime.datetime(2020, 1, 3, 11, 45, 36), u'parent': u'list00-task-0000004', u'title': u'fix', u'deleted': True, u'notes': u'na\xefve na\xefve <html> the <html> caf\xe9 milk buy buy na\xefve fix\ncar milk Mum comma,separated Mum the \u65e5\u672c "quoted"', u'kind': u'tasks#task', u'depth': 2, u'etag': u'"etag-458146800"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-01-03T11:45:36.000Z', u'id': u'list00-task-0000006', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000006'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000001', u'title': u'comma,separated fix back\\slash <html> buy buy call \u65e5\u672c', u'notes': u'comma,separated fix tab\there na\xefve comma,separated fix back\\slash report semi;colon\nmilk the tab\there &amp; car &amp; car 50%\r\nthe buy &amp; buy <html>', u'updated': datetime.datetime(2019, 10, 25, 3, 39, 11), u'depth': 1, u'etag': u'"etag-108761692"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2019-10-25T03:39:11.000Z', u'id': u'list00-task-0000007', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000007'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000007', u'title': u'car fix caf\xe9 meeting', u'notes': u'the "quoted" car &amp; &amp; buy fix car', u'updated': datetime.datetime(2020, 5, 4, 2, 48, 42), u'depth': 2, u'etag': u'"etag-508873746"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-05-04T02:48:42.000Z', u'id': u'list00-task-0000008', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000008'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-01-21T12:28:50.000Z', u'title': u'&amp; caf\xe9 "quoted"', u'completed': datetime.datetime(2020, 1, 21, 12, 28, 50), u'updated': datetime.datetime(2020, 1, 21, 4, 28, 50), u'due': datetime.date(2020, 2, 26), u'depth': 0, u'etag': u'"etag-932187472"', 'due_RFC3339': u'2020-02-26T00:00:00.000Z', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-01-21T04:28:50.000Z', u'id': u'list00-task-0000009', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000009'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-12-27T12:45:50.000Z', u'parent': u'list00-task-0000009', u'title': u'the &amp; back\\slash', u'completed': datetime.datetime(2019, 12, 27, 12, 45, 50), u'updated': datetime.datetime(2019, 12, 26, 9, 45, 50), u'id': u'list00-task-0000010', u'depth': 1, u'etag': u'"etag-368107999"', u'position': u'00000000000000000000', u'hidden': True, 'updated_RFC3339': u'2019-12-26T09:45:50.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000010'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-29T13:05:47.000Z', u'title': u'back\\slash na\xefve report', u'completed': datetime.datetime(2020, 3, 29, 13, 5, 47), u'updated': datetime.datetime(2020, 3, 27, 18, 5, 47), u'due': datetime.date(2020, 3, 4), u'depth': 0, u'etag': u'"etag-828505972"', 'due_RFC3339': u'2020-03-04T00:00:00.000Z', u'position': u'00000000000000003000', 'updated_RFC3339': u'2020-03-27T18:05:47.000Z', u'id': u'list00-task-0000011', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000011'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'caf\xe9', u'notes': u'buy fix tab\there meeting call Mum fix \u65e5\u672c call 50% report', u'updated': datetime.datetime(2019, 9, 5, 5, 51, 47), u'depth': 0, u'etag': u'"etag-827768157"', u'position': u'00000000000000004000', 'updated_RFC3339': u'2019-09-05T05:51:47.000Z', u'id': u'list00-task-0000012', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000012'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 11, 13, 15, 5, 6), u'title': u'buy', u'due': datetime.date(2019, 12, 7), u'depth': 0, u'etag': u'"etag-652050200"', 'due_RFC3339': u'2019-12-07T00:00:00.000Z', u'position': u'00000000000000005000', 'updated_RFC3339': u'2019-11-13T15:05:06.000Z', u'id': u'list00-task-0000013', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000013'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'fix', u'updated': datetime.datetime(2020, 4, 13, 3, 36, 58), u'depth': 0, u'etag': u'"etag-969796505"', u'position': u'00000000000000006000', 'updated_RFC3339': u'2020-04-13T03:36:58.000Z', u'id': u'list00-task-0000014', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000014'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000014', u'title': u'milk the', u'updated': datetime.datetime(2019, 8, 29, 23, 3, 32), u'depth': 1, u'etag': u'"etag-307321118"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-08-29T23:03:32.000Z', u'id': u'list00-task-0000015', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000015'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-10-16T03:59:18.000Z', u'parent': u'list00-task-0000015', u'title': u'<html> &amp; car', u'completed': datetime.datetime(2019, 10, 16, 3, 59, 18), u'updated': datetime.datetime(2019, 10, 14, 13, 59, 18), u'id': u'list00-task-0000016', u'depth': 2, u'etag': u'"etag-327241415"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-10-14T13:59:18.000Z', u'notes': u'semi;colon fix buy fix milk semi;colon milk\nthe na\xefve "quoted" &amp; Mum comma,separated na\xefve milk', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000016'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000014', u'title': u'&amp; call 50%', u'notes': u'<html> 50% <html> \u65e5\u672c caf\xe9 Mum meeting Mum \u65e5\u672c caf\xe9 the', u'updated': datetime.datetime(2019, 7, 8, 2, 38, 30), u'due': datetime.date(2019, 9, 3), u'depth': 1, u'etag': u'"etag-919356940"', 'due_RFC3339': u'2019-09-03T00:00:00.000Z', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-07-08T02:38:30.000Z', u'id': u'list00-task-0000017', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000017'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-23T07:07:27.000Z', u'parent': u'list00-task-0000014', u'title': u'the buy back\\slash', u'completed': datetime.datetime(2020, 3, 23, 7, 7, 27), u'updated': datetime.datetime(2020, 3, 22, 14, 7, 27), u'id': u'list00-task-0000018', u'depth': 1, u'etag': u'"etag-395710445"', u'position': u'00000000000000002000', u'hidden': True, 'updated_RFC3339': u'2020-03-22T14:07:27.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000018'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'fix buy comma,separated comma,separated back\\slash', u'updated': datetime.datetime(2020, 3, 14, 19, 48, 23), u'depth': 0, u'etag': u'"etag-401082152"', u'position': u'00000000000000007000', 'updated_RFC3339': u'2020-03-14T19:48:23.000Z', u'id': u'list00-task-0000019', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000019'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-11-16T06:13:13.000Z', u'title': u'50% 50% the back\\slash buy', u'completed': datetime.datetime(2019, 11, 16, 6, 13, 13), u'updated': datetime.datetime(2019, 11, 14, 6, 13, 13), u'depth': 0, u'etag': u'"etag-412246133"', u'notes': u'Mum na\xefve &amp; car caf\xe9 <html> report \u65e5\u672c \u65e5\u672c semi;colon &amp;\r\nsemi;colon Mum the fix semi;colon na\xefve milk caf\xe9 \u65e5\u672c car comma,separated Mum', u'position': u'00000000000000008000', 'updated_RFC3339': u'2019-11-14T06:13:13.000Z', u'id': u'list00-task-0000020', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000020'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-04-13T14:12:57.000Z', u'title': u'<html> caf\xe9 \u65e5\u672c meeting 50% tab\there report', u'completed': datetime.datetime(2020, 4, 13, 14, 12, 57), u'updated': datetime.datetime(2020, 4, 12, 23, 12, 57), u'id': u'list00-task-0000021', u'depth': 0, u'etag': u'"etag-139126159"', u'position': u'00000000000000009000', u'hidden': True, 'updated_RFC3339': u'2020-04-12T23:12:57.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000021'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000021', u'title': u'the', u'notes': u'Mum\nback\\slash\nfix the comma,separated the semi;colon the caf\xe9 na\xefve <html> tab\there comma,separated', u'updated': datetime.datetime(2019, 7, 12, 9, 13, 36), u'depth': 1, u'etag': u'"etag-408224098"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-07-12T09:13:36.000Z', u'id': u'list00-task-0000022', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000022'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-10-13T01:48:17.000Z', u'parent': u'list00-task-0000021', u'title': u'call \u65e5\u672c comma,separated tab\there na\xefve tab\there call', u'completed': datetime.datetime(2019, 10, 13, 1, 48, 17), u'updated': datetime.datetime(2019, 10, 12, 1, 48, 17), u'depth': 1, u'etag': u'"etag-108139208"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-10-12T01:48:17.000Z', u'id': u'list00-task-0000023', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000023'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'na\xefve caf\xe9 "quoted" back\\slash', u'notes': u'the', u'updated': datetime.datetime(2019, 11, 1, 13, 57, 26), u'depth': 0, u'etag': u'"etag-304799188"', u'position': u'00000000000000010000', 'updated_RFC3339': u'2019-11-01T13:57:26.000Z', u'id': u'list00-task-0000024', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000024'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000024', u'title': u'\u65e5\u672c tab\there car Mum', u'deleted': True, u'updated': datetime.datetime(2020, 5, 8, 17, 10, 27), u'depth': 1, u'etag': u'"etag-834593487"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-05-08T17:10:27.000Z', u'id': u'list00-task-0000025', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000025'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000024', u'title': u'\u65e5\u672c &amp; \u65e5\u672c "quoted" \u65e5\u672c', u'updated': datetime.datetime(2019, 10, 26, 20, 55, 24), u'depth': 1, u'etag': u'"etag-861245309"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-10-26T20:55:24.000Z', u'id': u'list00-task-0000026', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000026'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2020, 1, 7, 1, 6, 56), u'parent': u'list00-task-0000024', u'title': u'na\xefve <html> back\\slash car the \u65e5\u672c &amp;', u'due': datetime.date(2020, 2, 21), u'depth': 1, u'etag': u'"etag-782473686"', 'due_RFC3339': u'2020-02-21T00:00:00.000Z', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-01-07T01:06:56.000Z', u'id': u'list00-task-0000027', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000027'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'caf\xe9 buy comma,separated', u'updated': datetime.datetime(2019, 11, 25, 4, 20, 44), u'depth': 0, u'etag': u'"etag-422597811"', u'position': u'00000000000000011000', 'updated_RFC3339': u'2019-11-25T04:20:44.000Z', u'id': u'list00-task-0000028', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000028'}, {u'status': u'completed', u'kind': u'tasks#task', u'hidden': True, 'completed_RFC3339': u'2019-08-13T18:44:12.000Z', u'parent': u'list00-task-0000028', u'title': u'milk <html> comma,separated', u'completed': datetime.datetime(2019, 8, 13, 18, 44, 12), u'updated': datetime.datetime(2019, 8, 12, 12, 44, 12), u'id': u'list00-task-0000029', u'depth': 1, u'etag': u'"etag-886025290"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-08-12T12:44:12.000Z', u'notes': u'Mum caf\xe9 \u65e5\u672c <html> the back\\slash fix semi;colon Mum\r\ncar fix tab\there \u65e5\u672c <html> buy &amp; back\\slash car meeting na\xefve', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000029'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000028', u'title': u'comma,separated call call', u'updated': datetime.datetime(2020, 4, 13, 1, 33, 43), u'depth': 1, u'etag': u'"etag-606259905"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-04-13T01:33:43.000Z', u'id': u'list00-task-0000030', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000030'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-02-05T12:19:18.000Z', u'parent': u'list00-task-0000030', u'title': u'"quoted" milk Mum milk', u'completed': datetime.datetime(2020, 2, 5, 12, 19, 18), u'updated': datetime.datetime(2020, 2, 5, 11, 19, 18), u'depth': 2, u'etag': u'"etag-106385433"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-02-05T11:19:18.000Z', u'id': u'list00-task-0000031', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000031'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000031', u'title': u'caf\xe9', u'notes': u'report Mum fix <html> "quoted" semi;colon\ncar semi;colon 50% tab\there buy na\xefve &amp; car report', u'updated': datetime.datetime(2019, 12, 30, 21, 50, 20), u'depth': 3, u'etag': u'"etag-837868618"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-30T21:50:20.000Z', u'id': u'list00-task-0000032', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000032'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-02-20T07:21:09.000Z', u'parent': u'list00-task-0000032', u'title': u'call', u'completed': datetime.datetime(2020, 2, 20, 7, 21, 9), u'updated': datetime.datetime(2020, 2, 19, 9, 21, 9), u'due': datetime.date(2020, 2, 23), u'depth': 4, u'etag': u'"etag-913679921"', 'due_RFC3339': u'2020-02-23T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-02-19T09:21:09.000Z', u'id': u'list00-task-0000033', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000033'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'call milk buy', u'updated': datetime.datetime(2019, 6, 22, 3, 5, 50), u'depth': 0, u'etag': u'"etag-42814783"', u'position': u'00000000000000012000', 'updated_RFC3339': u'2019-06-22T03:05:50.000Z', u'id': u'list00-task-0000034', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000034'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-10-15T00:31:37.000Z', u'parent': u'list00-task-0000034', u'title': u'fix milk 50% semi;colon car back\\slash', u'completed': datetime.datetime(2019, 10, 15, 0, 31, 37), u'updated': datetime.datetime(2019, 10, 14, 7, 31, 37), u'depth': 1, u'etag': u'"etag-969594809"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-10-14T07:31:37.000Z', u'id': u'list00-task-0000035', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000035'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-10-26T10:20:39.000Z', u'parent': u'list00-task-0000035', u'title': u'\u65e5\u672c na\xefve the tab\there Mum 50%', u'completed': datetime.datetime(2019, 10, 26, 10, 20, 39), u'updated': datetime.datetime(2019, 10, 26, 6, 20, 39), u'depth': 2, u'etag': u'"etag-713546450"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-10-26T06:20:39.000Z', u'id': u'list00-task-0000036', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000036'}, {u'status': u'completed', u'kind': u'tasks#task', u'hidden': True, 'completed_RFC3339': u'2020-05-08T17:44:02.000Z', u'parent': u'list00-task-0000034', u'title': u'call report \u65e5\u672c &amp;', u'completed': datetime.datetime(2020, 5, 8, 17, 44, 2), u'updated': datetime.datetime(2020, 5, 7, 21, 44, 2), u'id': u'list00-task-0000037', u'depth': 1, u'etag': u'"etag-531465054"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-05-07T21:44:02.000Z', u'notes': u'<html> milk\n\u65e5\u672c car call na\xefve <html>', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000037'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'call caf\xe9 meeting tab\there \u65e5\u672c', u'updated': datetime.datetime(2019, 9, 26, 14, 12, 47), u'depth': 0, u'etag': u'"etag-956296160"', u'position': u'00000000000000013000', 'updated_RFC3339': u'2019-09-26T14:12:47.000Z', u'id': u'list00-task-0000038', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000038'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-09-10T20:43:09.000Z', u'parent': u'list00-task-0000038', u'title': u'milk car semi;colon buy <html>', u'completed': datetime.datetime(2019, 9, 10, 20, 43, 9), u'updated': datetime.datetime(2019, 9, 10, 3, 43, 9), u'depth': 1, u'etag': u'"etag-370351869"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-09-10T03:43:09.000Z', u'id': u'list00-task-0000039', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000039'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000038', u'title': u'car milk tab\there', u'updated': datetime.datetime(2019, 11, 30, 16, 24, 8), u'depth': 1, u'etag': u'"etag-914418003"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-11-30T16:24:08.000Z', u'id': u'list00-task-0000040', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000040'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000040', u'title': u'comma,separated semi;colon', u'updated': datetime.datetime(2020, 4, 17, 8, 2, 55), u'depth': 2, u'etag': u'"etag-801367678"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-04-17T08:02:55.000Z', u'id': u'list00-task-0000041', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000041'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000038', u'title': u'tab\there comma,separated Mum call', u'updated': datetime.datetime(2020, 4, 23, 4, 37, 38), u'depth': 1, u'etag': u'"etag-402574608"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-04-23T04:37:38.000Z', u'id': u'list00-task-0000042', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000042'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000038', u'title': u'the call the back\\slash comma,separated', u'notes': u'back\\slash Mum &amp; buy report <html> \u65e5\u672c the &amp; semi;colon &amp;', u'updated': datetime.datetime(2020, 2, 8, 18, 20, 3), u'depth': 1, u'etag': u'"etag-99222406"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2020-02-08T18:20:03.000Z', u'id': u'list00-task-0000043', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000043'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list00-task-0000038', u'title': u'tab\there the fix \u65e5\u672c na\xefve comma,separated "quoted"', u'updated': datetime.datetime(2020, 4, 24, 0, 48, 47), u'depth': 1, u'etag': u'"etag-725818501"', u'position': u'00000000000000004000', 'updated_RFC3339': u'2020-04-24T00:48:47.000Z', u'id': u'list00-task-0000044', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000044'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'caf\xe9 buy call', u'notes': u'tab\there comma,separated semi;colon semi;colon comma,separated comma,separated <html> tab\there meeting\ncar comma,separated semi;colon comma,separated\r\nback\\slash tab\there', u'updated': datetime.datetime(2020, 3, 22, 12, 51, 27), u'depth': 0, u'etag': u'"etag-189760528"', u'position': u'00000000000000014000', 'updated_RFC3339': u'2020-03-22T12:51:27.000Z', u'id': u'list00-task-0000045', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000045'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-04-22T05:22:53.000Z', u'title': u'50% <html> report "quoted" na\xefve report \u65e5\u672c "quoted"', u'completed': datetime.datetime(2020, 4, 22, 5, 22, 53), u'updated': datetime.datetime(2020, 4, 21, 4, 22, 53), u'due': datetime.date(2020, 6, 20), u'depth': 0, u'etag': u'"etag-669676289"', 'due_RFC3339': u'2020-06-20T00:00:00.000Z', u'id': u'list00-task-0000046', u'position': u'00000000000000015000', 'updated_RFC3339': u'2020-04-21T04:22:53.000Z', u'notes': u'report meeting\nthe &amp; semi;colon', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000046'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-02-26T17:59:29.000Z', u'title': u'tab\there \u65e5\u672c milk call', u'completed': datetime.datetime(2020, 2, 26, 17, 59, 29), u'updated': datetime.datetime(2020, 2, 25, 18, 59, 29), u'due': datetime.date(2020, 1, 28), u'depth': 0, u'etag': u'"etag-715465068"', 'due_RFC3339': u'2020-01-28T00:00:00.000Z', u'position': u'00000000000000016000', 'updated_RFC3339': u'2020-02-25T18:59:29.000Z', u'id': u'list00-task-0000047', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000047'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-17T16:02:05.000Z', u'parent': u'list00-task-0000047', u'title': u'comma,separated comma,separated car 50% tab\there call semi;colon meeting', u'completed': datetime.datetime(2020, 3, 17, 16, 2, 5), u'updated': datetime.datetime(2020, 3, 16, 17, 2, 5), u'due': datetime.date(2020, 3, 10), u'depth': 1, u'etag': u'"etag-611891955"', 'due_RFC3339': u'2020-03-10T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-03-16T17:02:05.000Z', u'id': u'list00-task-0000048', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000048'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-01-23T02:04:05.000Z', u'parent': u'list00-task-0000048', u'title': u'the comma,separated 50% call &amp; call', u'completed': datetime.datetime(2020, 1, 23, 2, 4, 5), u'updated': datetime.datetime(2020, 1, 22, 0, 4, 5), u'id': u'list00-task-0000049', u'depth': 2, u'etag': u'"etag-389717073"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-01-22T00:04:05.000Z', u'notes': u'comma,separated meeting &amp;\r\n"quoted" &amp; comma,separated fix\r\n"quoted" buy tab\there caf\xe9 50%', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/list00-task-0000049'}], u'id': u'list00', u'title': u'List 0 na\xefve the'}, {u'tasks': [{u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 6, 30, 8, 42, 13), u'title': u'car back\\slash comma,separated buy car call the na\xefve', u'due': datetime.date(2019, 6, 7), u'depth': 0, u'etag': u'"etag-680690554"', 'due_RFC3339': u'2019-06-07T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-06-30T08:42:13.000Z', u'id': u'list01-task-0000000', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list01/tasks/list01-task-0000000'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-09-03T13:29:02.000Z', u'title': u'report 50%', u'completed': datetime.datetime(2019, 9, 3, 13, 29, 2), u'updated': datetime.datetime(2019, 9, 2, 12, 29, 2), u'due': datetime.date(2019, 10, 3), u'depth': 0, u'etag': u'"etag-31169973"', 'due_RFC3339': u'2019-10-03T00:00:00.000Z', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-09-02T12:29:02.000Z', u'id': u'list01-task-0000001', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list01/tasks/list01-task-0000001'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'&amp; meeting caf\xe9 back\\slash comma,separated', u'updated': datetime.datetime(2020, 3, 6, 0, 22, 38), u'depth': 0, u'etag': u'"etag-843325579"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-03-06T00:22:38.000Z', u'id': u'list01-task-0000002', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list01/tasks/list01-task-0000002'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 12, 8, 16, 2, 3), u'parent': u'list01-task-0000002', u'title': u'fix meeting', u'due': datetime.date(2019, 12, 2), u'depth': 1, u'etag': u'"etag-508528114"', 'due_RFC3339': u'2019-12-02T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-08T16:02:03.000Z', u'id': u'list01-task-0000003', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list01/tasks/list01-task-0000003'}], u'id': u'list01', u'title': u'List 1 buy car'}, {u'tasks': [{u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-21T18:49:43.000Z', u'title': u'car', u'completed': datetime.datetime(2020, 3, 21, 18, 49, 43), u'updated': datetime.datetime(2020, 3, 19, 23, 49, 43), u'due': datetime.date(2020, 5, 11), u'depth': 0, u'etag': u'"etag-684589241"', 'due_RFC3339': u'2020-05-11T00:00:00.000Z', u'id': u'list02-task-0000000', u'position': u'00000000000000000000', u'hidden': True, 'updated_RFC3339': u'2020-03-19T23:49:43.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000000'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 9, 25, 11, 32, 53), u'parent': u'list02-task-0000000', u'title': u'report meeting call back\\slash the caf\xe9 na\xefve', u'due': datetime.date(2019, 11, 20), u'depth': 1, u'etag': u'"etag-159767792"', 'due_RFC3339': u'2019-11-20T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-09-25T11:32:53.000Z', u'id': u'list02-task-0000001', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000001'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000000', u'title': u'semi;colon meeting 50% meeting back\\slash milk "quoted"', u'notes': u'buy\ncomma,separated report\n50% caf\xe9 <html> <html> fix <html> fix semi;colon report Mum na\xefve 50%', u'updated': datetime.datetime(2019, 12, 13, 2, 37, 52), u'depth': 1, u'etag': u'"etag-459528804"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-12-13T02:37:52.000Z', u'id': u'list02-task-0000002', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000002'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000000', u'title': u'report the <html> meeting', u'updated': datetime.datetime(2020, 5, 11, 18, 15, 46), u'depth': 1, u'etag': u'"etag-55667211"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-05-11T18:15:46.000Z', u'id': u'list02-task-0000003', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000003'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000003', u'title': u'car \u65e5\u672c tab\there buy', u'updated': datetime.datetime(2020, 4, 5, 12, 12, 10), u'depth': 2, u'etag': u'"etag-642744419"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-04-05T12:12:10.000Z', u'id': u'list02-task-0000004', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000004'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000003', u'title': u'na\xefve "quoted" "quoted" "quoted" na\xefve \u65e5\u672c', u'notes': u'semi;colon 50% <html> call report call buy\nna\xefve caf\xe9 na\xefve', u'updated': datetime.datetime(2019, 7, 5, 14, 48, 20), u'due': datetime.date(2019, 6, 19), u'depth': 2, u'etag': u'"etag-969908680"', 'due_RFC3339': u'2019-06-19T00:00:00.000Z', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-07-05T14:48:20.000Z', u'id': u'list02-task-0000005', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000005'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-06-07T23:33:23.000Z', u'parent': u'list02-task-0000005', u'title': u'50% comma,separated report buy <html> tab\there', u'completed': datetime.datetime(2019, 6, 7, 23, 33, 23), u'updated': datetime.datetime(2019, 6, 7, 12, 33, 23), u'depth': 3, u'etag': u'"etag-633798217"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-06-07T12:33:23.000Z', u'id': u'list02-task-0000006', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000006'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000006', u'title': u'na\xefve 50% \u65e5\u672c \u65e5\u672c', u'updated': datetime.datetime(2019, 7, 31, 23, 23, 35), u'depth': 4, u'etag': u'"etag-513118269"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-07-31T23:23:35.000Z', u'id': u'list02-task-0000007', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000007'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-07-13T04:26:38.000Z', u'parent': u'list02-task-0000005', u'title': u'back\\slash "quoted" tab\there fix buy', u'completed': datetime.datetime(2019, 7, 13, 4, 26, 38), u'updated': datetime.datetime(2019, 7, 12, 8, 26, 38), u'depth': 3, u'etag': u'"etag-386987314"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-07-12T08:26:38.000Z', u'id': u'list02-task-0000008', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000008'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-09-20T15:40:32.000Z', u'parent': u'list02-task-0000005', u'title': u'meeting Mum report report fix', u'completed': datetime.datetime(2019, 9, 20, 15, 40, 32), u'updated': datetime.datetime(2019, 9, 19, 12, 40, 32), u'depth': 3, u'etag': u'"etag-448685497"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2019-09-19T12:40:32.000Z', u'id': u'list02-task-0000009', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000009'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000005', u'title': u'car the "quoted"', u'notes': u'Mum <html> comma,separated Mum', u'updated': datetime.datetime(2020, 2, 9, 19, 59, 20), u'depth': 3, u'etag': u'"etag-142711455"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2020-02-09T19:59:20.000Z', u'id': u'list02-task-0000010', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000010'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000003', u'title': u'na\xefve', u'notes': u'caf\xe9 semi;colon call comma,separated milk\nthe caf\xe9 tab\there report <html>\ncar comma,separated milk <html> fix "quoted" the <html> semi;colon', u'updated': datetime.datetime(2019, 10, 14, 20, 59, 11), u'depth': 2, u'etag': u'"etag-625405088"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2019-10-14T20:59:11.000Z', u'id': u'list02-task-0000011', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000011'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'back\\slash call &amp; back\\slash fix fix comma,separated call', u'updated': datetime.datetime(2020, 3, 14, 16, 38, 18), u'depth': 0, u'etag': u'"etag-812271127"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-03-14T16:38:18.000Z', u'id': u'list02-task-0000012', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000012'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-07-18T08:17:42.000Z', u'parent': u'list02-task-0000012', u'title': u'call', u'notes': u'"quoted" back\\slash the back\\slash caf\xe9\r\n&amp; tab\there na\xefve meeting the milk <html>\n"quoted" buy fix <html> comma,separated 50% 50%', u'updated': datetime.datetime(2019, 7, 17, 12, 17, 42), u'due': datetime.date(2019, 8, 17), u'depth': 1, u'etag': u'"etag-254604024"', 'due_RFC3339': u'2019-08-17T00:00:00.000Z', u'id': u'list02-task-0000013', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-07-17T12:17:42.000Z', u'completed': datetime.datetime(2019, 7, 18, 8, 17, 42), u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000013'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-08-07T19:20:30.000Z', u'parent': u'list02-task-0000012', u'title': u'report &amp;', u'completed': datetime.datetime(2019, 8, 7, 19, 20, 30), u'updated': datetime.datetime(2019, 8, 5, 23, 20, 30), u'depth': 1, u'etag': u'"etag-521828885"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2019-08-05T23:20:30.000Z', u'id': u'list02-task-0000014', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000014'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'comma,separated', u'updated': datetime.datetime(2019, 7, 22, 6, 42, 54), u'depth': 0, u'etag': u'"etag-285523440"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2019-07-22T06:42:54.000Z', u'id': u'list02-task-0000015', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000015'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000015', u'title': u'"quoted" 50% semi;colon 50% "quoted" meeting semi;colon car', u'notes': u'the &amp; na\xefve na\xefve meeting tab\there na\xefve semi;colon call semi;colon buy\r\nreport semi;colon back\\slash semi;colon "quoted"', u'updated': datetime.datetime(2020, 3, 19, 9, 13, 38), u'depth': 1, u'etag': u'"etag-394381331"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-03-19T09:13:38.000Z', u'id': u'list02-task-0000016', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000016'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-10T07:54:00.000Z', u'parent': u'list02-task-0000015', u'title': u'fix &amp; call', u'completed': datetime.datetime(2020, 3, 10, 7, 54), u'updated': datetime.datetime(2020, 3, 8, 8, 54), u'id': u'list02-task-0000017', u'depth': 1, u'etag': u'"etag-160710498"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-03-08T08:54:00.000Z', u'notes': u'<html> tab\there &amp; back\\slash buy milk back\\slash', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000017'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000015', u'title': u'milk the \u65e5\u672c', u'notes': u'"quoted" \u65e5\u672c car &amp;', u'updated': datetime.datetime(2019, 6, 27, 0, 17, 10), u'depth': 1, u'etag': u'"etag-936192297"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2019-06-27T00:17:10.000Z', u'id': u'list02-task-0000018', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000018'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-04-18T14:53:51.000Z', u'title': u'report \u65e5\u672c buy car', u'completed': datetime.datetime(2020, 4, 18, 14, 53, 51), u'updated': datetime.datetime(2020, 4, 17, 10, 53, 51), u'depth': 0, u'etag': u'"etag-133253291"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2020-04-17T10:53:51.000Z', u'id': u'list02-task-0000019', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000019'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'semi;colon call', u'notes': u'tab\there', u'updated': datetime.datetime(2020, 5, 3, 20, 45, 11), u'depth': 0, u'etag': u'"etag-114762616"', u'position': u'00000000000000004000', 'updated_RFC3339': u'2020-05-03T20:45:11.000Z', u'id': u'list02-task-0000020', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000020'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-04-21T11:14:00.000Z', u'title': u'the', u'completed': datetime.datetime(2020, 4, 21, 11, 14), u'updated': datetime.datetime(2020, 4, 19, 19, 14), u'due': datetime.date(2020, 5, 28), u'depth': 0, u'etag': u'"etag-981654819"', 'due_RFC3339': u'2020-05-28T00:00:00.000Z', u'id': u'list02-task-0000021', u'position': u'00000000000000005000', u'hidden': True, 'updated_RFC3339': u'2020-04-19T19:14:00.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000021'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'caf\xe9 Mum Mum caf\xe9', u'notes': u'"quoted" buy buy call back\\slash caf\xe9\r\n\u65e5\u672c car milk meeting \u65e5\u672c <html>\r\nsemi;colon semi;colon comma,separated "quoted" caf\xe9 semi;colon &amp; "quoted" "quoted" <html>', u'updated': datetime.datetime(2019, 9, 9, 6, 22, 29), u'depth': 0, u'etag': u'"etag-371377977"', u'position': u'00000000000000006000', 'updated_RFC3339': u'2019-09-09T06:22:29.000Z', u'id': u'list02-task-0000022', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000022'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000022', u'title': u'buy "quoted" &amp; fix meeting', u'updated': datetime.datetime(2019, 12, 28, 21, 31, 15), u'depth': 1, u'etag': u'"etag-310243212"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-28T21:31:15.000Z', u'id': u'list02-task-0000023', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000023'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-10-31T00:40:38.000Z', u'parent': u'list02-task-0000022', u'title': u'buy na\xefve \u65e5\u672c car buy car semi;colon', u'completed': datetime.datetime(2019, 10, 31, 0, 40, 38), u'updated': datetime.datetime(2019, 10, 30, 20, 40, 38), u'id': u'list02-task-0000024', u'depth': 1, u'etag': u'"etag-356319888"', u'position': u'00000000000000001000', u'hidden': True, 'updated_RFC3339': u'2019-10-30T20:40:38.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000024'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000022', u'title': u'fix tab\there \u65e5\u672c Mum na\xefve', u'updated': datetime.datetime(2019, 7, 15, 13, 42, 41), u'depth': 1, u'etag': u'"etag-959477853"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2019-07-15T13:42:41.000Z', u'id': u'list02-task-0000025', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000025'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000022', u'title': u'Mum', u'updated': datetime.datetime(2019, 11, 30, 18, 41, 27), u'depth': 1, u'etag': u'"etag-866265646"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2019-11-30T18:41:27.000Z', u'id': u'list02-task-0000026', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000026'}, {u'status': u'completed', u'updated': datetime.datetime(2019, 10, 16, 1, 0, 12), u'hidden': True, 'completed_RFC3339': u'2019-10-16T01:00:12.000Z', u'title': u'\u65e5\u672c &amp; buy \u65e5\u672c car "quoted" caf\xe9 buy', u'completed': datetime.datetime(2019, 10, 16, 1, 0, 12), u'kind': u'tasks#task', u'id': u'list02-task-0000027', u'depth': 0, u'etag': u'"etag-151983236"', u'position': u'00000000000000007000', 'updated_RFC3339': u'2019-10-16T01:00:12.000Z', u'notes': u'comma,separated car back\\slash semi;colon the comma,separated the buy car milk "quoted"\n\u65e5\u672c \u65e5\u672c tab\there the report fix call comma,separated comma,separated call 50%', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000027'}, {u'status': u'needsAction', u'updated': datetime.datetime(2019, 6, 23, 23, 23), u'parent': u'list02-task-0000027', u'title': u'buy buy fix', u'deleted': True, u'notes': u'the fix fix &amp; fix semi;colon "quoted"', u'kind': u'tasks#task', u'depth': 1, u'etag': u'"etag-537946644"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-06-23T23:23:00.000Z', u'id': u'list02-task-0000028', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000028'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-01-10T22:30:45.000Z', u'title': u'50% milk', u'completed': datetime.datetime(2020, 1, 10, 22, 30, 45), u'updated': datetime.datetime(2020, 1, 9, 6, 30, 45), u'id': u'list02-task-0000029', u'depth': 0, u'etag': u'"etag-218369821"', u'position': u'00000000000000008000', u'hidden': True, 'updated_RFC3339': u'2020-01-09T06:30:45.000Z', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000029'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 9, 28, 13, 21, 35), u'title': u'caf\xe9 call fix \u65e5\u672c call tab\there <html>', u'notes': u'meeting fix buy the', u'due': datetime.date(2019, 9, 29), u'depth': 0, u'etag': u'"etag-442521760"', 'due_RFC3339': u'2019-09-29T00:00:00.000Z', u'position': u'00000000000000009000', 'updated_RFC3339': u'2019-09-28T13:21:35.000Z', u'id': u'list02-task-0000030', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000030'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'updated': datetime.datetime(2019, 12, 31, 17, 1, 51), u'parent': u'list02-task-0000030', u'title': u'fix <html> &amp; 50%', u'due': datetime.date(2019, 12, 7), u'depth': 1, u'etag': u'"etag-386533447"', 'due_RFC3339': u'2019-12-07T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-31T17:01:51.000Z', u'id': u'list02-task-0000031', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000031'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-04-16T20:04:55.000Z', u'parent': u'list02-task-0000030', u'title': u'"quoted" report report', u'completed': datetime.datetime(2020, 4, 16, 20, 4, 55), u'updated': datetime.datetime(2020, 4, 15, 17, 4, 55), u'due': datetime.date(2020, 3, 27), u'depth': 1, u'etag': u'"etag-754751078"', 'due_RFC3339': u'2020-03-27T00:00:00.000Z', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-04-15T17:04:55.000Z', u'id': u'list02-task-0000032', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000032'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'back\\slash', u'notes': u'&amp; car meeting\n50% <html> caf\xe9 milk Mum comma,separated tab\there \u65e5\u672c Mum report tab\there', u'updated': datetime.datetime(2019, 11, 6, 22, 2, 37), u'depth': 0, u'etag': u'"etag-135191039"', u'position': u'00000000000000010000', 'updated_RFC3339': u'2019-11-06T22:02:37.000Z', u'id': u'list02-task-0000033', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000033'}, {u'status': u'needsAction', u'updated': datetime.datetime(2020, 1, 4, 17, 21, 39), u'parent': u'list02-task-0000033', u'title': u'50%', u'deleted': True, u'notes': u'tab\there fix fix <html> car meeting report buy', u'kind': u'tasks#task', u'depth': 1, u'etag': u'"etag-342077089"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2020-01-04T17:21:39.000Z', u'id': u'list02-task-0000034', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000034'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'fix car', u'updated': datetime.datetime(2019, 7, 18, 0, 47, 22), u'depth': 0, u'etag': u'"etag-890322025"', u'position': u'00000000000000011000', 'updated_RFC3339': u'2019-07-18T00:47:22.000Z', u'id': u'list02-task-0000035', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000035'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list02-task-0000035', u'title': u'comma,separated report meeting milk', u'notes': u'fix Mum\nreport\n&amp; milk back\\slash Mum car semi;colon <html> caf\xe9 tab\there', u'updated': datetime.datetime(2019, 10, 29, 1, 2, 52), u'due': datetime.date(2019, 10, 27), u'depth': 1, u'etag': u'"etag-580835257"', 'due_RFC3339': u'2019-10-27T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-10-29T01:02:52.000Z', u'id': u'list02-task-0000036', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000036'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'car', u'updated': datetime.datetime(2019, 10, 6, 8, 26, 33), u'depth': 0, u'etag': u'"etag-135515023"', u'position': u'00000000000000012000', 'updated_RFC3339': u'2019-10-06T08:26:33.000Z', u'id': u'list02-task-0000037', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000037'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-12-17T06:05:28.000Z', u'parent': u'list02-task-0000037', u'title': u'milk', u'completed': datetime.datetime(2019, 12, 17, 6, 5, 28), u'updated': datetime.datetime(2019, 12, 16, 22, 5, 28), u'depth': 1, u'etag': u'"etag-415545321"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-16T22:05:28.000Z', u'id': u'list02-task-0000038', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list02/tasks/list02-task-0000038'}], u'id': u'list02', u'title': u'List 2 caf\xe9 comma,separated'}, {u'tasks': [{u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2019-12-14T18:12:44.000Z', u'title': u'milk \u65e5\u672c <html> meeting caf\xe9', u'completed': datetime.datetime(2019, 12, 14, 18, 12, 44), u'updated': datetime.datetime(2019, 12, 13, 5, 12, 44), u'depth': 0, u'etag': u'"etag-165398050"', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-12-13T05:12:44.000Z', u'id': u'list03-task-0000000', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000000'}, {u'status': u'completed', u'kind': u'tasks#task', 'completed_RFC3339': u'2020-03-16T17:11:57.000Z', u'title': u'Mum "quoted" buy fix &amp; milk caf\xe9 comma,separated', u'completed': datetime.datetime(2020, 3, 16, 17, 11, 57), u'updated': datetime.datetime(2020, 3, 16, 5, 11, 57), u'depth': 0, u'etag': u'"etag-567338730"', u'position': u'00000000000000001000', 'updated_RFC3339': u'2020-03-16T05:11:57.000Z', u'id': u'list03-task-0000001', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000001'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'meeting "quoted" semi;colon Mum back\\slash', u'updated': datetime.datetime(2020, 4, 12, 14, 7, 37), u'depth': 0, u'etag': u'"etag-308157803"', u'position': u'00000000000000002000', 'updated_RFC3339': u'2020-04-12T14:07:37.000Z', u'id': u'list03-task-0000002', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000002'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'caf\xe9 \u65e5\u672c back\\slash meeting', u'updated': datetime.datetime(2019, 6, 3, 5, 39, 58), u'depth': 0, u'etag': u'"etag-119062173"', u'position': u'00000000000000003000', 'updated_RFC3339': u'2019-06-03T05:39:58.000Z', u'id': u'list03-task-0000003', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000003'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'parent': u'list03-task-0000003', u'title': u'meeting &amp;', u'notes': u'meeting report 50% na\xefve Mum semi;colon Mum na\xefve semi;colon na\xefve milk 50%', u'updated': datetime.datetime(2019, 7, 4, 18, 49, 23), u'due': datetime.date(2019, 8, 20), u'depth': 1, u'etag': u'"etag-443387474"', 'due_RFC3339': u'2019-08-20T00:00:00.000Z', u'position': u'00000000000000000000', 'updated_RFC3339': u'2019-07-04T18:49:23.000Z', u'id': u'list03-task-0000004', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000004'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'comma,separated Mum comma,separated meeting', u'updated': datetime.datetime(2019, 6, 19, 16, 16, 28), u'depth': 0, u'etag': u'"etag-930468302"', u'position': u'00000000000000004000', 'updated_RFC3339': u'2019-06-19T16:16:28.000Z', u'id': u'list03-task-0000005', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000005'}, {u'status': u'needsAction', u'kind': u'tasks#task', u'title': u'fix "quoted" &amp; call call milk Mum', u'notes': u'buy "quoted" meeting \u65e5\u672c', u'updated': datetime.datetime(2020, 5, 3, 5, 45, 36), u'depth': 0, u'etag': u'"etag-224972529"', u'position': u'00000000000000005000', 'updated_RFC3339': u'2020-05-03T05:45:36.000Z', u'id': u'list03-task-0000006', u'selfLink': u'https://www.googleapis.com/tasks/v1/lists/list03/tasks/list03-task-0000006'}], u'id': u'list03', u'title': u'List 3 "quoted" buy'}]
+
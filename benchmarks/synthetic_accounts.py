@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Generates repeatable synthetic Google Tasks accounts for the benchmarks.
+#
+# The tasks are generated in the same format as returned by tasks.list() (RFC 3339 timestamp strings,
+# parent/position values, etc.), and are then converted in the same way as the worker converts them,
+# so the frontend sees exactly the same structures as for a real backup.
+#
+# gae_stubs.install() must be called before this module is imported.
+
+import datetime
+import random
+
+import shared # pylint: disable=relative-import
+import model # pylint: disable=relative-import
+
+
+# Words used to build titles and notes. Includes characters which must be escaped by the CSV and ICS formats,
+# and non-ASCII characters.
+_WORDS = [u'buy', u'milk', u'call', u'Mum', u'fix', u'the', u'car', u'report', u'meeting', u'"quoted"',
+          u'comma,separated', u'semi;colon', u'back\\slash', u'café', u'日本', u'naïve',
+          u'<html>', u'&amp;', u'50%', u'tab\there']
+
+
+# { account name : (number of tasklists, number of tasks, maximum depth, maximum number of lines of notes) }
+ACCOUNTS = {
+    'small' : (4, 100, 4, 3),
+    'medium' : (12, 10000, 6, 5),
+    'large' : (30, 100000, 8, 8),
+}
+
+# Accounts in the order that they are benchmarked by default
+ACCOUNT_NAMES = ['small', 'medium', 'large']
+
+
+def _rfc3339(value, date_only=False):
+    if date_only:
+        return value.strftime('%Y-%m-%dT00:00:00.000Z')
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _text(rnd, num_words):
+    return u' '.join([rnd.choice(_WORDS) for _ in range(num_words)])
+
+
+def _notes(rnd, max_notes_lines):
+    num_lines = rnd.randint(1, max_notes_lines)
+    line_ends = [u'\n', u'\n', u'\r\n']
+    notes = u''
+    for line_num in range(num_lines):
+        if line_num:
+            notes += rnd.choice(line_ends)
+        notes += _text(rnd, rnd.randint(1, 12))
+    return notes
+
+
+def _generate_api_tasks(rnd, tasklist_id, num_tasks, max_depth, max_notes_lines): # pylint: disable=too-many-locals
+    """ Returns a list of task dictionaries, in the format returned by tasks.list() """
+    base_time = datetime.datetime(2019, 6, 1, 0, 0, 0)
+    tasks = []
+    # The ID of the most recent task at each depth, used to choose parents
+    ids_at_depth = []
+    # Number of children of each parent, used to create the position value
+    num_children = {}
+    for task_num in range(num_tasks):
+        task_id = u'%s-task-%07d' % (tasklist_id, task_num)
+        depth = rnd.randint(0, min(len(ids_at_depth), max_depth))
+        parent_id = ids_at_depth[depth - 1] if depth else None
+        ids_at_depth = ids_at_depth[:depth] + [task_id]
+        sibling_num = num_children.get(parent_id, 0)
+        num_children[parent_id] = sibling_num + 1
+
+        updated = base_time + datetime.timedelta(minutes=rnd.randint(0, 500000), seconds=rnd.randint(0, 59))
+        task = {
+            u'kind' : u'tasks#task',
+            u'id' : task_id,
+            u'etag' : u'"etag-%d"' % rnd.randint(0, 10 ** 9),
+            u'title' : _text(rnd, rnd.randint(1, 8)),
+            u'updated' : _rfc3339(updated),
+            u'selfLink' : u'https://www.googleapis.com/tasks/v1/lists/%s/tasks/%s' % (tasklist_id, task_id),
+            u'position' : u'%020d' % (sibling_num * 1000),
+            u'status' : u'needsAction',
+        }
+        if parent_id:
+            task[u'parent'] = parent_id
+        if rnd.random() < 0.4:
+            task[u'notes'] = _notes(rnd, max_notes_lines)
+        if rnd.random() < 0.3:
+            task[u'due'] = _rfc3339(updated + datetime.timedelta(days=rnd.randint(-30, 60)), date_only=True)
+        if rnd.random() < 0.35:
+            task[u'status'] = u'completed'
+            task[u'completed'] = _rfc3339(updated + datetime.timedelta(hours=rnd.randint(0, 48)))
+            if rnd.random() < 0.3:
+                task[u'hidden'] = True
+        if rnd.random() < 0.03:
+            task[u'deleted'] = True
+        tasks.append(task)
+
+    # The server returns tasks in an arbitrary order, so shuffle them so that fix_tasks_order() has work to do
+    rnd.shuffle(tasks)
+    return tasks
+
+
+def convert_tasks(tasks):
+    """ Convert tasks in the same way as the worker (worker._add_page_of_tasks) """
+    for task in tasks:
+        if task.has_key('due'):
+            task['due_RFC3339'] = task['due']
+        if task.has_key('updated'):
+            task['updated_RFC3339'] = task['updated']
+        if task.has_key('completed'):
+            task['completed_RFC3339'] = task['completed']
+    shared.set_timestamps(tasks)
+    shared_values = {}
+    return [model.TaskRecord.from_api_dict(task, shared_values) for task in tasks]
+
+
+def generate_api_tasklists(account_name, seed=1):
+    """ Returns the list of tasklists for the named account, with the tasks in the format returned by
+        tasks.list() (i.e., as retrieved by the worker, before being converted)
+    """
+    num_tasklists, num_tasks, max_depth, max_notes_lines = ACCOUNTS[account_name]
+    rnd = random.Random(seed)
+
+    # Spread the tasks unevenly between the tasklists; one large list, and the rest shared between the others
+    tasks_per_list = [num_tasks // 2]
+    remaining = num_tasks - tasks_per_list[0]
+    for list_num in range(1, num_tasklists):
+        num_lists_left = num_tasklists - list_num
+        if num_lists_left == 1:
+            count = remaining
+        else:
+            count = rnd.randint(0, 2 * remaining // num_lists_left)
+        tasks_per_list.append(count)
+        remaining -= count
+
+    tasklists = []
+    for list_num, count in enumerate(tasks_per_list):
+        tasklist_id = u'list%02d' % list_num
+        tasklist = {u'title' : u'List %d %s' % (list_num, _text(rnd, 2)), u'id' : tasklist_id}
+        if count:
+            tasklist[u'tasks'] = _generate_api_tasks(rnd, tasklist_id, count, max_depth, max_notes_lines)
+        tasklists.append(tasklist)
+    return tasklists
+
+
+def generate_tasklists(account_name, seed=1):
+    """ Returns the list of tasklists for the named account, in the same format as created by the worker """
+    tasklists = generate_api_tasklists(account_name, seed)
+    for tasklist in tasklists:
+        if u'tasks' in tasklist:
+            tasklist[u'tasks'] = convert_tasks(tasklist[u'tasks'])
+    return tasklists
+
+
+def generate_deep_tasklist(num_tasks, num_orphans=100, cycle_length=10, seed=1):
+    """ Returns a tasklist whose tasks form a single chain, each task being the parent of the next.
+    
+        Also adds 'num_orphans' tasks whose parent does not exist, and 'cycle_length' tasks whose parents
+        form a cycle, so that fix_tasks_order() has to detect both. The tasks are in random order.
+    """
+    rnd = random.Random(seed)
+    tasklist_id = u'deep'
+    tasks = []
+    parent_id = None
+    for task_num in range(num_tasks):
+        task_id = u'deep-task-%07d' % task_num
+        task = {u'id' : task_id, u'title' : u'Task %d' % task_num, u'position' : u'%020d' % 0,
+                u'status' : u'needsAction'}
+        if parent_id:
+            task[u'parent'] = parent_id
+        tasks.append(task)
+        parent_id = task_id
+    for task_num in range(num_orphans):
+        tasks.append({u'id' : u'orphan-%07d' % task_num, u'title' : u'Orphan %d' % task_num,
+                      u'position' : u'%020d' % task_num, u'status' : u'needsAction',
+                      u'parent' : u'missing-%07d' % (task_num % 7)})
+    for task_num in range(cycle_length):
+        tasks.append({u'id' : u'cycle-%07d' % task_num, u'title' : u'Cycle %d' % task_num,
+                      u'position' : u'%020d' % 0, u'status' : u'needsAction',
+                      u'parent' : u'cycle-%07d' % ((task_num + 1) % cycle_length)})
+    rnd.shuffle(tasks)
+    shared_values = {}
+    return {u'title' : u'Deep list', u'id' : tasklist_id,
+            u'tasks' : [model.TaskRecord.from_api_dict(task, shared_values) for task in tasks]}
@@ -29,6 +29,23 @@ class ExportJobStatus(object): # pylint: disable=too-few-public-methods
     PROGRESS_VALUES = [TO_BE_STARTED, INITIALISING, BUILDING]
     STOPPED_VALUES = [EXPORT_COMPLETED, ERROR]
 
+
+class TasklistsDataFormat(object): # pylint: disable=too-few-public-methods
+    # How the tasklists are serialised in the TasklistsData blobs (before being encrypted)
+    # The format is stored in the job record, so that backups created by an older version can still be read.
+    PICKLED_LIST = 0 # The complete list of tasklists is pickled as a single object (original format)
+    PICKLED_TASKLISTS = 1 # Each tasklist is pickled separately, one after another, in the original order
+    
+    
+class DataCompression(object): # pylint: disable=too-few-public-methods
+    # How the serialised tasklists are compressed (before being encrypted) in the TasklistsData blobs
+    # The compression is stored in the job record, so that the data can be decompressed when it is read.
+    NONE = '' # Not compressed (all backups created before compression was added)
+    ZLIB = 'zlib'
+    BZ2 = 'bz2'
+    
+    ALL_VALUES = [NONE, ZLIB, BZ2]
+    
     
 # Max blob size is just under 1MB (~2^20), so use 1000000 to allow some margin for overheads
 MAX_BLOB_SIZE = 1000000
@@ -36,6 +53,10 @@ MAX_BLOB_SIZE = 1000000
 # Name of folder containg templates. Do not include path separator characters, as they are inserted by os.path.join()
 PATH_TO_TEMPLATES = "templates"
 
+# Copy of the Tasks API v1 discovery document, used if the discovery document cannot be fetched 
+# and there is no cached copy (see worker._get_discovery_document())
+TASKS_DISCOVERY_DOCUMENT_FALLBACK_FILE = "tasks_v1_discovery.json"
+
 RSA_PRIVATE_KEY_COOKIE_NAME = 'private_key_b64'
 
 
@@ -48,3 +69,25 @@ ZERO_DATETIME_STRING = '0000-01-01 00:00:00'
 
 # This is how we display ZERO_RFC3339_DATETIME_STRING to the user for date-only fields such as 'due'
 ZERO_DATE_STRING = '0000-01-01'
+
+# Key in a stored tasklist dictionary which holds the number of tasks (at the start of the 'tasks' list)
+# which the worker has already put in hierarchy order, with 'depth' set. Any tasks after those could not
+# be reached from a root task, and are only kept for merging the changes in later incremental backup layers.
+# Tasklists stored before the worker ordered the tasks do not have this key.
+TASKLIST_NUM_ORDERED_TASKS = u'num_ordered_tasks'
+
+# Key in a tasklist dictionary stored in an incremental backup layer, which says how the tasklist is to be
+# combined with the same tasklist from the previous layers (see shared.merge_backup_layer());
+#   TASKLIST_CHANGES_ONLY   'tasks' only contains the tasks which have changed since the previous layer
+#                           (including deleted, hidden and completed tasks)
+#   TASKLIST_UNCHANGED      The tasklist has no 'tasks', because it hasn't changed since the previous layer
+# Tasklists which were retrieved in full do not have this key.
+TASKLIST_LAYER_CONTENT = u'layer_content'
+TASKLIST_CHANGES_ONLY = u'changes_only'
+TASKLIST_UNCHANGED = u'unchanged'
+
+# Export formats which are returned as a file, and so can be cached (see settings.EXPORT_CACHE_ENABLED).
+# The 'html_raw' page includes the current time and the user's display options, and 'RTM' is sent by email.
+# 'ics' is not cached, because every VTODO has a DTSTAMP of the time the file was created.
+EXPORT_CACHE_FORMATS = ['outlook', 'raw', 'raw1', 'raw2', 'log', 'import_export', 'py', 
+                        'tabbed_text', 'spaced_text', 'gtb']
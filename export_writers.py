@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This module contains hand-written writers for the file-based export formats.
+#
+# Each writer produces exactly the same output as the corresponding Django template in the templates
+# directory (tasks_template_FORMAT.EXT), but yields the output one row (task) at a time, so that the
+# frontend can write each row to the response as it is produced, instead of rendering the entire file
+# in memory. Rendering a large account using the Django templates is slow, and needs several copies
+# of the output in memory at once.
+#
+# CAUTION: The templates are the reference for each format. If a template is changed, the corresponding
+# writer in this module must also be changed (and vice versa).
+#
+# The writers reproduce the way that Django 1.2 renders the templates (with autoescape off);
+#   - A missing value is rendered as an empty string, and is False in an {% if %}
+#   - A datetime is rendered using Django's default DATETIME_FORMAT ("N j, Y, P"), and a date is rendered
+#     using Django's default DATE_FORMAT ("N j, Y"), e.g., "Jan. 26, 2012, 7:47 a.m."
+#   - The 'date' filter returns an empty string if the value is empty or cannot be formatted
+#   - The replace, replacenewline and replacecsv filters from common/customdjango.py return None when
+#     passed None, which is then rendered as "None"
+
+import datetime
+
+
+# Month abbreviations used by the Django 'N' date format character
+_MONTHS_AP = { 1 : u'Jan.', 2 : u'Feb.', 3 : u'March', 4 : u'April', 5 : u'May', 6 : u'June', 7 : u'July',
+               8 : u'Aug.', 9 : u'Sept.', 10 : u'Oct.', 11 : u'Nov.', 12 : u'Dec.' }
+
+
+def _format_p(value):
+    """ Django 'P' date format character; time in 12-hour hours and minutes, with 'a.m.'/'p.m.',
+        minutes left off if they're zero, and 'midnight' and 'noon' if appropriate.
+        e.g., '1 a.m.', '1:30 p.m.', 'midnight', 'noon', '12:30 p.m.'
+    """
+    if value.minute == 0 and value.hour == 0:
+        return u'midnight'
+    if value.minute == 0 and value.hour == 12:
+        return u'noon'
+    hour = value.hour
+    if hour == 0:
+        hour = 12
+    elif hour > 12:
+        hour -= 12
+    if value.minute == 0:
+        time_str = unicode(hour)
+    else:
+        time_str = u'%s:%02d' % (hour, value.minute)
+    if value.hour > 11:
+        return time_str + u' p.m.'
+    return time_str + u' a.m.'
+
+
+# The Django date format characters used by the templates
+# Accessing a time attribute of a date object raises AttributeError, in the same way as Django
+_DATE_FORMAT_CHARS = {
+    'Y' : lambda value: unicode(value.year),
+    'm' : lambda value: u'%02d' % value.month,
+    'd' : lambda value: u'%02d' % value.day,
+    'j' : lambda value: unicode(value.day),
+    'N' : lambda value: _MONTHS_AP[value.month],
+    'H' : lambda value: u'%02d' % value.hour,
+    'i' : lambda value: u'%02d' % value.minute,
+    's' : lambda value: u'%02d' % value.second,
+    'P' : _format_p,
+}
+
+
+class DateFormat(object): # pylint: disable=too-few-public-methods
+    r""" A pre-parsed Django date format string, e.g. DateFormat("Ymd\THis\Z")
+
+        Supports the subset of Django date format characters used by the export templates.
+        As in Django, a backslash escapes the following character.
+    """
+    def __init__(self, format_str):
+        self.format_str = format_str
+        # List of (literal string, None) or (None, format function)
+        self._pieces = []
+        escaped = False
+        for char in format_str:
+            if escaped:
+                self._pieces.append((char, None))
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char in _DATE_FORMAT_CHARS:
+                self._pieces.append((None, _DATE_FORMAT_CHARS[char]))
+            else:
+                self._pieces.append((char, None))
+
+
+    def format(self, value):
+        """ Returns the formatted value. Raises AttributeError if value is not a date/datetime. """
+        return u''.join([literal if fn is None else fn(value) for literal, fn in self._pieces])
+
+
+_DATETIME_FORMAT = DateFormat("N j, Y, P")
+_DATE_FORMAT = DateFormat("N j, Y")
+_DATE_ISO = DateFormat("Y-m-d")
+_DATETIME_ISO = DateFormat("Y-m-d H:i:s")
+_DATE_COMPACT = DateFormat("Ymd")
+_DATETIME_ICS = DateFormat("Ymd\\THis\\Z")
+_DATE_US = DateFormat("m/d/Y")
+
+
+def date_filter(value, date_format):
+    """ Equivalent of the Django 'date' filter; {{ value|date:"FORMAT" }} """
+    if not value:
+        return u''
+    try:
+        return date_format.format(value)
+    except AttributeError:
+        return u''
+
+
+def render(value):
+    """ Returns value as it would be rendered by Django; {{ value }} """
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    if isinstance(value, (bool, int, long, float)):
+        return unicode(value)
+    if isinstance(value, datetime.datetime):
+        return _DATETIME_FORMAT.format(value)
+    if isinstance(value, datetime.date):
+        return _DATE_FORMAT.format(value)
+    if hasattr(value, '__unicode__'):
+        return unicode(value)
+    return str(value).decode('utf-8')
+
+
+def _get(obj, key):
+    """ Returns the value of obj.key in the same way as a Django variable lookup,
+        where a missing value is returned as an empty string """
+    return obj.get(key, u'')
+
+
+# ------------------------------------------------------------
+#   Equivalents of the filters in common/customdjango.py
+# ------------------------------------------------------------
+def _replacecsv(value):
+    if value is None:
+        return None
+    return value.replace(u'"', u'""').replace(u'\n', u'\r\n')
+
+
+def _replacenewline(value):
+    if value is None:
+        return None
+    return value.replace(u'\r\n', u'\\n').replace(u'\r', u'\\n').replace(u'\n', u'\\n')
+
+
+def _ics_text(value):
+    r""" Equivalent of value|replace:"/\/\\\\"|replace:"/,/\,"|replace:"/;/\;"|replacenewline """
+    if value is None:
+        return None
+    return _replacenewline(value.replace(u'\\', u'\\\\').replace(u',', u'\\,').replace(u';', u'\\;'))
+
+
+def _csv_and_no_newline(value):
+    """ Equivalent of value|replacenewline|replacecsv """
+    return _replacecsv(_replacenewline(value))
+
+
+# ----------------------------------
+#   CSV formats
+# ----------------------------------
+# Each CSV column is a function which is passed (tasklist, task, template_values),
+# and returns the unicode string for that column
+
+def _literal(text):
+    """ A column which always contains text """
+    return lambda tasklist, task, template_values: text
+
+
+def _if_field(key, fmt=render, quoted=True, from_tasklist=False):
+    """ A column containing the (quoted) formatted value of the field, if the field is set;
+            {% if task.key %}"{{ task.key|fmt }}"{% endif %}
+        fmt is a function which is passed the value, and returns the unicode string to be written
+    """
+    def column(tasklist, task, template_values): # pylint: disable=unused-argument
+        value = _get(tasklist if from_tasklist else task, key)
+        if not value:
+            return u''
+        if quoted:
+            return u'"' + fmt(value) + u'"'
+        return fmt(value)
+    return column
+
+
+def _field(key, fmt=render, quoted=True, from_tasklist=False):
+    """ A column containing the (quoted) formatted value of the field; "{{ task.key|fmt }}" """
+    def column(tasklist, task, template_values): # pylint: disable=unused-argument
+        value = fmt(_get(tasklist if from_tasklist else task, key))
+        if quoted:
+            return u'"' + value + u'"'
+        return value
+    return column
+
+
+def _is_completed(task):
+    return _get(task, 'status') == u'completed'
+
+
+def _filtered(filter_fn):
+    """ Returns a function which renders the value after it has been passed through filter_fn """
+    return lambda value: render(filter_fn(value))
+
+
+def _formatted_date(date_format):
+    """ Returns a function which renders the value using the 'date' filter """
+    return lambda value: date_filter(value, date_format)
+
+
+_CSV = _filtered(_replacecsv)
+_CSV_NO_NEWLINE = _filtered(_csv_and_no_newline)
+
+
+def _utc_prefixed_date(key, date_format):
+    """ A column containing the date, prefixed by utc_prefix_str, if the field is set;
+            {% if task.key %}"{{ utc_prefix_str }}{{ task.key|date:"FORMAT" }}"{% endif %}
+    """
+    def column(tasklist, task, template_values): # pylint: disable=unused-argument
+        value = _get(task, key)
+        if not value:
+            return u''
+        return u'"' + render(template_values['utc_prefix_str']) + date_filter(value, date_format) + u'"'
+    return column
+
+
+def _outlook_completed(tasklist, task, template_values): # pylint: disable=unused-argument
+    if _is_completed(task):
+        return u'"' + date_filter(_get(task, 'completed'), _DATE_ISO) + u'"'
+    return u''
+
+
+def _outlook_status(tasklist, task, template_values): # pylint: disable=unused-argument
+    if _is_completed(task):
+        return u'"Complete"'
+    return u'"Not Started"'
+
+
+# { export_format : (header row, list of columns) }
+_CSV_FORMATS = {
+    # tasks_template_outlook.csv
+    'outlook' : (u'"Subject","Start Date","Due Date","Reminder On/Off","Reminder Date","Reminder Time",'
+                 u'"Date Completed","% Complete","Total Work","Actual Work","Billing Information","Categories",'
+                 u'"Companies","Contacts","Mileage","Notes","Priority","Private","Role","Schedule+ Priority",'
+                 u'"Sensitivity","Status"',
+                 [_field('title', _CSV),
+                  _literal(u''),
+                  _if_field('due', _formatted_date(_DATE_ISO)),
+                  _literal(u'"False"'),
+                  _literal(u''),
+                  _literal(u''),
+                  _outlook_completed,
+                  _literal(u''),
+                  _literal(u''),
+                  _literal(u''),
+                  _literal(u''),
+                  _if_field('title', _CSV, from_tasklist=True),
+                  _literal(u''),
+                  _literal(u''),
+                  _literal(u''),
+                  _if_field('notes', _CSV),
+                  _literal(u'"Normal"'),
+                  _literal(u'"False"'),
+                  _literal(u''),
+                  _literal(u''),
+                  _literal(u'"Normal"'),
+                  _outlook_status]),
+
+    # tasks_template_raw.csv
+    'raw' : (u'"tasklist","kind","id","etag","title","updated","selfLink","parent","position","notes",'
+             u'"status","due","completed","deleted","hidden"',
+             [_if_field('title', _CSV, from_tasklist=True),
+              _if_field('kind'),
+              _if_field('id'),
+              _if_field('etag'),
+              _if_field('title', _CSV),
+              _if_field('updated'),
+              _if_field('selfLink'),
+              _if_field('parent'),
+              _if_field('position'),
+              _if_field('notes', _CSV),
+              _if_field('status'),
+              _if_field('due'),
+              _if_field('completed'),
+              _if_field('deleted'),
+              _if_field('hidden')]),
+
+    # tasks_template_raw1.csv
+    'raw1' : (u'"tasklist","kind","id","etag","title","updated","selfLink","parent","position","notes",'
+              u'"status","due","completed","deleted","hidden"',
+              [_if_field('title', _CSV, from_tasklist=True),
+               _if_field('kind'),
+               _if_field('id'),
+               _if_field('etag'),
+               _if_field('title', _CSV),
+               _if_field('updated', _formatted_date(_DATETIME_ISO), quoted=False),
+               _if_field('selfLink'),
+               _if_field('parent'),
+               _if_field('position'),
+               _if_field('notes', _CSV),
+               _if_field('status'),
+               _if_field('due', _formatted_date(_DATE_ISO), quoted=False),
+               _if_field('completed', _formatted_date(_DATETIME_ISO), quoted=False),
+               _if_field('deleted'),
+               _if_field('hidden')]),
+
+    # tasks_template_raw2.csv
+    'raw2' : (u'"tasklist","kind","id","etag","title","updated","updated_RFC3339","selfLink","parent",'
+              u'"position","notes","status","due","due_RFC3339","completed","completed_RFC3339","deleted","hidden"',
+              [_if_field('title', _CSV, from_tasklist=True),
+               _if_field('kind'),
+               _if_field('id'),
+               _if_field('etag'),
+               _if_field('title', _CSV),
+               _if_field('updated', _formatted_date(_DATETIME_ISO)),
+               _if_field('updated_RFC3339'),
+               _if_field('selfLink'),
+               _if_field('parent'),
+               _if_field('position'),
+               _if_field('notes', _CSV),
+               _if_field('status'),
+               _if_field('due', _formatted_date(_DATE_ISO)),
+               _if_field('due_RFC3339'),
+               _if_field('completed', _formatted_date(_DATETIME_ISO)),
+               _if_field('completed_RFC3339'),
+               _if_field('deleted'),
+               _if_field('hidden')]),
+
+    # tasks_template_log.csv
+    'log' : (u'"tasklist_id","task_id","parent","position","status","deleted","hidden",depth',
+             [_field('id', from_tasklist=True),
+              _field('id'),
+              _field('parent'),
+              _field('position'),
+              _field('status'),
+              _if_field('deleted'),
+              _if_field('hidden'),
+              _if_field('depth', quoted=False)]),
+
+    # tasks_template_import_export.csv
+    'import_export' : (u'"tasklist_name","title","notes","status","due","completed","deleted","hidden",depth',
+                       [_if_field('title', _CSV_NO_NEWLINE, from_tasklist=True),
+                        _if_field('title', _CSV_NO_NEWLINE),
+                        _if_field('notes', _CSV_NO_NEWLINE),
+                        _if_field('status'),
+                        _utc_prefixed_date('due', _DATE_ISO),
+                        _utc_prefixed_date('completed', _DATETIME_ISO),
+                        _if_field('deleted'),
+                        _if_field('hidden'),
+                        _field('depth', quoted=False)]),
+}
+
+
+def _write_csv(export_format, template_values):
+    header, columns = _CSV_FORMATS[export_format]
+    yield header
+    for tasklist in template_values['tasklists']:
+        for task in tasklist.get('tasks', []):
+            yield u'\n' + u','.join([column(tasklist, task, template_values) for column in columns])
+    yield u'\n'
+
+
+# ----------------------------------
+#   Other formats
+# ----------------------------------
+def _write_ics(export_format, template_values): # pylint: disable=unused-argument
+    """ tasks_template_ics.ics """
+    yield u'BEGIN:VCALENDAR\nPRODID:-//Google Inc//Google Tasks//EN\nVERSION:2.0'
+    dtstamp = date_filter(template_values['now'], _DATETIME_ICS)
+    for tasklist in template_values['tasklists']:
+        tasklist_title = _get(tasklist, 'title')
+        if tasklist_title:
+            categories = u'\nCATEGORIES:' + render(_ics_text(tasklist_title))
+        else:
+            categories = u''
+        for task in tasklist.get('tasks', []):
+            row = [u'\nBEGIN:VTODO\nUID:', render(_get(task, 'id')), u'@google.com\nDTSTAMP:', dtstamp]
+            due = _get(task, 'due')
+            if due:
+                row.append(u'\nDUE;VALUE=DATE:' + date_filter(due, _DATE_COMPACT))
+            row.append(u'\nSUMMARY:' + render(_ics_text(_get(task, 'title'))))
+            notes = _get(task, 'notes')
+            if notes:
+                row.append(u'\nDESCRIPTION:' + render(_ics_text(notes)))
+            if _is_completed(task):
+                row.append(u'\nSTATUS:COMPLETED\nCOMPLETED:' + date_filter(_get(task, 'completed'), _DATETIME_ICS))
+            else:
+                row.append(u'\nSTATUS:NEEDS-ACTION')
+            row.append(categories)
+            row.append(u'\nEND:VTODO')
+            yield u''.join(row)
+    yield u'\nEND:VCALENDAR\n'
+
+
+def _write_py(export_format, template_values): # pylint: disable=unused-argument
+    """ tasks_template_py.py
+
+        Django renders {{ tasklists }} as str(tasklists), so this writes the repr of each tasklist in turn.
+    """
+    yield u'\nimport datetime\n\ntasklists = ['
+    separator = u''
+    for tasklist in template_values['tasklists']:
+        yield separator + repr(tasklist).decode('utf-8')
+        separator = u', '
+    yield u']\n\n'
+
+
+# { export_format : (indent for each depth level, title prefix, due prefix, notes prefix, trailing text) }
+_TEXT_FORMATS = {
+    # tasks_template_spaced_text.txt
+    'spaced_text' : (u'      ', u'  ', u'  ', u'    ', u'\n'),
+    # tasks_template_tabbed_text.txt
+    'tabbed_text' : (u'\t\t', u'\t', u'\t', u'\t\t', u''),
+}
+
+
+def _write_text(export_format, template_values):
+    depth_indent, title_prefix, due_prefix, notes_prefix, trailing_text = _TEXT_FORMATS[export_format]
+    for tasklist in template_values['tasklists']:
+        yield (u'\n===========================================================\n' +
+            render(_get(tasklist, 'title')) +
+            u'\n-----------------------------------------------------------\n')
+        for task in tasklist.get('tasks', []):
+            indent = depth_indent * len(range(_get(task, 'depth')))
+            row = [u'\n', indent, title_prefix]
+            if _is_completed(task):
+                row.append(u'x ')
+            row.append(render(_get(task, 'title')))
+            row.append(u'\n')
+            due = _get(task, 'due')
+            if due:
+                row.append(indent + due_prefix + u'DUE: ' + date_filter(due, _DATE_ISO) + u'\n')
+            notes = _get(task, 'notes')
+            if notes:
+                for line in notes.split(u'\n'):
+                    row.append(indent + notes_prefix + render(line) + u'\n')
+            yield u''.join(row)
+        yield u'\n\n'
+    if trailing_text:
+        yield trailing_text
+
+
+def _write_rtm(export_format, template_values): # pylint: disable=unused-argument
+    """ tasks_template_RTM.txt (Remember The Milk 'Import by email') """
+    for tasklist in template_values['tasklists']:
+        tasklist_title = _get(tasklist, 'title')
+        if tasklist_title:
+            list_tag = u' #' + render(tasklist_title)
+        else:
+            list_tag = u' '
+        for task in tasklist.get('tasks', []):
+            if _is_completed(task):
+                continue
+            due = _get(task, 'due')
+            if due:
+                due_str = u'^' + date_filter(due, _DATE_US)
+            else:
+                due_str = u''
+            yield render(_get(task, 'title')) + u' ' + due_str + list_tag + u'\n'
+    yield u'\n-end-\n'
+
+
+_WRITERS = {
+    'outlook' : _write_csv,
+    'raw' : _write_csv,
+    'raw1' : _write_csv,
+    'raw2' : _write_csv,
+    'log' : _write_csv,
+    'import_export' : _write_csv,
+    'ics' : _write_ics,
+    'py' : _write_py,
+    'spaced_text' : _write_text,
+    'tabbed_text' : _write_text,
+    'RTM' : _write_rtm,
+}
+
+SUPPORTED_FORMATS = frozenset(_WRITERS)
+
+
+def iter_export(export_format, template_values):
+    """ Yields the export file for export_format as a series of unicode strings (usually one per task).
+
+        template_values is the same dictionary that is passed to the Django template, and must contain
+        'tasklists', 'now' and 'utc_prefix_str'.
+
+        Joining the strings produces the same output as rendering tasks_template_<export_format>.<ext>
+    """
+    return _WRITERS[export_format](export_format, template_values)
+
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This module contains a pool of httplib2.Http objects, used by the worker to access the Tasks API.
+#
+# Each httplib2.Http object keeps its connections open (one per scheme and host), and reuses them for
+# subsequent requests (keep-alive). Previously, the worker created a new Http object for every connection
+# attempt and every fetch thread, so every job (and every thread) started with new connections.
+# The pool keeps idle Http objects (and their open connections) so that they can be reused by later
+# attempts, threads and jobs on the same instance.
+#
+# NOTE: When running on App Engine, the vendored httplib2 sends requests using urlfetch
+# (httplib2.AppEngineHttpConnection), and the actual connections are managed by the urlfetch service.
+# In that case, reusing the Http objects only saves re-creating and re-authorising them.
+#
+# credentials.authorize(http) replaces http.request with a method that adds the access token, so
+# a pooled Http object is authorised when it is acquired, and the authorisation is removed when it
+# is released, so that one user's credentials are never used for another user's requests.
+#
+# httplib2.Http is not thread safe, so each Http object must only be used by one thread at a time.
+# The pool itself is thread safe.
+
+import threading
+import time
+
+import httplib2 # pylint: disable=relative-import
+
+
+class HttpPool(object):
+    """ Pool of idle httplib2.Http objects.
+
+        acquire() returns the most recently released idle Http object (which is most likely to still have
+        open connections), or a new Http object if there are no idle objects.
+
+        release() returns the Http object to the pool. At most max_size idle objects are kept.
+        Objects which have been idle for more than idle_timeout seconds are closed and discarded.
+    """
+
+    def __init__(self, max_size, idle_timeout, timeout=None):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        # List of (Http object, time released), least recently released first
+        self._idle = []
+
+
+    @staticmethod
+    def _close(http):
+        """ Close all the open connections of an Http object """
+        for conn in http.connections.values():
+            try:
+                conn.close()
+            except Exception: # pylint: disable=broad-except
+                pass
+        http.connections.clear()
+
+
+    def _evict_idle(self):
+        """ Close and discard idle Http objects which have been idle for more than idle_timeout seconds.
+            Must be called with the lock held.
+        """
+        expiry_time = time.time() - self._idle_timeout
+        num_expired = 0
+        for _, released_time in self._idle:
+            if released_time >= expiry_time:
+                break
+            num_expired += 1
+        if num_expired:
+            for http, _ in self._idle[:num_expired]:
+                self._close(http)
+            del self._idle[:num_expired]
+
+
+    def acquire(self, credentials=None):
+        """ Returns an Http object from the pool (or a new Http object), authorised with credentials
+            (if credentials is not None).
+
+            The caller must call release() when it has finished with the Http object.
+        """
+
+        http = None
+        with self._lock:
+            self._evict_idle()
+            if self._idle:
+                http, _ = self._idle.pop()
+        if http is None:
+            http = httplib2.Http(timeout=self._timeout)
+        if credentials:
+            http = credentials.authorize(http)
+        return http
+
+
+    def release(self, http, discard=False):
+        """ Return an Http object to the pool.
+
+            If discard is True (e.g., if the last request failed), or if the pool already has max_size
+            idle objects, the Http object's connections are closed, and the object is not reused.
+        """
+
+        if http is None:
+            return
+        # Remove the authorisation added by credentials.authorize(), which replaced the request
+        # method of this instance (so the Http.request method of the class is used again)
+        http.__dict__.pop('request', None)
+
+        with self._lock:
+            self._evict_idle()
+            if discard or len(self._idle) >= self._max_size:
+                self._close(http)
+                return
+            self._idle.append((http, time.time()))
@@ -18,10 +18,14 @@
 
 """Classes to represent Tasks data"""
 
+import datetime
+
 from google.appengine.ext import db
 
 from oauth2client import appengine
 
+from common.properties import DictProperty
+
 import constants
 
 
@@ -84,6 +88,32 @@ class ProcessTasksJob(db.Model):
     # The decrypted AES key is used to decrypt the encrypted tasklist data
     encrypted_aes_key_b64 = db.StringProperty(indexed=False, default='')
     
+    # The job_start_timestamp of the user's previous completed backup job, if this job may be stored as
+    # an incremental backup layer on top of the previous backup.
+    # Used by the worker to check that the TasklistsSnapshotState matches the stored TasklistsData
+    previous_job_start_timestamp = db.DateTimeProperty(indexed=False)
+
+    # {layer number : { 'job_start_timestamp', 'encrypted_aes_key_b64', 'data_format', 'data_compression' }}
+    # for each of the backup layers which this job's backup is stored on top of, starting with the last
+    # full backup (layer 0). This job's own layer number is len(previous_layers).
+    # Every layer is encrypted with its own AES key, and every AES key is encrypted with the same RSA
+    # public key, so the layers can only be decrypted (and merged) using the private key from the user's cookie.
+    # Empty if this job is (or will be) a full backup.
+    previous_layers = DictProperty(indexed=False)
+
+    # The number of layers of TasklistsData blobs which may be stored for the user (i.e., 1 more than the 
+    # highest layer written since the last full backup deleted the blobs). The frontend copies this from 
+    # the previous job record, so that a full backup only has to delete the layers which were written.
+    # None if not known (e.g., if the previous job record was created before this property was added).
+    num_stored_layers = db.IntegerProperty(indexed=False)
+
+    # How the tasklists are serialised in the TasklistsData blobs. 
+    # Backups created before this property was added use the original format (a single pickled list)
+    data_format = db.IntegerProperty(indexed=False, default=constants.TasklistsDataFormat.PICKLED_LIST)
+    
+    # How the serialised tasklists are compressed (one of constants.DataCompression)
+    data_compression = db.StringProperty(indexed=False, default=constants.DataCompression.NONE)
+    
 
 class TasklistsData(db.Model):
     """ The user's tasklists are pickled, encrypted and stored in 1 or more blobs """
@@ -91,6 +121,105 @@ class TasklistsData(db.Model):
     idx = db.IntegerProperty(default=0, indexed=True) # To reassemble in order        
 
 
+class TasklistsSnapshotState(db.Model):
+    """ Details of the user's most recent completed backup, used by the worker to perform incremental backups.
+    
+        When creating an instance, the user's email address is used as the key
+        
+        This does NOT contain any tasks data. The tasks are only stored (encrypted) in the TasklistsData blobs.
+    """
+    
+    # The job_start_timestamp of the backup job which created the current TasklistsData blobs.
+    # The snapshot can only be used if this matches the job_start_timestamp of the previous job.
+    job_start_timestamp = db.DateTimeProperty(indexed=False)
+    
+    # When the last full (non-incremental) backup was started. 
+    # A full backup is performed when this is more than settings.INCREMENTAL_BACKUP_MAX_AGE_HOURS old
+    full_backup_timestamp = db.DateTimeProperty(indexed=False)
+    
+    # The options used to create the snapshot. An incremental backup can only be performed
+    # if the new backup job uses the same options.
+    include_completed = db.BooleanProperty(indexed=False, default=False)
+    include_deleted = db.BooleanProperty(indexed=False, default=False)
+    include_hidden = db.BooleanProperty(indexed=False, default=False)
+    
+    # {tasklist_id : RFC-3339 timestamp}
+    # Changes to tasks in the tasklist at or after this time are not in the snapshot, 
+    # so this is used as the 'updatedMin' when retrieving changes for the tasklist.
+    tasklist_watermarks = DictProperty(indexed=False)
+    
+    # {tasklist_id : (updated, etag)}
+    # The 'updated' and 'etag' values of each tasklist (as returned by tasklists.list()) when the snapshot
+    # was created. If these are unchanged, the tasklist from the snapshot is reused without retrieving any tasks.
+    tasklist_versions = DictProperty(indexed=False)
+    
+    # {tasklist_id : number of tasks}
+    # The number of tasks in each tasklist when the snapshot was created. For tasklists which were only
+    # retrieved as changes, this is an estimate (changed tasks can't be told apart from new tasks without
+    # the previous backup's tasks). Only used for progress and statistics.
+    tasklist_num_tasks = DictProperty(indexed=False)
+
+    # The number of backup layers (including the full backup) which make up the backup of the job that
+    # created this snapshot. The snapshot can only be used if this matches the number of previous layers
+    # of the new backup job.
+    num_layers = db.IntegerProperty(indexed=False, default=0)
+
+    # The format and compression of the TasklistsData blobs which were stored with this snapshot
+    data_format = db.IntegerProperty(indexed=False, default=constants.TasklistsDataFormat.PICKLED_LIST)
+    data_compression = db.StringProperty(indexed=False, default=constants.DataCompression.NONE)
+
+
+class CachedExport(db.Model):
+    """ A finished export file, so that the user can download the same backup in the same format again,
+        without the backup being reassembled, decrypted, unpickled and exported again.
+        
+        The key name is the cache key from shared.get_export_cache_key(), and the parent is keyed by the
+        user's email address (see shared.get_cached_export()).
+        
+        This does NOT contain any tasks data. The (compressed) file content is encrypted with the backup's 
+        AES key, and stored in CachedExportData child entities.
+    """
+    
+    # The job_start_timestamp of the backup that was exported
+    job_start_timestamp = db.DateTimeProperty(indexed=False)
+    
+    export_format = db.StringProperty(indexed=False)
+    
+    # Used to set the response headers when the cached file is returned.
+    # The Content-Disposition header is content_disposition_prefix followed by the filename, 
+    # which is built (using the current date) with file_extension at the end.
+    content_type = db.StringProperty(indexed=False)
+    content_disposition_prefix = db.StringProperty(indexed=False)
+    file_extension = db.StringProperty(indexed=False)
+    
+    # Number of bytes stored (after compression), and the number of CachedExportData blobs
+    stored_size = db.IntegerProperty(indexed=False, default=0)
+    num_blobs = db.IntegerProperty(indexed=False, default=0)
+    
+    # Random nonce used (with the backup's AES key) to encrypt this file, so that the AES key stream 
+    # used for the backup data is never reused. Empty if the backup is not encrypted.
+    aes_nonce = db.ByteStringProperty(indexed=False, default='')
+    
+    # When the file was last returned to the user. The least recently used files are evicted first.
+    last_used_timestamp = db.DateTimeProperty(auto_now_add=True, indexed=False)
+    
+    
+class CachedExportData(db.Model):
+    """ Part of the content of a CachedExport. The key name is 'blob' followed by the index, starting at 'blob0' """
+    data = db.BlobProperty(indexed=False) # NOTE: Blob max size is just under 1MB
+
+
+class DiscoveryDocument(db.Model):
+    """ A copy of an API discovery document, so that the document doesn't need to be fetched for every job.
+    
+        The key name is the API name and version; e.g. 'tasks:v1'. See worker._get_discovery_document()
+    """
+    
+    # The discovery document, as returned by the discovery service (a JSON string)
+    content = db.TextProperty()
+    
+    fetched_timestamp = db.DateTimeProperty(indexed=False)
+
     
 class UsageStats(db.Model):
     """ Used to track GTB usage.
@@ -123,4 +252,338 @@ class UsageStats(db.Model):
     # The number of seconds taken to retrieve the tasks
     processing_time = db.FloatProperty(indexed=False)
     
-    
\ No newline at end of file
+        
+    
+class TaskRecord(object): # pylint: disable=too-many-instance-attributes
+    """ A compact representation of a single task, used instead of the task dictionary returned by the server.
+    
+        A 50,000 task account needs 50,000 of these in memory at once, so each field is stored in a slot 
+        (rather than in a per-task dictionary), and values which are the same for many tasks (kind, status, 
+        and the start of selfLink) are shared between tasks.
+        
+        TaskRecord supports the same dictionary methods (task[key], task.get(), task.has_key(), 'key' in task,
+        del task[key]) as the original task dictionary, so the frontend and the Django templates 
+        can use either a TaskRecord or a task dictionary (from backups created by older versions).
+        A field which has not been set is treated the same as a missing dictionary key.
+        
+        Schema:
+            Fields returned by the server
+                kind            u'tasks#task'
+                id              Used when determining parent-child relationships
+                etag
+                title           Free text
+                updated         datetime
+                selfLink        Derived from the tasklist URL and the task id (see below)
+                parent          OPT: ID of the parent of this task (only if this is a sub-task)
+                position        OPT: Position of the task amongst its siblings
+                notes           OPT: Free text
+                status          u'completed' | u'needsAction'
+                due             OPT: date (the server only stores the date)
+                completed       OPT: datetime, or None if the server returned the zero timestamp
+                deleted         OPT: True if the task has been deleted
+                hidden          OPT: True if the task has been hidden (cleared)
+                links           OPT: List of link dictionaries
+            Original RFC 3339 strings (used by the raw2 export format)
+                due_RFC3339, updated_RFC3339, completed_RFC3339
+                    These are derived from the date/datetime values when requested, and are only stored
+                    when they can't be derived (e.g. if the server returned an invalid timestamp).
+            Fields set when the tasks are put in hierarchy order (by the worker, or by the frontend for older backups)
+                depth
+            Fields set by the frontend when processing tasks for display or export
+                display, indent, invalid
+            Any other fields (e.g., new fields returned by the server) are stored in a dictionary.
+            
+        selfLink is almost always the tasklist URL followed by the task id, so only the (shared) tasklist URL 
+        is stored, unless selfLink doesn't end with the task id.
+    """
+    
+    # Fields which are stored directly in a slot with the same name
+    _FIELDS = ('kind', 'id', 'etag', 'title', 'updated', 'parent', 'position', 'notes', 'status', 
+               'due', 'completed', 'deleted', 'hidden', 'links', 
+               'depth', 'display', 'indent', 'invalid')
+    _FIELDS_SET = frozenset(_FIELDS)
+    
+    # { RFC3339 key name : (timestamp field name, slot used if the RFC3339 string can't be derived) }
+    _RFC3339_FIELDS = {
+        'due_RFC3339' : ('due', '_due_RFC3339'),
+        'updated_RFC3339' : ('updated', '_updated_RFC3339'),
+        'completed_RFC3339' : ('completed', '_completed_RFC3339'),
+    }
+    
+    # Slots which are pickled
+    _STATE_SLOTS = _FIELDS + ('_self_link_prefix', '_self_link', 
+                              '_due_RFC3339', '_updated_RFC3339', '_completed_RFC3339', '_extra')
+    _STATE_SLOTS_SET = frozenset(_STATE_SLOTS)
+    
+    __slots__ = _STATE_SLOTS
+    
+    # Version of the pickled state (see __getstate__). 
+    _STATE_VERSION = 1
+    
+    # Order in which keys are returned by keys(), which matches the column order of the raw export formats
+    _KEY_ORDER = ('kind', 'id', 'etag', 'title', 'updated', 'updated_RFC3339', 'selfLink', 'parent', 'position', 
+                  'notes', 'status', 'due', 'due_RFC3339', 'completed', 'completed_RFC3339', 'deleted', 'hidden', 
+                  'links', 'depth', 'display', 'indent', 'invalid')
+    
+    # { key : key used by __repr__ }
+    # Keys in the dictionary returned by the server (and most of the keys added by the worker and the frontend)
+    # were unicode, whereas the RFC3339 keys and 'display' were added as str.
+    _REPR_KEYS = dict([(key, unicode(key)) for key in _KEY_ORDER 
+                       if key not in _RFC3339_FIELDS and key != 'display'])
+    
+    
+    @classmethod
+    def from_api_dict(cls, task_dict, shared_values=None):
+        """ Returns a TaskRecord containing all the fields from the task dictionary.
+        
+            The timestamps in task_dict should already have been converted to date/datetime objects,
+            with the original strings stored in the '*_RFC3339' fields.
+            
+            shared_values is an optional dictionary which is used to share identical values (such as the 
+            start of selfLink) between TaskRecords. The same dictionary should be used for all the tasks 
+            in a tasklist.
+        """
+        
+        if shared_values is None:
+            shared_values = {}
+            
+        record = cls()
+        
+        # The id must be set before selfLink, so that selfLink can be derived from the id
+        if 'id' in task_dict:
+            record.id = task_dict['id'] # pylint: disable=attribute-defined-outside-init
+            
+        for key, value in task_dict.iteritems():
+            if key == 'id' or key in cls._RFC3339_FIELDS:
+                continue
+            if key in ('kind', 'status'):
+                value = shared_values.setdefault(value, value)
+            if key == 'selfLink':
+                record._set_self_link(value, shared_values)
+            else:
+                record[key] = value
+                
+        # Only store the original RFC3339 strings which can't be derived from the date/datetime values
+        for rfc3339_key, (field_name, slot_name) in cls._RFC3339_FIELDS.iteritems():
+            if rfc3339_key in task_dict:
+                original_value = task_dict[rfc3339_key]
+                if record._derive_RFC3339(field_name) != original_value:
+                    setattr(record, slot_name, original_value)
+                    
+        return record
+        
+        
+    @staticmethod
+    def _format_RFC3339(value): # pylint: disable=invalid-name
+        """ Returns the RFC3339 string that shared.convert_RFC3339_string_to_datetime() would have parsed to value """
+        
+        if value is None:
+            return constants.ZERO_RFC3339_DATETIME_STRING
+        if isinstance(value, datetime.datetime):
+            return unicode(value.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+        return unicode(value.strftime("%Y-%m-%dT00:00:00.000Z"))
+        
+        
+    def _derive_RFC3339(self, field_name): # pylint: disable=invalid-name
+        """ Returns the RFC3339 string derived from the timestamp field, or None if it can't be derived """
+        
+        try:
+            return self._format_RFC3339(getattr(self, field_name))
+        except Exception: # pylint: disable=broad-except
+            # Field is not set, or can't be formatted
+            return None
+            
+            
+    def _set_self_link(self, value, shared_values=None):
+        task_id = getattr(self, 'id', None)
+        if task_id and value.endswith(task_id) and len(value) > len(task_id):
+            prefix = value[:-len(task_id)]
+            if shared_values is not None:
+                prefix = shared_values.setdefault(prefix, prefix)
+            self._self_link_prefix = prefix # pylint: disable=attribute-defined-outside-init
+            self._clear_slot('_self_link')
+        else:
+            self._self_link = value # pylint: disable=attribute-defined-outside-init
+            self._clear_slot('_self_link_prefix')
+            
+            
+    def _clear_slot(self, slot_name):
+        try:
+            delattr(self, slot_name)
+        except AttributeError:
+            pass
+            
+            
+    def _freeze_derived_values(self, field_name):
+        """ Store any values which are derived from field_name, before field_name is changed or deleted """
+        
+        if field_name == 'id':
+            prefix = getattr(self, '_self_link_prefix', None)
+            if prefix is not None:
+                self._self_link = prefix + self.id # pylint: disable=attribute-defined-outside-init
+                self._clear_slot('_self_link_prefix')
+            return
+            
+        for rfc3339_key, (timestamp_field_name, slot_name) in self._RFC3339_FIELDS.iteritems():
+            if timestamp_field_name == field_name:
+                if not hasattr(self, slot_name) and rfc3339_key in self:
+                    setattr(self, slot_name, self[rfc3339_key])
+                return
+                
+                
+    def __getitem__(self, key):
+        if key in self._FIELDS_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+                
+        if key == 'selfLink':
+            self_link = getattr(self, '_self_link', None)
+            if self_link is not None:
+                return self_link
+            prefix = getattr(self, '_self_link_prefix', None)
+            if prefix is not None:
+                return prefix + self.id
+            raise KeyError(key)
+            
+        if key in self._RFC3339_FIELDS:
+            field_name, slot_name = self._RFC3339_FIELDS[key]
+            value = getattr(self, slot_name, None)
+            if value is False:
+                # The RFC3339 field has been deleted
+                raise KeyError(key)
+            if value is not None:
+                return value
+            if hasattr(self, field_name):
+                value = self._derive_RFC3339(field_name)
+                if value is not None:
+                    return value
+            raise KeyError(key)
+            
+        extra = getattr(self, '_extra', None)
+        if extra and key in extra:
+            return extra[key]
+        raise KeyError(key)
+        
+        
+    def __setitem__(self, key, value):
+        if key in self._FIELDS_SET:
+            if key in ('id', 'due', 'updated', 'completed'):
+                self._freeze_derived_values(key)
+            setattr(self, key, value)
+        elif key == 'selfLink':
+            self._set_self_link(value)
+        elif key in self._RFC3339_FIELDS:
+            setattr(self, self._RFC3339_FIELDS[key][1], value)
+        else:
+            extra = getattr(self, '_extra', None)
+            if extra is None:
+                extra = self._extra = {} # pylint: disable=attribute-defined-outside-init
+            extra[key] = value
+            
+            
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+            
+        if key in self._FIELDS_SET:
+            if key in ('id', 'due', 'updated', 'completed'):
+                self._freeze_derived_values(key)
+            delattr(self, key)
+        elif key == 'selfLink':
+            self._clear_slot('_self_link')
+            self._clear_slot('_self_link_prefix')
+        elif key in self._RFC3339_FIELDS:
+            field_name, slot_name = self._RFC3339_FIELDS[key]
+            self._clear_slot(slot_name)
+            if hasattr(self, field_name):
+                # Prevent the value from being derived from the timestamp field
+                setattr(self, slot_name, False)
+        else:
+            del self._extra[key]
+            
+            
+    def __contains__(self, key):
+        try:
+            self[key] # pylint: disable=pointless-statement
+        except KeyError:
+            return False
+        return True
+        
+        
+    def has_key(self, key):
+        return key in self
+        
+        
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+        
+        
+    def keys(self):
+        keys = [key for key in self._KEY_ORDER if key in self]
+        extra = getattr(self, '_extra', None)
+        if extra:
+            keys.extend(extra.keys())
+        return keys
+        
+        
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+        
+        
+    def __iter__(self):
+        return iter(self.keys())
+        
+        
+    def __len__(self):
+        return len(self.keys())
+        
+        
+    def __eq__(self, other):
+        if isinstance(other, (TaskRecord, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+        
+        
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+        
+        
+    def __repr__(self):
+        # The 'py' export format writes repr(tasklists), so this must return a valid Python dictionary literal.
+        # The keys are the same type as in the task dictionary returned by the server (see _REPR_KEYS), 
+        # so that the 'py' export is unchanged.
+        return repr(dict((self._REPR_KEYS.get(key, key), value) for key, value in self.items()))
+        
+        
+    def __getstate__(self):
+        # Store the version, and a dictionary of the slots which are set. The slot names are the same string 
+        # objects for every task, so pickle only stores each name once per pickled tasklist.
+        # Tasks are pickled by reference to the model.TaskRecord class, so if the class is ever moved or 
+        # renamed, model.TaskRecord must remain as an alias, so that stored backups can still be loaded.
+        state = {}
+        for slot_name in self._STATE_SLOTS:
+            try:
+                state[slot_name] = getattr(self, slot_name)
+            except AttributeError:
+                pass
+        return (self._STATE_VERSION, state)
+        
+        
+    def __setstate__(self, state):
+        # A later version may store the state differently, but must still return (version, dictionary of slots). 
+        # Any fields which don't have a slot in this version (e.g., fields added by a later version) 
+        # are kept as extra fields. Unknown private slots are ignored.
+        _, slot_values = state
+        for slot_name, value in slot_values.iteritems():
+            if slot_name in self._STATE_SLOTS_SET:
+                setattr(self, slot_name, value)
+            elif not slot_name.startswith('_'):
+                self[slot_name] = value
@@ -275,7 +275,12 @@ class StorageByKeyName(Storage):
     if self._cache:
       json = self._cache.get(self._key_name)
       if json:
-        return Credentials.new_from_json(json)
+        credential = Credentials.new_from_json(json)
+        # So that refreshed credentials are written back through this storage
+        # (and so update the cache)
+        if hasattr(credential, 'set_store'):
+          credential.set_store(self)
+        return credential
 
     credential = None
     entity = self._model.get_by_key_name(self._key_name)
@@ -392,6 +397,7 @@ class OAuth2Decorator(object):
                user_agent=None,
                message=None,
                callback_path='/oauth2callback',
+               credentials_cache=None,
                **kwargs):
 
     """Constructor for OAuth2Decorator
@@ -412,6 +418,9 @@ class OAuth2Decorator(object):
       callback_path: string, The absolute path to use as the callback URI. Note
         that this must match up with the URI given when registering the
         application in the APIs Console.
+      credentials_cache: memcache, or an object with the same get(), set() and
+        delete() methods, used as a write-through cache in front of the
+        datastore for the users' credentials. See StorageByKeyName.
       **kwargs: dict, Keyword arguments are be passed along as kwargs to the
         OAuth2WebServerFlow constructor.
     """
@@ -427,6 +436,7 @@ class OAuth2Decorator(object):
     self._message = message
     self._in_error = False
     self._callback_path = callback_path
+    self._credentials_cache = credentials_cache
 
   def _display_error_message(self, request_handler):
     request_handler.response.out.write('<html><body>')
@@ -462,7 +472,8 @@ class OAuth2Decorator(object):
       # Store the request URI in 'state' so we can use it later
       self.flow.params['state'] = _build_state_value(request_handler, user)
       self.credentials = StorageByKeyName(
-          CredentialsModel, user.user_id(), 'credentials').get()
+          CredentialsModel, user.user_id(), 'credentials',
+          cache=self._credentials_cache).get()
 
       if not self.has_credentials():
         return request_handler.redirect(self.authorize_url())
@@ -523,7 +534,8 @@ class OAuth2Decorator(object):
 
       self.flow.params['state'] = _build_state_value(request_handler, user)
       self.credentials = StorageByKeyName(
-          CredentialsModel, user.user_id(), 'credentials').get()
+          CredentialsModel, user.user_id(), 'credentials',
+          cache=self._credentials_cache).get()
       return method(request_handler, *args, **kwargs)
     return setup_oauth
 
@@ -598,7 +610,8 @@ class OAuth2Decorator(object):
           decorator._create_flow(self)
           credentials = decorator.flow.step2_exchange(self.request.params)
           StorageByKeyName(
-              CredentialsModel, user.user_id(), 'credentials').put(credentials)
+              CredentialsModel, user.user_id(), 'credentials',
+              cache=decorator._credentials_cache).put(credentials)
           redirect_uri = _parse_state_value(str(self.request.get('state')),
                                             user)
           self.redirect(redirect_uri)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This module limits the rate at which the workers send requests to the Tasks API.
+#
+# Several workers (on up to 10 instances) may be processing jobs at the same time, and each worker may
+# use several fetch threads, so at peak times the combined request rate could exceed the Tasks API quota,
+# and every worker would start getting rate limit errors (and retrying). Instead, every Tasks API request
+# first takes a token from a token bucket which is shared by all the workers, so that at peak times
+# requests are delayed (a little) rather than failing. If a request would have to wait for more than
+# max_wait seconds, RateLimitExceededError is raised instead of sending the request, so that the caller
+# backs off and retries in the same way as for a rate limit error from the server (see retry_policy.py).
+#
+# The shared bucket is stored in memcache. The tokens used in each one-second window are counted with a
+# single atomic memcache.offset_multi() call, which also increments the usage counters (requests per
+# minute and per day) which are displayed by /admin/api_usage. If there weren't enough tokens left in the
+# window, the tokens (and usage) are given back, so that only requests which are actually sent are counted.
+# If memcache is unavailable, each instance uses its own LocalTokenBucket instead. A LocalTokenBucket can
+# also be passed to RateLimiter as a stand-in for the shared bucket (e.g. when testing).
+#
+# The memcache keys are not given an expiry time (offset_multi doesn't support one), but they are
+# small, and old keys are never read again, so they are evicted by memcache as required.
+
+import datetime
+import logging
+import threading
+import time
+
+from google.appengine.api import memcache
+from google.appengine.api import logservice # To flush logs
+
+
+# Namespace for all the memcache keys used by this module
+_MEMCACHE_NAMESPACE = 'tasks_api_rate_limiter'
+
+# Usage counters
+_REQUESTS = 'requests'
+_THROTTLED = 'throttled'
+
+
+def _window_key(window):
+    """ Key of the number of tokens used in the one-second window """
+    return 'window:%d' % window
+
+
+def _minute_usage_key(counter, timestamp):
+    return 'usage:%s:minute:%d' % (counter, int(timestamp) // 60)
+
+
+def _day_usage_key(counter, timestamp):
+    return 'usage:%s:day:%s' % (counter, datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d'))
+
+
+def _usage_keys(counter, timestamp):
+    return [_minute_usage_key(counter, timestamp), _day_usage_key(counter, timestamp)]
+
+
+class BucketUnavailableError(Exception):
+    """ The shared token bucket could not be accessed (e.g., memcache is unavailable) """
+    pass
+
+
+class RateLimitExceededError(Exception):
+    """ The requests could not be sent within the rate limit, without waiting for more than max_wait seconds.
+    
+        The name is recognised by retry_policy.classify_error() as a rate limit error.
+    """
+    pass
+
+
+class LocalTokenBucket(object):
+    """ Token bucket for a single instance.
+
+        Holds up to capacity tokens, and is refilled at rate tokens per second.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.time):
+        self._rate = float(rate)
+        self._capacity = float(capacity or rate)
+        self._clock = clock
+        self._tokens = self._capacity
+        self._timestamp = clock()
+        # The bucket may be shared by several fetch threads
+        self._lock = threading.Lock()
+
+
+    def try_acquire(self, num_tokens=1, usage_keys=None): # pylint: disable=unused-argument
+        """ Takes num_tokens tokens from the bucket, and returns 0, or if there are not enough tokens,
+            returns the number of seconds until there should be enough tokens.
+
+            num_tokens must not be more than the capacity of the bucket.
+            usage_keys is ignored; a local bucket doesn't record usage.
+        """
+        if num_tokens > self._capacity:
+            raise ValueError("Cannot take %s tokens from a bucket which holds %s tokens" % (num_tokens, self._capacity))
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._capacity, self._tokens + (now - self._timestamp) * self._rate)
+            self._timestamp = now
+            # Allow for rounding errors when the bucket has been refilled after waiting for the returned delay
+            if self._tokens >= num_tokens - 1e-6:
+                self._tokens = max(0.0, self._tokens - num_tokens)
+                return 0
+            return (num_tokens - self._tokens) / self._rate
+
+
+class MemcacheTokenBucket(object):
+    """ Token bucket shared by all instances, which allows up to rate tokens in each one-second window """
+
+    def __init__(self, rate, clock=time.time):
+        self._rate = rate
+        self._clock = clock
+
+
+    def try_acquire(self, num_tokens=1, usage_keys=None):
+        """ Takes num_tokens tokens from the bucket, and returns 0, or if there are not enough tokens left
+            in the current window, returns the number of seconds until the next window.
+
+            num_tokens must not be more than rate.
+            If the tokens are taken, the counters in usage_keys are incremented by num_tokens (in the same
+            memcache call).
+
+            Raises BucketUnavailableError if memcache is unavailable.
+        """
+        if num_tokens > self._rate:
+            raise ValueError("Cannot take %s tokens from a bucket which allows %s tokens per second" % 
+                (num_tokens, self._rate))
+        now = self._clock()
+        window = int(now)
+        key = _window_key(window)
+        offsets = {key : num_tokens}
+        for usage_key in usage_keys or []:
+            offsets[usage_key] = num_tokens
+        results = memcache.offset_multi(offsets, namespace=_MEMCACHE_NAMESPACE, initial_value=0)
+        num_used = results.get(key)
+        if num_used is None:
+            raise BucketUnavailableError("Unable to update token count in memcache")
+        if num_used <= self._rate:
+            return 0
+        # Not enough tokens left in this window, so give the tokens (and usage) back. Until they have been 
+        # given back, another request may be refused when it could have been allowed, but the rate is 
+        # never exceeded.
+        memcache.offset_multi(dict((offset_key, -num_tokens) for offset_key in offsets), 
+            namespace=_MEMCACHE_NAMESPACE, initial_value=0)
+        return window + 1 - now
+
+
+class _UnlimitedBucket(object): # pylint: disable=too-few-public-methods
+    """ Bucket used when the rate is not limited, which only records the usage """
+
+    def try_acquire(self, num_tokens=1, usage_keys=None): # pylint: disable=no-self-use
+        if usage_keys:
+            memcache.offset_multi(dict((key, num_tokens) for key in usage_keys),
+                namespace=_MEMCACHE_NAMESPACE, initial_value=0)
+        return 0
+
+
+class RateLimiter(object):
+    """ Limits the rate of Tasks API requests (from all workers) to rate requests per second.
+
+        rate        -- Maximum number of requests per second. If 0, requests are not limited (but
+                       the usage is still recorded).
+        max_wait    -- Maximum number of seconds to delay a request. If the request would have to be delayed
+                       for longer, acquire() raises RateLimitExceededError, so that the caller backs off
+                       (as per its retry policy) rather than sending the request.
+        bucket      -- The token bucket. Defaults to a MemcacheTokenBucket shared by all instances.
+    """
+
+    def __init__(self, rate, max_wait, bucket=None, clock=time.time, sleep=time.sleep): # pylint: disable=too-many-arguments
+        self._rate = rate
+        self._max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        if rate > 0:
+            self._bucket = bucket or MemcacheTokenBucket(rate, clock)
+        else:
+            self._bucket = bucket or _UnlimitedBucket()
+        # Used by this instance if the shared bucket is unavailable
+        self._local_bucket = LocalTokenBucket(rate, clock=clock) if rate > 0 else self._bucket
+        self._using_local_bucket = False
+
+
+    def _try_acquire(self, num_tokens, usage_keys):
+        fn_name = "RateLimiter._try_acquire(): "
+        try:
+            delay = self._bucket.try_acquire(num_tokens, usage_keys)
+            if self._using_local_bucket:
+                logging.info("%sShared token bucket is available again", fn_name)
+                logservice.flush()
+                self._using_local_bucket = False
+            return delay
+        except BucketUnavailableError as ex:
+            if not self._using_local_bucket:
+                logging.warning("%sUsing local token bucket: %s", fn_name, ex)
+                logservice.flush()
+                self._using_local_bucket = True
+            return self._local_bucket.try_acquire(num_tokens)
+
+
+    def acquire(self, num_requests=1):
+        """ Waits (if necessary) until num_requests requests may be sent, and returns the number of
+            seconds waited.
+
+            A batch request counts as one request for each of the requests in the batch. If num_requests
+            is more than rate, the tokens are taken from successive one-second windows, rate at a time.
+            
+            Raises RateLimitExceededError if the requests can't be sent within max_wait seconds. The requests
+            must then not be sent. Tokens which were already taken for some of the requests are not given back.
+        """
+        fn_name = "RateLimiter.acquire(): "
+
+        # The most tokens that can be taken at once
+        max_tokens = max(1, int(self._rate)) if self._rate > 0 else num_requests
+        num_remaining = num_requests
+        waited = 0
+        while num_remaining > 0:
+            num_tokens = min(num_remaining, max_tokens)
+            # The usage is only recorded when the tokens are taken, so that each request is only counted once
+            delay = self._try_acquire(num_tokens, _usage_keys(_REQUESTS, self._clock()))
+            if delay <= 0:
+                num_remaining -= num_tokens
+                continue
+
+            if not waited:
+                memcache.offset_multi(dict((key, num_requests) for key in _usage_keys(_THROTTLED, self._clock())),
+                    namespace=_MEMCACHE_NAMESPACE, initial_value=0)
+
+            if waited + delay > self._max_wait:
+                logging.warning("%sRate limit of %s requests per second exceeded. Not sending %d requests, " +
+                    "because they would have to wait more than %s seconds (already waited %.1f seconds)",
+                    fn_name, self._rate, num_requests, self._max_wait, waited)
+                logservice.flush()
+                raise RateLimitExceededError("Rate limit of %s requests per second exceeded" % self._rate)
+
+            self._sleep(delay)
+            waited += delay
+        return waited
+
+
+def get_usage(num_minutes=60):
+    """ Returns a dictionary of the recorded Tasks API usage (from all workers);
+
+            'current_second'    -- Number of requests in the current one-second window
+            'today'             -- { 'date', 'requests', 'throttled' } for the current (UTC) day
+            'minutes'           -- List of { 'minute', 'requests', 'throttled' } for each of the previous
+                                   num_minutes minutes (including the current minute), most recent first
+
+        'throttled' is the number of requests which were delayed by the rate limiter.
+        Values are 0 if there were no requests, or if the counter has been evicted from memcache.
+    """
+    now = time.time()
+    minute_timestamps = [now - 60 * minute_num for minute_num in range(num_minutes)]
+    keys = [_window_key(int(now))]
+    for counter in [_REQUESTS, _THROTTLED]:
+        keys.append(_day_usage_key(counter, now))
+        keys.extend([_minute_usage_key(counter, timestamp) for timestamp in minute_timestamps])
+    values = memcache.get_multi(keys, namespace=_MEMCACHE_NAMESPACE)
+
+    def _value(key):
+        return int(values.get(key) or 0)
+
+    usage = {
+        'current_second' : _value(_window_key(int(now))),
+        'today' : {
+            'date' : datetime.datetime.utcfromtimestamp(now).strftime('%Y-%m-%d'),
+            'requests' : _value(_day_usage_key(_REQUESTS, now)),
+            'throttled' : _value(_day_usage_key(_THROTTLED, now)),
+        },
+        'minutes' : [],
+    }
+    for timestamp in minute_timestamps:
+        usage['minutes'].append({
+            'minute' : datetime.datetime.utcfromtimestamp(int(timestamp) // 60 * 60).strftime('%Y-%m-%d %H:%M'),
+            'requests' : _value(_minute_usage_key(_REQUESTS, timestamp)),
+            'throttled' : _value(_minute_usage_key(_THROTTLED, timestamp)),
+        })
+    return usage
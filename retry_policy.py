@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This module decides whether a failed server request should be retried, and how long to wait first.
+#
+# Previously, each request was tried NUM_API_TRIES times, with no delay before the first retries, and a fixed
+# sleep (e.g. 45 seconds) before the last 2 retries, regardless of the error. Now:
+#   - The delay increases exponentially with each retry of the same request, with random jitter,
+#     so that retries from many requests (and many jobs) don't all hit an overloaded server at the same time.
+#   - If the server returns a Retry-After header (e.g. with a 429 or 503), the delay is at least that long.
+#   - Each class of error (see ErrorClass) has its own retry budget; e.g., a 503 is worth retrying
+#     several times, but a 404 is not.
+#   - The policy has an overall deadline (e.g., for the whole job), and a limit on the total number of retries,
+#     so that a job which keeps getting errors gives up, rather than piling up more and more retries.
+#
+# A RetryPolicy is created for each job (or frontend request), and a RetryState is created from the policy
+# for each request (operation) that may need to be retried.
+#
+# This module doesn't import apiclient or the App Engine APIs, so that it can be used by the frontend
+# and the worker. Errors are classified using their HTTP status (if any) and their class names.
+
+import datetime
+import email.utils
+import random
+import threading
+import time
+
+
+class ErrorClass(object): # pylint: disable=too-few-public-methods
+    """ Classes of errors, each of which has its own retry budget """
+
+    # HTTP 429, or 403 with a rate limit reason
+    RATE_LIMIT = 'rate_limit'
+
+    # HTTP 5xx
+    SERVER = 'server'
+
+    # Timeouts and connection errors (DeadlineExceededError, socket errors, etc.)
+    NETWORK = 'network'
+
+    # AccessTokenRefreshError
+    AUTH = 'auth'
+
+    # Any other HTTP 4xx
+    CLIENT = 'client'
+
+    # Anything else
+    OTHER = 'other'
+
+    ALL_VALUES = [RATE_LIMIT, SERVER, NETWORK, AUTH, CLIENT, OTHER]
+
+
+# Reasons returned in a 403 response when the request should be retried later
+_RATE_LIMIT_REASONS = ['ratelimitexceeded', 'userratelimitexceeded']
+
+# Names of exception classes which indicate that the request was not sent because of our own rate limit
+# (see rate_limiter.py)
+_RATE_LIMIT_ERROR_NAMES = ['RateLimitExceededError']
+
+# Names of exception classes which indicate a timeout or connection problem
+_NETWORK_ERROR_NAMES = ['DeadlineExceededError', 'DownloadError', 'InternalTransientError', 'TransientError',
+                        'timeout', 'error', 'gaierror', 'HTTPException', 'BadStatusLine', 'IncompleteRead',
+                        'IOError', 'SSLError', 'SSLCertificateError']
+
+
+def get_http_status(ex):
+    """ Returns the HTTP status of an apiclient HttpError (or similar), or None """
+    resp = getattr(ex, 'resp', None)
+    return getattr(resp, 'status', None)
+
+
+def get_retry_after(ex):
+    """ Returns the number of seconds from the Retry-After header of the error's HTTP response, or None.
+
+        Retry-After may be a number of seconds, or an HTTP date.
+    """
+    resp = getattr(ex, 'resp', None)
+    if not resp or not hasattr(resp, 'get'):
+        return None
+    value = resp.get('retry-after')
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if not parsed:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+def classify_error(ex):
+    """ Returns the ErrorClass of the exception """
+
+    status = get_http_status(ex)
+    if status:
+        if status == 429:
+            return ErrorClass.RATE_LIMIT
+        if status == 403:
+            reason = ''
+            get_reason = getattr(ex, '_get_reason', None)
+            if get_reason:
+                try:
+                    reason = (get_reason() or '').replace(' ', '').lower()
+                except Exception: # pylint: disable=broad-except
+                    pass
+            if reason in _RATE_LIMIT_REASONS:
+                return ErrorClass.RATE_LIMIT
+            return ErrorClass.CLIENT
+        if status >= 500:
+            return ErrorClass.SERVER
+        return ErrorClass.CLIENT
+
+    class_names = [cls.__name__ for cls in type(ex).__mro__]
+    if 'AccessTokenRefreshError' in class_names:
+        return ErrorClass.AUTH
+    for class_name in class_names:
+        if class_name in _RATE_LIMIT_ERROR_NAMES:
+            return ErrorClass.RATE_LIMIT
+    for class_name in class_names:
+        if class_name in _NETWORK_ERROR_NAMES:
+            return ErrorClass.NETWORK
+    return ErrorClass.OTHER
+
+
+class RetryPolicy(object): # pylint: disable=too-many-instance-attributes
+    """ Retry settings shared by all the operations of a job (or frontend request).
+
+        budgets            -- { ErrorClass : maximum number of retries of an operation for that class of error }
+        base_delay         -- Delay (seconds) before the first retry of an operation. The delay doubles
+                              for each subsequent retry of the same operation.
+        max_delay          -- Maximum delay (seconds) before any retry (unless Retry-After is longer)
+        deadline_seconds   -- No retry is started if the delay would end more than this many seconds after
+                              the policy was created. None means no deadline.
+        max_total_retries  -- Maximum number of retries of all operations using this policy. None means no limit.
+    """
+
+    def __init__(self, budgets, base_delay, max_delay, # pylint: disable=too-many-arguments
+                 deadline_seconds=None, max_total_retries=None, rnd=None):
+        self.budgets = budgets
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.start_time = time.time()
+        self.deadline = self.start_time + deadline_seconds if deadline_seconds else None
+        self.max_total_retries = max_total_retries
+        self.total_retries = 0
+        self._rnd = rnd or random.Random()
+        # The policy may be shared by several fetch threads
+        self._lock = threading.Lock()
+
+
+    def take_retry(self):
+        """ Returns True (and counts the retry) if the total number of retries is below max_total_retries """
+        with self._lock:
+            if self.max_total_retries is not None and self.total_retries >= self.max_total_retries:
+                return False
+            self.total_retries += 1
+            return True
+
+
+    def new_state(self):
+        """ Returns a new RetryState, to track the retries of one operation """
+        return RetryState(self)
+
+
+    def seconds_until_deadline(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+
+    def get_delay(self, num_retries, retry_after=None):
+        """ Returns the delay before retry number num_retries (starting at 1), using exponential backoff
+            with "equal jitter" (a random delay between half and all of the backoff delay), or retry_after
+            if that is longer.
+        """
+        backoff = min(self.max_delay, self.base_delay * (2 ** (num_retries - 1)))
+        delay = backoff / 2.0 + self._rnd.uniform(0, backoff / 2.0)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class RetryState(object):
+    """ The retries of a single operation (e.g. retrieving one page of tasks) """
+
+    def __init__(self, policy):
+        self.policy = policy
+        # Number of retries of this operation, for all classes of errors
+        self.num_retries = 0
+        # { ErrorClass : number of retries of this operation for that class of error }
+        self.retries_by_class = {}
+        # Why the most recent call to next_delay() returned None
+        self.give_up_reason = ''
+
+
+    def remaining(self, error_class):
+        """ Number of retries remaining for the error class """
+        return self.policy.budgets.get(error_class, 0) - self.retries_by_class.get(error_class, 0)
+
+
+    def next_delay(self, ex):
+        """ Records a failure of the operation, and returns the number of seconds to wait before
+            retrying the operation, or None if the operation should not be retried.
+
+            If None is returned, give_up_reason describes why.
+        """
+
+        policy = self.policy
+        error_class = classify_error(ex)
+
+        if self.remaining(error_class) <= 0:
+            self.give_up_reason = "No retries remaining for '%s' errors after %d retries" % (
+                error_class, self.num_retries)
+            return None
+
+        delay = policy.get_delay(self.num_retries + 1, get_retry_after(ex))
+
+        seconds_until_deadline = policy.seconds_until_deadline()
+        if seconds_until_deadline is not None and delay > seconds_until_deadline:
+            self.give_up_reason = "Retrying after %.1f seconds would exceed the deadline at %s UTC" % (
+                delay, datetime.datetime.utcfromtimestamp(policy.deadline).strftime('%H:%M:%S'))
+            return None
+
+        if not policy.take_retry():
+            self.give_up_reason = "Reached the limit of %d retries" % policy.max_total_retries
+            return None
+
+        self.num_retries += 1
+        self.retries_by_class[error_class] = self.retries_by_class.get(error_class, 0) + 1
+        return delay
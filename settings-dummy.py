@@ -100,6 +100,8 @@ MAIN_PAGE_URL = '/main'
 START_BACKUP_URL = '/startbackup'
 
 PROGRESS_URL = '/progress'
+# Returns the current job progress as JSON, for the progress page
+PROGRESS_JSON_URL = '/progress.json'
 
 RESULTS_URL = '/results'
 
@@ -107,13 +109,25 @@ WORKER_URL = '/worker'
 
 DB_KEY_TASKS_BACKUP_DATA = 'tasks_backup_data'
 
-
-# Number of times to try server actions
-# Exceptions are usually due to DeadlineExceededError on individual API calls
-# The first (NUM_API_TRIES - 2) retries are immediate. The app sleeps for 
-# WORKER_API_RETRY_SLEEP_DURATION or FRONTEND_API_RETRY_SLEEP_DURATION seconds 
-# before trying the 2nd last and last retries.
-NUM_API_TRIES = 4
+DB_KEY_CACHED_EXPORTS = 'cached_exports'
+
+
+# Maximum number of times to retry a failed server action, for each class of error (see retry_policy.ErrorClass)
+# Exceptions are usually due to DeadlineExceededError on individual API calls, or 5xx server errors.
+# Errors which are unlikely to succeed on retry (e.g. 404) are not retried.
+# Before each retry, the app waits for an exponentially increasing (randomised) delay, starting at 
+# WORKER_RETRY_BASE_DELAY or FRONTEND_RETRY_BASE_DELAY seconds, or longer if the server sends Retry-After.
+# CAUTION: These settings replace NUM_API_TRIES, WORKER_API_RETRY_SLEEP_DURATION and 
+# FRONTEND_API_RETRY_SLEEP_DURATION. When upgrading an existing deployment, these settings must be added to 
+# settings.py, otherwise the app fails with AttributeError.
+API_RETRY_BUDGETS = {
+    'rate_limit' : 6,
+    'server' : 5,
+    'network' : 4,
+    'auth' : 3,
+    'client' : 1,
+    'other' : 3,
+}
 
 # The number of seconds to wait before a URL fetch times out.
 # The deault timeout is 5 seconds, but that results in significant numbers
@@ -122,20 +136,34 @@ NUM_API_TRIES = 4
 #   Used as a parameter to fetch_with_deadline()
 URL_FETCH_TIMEOUT = 12
 
+# The Tasks API discovery document is cached (at module level, in memcache and in the datastore) for 
+# DISCOVERY_DOCUMENT_CACHE_TTL seconds, so that the worker doesn't fetch it from the discovery service 
+# for every job (and every retry). If the document cannot be fetched, the previous (expired) copy 
+# from the datastore is used, or if there is none, the copy in constants.TASKS_DISCOVERY_DOCUMENT_FALLBACK_FILE
+DISCOVERY_DOCUMENT_CACHE_TTL = 24 * 60 * 60
+
 
-# Number of seconds for worker to sleep for the last 2 API retries
-# This affects how often the job progress is updated, so MAX_JOB_PROGRESS_INTERVAL
-# must be greater than all possible retry and sleep durations combined
-WORKER_API_RETRY_SLEEP_DURATION = 45
+# Number of seconds for worker to wait before the first retry of an API call. The delay doubles for each 
+# subsequent retry of the same call, up to WORKER_RETRY_MAX_DELAY seconds.
+# The worker keeps updating the job progress while it waits for more than PROGRESS_UPDATE_INTERVAL seconds,
+# so long delays do not cause the job to appear to have stalled.
+WORKER_RETRY_BASE_DELAY = 1
+WORKER_RETRY_MAX_DELAY = 60
 
+# The worker does not start any retry that would end more than WORKER_RETRY_DEADLINE seconds after 
+# the job started, and gives up after WORKER_MAX_RETRIES_PER_JOB retries in total (for all API calls), 
+# so that a job which keeps getting errors fails, rather than retrying indefinitely.
+WORKER_RETRY_DEADLINE = 3600
+WORKER_MAX_RETRIES_PER_JOB = 100
 
-# Number of seconds for frontend to sleep for the last API retries
-# The total amount of time allowed for a page response is 60 seconds. 
-# An API call times out after 5 seconds, so 4 API tries is up to 20 seconds
-# The FRONTEND_API_RETRY_SLEEP_DURATION should be less than 
-# (60 - (NUM_API_TRIES - 2) * 5 - (2 * (5 + FRONTEND_API_RETRY_SLEEP_DURATION)))
-# i.e., if NUM_API_TRIES = 4, FRONTEND_API_RETRY_SLEEP_DURATION should be LESS than 20 sec
-FRONTEND_API_RETRY_SLEEP_DURATION = 18
+
+# Number of seconds for frontend to wait before the first retry (doubling for each subsequent retry,
+# up to FRONTEND_RETRY_MAX_DELAY seconds).
+# The total amount of time allowed for a page response is 60 seconds, so the frontend does not start 
+# any retry that would end more than FRONTEND_RETRY_DEADLINE seconds after the first attempt.
+FRONTEND_RETRY_BASE_DELAY = 1
+FRONTEND_RETRY_MAX_DELAY = 10
+FRONTEND_RETRY_DEADLINE = 40
 
 # Number of seconds to allow for job to start
 # Log and display an error if job has not started after this number of seconds.
@@ -151,6 +179,146 @@ MAX_TIME_ALLOWED_FOR_JOB_TO_START = 900
 WORKER_INVALID_GRANT_SLEEP_DURATION = 90
 
 
+# The number of tasks (or tasklists) requested in each page of tasks.list() (or tasklists.list()) results.
+# If maxResults is not set, the server returns pages of 20, so a 10,000 task account would need 500 requests.
+# 100 is the maximum allowable value. If the server returns smaller (but otherwise full) pages, the worker
+# adapts to the server's page size.
+TASKS_API_MAX_RESULTS = 100
+
+
+# If True, and the previous backup completed successfully with the same options, the worker only retrieves
+# tasks which have changed since the previous backup (using 'updatedMin'), and stores those changes as a new
+# backup layer on top of the previous backup's layers.
+# The worker never decrypts the previous backup. Each layer is encrypted with its own AES key, and the layers
+# are only decrypted and merged by the frontend, using the private key from the user's cookie. The new job 
+# reuses the previous job's RSA key pair, so that the one private key can decrypt every layer.
+INCREMENTAL_BACKUPS_ENABLED = True
+
+# Maximum number of layers (including the full backup) in a backup. When the previous backup already has
+# this many layers, a full backup is performed, so that the frontend never needs to decrypt and merge more
+# than this number of layers when returning the backup.
+INCREMENTAL_BACKUP_MAX_LAYERS = 10
+
+# A full backup is performed if the last full backup was started more than this number of hours ago.
+# This limits the effect of any changes which may not have been detected by 'updatedMin' (e.g., tasks
+# that have been permanently removed by the server).
+INCREMENTAL_BACKUP_MAX_AGE_HOURS = 24 * 7
+
+# The watermark for each tasklist is the time that the worker started retrieving the tasks, minus this
+# number of seconds, to allow for any difference between the worker's clock and the Tasks server's clock.
+# Tasks which changed in this period are retrieved (again) in the next incremental backup.
+INCREMENTAL_BACKUP_WATERMARK_MARGIN = 300
+
+# If True, when performing an incremental backup, tasklists whose 'updated' timestamp and etag (as returned 
+# by tasklists.list()) haven't changed since the previous backup are not retrieved at all. The tasks from
+# the previous backup are used for those tasklists.
+SKIP_UNCHANGED_TASKLISTS = True
+
+
+# Maximum number of tasklists that the worker retrieves in parallel.
+# Each tasklist is retrieved in its own thread, using its own authorised connection, so that users
+# with many tasklists don't spend most of the job waiting on sequential round trips.
+# Set to 1 to retrieve tasklists one after another (the original behaviour).
+# Note that each thread can hold a complete tasklist in memory, and may retry/sleep independently,
+# so keep this small to stay within the B4 instance memory and the Tasks API per-user rate limits.
+# CAUTION: Only used when WORKER_USE_BATCH_REQUESTS is False. Batch requests are sent one at a time,
+# so if WORKER_USE_BATCH_REQUESTS is True, this setting is ignored.
+WORKER_TASKLIST_FETCH_CONCURRENCY = 4
+
+# The worker reuses httplib2.Http objects (and their open keep-alive connections) across connection attempts,
+# fetch threads and jobs on the same instance (see http_pool.py).
+# WORKER_HTTP_POOL_MAX_SIZE is the maximum number of idle Http objects kept; it should be at least 
+# WORKER_TASKLIST_FETCH_CONCURRENCY + 1 (the fetch threads, plus the Http object used by the Tasks service).
+# Idle Http objects (and their connections) are discarded after WORKER_HTTP_POOL_IDLE_TIMEOUT seconds,
+# because the server closes idle connections anyway.
+WORKER_HTTP_POOL_MAX_SIZE = 5
+WORKER_HTTP_POOL_IDLE_TIMEOUT = 60
+
+# The worker refreshes the access token before each Tasks API request if the token expires within 
+# WORKER_ACCESS_TOKEN_REFRESH_MARGIN seconds, rather than waiting for a request to fail with 401.
+# Access tokens are valid for 1 hour. The margin must be longer than the longest request (including any
+# retries), so that a token doesn't expire part way through a request.
+WORKER_ACCESS_TOKEN_REFRESH_MARGIN = 300
+
+# Maximum number of Tasks API requests per second, from all workers on all instances combined
+# (a batch request counts as one request for each request in the batch). The count is shared in memcache.
+# If the limit is reached, requests are delayed until the next second, so that at peak times the workers
+# slow down rather than getting rate limit errors. Set to 0 to disable the limit (usage is still recorded,
+# and can be viewed at /admin/api_usage).
+TASKS_API_MAX_REQUESTS_PER_SECOND = 20
+
+# Maximum number of seconds that a request is delayed by the rate limiter. If a request would have to wait
+# longer, it is not sent; it is treated as a rate limit error, and retried after backing off as per 
+# API_RETRY_BUDGETS['rate_limit'] (and WORKER_RETRY_BASE_DELAY).
+TASKS_API_RATE_LIMIT_MAX_WAIT = 10
+
+
+# If True, the worker retrieves the tasks using batch requests. The first page of every tasklist is
+# requested in a single multipart request, then any further pages (for tasklists with more than one page)
+# are requested in subsequent batches, until all pages of all tasklists have been retrieved.
+# This saves a round trip per tasklist for accounts with many small tasklists.
+# CAUTION: When True, tasklists are NOT retrieved in parallel; WORKER_TASKLIST_FETCH_CONCURRENCY is ignored,
+# because batches are sent one at a time. Leave this False to retrieve up to WORKER_TASKLIST_FETCH_CONCURRENCY
+# tasklists in parallel, which is faster for accounts with large tasklists (whose pages must be retrieved 
+# one after another in either case).
+WORKER_USE_BATCH_REQUESTS = False
+
+# Maximum number of tasks.list() requests in each batch request.
+# Google allows up to 1000 calls in a batch, but each call still counts towards the per-user rate limit,
+# and a large batch may take longer than URL_FETCH_TIMEOUT to return.
+# If TASKS_API_MAX_REQUESTS_PER_SECOND is set, batches are also limited to that many requests, so that
+# sending a batch doesn't exceed the rate limit.
+WORKER_MAX_REQUESTS_PER_BATCH = 50
+
+# The URL that batch requests are sent to. The Tasks API requires the API-specific batch endpoint.
+TASKS_API_BATCH_URI = 'https://www.googleapis.com/batch/tasks/v1'
+
+
+# How the worker compresses the pickled tasklists before they are encrypted and stored.
+# One of '' (no compression), 'zlib' or 'bz2' (see constants.DataCompression)
+# Task titles and notes are very compressible, so compression reduces the number of 1MB blobs 
+# (and therefore datastore RPCs and storage). bz2 compresses better than zlib, but is much slower.
+# (lzma is not available in the Python 2.7 runtime)
+BACKUP_DATA_COMPRESSION = 'zlib'
+
+# Compression level, from 1 (fastest) to 9 (smallest)
+BACKUP_DATA_COMPRESSION_LEVEL = 6
+
+
+# Maximum number of TasklistsData blobs that the worker may be storing (using asynchronous puts) at once.
+# Each blob is up to 1MB, and is held in memory until its put completes. Blobs are put separately
+# (rather than in a single batch put), because each datastore put RPC is limited in size.
+MAX_BLOB_PUTS_IN_PROGRESS = 2
+
+
+# If True, the worker puts the tasks in each tasklist in hierarchy order (and sets each task's depth) 
+# before storing the tasklist, so that the frontend doesn't need to reorder the tasks every time the user
+# exports the same backup. The frontend still reorders tasklists which were stored without a precomputed order.
+WORKER_PRECOMPUTE_TASKS_ORDER = True
+
+
+# If True, the file-based export formats (CSV, ICS, text, py and the RTM email) are written a row at a time
+# by the writers in export_writers.py, which produce the same output as the tasks_template_* Django templates,
+# but much faster and without holding the entire rendered file in memory.
+# Set to False to render the export formats using the Django templates.
+USE_NATIVE_EXPORT_WRITERS = True
+
+
+# If True, each exported file (except the HTML page and the RTM email) is cached, so that exporting the 
+# same backup in the same format (with the same options) again returns the cached file. The cached file is 
+# compressed and encrypted with the backup's AES key, and all the user's cached files are deleted when 
+# a new backup is started.
+EXPORT_CACHE_ENABLED = True
+
+# Exports which are larger than this after compression (in bytes) are not cached
+EXPORT_CACHE_MAX_ENTRY_SIZE = 5000000
+
+# When the total (compressed) size or the number of a user's cached exports exceeds these limits,
+# the least recently used cached exports are deleted
+EXPORT_CACHE_MAX_SIZE_PER_USER = 10000000
+EXPORT_CACHE_MAX_ENTRIES_PER_USER = 8
+
+
 # If the user has more than this number of tasks, display a warning message that
 # displaying as an HTML page may fail
 LARGE_LIST_HTML_WARNING_LIMIT = 20000
@@ -158,8 +326,9 @@ LARGE_LIST_HTML_WARNING_LIMIT = 20000
 # If the job hasn't been updated in MAX_JOB_PROGRESS_INTERVAL seconds, assume that the job has stalled, 
 # and display error message and stop refreshing progress.html
 # Longest observed time between job added to taskqueue, and worker starting, is 94.5 seconds
-# Note that WORKER_API_RETRY_SLEEP_DURATION affects how long between job progress updates, 
-# so MAX_JOB_PROGRESS_INTERVAL must be greater than all possible retry and sleep durations combined
+# Note that the worker updates the job progress while waiting to retry an API call, but a single 
+# attempt (e.g. a slow API call) can take a long time, so MAX_JOB_PROGRESS_INTERVAL must be greater than 
+# the longest time that a single API call can take
 MAX_JOB_PROGRESS_INTERVAL = 125
 
 # Every time that the worker starts a particular backup job, the number_of_job_starts counter is incremented.
@@ -170,9 +339,50 @@ MAX_NUM_JOB_STARTS = 3
 # This prevents excessive Datastore Write Operations which can exceed quota
 PROGRESS_UPDATE_INTERVAL = 5
 
+# If True, the worker stores a small job progress record in memcache for every page of tasks retrieved,
+# and the progress page and PROGRESS_JSON_URL read the progress from memcache before trying the datastore.
+# The full job record is then only put when the job status changes, or every JOB_PROGRESS_DATASTORE_INTERVAL 
+# seconds, as a durable fallback in case the memcache record is evicted.
+# If False, the job record is put every PROGRESS_UPDATE_INTERVAL seconds.
+JOB_PROGRESS_MEMCACHE_ENABLED = True
+
+# Maximum number of seconds between datastore puts of the job record while the job is in progress.
+# Must be much less than MAX_JOB_PROGRESS_INTERVAL, because if the memcache record is evicted, the
+# progress page uses the job_progress_timestamp from the datastore to decide if the job has stalled.
+JOB_PROGRESS_DATASTORE_INTERVAL = 30
+
+# The users' OAuth2 credentials are cached (see shared.CredentialsCache), so that every page which uses 
+# auth_decorator, and every worker start, doesn't need to read the credentials from the datastore.
+# Credentials are held in each instance for CREDENTIALS_CACHE_LOCAL_TTL seconds (for up to 
+# CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES users), and in memcache for CREDENTIALS_CACHE_MEMCACHE_EXPIRY seconds.
+# The local TTL is short, because another instance may refresh or replace the credentials.
+CREDENTIALS_CACHE_LOCAL_TTL = 60
+CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES = 200
+CREDENTIALS_CACHE_MEMCACHE_EXPIRY = 3600
+
+# Number of seconds that the memcache job progress record is kept. The record is only needed while the
+# user is waiting for the job to complete.
+JOB_PROGRESS_MEMCACHE_EXPIRY = 3600
+
 # Refresh progress page every PROGRESS_PAGE_REFRESH_INTERVAL seconds
+# If Javascript is enabled, the progress page updates itself from PROGRESS_JSON_URL instead of reloading
+# the page. If long-polling is disabled, PROGRESS_JSON_URL is requested every PROGRESS_PAGE_REFRESH_INTERVAL
+# seconds, otherwise it is requested again as soon as the previous request returns.
 PROGRESS_PAGE_REFRESH_INTERVAL = 6
 
+# Maximum number of seconds that a PROGRESS_JSON_URL request is held waiting for the job progress to change.
+# Set to 0 to disable long-polling (the default).
+# CAUTION: app.yaml has 'threadsafe: no', so each held request occupies a whole frontend instance for up 
+# to this long, which costs far more instance hours than a short PROGRESS_JSON_URL request every 
+# PROGRESS_PAGE_REFRESH_INTERVAL seconds. Only enable long-polling if PROGRESS_JSON_URL is served by a 
+# module (or version) which has 'threadsafe: yes', so that one instance can hold many requests at once.
+# Must be much less than the 60 second request deadline. Long-polling is only done if
+# JOB_PROGRESS_MEMCACHE_ENABLED, because the progress is polled every PROGRESS_JSON_LONG_POLL_INTERVAL seconds.
+PROGRESS_JSON_LONG_POLL_TIMEOUT = 0
+
+# Number of seconds between checks of the memcache job progress while a PROGRESS_JSON_URL request is held
+PROGRESS_JSON_LONG_POLL_INTERVAL = 1
+
 # Number of pixels for each depth level for sub-tasks
 # e.g., for a 3rd level subtask, indent would be 3 * TASK_INDENT
 TASK_INDENT = 40
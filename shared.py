@@ -21,32 +21,46 @@
 
 # import Cookie
 import cgi
+import re
+import operator
+import collections
 import sys
 import os
+import threading
 import traceback
 import logging
 import datetime
+import time
 import base64
+import hashlib
+import json
+import pickle
+import zlib
+import bz2
 import unicodedata
 from urlparse import urljoin
 
 
 from google.appengine.api import logservice # To flush logs
 from google.appengine.api import mail
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
 from google.appengine.api.app_identity import get_application_id
+from google.appengine.ext import db
 from google.appengine.ext.webapp import template
 
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import PKCS1_OAEP
 from Crypto.Cipher import AES
 from Crypto.Util import Counter
+from Crypto import Random
 
 # Project-specific imports
 import settings # pylint: disable=relative-import
 import constants # pylint: disable=relative-import
 import appversion # appversion.version is set before the upload process to keep the version number consistent # pylint: disable=relative-import
 import host_settings # pylint: disable=relative-import
+import model # pylint: disable=relative-import
 
 
 # Fix for DeadlineExceeded, because "Pre-Call Hooks to UrlFetch Not Working"
@@ -423,6 +437,82 @@ def format_datetime_as_str(dt, format_str, date_only=False, prefix=''): # pylint
         return ''
         
     
+# The layout of the RFC 3339 strings returned by the Tasks server, e.g. '2012-01-26T07:47:18.000Z'
+# (The server always returns zero milliseconds). Note that \d only matches ASCII digits, as with strptime()
+_RFC3339_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)\.000Z\Z')
+
+# Cache of the date objects parsed from 'due' strings. Many tasks have the same due date, so this saves 
+# parsing the same string repeatedly (and the tasks share the same date object).
+# The cache is cleared when it reaches the maximum size, which should only happen for huge accounts.
+_RFC3339_DATE_CACHE = {}
+_RFC3339_DATE_CACHE_MAX_SIZE = 10000
+
+# Returned by _parse_RFC3339_string() if the string has to be parsed by convert_RFC3339_string_to_datetime()
+_NOT_PARSED = object()
+
+# The task fields which contain RFC 3339 strings, and whether each is a date-only value
+_TASK_TIMESTAMP_FIELDS = ((u'due', True), (u'updated', False), (u'completed', False))
+
+
+def _parse_RFC3339_string(datetime_str, date_only): # pylint: disable=invalid-name
+    """ Quickly parse a valid RFC 3339 string in the layout returned by the server.
+    
+        Returns a date (if date_only) or datetime object, or _NOT_PARSED if the string is not in the 
+        expected layout, has a value that strptime() wouldn't accept, or has a year before 1900. 
+        Those strings are handled (with the appropriate fallback values and logging) by 
+        convert_RFC3339_string_to_datetime().
+        
+        This produces the same result as strptime(datetime_str, "%Y-%m-%dT%H:%M:%S.000Z"), but is 
+        much faster, because the layout is fixed.
+    """
+    
+    if date_only:
+        d = _RFC3339_DATE_CACHE.get(datetime_str)
+        if d is not None:
+            return d
+    
+    try:
+        match = _RFC3339_RE.match(datetime_str)
+    except TypeError:
+        # Not a string
+        return _NOT_PARSED
+    if not match:
+        return _NOT_PARSED
+    year, month, day, hour, minute, second = [int(val) for val in match.groups()]
+    if year < 1900:
+        # Years before 1900 can't be displayed by strftime()
+        return _NOT_PARSED
+    try:
+        d = datetime.datetime(year, month, day, hour, minute, second)
+    except ValueError:
+        return _NOT_PARSED
+        
+    if date_only:
+        d = d.date()
+        if len(_RFC3339_DATE_CACHE) >= _RFC3339_DATE_CACHE_MAX_SIZE:
+            _RFC3339_DATE_CACHE.clear()
+        _RFC3339_DATE_CACHE[datetime_str] = d
+    return d
+    
+    
+def set_timestamps(tasks):
+    """ Convert the 'due', 'updated' and 'completed' RFC 3339 strings in each task in a page of tasks 
+        to date or datetime objects.
+    
+        This has the same result as calling set_timestamp() for each field of each task, but almost all 
+        values are converted by the fast parser. Any value which can't be (e.g. invalid values or the zero
+        timestamp) is handled by set_timestamp().
+    """
+    for task in tasks:
+        for field_name, date_only in _TASK_TIMESTAMP_FIELDS:
+            if field_name in task:
+                d = _parse_RFC3339_string(task[field_name], date_only)
+                if d is _NOT_PARSED:
+                    set_timestamp(task, field_name, date_only)
+                else:
+                    task[field_name] = d
+    
+    
 def convert_RFC3339_string_to_datetime( # pylint: disable=invalid-name
     datetime_str, field_name, date_only=False):
     """ Attempt to convert the RFC 3339 datetime string to a valid datetime object.
@@ -457,6 +547,11 @@ def convert_RFC3339_string_to_datetime( # pylint: disable=invalid-name
     
     fn_name = "convert_RFC3339_string_to_datetime: "
     
+    # Most values can be parsed by the fast parser. Any other values are handled below.
+    d = _parse_RFC3339_string(datetime_str, date_only)
+    if d is not _NOT_PARSED:
+        return d
+    
     try:
         if not datetime_str:
             # Nothing to parse, so raise an Exception, so that the calling method can deal with it
@@ -759,6 +854,195 @@ def is_dev_server():
     return server_software.startswith('Dev')
 
 
+# ---------------------------------------------------------------------------------------------
+#   Credentials cache
+# ---------------------------------------------------------------------------------------------
+class CredentialsCache(object):
+    """ Write-through cache of the users' OAuth2 credentials, for StorageByKeyName(cache=...)
+    
+        Credentials (as JSON strings) are held in a per-instance LRU cache for up to 
+        settings.CREDENTIALS_CACHE_LOCAL_TTL seconds, and in memcache. StorageByKeyName only reads the 
+        datastore if neither cache has the credentials, and writes the credentials to both caches 
+        (and the datastore) whenever they are stored; e.g., when the access token is refreshed, or when 
+        the user authorises the app.
+        
+        Each instance has its own LRU cache, so the TTL is short, so that an instance doesn't use credentials
+        which have been replaced by another instance for long. Invalid credentials are not held in the 
+        LRU cache, so that an instance immediately sees new credentials after the user re-authorises.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # { key : (credentials JSON, time that the entry expires) }, least recently used first
+        self._local_cache = collections.OrderedDict()
+        
+        
+    @staticmethod
+    def _get_memcache_key(key):
+        return 'credentials:' + key
+        
+        
+    def _set_local(self, key, value):
+        with self._lock:
+            self._local_cache.pop(key, None)
+            try:
+                is_invalid = json.loads(value).get('invalid')
+            except Exception: # pylint: disable=broad-except
+                is_invalid = True
+            if is_invalid:
+                return
+            self._local_cache[key] = (value, time.time() + settings.CREDENTIALS_CACHE_LOCAL_TTL)
+            while len(self._local_cache) > settings.CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES:
+                self._local_cache.popitem(last=False)
+        
+        
+    def get(self, key):
+        """ Returns the credentials JSON for the key, or None if it is not cached """
+        
+        fn_name = "CredentialsCache.get(): "
+        
+        with self._lock:
+            value, expiry_time = self._local_cache.pop(key, (None, None))
+            if value and time.time() < expiry_time:
+                # Move to the end, as the most recently used
+                self._local_cache[key] = (value, expiry_time)
+                return value
+        
+        try:
+            value = memcache.get(self._get_memcache_key(key))
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%sUnable to get credentials from memcache: %s", fn_name, get_exception_msg(ex))
+            return None
+        if value:
+            self._set_local(key, value)
+        return value
+        
+        
+    def set(self, key, value):
+        """ Store the credentials JSON, replacing any previously cached credentials for the key """
+        
+        fn_name = "CredentialsCache.set(): "
+        
+        self._set_local(key, value)
+        try:
+            if not memcache.set(self._get_memcache_key(key), value, time=settings.CREDENTIALS_CACHE_MEMCACHE_EXPIRY):
+                # Don't leave the old credentials in memcache
+                memcache.delete(self._get_memcache_key(key))
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%sUnable to store credentials in memcache: %s", fn_name, get_exception_msg(ex))
+            
+            
+    def delete(self, key):
+        """ Remove the credentials for the key from both caches """
+        
+        fn_name = "CredentialsCache.delete(): "
+        
+        with self._lock:
+            self._local_cache.pop(key, None)
+        try:
+            memcache.delete(self._get_memcache_key(key))
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%sUnable to delete credentials from memcache: %s", fn_name, get_exception_msg(ex))
+        
+        
+# Used by the OAuth2Decorator in tasks_backup.py and by the worker, so that both use the same cache
+credentials_cache = CredentialsCache() # pylint: disable=invalid-name
+
+
+# ---------------------------------------------------------------------------------------------
+#   Job progress
+# ---------------------------------------------------------------------------------------------
+# The worker updates the job progress (in memory) after every page of tasks, and stores a small progress
+# record in memcache each time, so that the progress can be polled cheaply. The full ProcessTasksJob entity
+# is only put when the status changes, or every settings.JOB_PROGRESS_DATASTORE_INTERVAL seconds, so that 
+# the progress is still available (although not as up to date) if the memcache record is evicted.
+#
+# Every put of the ProcessTasksJob must go through put_job(), so that the memcache record is never older
+# than the datastore entity.
+
+# The ProcessTasksJob properties which are stored in the memcache progress record.
+# job_created_timestamp identifies the job that the record belongs to.
+JOB_PROGRESS_FIELDS = ('job_created_timestamp', 'job_start_timestamp', 'job_progress_timestamp', 'status',
+                       'total_progress', 'tasklist_progress', 'message', 'error_message')
+
+
+def _get_job_progress_memcache_key(user_email):
+    return 'job_progress:' + user_email
+    
+    
+def set_job_progress(tasks_backup_job, user_email=None):
+    """ Store the progress of the job in memcache (but not in the datastore) """
+    
+    fn_name = "set_job_progress(): "
+    
+    if not settings.JOB_PROGRESS_MEMCACHE_ENABLED:
+        return
+    if not user_email:
+        user_email = tasks_backup_job.key().name()
+    progress = dict((field_name, getattr(tasks_backup_job, field_name)) for field_name in JOB_PROGRESS_FIELDS)
+    try:
+        memcache.set(_get_job_progress_memcache_key(user_email), progress, 
+            time=settings.JOB_PROGRESS_MEMCACHE_EXPIRY)
+    except Exception as ex: # pylint: disable=broad-except
+        # Not critical; the progress will be read from the datastore
+        logging.warning("%sUnable to store job progress in memcache: %s", fn_name, get_exception_msg(ex))
+    
+    
+def put_job(tasks_backup_job, user_email=None):
+    """ Store the job in the datastore, and its progress in memcache """
+    
+    tasks_backup_job.put()
+    set_job_progress(tasks_backup_job, user_email)
+    
+    
+def get_job_progress(user_email):
+    """ Returns a dictionary of the JOB_PROGRESS_FIELDS values of the user's job, 
+        or None if the user doesn't have a job record.
+        
+        The progress is read from memcache if possible. Otherwise the job is read from the datastore,
+        and its progress is stored in memcache for the next request.
+    """
+    
+    fn_name = "get_job_progress(): "
+    
+    if settings.JOB_PROGRESS_MEMCACHE_ENABLED:
+        try:
+            progress = memcache.get(_get_job_progress_memcache_key(user_email))
+            if progress:
+                return progress
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%sUnable to get job progress from memcache: %s", fn_name, get_exception_msg(ex))
+            
+    tasks_backup_job = model.ProcessTasksJob.get_by_key_name(user_email)
+    if tasks_backup_job is None:
+        return None
+    set_job_progress(tasks_backup_job, user_email)
+    return dict((field_name, getattr(tasks_backup_job, field_name)) for field_name in JOB_PROGRESS_FIELDS)
+    
+    
+def apply_job_progress(tasks_backup_job, user_email):
+    """ Update the progress properties of a job read from the datastore with the (more recent) progress
+        from memcache, if the memcache record is for the same job. The job is not put.
+    """
+    
+    fn_name = "apply_job_progress(): "
+    
+    if not settings.JOB_PROGRESS_MEMCACHE_ENABLED:
+        return
+    try:
+        progress = memcache.get(_get_job_progress_memcache_key(user_email))
+    except Exception as ex: # pylint: disable=broad-except
+        logging.warning("%sUnable to get job progress from memcache: %s", fn_name, get_exception_msg(ex))
+        return
+    if not progress or progress.get('job_created_timestamp') != tasks_backup_job.job_created_timestamp:
+        return
+    if progress.get('job_progress_timestamp') < tasks_backup_job.job_progress_timestamp:
+        # The datastore entity is more recent (which should never happen, because every put updates memcache)
+        return
+    for field_name in JOB_PROGRESS_FIELDS:
+        setattr(tasks_backup_job, field_name, progress[field_name])
+
+
 def data_is_encrypted(tasks_backup_job):
     """ Returns True if the tasks data has been encrypted.
     
@@ -882,6 +1166,26 @@ def get_aes_decrypt_cipher(private_key_b64, tasks_backup_job):
     
     fn_name = "get_aes_decrypt_cipher(): "
     
+    aes_key = get_aes_key(private_key_b64, tasks_backup_job)
+    aes_decrypt_cipher = new_aes_ctr_cipher(aes_key)
+    logging.debug("%sReturning AES decrypt cypher", fn_name)
+    return aes_decrypt_cipher
+    
+    
+def get_aes_key(private_key_b64, tasks_backup_job):
+    """ Returns the AES key that was used to encrypt the user's tasks.
+    
+        The AES key is stored in the job record, encrypted with the user's RSA public key, 
+        so it can only be decrypted using the RSA private key from the user's cookie.
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If the AES key could not be decrypted
+    """
+    
+    fn_name = "get_aes_key(): "
+    
     if not tasks_backup_job:
         # A job record must be supplied
         logging.warning("%sNo tasks_backup_job", fn_name)
@@ -896,6 +1200,27 @@ def get_aes_decrypt_cipher(private_key_b64, tasks_backup_job):
         logging.warning("%sNo encrypted AES key", fn_name)
         raise GtbDecryptionError("No encrypted AES key")
 
+    return decrypt_aes_key(private_key_b64, tasks_backup_job.encrypted_aes_key_b64)
+    
+    
+def decrypt_aes_key(private_key_b64, encrypted_aes_key_b64):
+    """ Returns the AES key, decrypted from encrypted_aes_key_b64 using the user's RSA private key.
+    
+        Used for the AES key of the job, and for the AES key of each of the previous layers of an
+        incremental backup (which are all encrypted with the same RSA public key).
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If the AES key could not be decrypted
+    """
+    
+    fn_name = "decrypt_aes_key(): "
+    
+    if not private_key_b64:
+        logging.warning("%sNo private key", fn_name)
+        raise GtbDecryptionError("No private key")
+        
     try:
         # This will fail if private_key_b64 is not a Base64-encoded RSA key, the most likely
         # cause is that the user has edited the cookie
@@ -907,14 +1232,12 @@ def get_aes_decrypt_cipher(private_key_b64, tasks_backup_job):
             
         rsa_decrypt_cipher = PKCS1_OAEP.new(rsa_decrypt_key)
         
-        encrypted_aes_key = base64.b64decode(tasks_backup_job.encrypted_aes_key_b64)
+        encrypted_aes_key = base64.b64decode(encrypted_aes_key_b64)
         
         # This will raise "ValueError: Incorrect decryption" if the private key doesn't
         # match the public key used to encrypt the AES key.
-        aes_key = rsa_decrypt_cipher.decrypt(encrypted_aes_key) # pylint: disable=unused-variable
-        aes_decrypt_cipher = AES.new(aes_key, AES.MODE_CTR, counter=Counter.new(128))
-        logging.debug("%sReturning AES decrypt cypher", fn_name)
-        return aes_decrypt_cipher
+        aes_key = rsa_decrypt_cipher.decrypt(encrypted_aes_key)
+        return aes_key
     
     except ValueError as ve: # pylint: disable=invalid-name
         logging.exception("%sUnable to decrypt AES key using RSA private key", fn_name)
@@ -925,3 +1248,1249 @@ def get_aes_decrypt_cipher(private_key_b64, tasks_backup_job):
         logging.exception("%sError attempting to decrypt AES key with RSA private key", fn_name)
         raise GtbDecryptionError("Error attempting to decrypt AES key with RSA private key: " +
             get_exception_msg(ex))
+
+
+def get_tasklists_data_parent_key(user_email, layer=0):
+    """ Returns the key of the parent of the TasklistsData blobs of one layer of the user's backup.
+    
+        Layer 0 (the full backup) uses the same parent key as backups created before incremental backup 
+        layers were added. Each incremental layer has its own parent key, so that the blobs of each layer 
+        can be queried (in idx order) and deleted separately.
+    """
+    
+    if layer:
+        return db.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, "%s:layer%d" % (user_email, layer))
+    return db.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, user_email)
+    
+    
+def get_tasklists_data_records(user_email, layer=0):
+    """ Returns a query for the TasklistsData blobs which contain one layer of the user's most recent backup, 
+        in order """
+    
+    return db.GqlQuery("SELECT * "
+                       "FROM TasklistsData "
+                       "WHERE ANCESTOR IS :1 "
+                       "ORDER BY idx ASC",
+                       get_tasklists_data_parent_key(user_email, layer))
+                       
+                       
+def delete_tasklists_data(user_email, layer=0):
+    """ Delete all of the user's TasklistsData blobs for one layer of the backup.
+    
+        Uses a keys-only query and a single batched delete, rather than loading and deleting each blob in turn.
+        
+        Returns a tuple of (number of blobs deleted, query duration in seconds, delete duration in seconds)
+    """
+    
+    query_start = time.time()
+    keys = model.TasklistsData.all(keys_only=True).ancestor(
+        get_tasklists_data_parent_key(user_email, layer)).fetch(None)
+    query_duration = time.time() - query_start
+    
+    delete_start = time.time()
+    if keys:
+        db.delete(keys)
+    delete_duration = time.time() - delete_start
+    
+    return len(keys), query_duration, delete_duration
+    
+    
+def delete_all_tasklists_data(user_email, num_layers):
+    """ Delete the user's TasklistsData blobs for layers 0 to num_layers - 1 of the backup.
+    
+        num_layers is the number of layers which may be stored (see ProcessTasksJob.num_stored_layers)
+    
+        Returns a tuple of (number of blobs deleted, query duration in seconds, delete duration in seconds)
+    """
+    
+    total_num_records = 0
+    total_query_duration = 0.0
+    total_delete_duration = 0.0
+    for layer in range(max(1, num_layers)):
+        num_records, query_duration, delete_duration = delete_tasklists_data(user_email, layer)
+        total_num_records += num_records
+        total_query_duration += query_duration
+        total_delete_duration += delete_duration
+    return total_num_records, total_query_duration, total_delete_duration
+    
+    
+def get_compressor(compression):
+    """ Returns a streaming compressor object (with compress() and flush() methods) for the 
+        constants.DataCompression value, or None if the data is not to be compressed. """
+        
+    if compression == constants.DataCompression.ZLIB:
+        return zlib.compressobj(settings.BACKUP_DATA_COMPRESSION_LEVEL)
+    if compression == constants.DataCompression.BZ2:
+        return bz2.BZ2Compressor(settings.BACKUP_DATA_COMPRESSION_LEVEL)
+    return None
+    
+    
+def get_decompressor(compression):
+    """ Returns a streaming decompressor object (with a decompress() method) for the 
+        constants.DataCompression value, or None if the data is not compressed. """
+        
+    if compression == constants.DataCompression.ZLIB:
+        return zlib.decompressobj()
+    if compression == constants.DataCompression.BZ2:
+        return bz2.BZ2Decompressor()
+    if compression:
+        raise GtbDecryptionError("Unknown data compression '%s'" % compression)
+    return None
+    
+    
+def iter_tasklists_data_chunks(user_email, aes_decrypt_cipher=None, compression=constants.DataCompression.NONE,
+                               layer=0):
+    """ Yields the data from each of the user's TasklistsData blobs (for one layer of the backup), in order, 
+        decrypted if aes_decrypt_cipher is supplied, and decompressed if the data was compressed.
+    
+        The AES cipher must be a CTR mode cipher. Every blob except the last is MAX_BLOB_SIZE bytes, which is 
+        a multiple of the AES block size, so decrypting each blob in turn is identical to decrypting all the 
+        data at once, without needing to reassemble all the blobs into a single string first.
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If the data could not be decrypted or decompressed
+    """
+    
+    fn_name = "iter_tasklists_data_chunks(): "
+    
+    decompressor = get_decompressor(compression)
+    
+    for tasklists_record in get_tasklists_data_records(user_email, layer):
+        data = tasklists_record.pickled_tasks_data
+        if aes_decrypt_cipher:
+            try:
+                data = aes_decrypt_cipher.decrypt(data)
+            except Exception as ex: # pylint: disable=broad-except
+                logging.exception("%sError decrypting encrypted tasks in blob %s", fn_name, tasklists_record.idx)
+                raise GtbDecryptionError("Error decrypting encrypted tasks: " +
+                    get_exception_msg(ex))
+        if decompressor:
+            try:
+                data = decompressor.decompress(data)
+            except Exception as ex: # pylint: disable=broad-except
+                # This is most likely to happen if the data was decrypted with the wrong AES key
+                logging.exception("%sError decompressing tasks in blob %s", fn_name, tasklists_record.idx)
+                raise GtbDecryptionError("Error decompressing tasks: " +
+                    get_exception_msg(ex))
+        yield data
+        
+        
+class ChunkedDataStream(object):
+    """ A read-only file-like object which reads from an iterable of strings (chunks).
+    
+        This allows pickle to unpickle data which is stored in several blobs, without having to 
+        concatenate all the blobs first. Only the current chunk (plus any unread remainder of the 
+        previous chunk) is held in memory.
+    """
+    
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._pos = 0
+        self.num_chunks = 0
+        self.num_bytes = 0
+        
+        
+    def _read_next_chunk(self):
+        """ Append the next chunk to the unread data in the buffer. Returns False if there are no more chunks. """
+        
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            return False
+            
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        self.num_chunks += 1
+        self.num_bytes += len(chunk)
+        return True
+        
+        
+    def at_end(self):
+        """ Returns True if all the data from all the chunks has been read """
+        
+        while self._pos >= len(self._buffer):
+            if not self._read_next_chunk():
+                return True
+        return False
+        
+        
+    def read(self, size=-1):
+        if size < 0:
+            while self._read_next_chunk():
+                pass
+            size = len(self._buffer) - self._pos
+        else:
+            while len(self._buffer) - self._pos < size:
+                if not self._read_next_chunk():
+                    break
+                    
+        data = self._buffer[self._pos : self._pos + size]
+        self._pos += len(data)
+        return data
+        
+        
+    def readline(self):
+        search_start = self._pos
+        while True:
+            newline_pos = self._buffer.find("\n", search_start)
+            if newline_pos >= 0:
+                return self.read(newline_pos + 1 - self._pos)
+            # The unread part of the buffer is moved to the start of the buffer when the next chunk is read
+            search_start = len(self._buffer) - self._pos
+            if not self._read_next_chunk():
+                return self.read()
+                
+                
+def new_tasks_order_stats():
+    """ Returns an empty statistics dictionary for fix_tasklist_order() and log_tasks_order_stats() 
+    
+            'num_tasklists'                 Number of tasklists
+            'num_empty_tasklists'           Number of tasklists without any tasks
+            'num_tasklists_without_root'    Number of tasklists without any root tasks
+            'num_tasks'                     Total number of tasks
+            'num_subtasks'                  Number of tasks which have a parent
+            'num_orphaned_tasks'            Number of tasks whose parent (or ancestor's parent) does not exist
+            'num_cyclic_tasks'              Number of tasks whose chain of parents loops back on itself
+            'depth_counts'                  { depth : number of tasks at that depth }
+    """
+    return {
+        'num_tasklists' : 0,
+        'num_empty_tasklists' : 0,
+        'num_tasklists_without_root' : 0,
+        'num_tasks' : 0,
+        'num_subtasks' : 0,
+        'num_orphaned_tasks' : 0,
+        'num_cyclic_tasks' : 0,
+        'depth_counts' : collections.Counter(),
+    }
+    
+    
+def add_tasks_order_stats(total_stats, stats):
+    """ Add the statistics from one call (or set of calls) of fix_tasklist_order() to total_stats """
+    for key, value in stats.iteritems():
+        if key == 'depth_counts':
+            total_stats[key].update(value)
+        else:
+            total_stats[key] += value
+    
+    
+def _count_unreachable_tasks(unreachable_tasks, tasks_by_id):
+    """ Returns (num_orphaned_tasks, num_cyclic_tasks) for tasks which cannot be reached from a root task.
+    
+        An orphaned task has a parent (or an ancestor has a parent) which does not exist in the tasklist.
+        A cyclic task has a chain of parents which loops back on itself (e.g. a task which is its own parent,
+        or two tasks which are each other's parent).
+        
+        The result for each ancestor is remembered, so each parent chain is only followed once.
+    """
+    num_orphaned_tasks = 0
+    num_cyclic_tasks = 0
+    # { task ID : True if the task's parent chain loops, False if it ends at a missing parent }
+    chain_is_cyclic = {}
+    
+    for task in unreachable_tasks:
+        chain = []
+        ids_in_chain = set()
+        parent_id = task.get('parent', '') or ''
+        while True:
+            if parent_id in chain_is_cyclic:
+                is_cyclic = chain_is_cyclic[parent_id]
+                break
+            parent_task = tasks_by_id.get(parent_id) if parent_id else None
+            if parent_task is None:
+                is_cyclic = False
+                break
+            if parent_id in ids_in_chain:
+                is_cyclic = True
+                break
+            chain.append(parent_id)
+            ids_in_chain.add(parent_id)
+            parent_id = parent_task.get('parent', '') or ''
+            
+        for ancestor_id in chain:
+            chain_is_cyclic[ancestor_id] = is_cyclic
+        if is_cyclic:
+            num_cyclic_tasks += 1
+        else:
+            num_orphaned_tasks += 1
+            
+    return num_orphaned_tasks, num_cyclic_tasks
+    
+
+def fix_tasklist_order(tasklist_dict, stats, keep_unreachable_tasks=False): # pylint:disable=too-many-locals,too-many-statements,too-many-branches
+    """ Fix the order of the tasks in a single tasklist,
+        as the tasks returned from the Google Tasks server are out of sequence.
+        
+        Reorders the tasks so that subtasks appear under the respective parents, 
+        and in correct sibling order. Also set each task's 'depth' value.
+        
+        Orphaned and cyclic tasks cannot be reached from a root task, so they are not included
+        in the reordered tasklist (unless the tasklist has no root tasks at all, in which case
+        all the tasks are kept with a depth of zero).
+        
+        If keep_unreachable_tasks is True, the unreachable tasks are kept at the end of the list (so that
+        the worker can store them for the next incremental backup), and tasklist_dict[constants.TASKLIST_NUM_ORDERED_TASKS]
+        is set to the number of tasks at the start of the list which are in order.
+        
+        arguments:
+          tasklist_dict             -- The tasklist dictionary. The 'tasks' list is replaced by the ordered list.
+          stats                     -- Statistics dictionary (from new_tasks_order_stats()) which is updated
+          keep_unreachable_tasks    -- If True, keep unreachable tasks, and record the number of ordered tasks
+    """
+    
+    fn_name = "fix_tasklist_order()"
+
+    stats['num_tasklists'] += 1
+    
+    # tasklist_title = tasklist_dict['title']
+    # logging.debug("%s: Fixing '%s'", fn_name, tasklist_title)
+        
+    if 'tasks' not in tasklist_dict:
+        stats['num_empty_tasklists'] += 1
+        # logging.debug("%s: %s", fn_name, "Empty tasklist: No 'tasks' in tasklist")
+        if keep_unreachable_tasks:
+            tasklist_dict[constants.TASKLIST_NUM_ORDERED_TASKS] = 0
+        return
+        
+    tasks_unsorted = tasklist_dict['tasks']
+        
+    # -----------------------------------
+    # Process all the tasks in a tasklist
+    # -----------------------------------
+    
+    # tasks_unsorted contains tasks in "random" order:
+    #   subtasks may appear in the list before the subtask's parent task
+    
+    # ---------------------------------------------------
+    # Group tasks by parent ID, and index tasks by their ID
+    # ---------------------------------------------------
+    # Root tasks will (should) have '' parent
+    # JS 2019-06-03; There have been some instances where users have had
+    # no tasks with an empty parent. i.e., no root tasks!
+    # In the most recent example (2019-06-03 06:54:50.026 AEST), 
+    # 'tasks_grouped_by_parent_id' contains 7 non-root parent IDs, and the
+    # user had not exported hidden or deleted tasks, so I do not know
+    # how these could exist. There should have been at least one 
+    # root parent.
+    tasks_grouped_by_parent_id = {} # New tasklist, so start with an empty dict
+    # The index is built once, and is used to check for missing parents (orphans) and for cycles,
+    # instead of searching through all the tasks for each parent ID.
+    tasks_by_id = {}
+    for task_dict in tasks_unsorted:
+        stats['num_tasks'] += 1
+        tasks_by_id[task_dict.get('id', None)] = task_dict
+        parent_id = task_dict.get('parent', '') # Will be '' for root tasks
+        if parent_id is None:
+            # JS 2019-04-04; The spec at
+            #   https://developers.google.com/tasks/v1/reference/tasks#resource
+            # for the 'parent' property says;
+            #   "This field is omitted if it is a top-level task"
+            # Just in case Google sets the parent property to None
+            # for a root task (instead of omitting the property), 
+            # we set parent_id to '' so that root tasks can still be accessed
+            # by the '' key in tasks_grouped_by_parent_id.
+            parent_id = ''
+        if parent_id:
+            # This is a subtask
+            stats['num_subtasks'] += 1
+        if parent_id not in tasks_grouped_by_parent_id:
+            # Creat a new list for 'parent_id'
+            tasks_grouped_by_parent_id[parent_id] = []
+        # Add this task to list of sibling tasks (keyed by parent_id)
+        tasks_grouped_by_parent_id[parent_id].append(task_dict)
+    
+    # --------------------------------------
+    # Sort each group of tasks by 'position'
+    # --------------------------------------
+    #   String indicating the position of the task among its sibling tasks 
+    #   under the same parent task or at the top level. 
+    #   If this string is greater than another task's corresponding position 
+    #   string according to lexicographical ordering, the task is positioned 
+    #   after the other task under the same parent task (or at the top level).    
+    # Each group contains all the siblings below a given parent (or root)
+    for parent_id, list_of_tasks_dicts in tasks_grouped_by_parent_id.iteritems():
+        # Sort all the siblings in 'list_of_tasks' by 'position'
+        list_of_tasks_dicts.sort(key=operator.itemgetter('position'))
+        
+    if '' not in tasks_grouped_by_parent_id:
+        # ------------------------------
+        # No root tasks in this tasklist
+        # ------------------------------
+        # This can happen if:
+        #   (a) A root-level parent task is marked as completed using a third party app [1], 
+        #   AND
+        #   (b) The user chooses to export without including completed tasks
+        #
+        # [1] It is up to the client as to what happens to subtasks when a parent is marked as completed. 
+        # For example, CalenGoo only marks the parent as 'complete', and doesn't alter the subtasks in any way.
+        # If using the Tasks panel in Gmail or Calendar, marking a parent task as 'complete'
+        # also sets the 'hidden' flag on the parent, and marks all children as 'complete' and 'hidden', 
+        # and removes the 'parent' property from all children. 
+        stats['num_tasklists_without_root'] += 1
+        
+        logging.warning("%s: There are no root tasks in tasklist (no tasks with '' parent ID)", fn_name)
+        logging.warning("%s:     'tasks_grouped_by_parent_id' contains %d non-root parent IDs", 
+            fn_name, len(tasks_grouped_by_parent_id))
+            
+        # TESTING +++
+        # DEBUG: Additional logging to help find why/how we have a tasklist with no root task(s)
+        try:
+            for parent_id, tasks_with_same_parent in tasks_grouped_by_parent_id.iteritems():
+                logging.info("{}DEBUG: Found {:,} tasks with parent ID '{}'".format(
+                    fn_name,
+                    len(tasks_with_same_parent),
+                    parent_id))
+                    
+                # Check if any of the tasks in this group of tasks (grouped by parent ID)
+                # is the parent of another group
+                for child_task in tasks_with_same_parent:
+                    child_task_id = child_task['id']
+                    child_task_parent_id = child_task.get('parent', '') # Should be '' for root tasks
+                    if child_task_id in tasks_grouped_by_parent_id:
+                        if child_task_parent_id:
+                            logging.info("%sDEBUG: Child task '%s' in group of tasks with parent ID '%s' is a parent, and has a parent '%s'",
+                                fn_name,
+                                child_task_id,
+                                parent_id,
+                                child_task_parent_id)
+                        else:
+                            logging.info("%sDEBUG: Child task '%s' in group of tasks with parent ID '%s' is a parent",
+                                fn_name,
+                                child_task_id,
+                                parent_id)
+                # Check if there is a task with ID == parent_id
+                if parent_id not in tasks_by_id:
+                    logging.error("%sDEBUG: %s tasks have parent ID '%s', but no task with that ID exists in this tasklist",
+                        fn_name,
+                        len(tasks_grouped_by_parent_id[parent_id]),
+                        parent_id)
+                # TODO: Check if a task with that parent task ID exists in another tasklist (should never happen)
+                
+                
+        except Exception as ex: # pylint: disable=broad-except
+            logging.exception(fn_name + "Error logging details of tasklist with no root tasks: " + get_exception_msg(ex))
+            
+        num_orphaned_tasks, num_cyclic_tasks = _count_unreachable_tasks(tasks_unsorted, tasks_by_id)
+        stats['num_orphaned_tasks'] += num_orphaned_tasks
+        stats['num_cyclic_tasks'] += num_cyclic_tasks
+        logging.warning("%s: %d orphaned tasks, %d tasks in a cycle of parents", 
+            fn_name, num_orphaned_tasks, num_cyclic_tasks)
+            
+        # -------------------------------------
+        # KLUDGE: Set 'depth' of all tasks to 0
+        # -------------------------------------
+        logging.warning(fn_name + "No root tasks in tasklist, so setting depth of all tasks to zero")
+        for task in tasklist_dict['tasks']:
+            task['depth'] = 0
+        if keep_unreachable_tasks:
+            tasklist_dict[constants.TASKLIST_NUM_ORDERED_TASKS] = len(tasks_unsorted)
+        
+        # TESTING ---
+        
+        return
+        
+    # ---------------------------------
+    # Create a new sorted list of tasks
+    # ---------------------------------
+    # Walk the tree depth-first, starting with the root tasks. An explicit stack is used rather than
+    # recursion, so that a deep hierarchy of subtasks cannot exceed Python's recursion limit.
+    # Siblings are pushed in reverse order so that they are popped (and added to tasks_sorted) in order.
+    depth_counter = stats['depth_counts']
+    tasks_sorted = []
+    # IDs of tasks whose subtasks have already been pushed. Each task ID should only appear once in a
+    # tasklist, but this ensures that a duplicated ID cannot cause an endless loop.
+    expanded_task_ids = set()
+    stack = [(root_task, 0) for root_task in reversed(tasks_grouped_by_parent_id[''])]
+    while stack:
+        task, depth = stack.pop()
+        
+        depth_counter[depth] += 1
+        task[u'depth'] = depth
+        tasks_sorted.append(task)
+        
+        # Process tasks for which this ID is the parent
+        task_id = task.get('id', None)
+        list_of_subtasks = tasks_grouped_by_parent_id.get(task_id, None)
+        if list_of_subtasks and task_id not in expanded_task_ids:
+            # Task has subtasks
+            expanded_task_ids.add(task_id)
+            subtask_depth = depth + 1
+            stack.extend([(subtask, subtask_depth) for subtask in reversed(list_of_subtasks)])
+            
+    num_ordered_tasks = len(tasks_sorted)
+    if num_ordered_tasks < len(tasks_unsorted):
+        # Some tasks could not be reached from any root task, because their parent (or an ancestor's
+        # parent) does not exist, or because their parents form a cycle.
+        sorted_task_ids = set(id(task) for task in tasks_sorted)
+        unreachable_tasks = [task for task in tasks_unsorted if id(task) not in sorted_task_ids]
+        num_orphaned_tasks, num_cyclic_tasks = _count_unreachable_tasks(unreachable_tasks, tasks_by_id)
+        stats['num_orphaned_tasks'] += num_orphaned_tasks
+        stats['num_cyclic_tasks'] += num_cyclic_tasks
+        logging.warning("%s: %d tasks cannot be reached from a root task; " +
+            "%d orphaned tasks, %d tasks in a cycle of parents", 
+            fn_name, len(unreachable_tasks), num_orphaned_tasks, num_cyclic_tasks)
+        if keep_unreachable_tasks:
+            tasks_sorted.extend(unreachable_tasks)
+        
+    tasklist_dict['tasks'] = tasks_sorted
+    if keep_unreachable_tasks:
+        tasklist_dict[constants.TASKLIST_NUM_ORDERED_TASKS] = num_ordered_tasks
+        
+        
+def log_tasks_order_stats(stats):
+    """ Log the statistics collected by fix_tasklist_order() """
+    
+    fn_name = "log_tasks_order_stats()"
+    
+    total_num_tasks = stats['num_tasks']
+    total_num_subtasks = stats['num_subtasks']
+    
+    logging.info("%s: %s", fn_name,
+        "Processed {:,} tasks in {:,} tasklists".format(
+            total_num_tasks,
+            stats['num_tasklists']))
+    if stats['num_empty_tasklists']:
+        logging.info("%s: There were %d empty tasklists", fn_name, stats['num_empty_tasklists'])
+        
+    if total_num_tasks:
+        avg_subtasks = total_num_subtasks * 1.0 / total_num_tasks
+    else:
+        # Prevent divide by zero
+        avg_subtasks = 0.0
+        
+    logging.info("%s: %s", fn_name, 
+        "There were {:,} sub-tasks ({:.2%})".format(
+            total_num_subtasks, 
+            avg_subtasks))
+
+    num_tasks_greater_than_depth1 = 0
+    for depth, count in sorted(stats['depth_counts'].iteritems()):
+        if depth > 1:
+            num_tasks_greater_than_depth1 += count
+        
+        if total_num_tasks:
+            avg_subtasks = count * 1.0 / total_num_tasks
+        else:
+            # Prevent divide by zero
+            avg_subtasks = 0.0
+        
+        logging.info("%s: %s", fn_name,
+            "    Depth {}: {:>6,}  {:>7.2%}".format(
+            depth, 
+            count,
+            avg_subtasks))
+        
+    if num_tasks_greater_than_depth1:
+        logging.info("%s: %s", fn_name,
+            "    {:,} sub-tasks have depth greater than 1. That is;".format(
+                num_tasks_greater_than_depth1))
+            
+        if total_num_subtasks:
+            avg_subtasks = num_tasks_greater_than_depth1 * 1.0 / total_num_subtasks
+        else:
+            # Prevent divide by zero
+            avg_subtasks = 0.0
+        
+        logging.info("%s: %s", fn_name,
+            "          {:.2%} of all sub-tasks".format(
+                avg_subtasks))
+            
+        if total_num_tasks:
+            avg_subtasks = num_tasks_greater_than_depth1 * 1.0 / total_num_tasks
+        else:
+            # Prevent divide by zeero
+            avg_subtasks = 0.0
+        
+        logging.info("%s: %s", fn_name,
+            "          {:.2%} of all tasks".format(
+                num_tasks_greater_than_depth1 * 1.0 / total_num_tasks))
+
+    if stats['num_orphaned_tasks'] or stats['num_cyclic_tasks']:
+        logging.warning("%s: %s", fn_name,
+            "There were {:,} orphaned tasks and {:,} tasks in a cycle of parents".format(
+                stats['num_orphaned_tasks'],
+                stats['num_cyclic_tasks']))
+                
+                
+def fix_tasks_order(tasklists):
+    """ Fix the order of tasks within the 'tasklists' list,
+        as the tasks returned from the Google Tasks server are out of sequence.
+        
+        Reorders tasks in each tasklist so that subtasks appear under
+        the respective parents, and in correct sibling order.
+        
+        Also set each task's 'depth' value.
+        
+        Returns the statistics dictionary (see new_tasks_order_stats()), 
+        with 'depth_counts' converted to a plain dictionary.
+    """
+    
+    stats = new_tasks_order_stats()
+    for tasklist_dict in tasklists:
+        fix_tasklist_order(tasklist_dict, stats)
+    log_tasks_order_stats(stats)
+    stats['depth_counts'] = dict(stats['depth_counts'])
+    return stats
+    
+    
+def use_precomputed_tasks_order(tasklists):
+    """ Prepare tasklists loaded from a backup for display or export.
+    
+        Tasklists which were ordered by the worker (see fix_tasklist_order()) already have their tasks in
+        order, with the 'depth' set, so only the unreachable tasks stored after the ordered tasks are removed.
+        Tasklists from backups created before the worker ordered the tasks are reordered by fix_tasks_order().
+        
+        Returns the number of tasklists which had to be reordered.
+    """
+    
+    fn_name = "use_precomputed_tasks_order(): "
+    
+    tasklists_to_fix = []
+    for tasklist_dict in tasklists:
+        num_ordered_tasks = tasklist_dict.pop(constants.TASKLIST_NUM_ORDERED_TASKS, None)
+        if num_ordered_tasks is None:
+            tasklists_to_fix.append(tasklist_dict)
+        elif 'tasks' in tasklist_dict and num_ordered_tasks < len(tasklist_dict['tasks']):
+            del tasklist_dict['tasks'][num_ordered_tasks:]
+            
+    if tasklists_to_fix:
+        logging.debug("%sReordering %d of %d tasklists which were stored without a precomputed order",
+            fn_name, len(tasklists_to_fix), len(tasklists))
+        fix_tasks_order(tasklists_to_fix)
+    return len(tasklists_to_fix)
+    
+    
+def load_tasklists(user_email, aes_decrypt_cipher=None, data_format=constants.TasklistsDataFormat.PICKLED_LIST,
+                   compression=constants.DataCompression.NONE, layer=0):
+    """ Returns the list of tasklists from one layer of the user's most recent backup.
+    
+        The blobs are read in order, decrypted (if aes_decrypt_cipher is supplied), decompressed and unpickled 
+        one blob at a time, so memory use doesn't grow with the size of the pickled data.
+        data_format and compression are the constants.TasklistsDataFormat and constants.DataCompression
+        values which were used to store the blobs.
+        
+        Returns None if there are no TasklistsData records for the user.
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If the data could not be decrypted or unpickled
+    """
+    
+    fn_name = "load_tasklists(): "
+    
+    stream = ChunkedDataStream(iter_tasklists_data_chunks(user_email, aes_decrypt_cipher, compression, layer))
+    
+    # Unpickle in a try/except, in case the pickled data is corrupt,
+    # possibly because it was incorrectly decrypted (or decrypted with the wrong AES key).
+    try:
+        if stream.at_end() and not stream.num_chunks:
+            logging.debug("%sNo data records found", fn_name)
+            return None
+            
+        unpickler = pickle.Unpickler(stream)
+        if data_format == constants.TasklistsDataFormat.PICKLED_TASKLISTS:
+            # Each tasklist was pickled separately, so unpickle each tasklist in turn until we reach the end of the data
+            tasklists = []
+            while not stream.at_end():
+                tasklists.append(unpickler.load())
+        else:
+            tasklists = unpickler.load()
+            
+    except GtbDecryptionError:
+        raise
+    except Exception as ex: # pylint: disable=broad-except
+        logging.exception("%sError unpickling pickled tasklists", fn_name)
+        raise GtbDecryptionError("Error unpickling pickled tasklists: " +
+            get_exception_msg(ex))
+        
+    logging.debug("%sLoaded %s tasklists from %s bytes (compression = '%s')",
+        fn_name,
+        len(tasklists),
+        stream.num_bytes,
+        compression)
+    return tasklists
+
+    
+    
+def task_is_included(task, include_hidden, include_completed, include_deleted):
+    """ Returns True if the task would have been returned by tasks.list() using the backup job's options.
+    
+        Equivalent to the showHidden, showCompleted and showDeleted options used by the worker when 
+        retrieving a tasklist in full.
+    """
+    
+    if task.get(u'deleted') and not include_deleted:
+        return False
+    if task.get(u'hidden') and not include_hidden:
+        return False
+    if task.get(u'status') == u'completed' and not include_completed:
+        return False
+    return True
+    
+    
+def merge_tasklist_changes(prev_tasklist_dict, changes_tasklist_dict, # pylint: disable=too-many-arguments
+                           include_hidden, include_completed, include_deleted):
+    """ Merge the changed tasks into the tasklist from the previous backup layer.
+    
+        arguments:
+          prev_tasklist_dict       -- The tasklist dictionary from the previous backup layer
+          changes_tasklist_dict    -- Tasklist dictionary containing all the tasks that have changed 
+                                      since the previous layer (including deleted, hidden and completed)
+          include_hidden           -- If true, hidden tasks are kept in the backup
+          include_completed        -- If true, completed tasks are kept in the backup
+          include_deleted          -- If true, deleted tasks are kept in the backup
+    
+        returns a tuple;
+          tasklist dictionary containing the merged tasks
+          number of tasks
+    """
+    
+    fn_name = "merge_tasklist_changes(): "
+    
+    changed_tasks = changes_tasklist_dict.get(u'tasks', [])
+    changed_tasks_by_id = {}
+    for task in changed_tasks:
+        changed_tasks_by_id[task[u'id']] = task
+        
+    num_changed = 0
+    num_removed = 0
+    merged_tasks = []
+    
+    # Replace (or remove) tasks that have changed
+    for task in prev_tasklist_dict.get(u'tasks', []):
+        changed_task = changed_tasks_by_id.pop(task[u'id'], None)
+        if changed_task is None:
+            # Task is unchanged
+            merged_tasks.append(task)
+        elif task_is_included(changed_task, include_hidden, include_completed, include_deleted):
+            num_changed = num_changed + 1
+            merged_tasks.append(changed_task)
+        else:
+            # Task has been deleted, hidden or completed, and user doesn't want those tasks
+            num_removed = num_removed + 1
+        
+    # Add new tasks (in the order returned by the server)
+    num_added = 0
+    for task in changed_tasks:
+        if (task[u'id'] in changed_tasks_by_id and 
+                task_is_included(task, include_hidden, include_completed, include_deleted)):
+            num_added = num_added + 1
+            merged_tasks.append(task)
+            
+    logging.debug("%s%d tasks changed, %d tasks added, %d tasks removed",
+        fn_name, num_changed, num_added, num_removed)
+    
+    # The title may have changed, so use the current title.
+    # The merged tasks are not in hierarchy order, so the tasklist doesn't have TASKLIST_NUM_ORDERED_TASKS
+    merged_tasklist_dict = {}
+    merged_tasklist_dict[u'title'] = changes_tasklist_dict[u'title']
+    merged_tasklist_dict[u'id'] = changes_tasklist_dict[u'id']
+    if merged_tasks:
+        merged_tasklist_dict[u'tasks'] = merged_tasks
+        
+    return merged_tasklist_dict, len(merged_tasks)
+    
+    
+def merge_backup_layer(tasklists, layer_tasklists, include_hidden, include_completed, include_deleted): # pylint: disable=too-many-arguments
+    """ Returns the tasklists from an incremental backup layer, combined with the tasklists from the previous layers.
+    
+        arguments:
+          tasklists                -- List of tasklists from the previous layers (already merged)
+          layer_tasklists          -- List of tasklists from the layer, as stored by the worker.
+                                      Each tasklist has a constants.TASKLIST_LAYER_CONTENT value, unless 
+                                      it was retrieved in full.
+          include_hidden, include_completed, include_deleted 
+                                   -- The options of the backup job
+    
+        The tasklists are returned in the order that they are in layer_tasklists (the order returned by the
+        server when the layer was created), so tasklists which had been deleted are dropped, and renamed 
+        tasklists use the title from the layer.
+        
+        A task which has been moved to another tasklist keeps its ID, and is returned in the changes of the 
+        tasklist it was moved to, so it is removed from the tasklist that it was in.
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If the layer refers to a tasklist which isn't in the previous layers
+    """
+    
+    fn_name = "merge_backup_layer(): "
+    
+    prev_tasklists_by_id = dict((tasklist_dict[u'id'], tasklist_dict) for tasklist_dict in tasklists)
+    
+    # {task_id : tasklist_id} for every (non-deleted) task retrieved in this layer
+    task_tasklist_ids = {}
+    for tasklist_dict in layer_tasklists:
+        for task in tasklist_dict.get(u'tasks', []):
+            if not task.get(u'deleted'):
+                task_tasklist_ids[task[u'id']] = tasklist_dict[u'id']
+                
+    num_moved = 0
+    merged_tasklists = []
+    for idx, tasklist_dict in enumerate(layer_tasklists):
+        tasklist_id = tasklist_dict[u'id']
+        layer_content = tasklist_dict.pop(constants.TASKLIST_LAYER_CONTENT, None)
+        if layer_content is None:
+            # Retrieved in full
+            merged_tasklists.append(tasklist_dict)
+            continue
+            
+        prev_tasklist_dict = prev_tasklists_by_id.get(tasklist_id)
+        if prev_tasklist_dict is None:
+            # Should never happen, because the worker only stores changes for tasklists in the previous layer.
+            # Log the position (rather than the title), so that we don't log any personal data
+            logging.error("%sTasklist %d of layer is not in the previous layer", fn_name, idx)
+            raise GtbDecryptionError("Backup layer doesn't match the previous layer")
+            
+        # Remove tasks which have been moved to another tasklist
+        prev_tasks = prev_tasklist_dict.get(u'tasks', [])
+        remaining_tasks = [task for task in prev_tasks 
+            if task_tasklist_ids.get(task[u'id'], tasklist_id) == tasklist_id]
+        if len(remaining_tasks) != len(prev_tasks):
+            num_moved += len(prev_tasks) - len(remaining_tasks)
+            prev_tasklist_dict[u'tasks'] = remaining_tasks
+            # The remaining tasks may no longer be in hierarchy order
+            prev_tasklist_dict.pop(constants.TASKLIST_NUM_ORDERED_TASKS, None)
+            
+        if layer_content == constants.TASKLIST_UNCHANGED:
+            prev_tasklist_dict[u'title'] = tasklist_dict[u'title']
+            merged_tasklists.append(prev_tasklist_dict)
+        else:
+            merged_tasklist_dict, _ = merge_tasklist_changes(prev_tasklist_dict, tasklist_dict, 
+                include_hidden, include_completed, include_deleted)
+            merged_tasklists.append(merged_tasklist_dict)
+            
+    logging.debug("%sMerged %d tasklists into %d tasklists; %d tasks moved between tasklists",
+        fn_name, len(layer_tasklists), len(merged_tasklists), num_moved)
+    return merged_tasklists
+    
+    
+def load_backup_tasklists(user_email, tasks_backup_job, aes_key=None, private_key_b64=None):
+    """ Returns the list of tasklists in the backup created by tasks_backup_job.
+    
+        If the job was an incremental backup, each of the previous layers is loaded in turn (using the AES key 
+        of each layer, which is decrypted with private_key_b64), and merged with the following layer.
+        aes_key is the (decrypted) AES key of the job's own layer, or None if the data is not encrypted.
+        
+        Tasklists which have had changes merged don't have a precomputed tasks order, so they are reordered
+        by use_precomputed_tasks_order().
+        
+        Returns None if there are no TasklistsData records for any of the layers.
+    
+        Raises
+        ------
+        GtbDecryptionError
+            If any of the layers could not be decrypted, unpickled or merged
+    """
+    
+    fn_name = "load_backup_tasklists(): "
+    
+    previous_layers = tasks_backup_job.previous_layers or {}
+    num_layers = len(previous_layers) + 1
+    tasklists = None
+    for layer in range(num_layers):
+        if layer < len(previous_layers):
+            layer_details = previous_layers[layer]
+            layer_aes_key = decrypt_aes_key(private_key_b64, layer_details['encrypted_aes_key_b64'])
+            data_format = layer_details['data_format']
+            compression = layer_details['data_compression']
+        else:
+            layer_aes_key = aes_key
+            data_format = tasks_backup_job.data_format
+            compression = tasks_backup_job.data_compression
+            
+        layer_tasklists = load_tasklists(user_email, new_aes_ctr_cipher(layer_aes_key) if layer_aes_key else None, 
+            data_format, compression, layer)
+        if layer_tasklists is None:
+            logging.error("%sNo data records found for layer %d of %d", fn_name, layer, num_layers)
+            return None
+            
+        if tasklists is None:
+            tasklists = layer_tasklists
+        else:
+            tasklists = merge_backup_layer(tasklists, layer_tasklists, tasks_backup_job.include_hidden, 
+                tasks_backup_job.include_completed, tasks_backup_job.include_deleted)
+                
+    if num_layers > 1:
+        logging.debug("%sMerged %d backup layers", fn_name, num_layers)
+    return tasklists
+            
+            
+class TasklistsDataWriter(object):
+    """ Stores the user's tasklists in TasklistsData blobs, one tasklist at a time.
+    
+        Each tasklist is pickled, compressed (if compression is set) and encrypted (if aes_encrypt_cipher 
+        is supplied) as soon as it is written, and each full blob is stored as soon as there is enough data 
+        to fill it, so that only one tasklist and one blob need to be held in memory, rather than the 
+        entire backup (up to 3 times over).
+        
+        The blobs are stored in the constants.TasklistsDataFormat.PICKLED_TASKLISTS format, as the specified
+        layer of the backup (see get_tasklists_data_parent_key()). Any existing TasklistsData records for that
+        layer must be deleted before the first tasklist is written.
+        
+        Each blob is stored using an asynchronous put, so that the datastore RPC overlaps with retrieving 
+        and pickling the following tasklists. Up to settings.MAX_BLOB_PUTS_IN_PROGRESS puts may be in 
+        progress at once. All puts have completed when close() returns.
+        
+        The AES cipher must be a CTR mode cipher, which allows the data to be encrypted in pieces. 
+        Only complete blobs are encrypted (except for the final blob), and MAX_BLOB_SIZE is a multiple 
+        of the AES block size, so the result is identical to encrypting all the data at once.
+    """
+    
+    data_format = constants.TasklistsDataFormat.PICKLED_TASKLISTS
+    
+    def __init__(self, user_email, aes_encrypt_cipher=None, compression=constants.DataCompression.NONE, layer=0):
+        self._parent_key = get_tasklists_data_parent_key(user_email, layer)
+        self._aes_encrypt_cipher = aes_encrypt_cipher
+        
+        if compression not in constants.DataCompression.ALL_VALUES:
+            logging.warning("TasklistsDataWriter(): Unknown compression '%s', so data will not be compressed", 
+                compression)
+            compression = constants.DataCompression.NONE
+        self.compression = compression
+        self._compressor = get_compressor(compression)
+        
+        # Pickled (and compressed) data which hasn't yet been stored in a blob
+        self._pending_data = []
+        self._pending_len = 0
+        
+        # Futures for the asynchronous puts which may not have completed yet, oldest first
+        self._puts_in_progress = []
+        
+        self.num_tasklists = 0
+        self.num_blobs = 0
+        self.num_bytes = 0
+        self.num_uncompressed_bytes = 0
+        self.closed = False
+        
+        # Total time spent compressing data
+        self.compress_duration = 0.0
+        
+        # Total time spent encrypting data, and waiting for asynchronous puts to complete
+        self.encrypt_duration = 0.0
+        self.put_wait_duration = 0.0
+        
+        
+    def write_tasklist(self, tasklist_dict):
+        """ Pickle the tasklist, and store any blobs which are now full """
+        
+        data = pickle.dumps(tasklist_dict, pickle.HIGHEST_PROTOCOL)
+        self.num_uncompressed_bytes += len(data)
+        self.num_tasklists += 1
+        self._append_data(data)
+        
+        
+    def _append_data(self, data):
+        """ Compress (if required) and append the data to the pending data, and store any blobs which are now full """
+        
+        if self._compressor:
+            compress_start = time.time()
+            data = self._compressor.compress(data)
+            self.compress_duration += time.time() - compress_start
+            
+        self._pending_data.append(data)
+        self._pending_len += len(data)
+        self._store_full_blobs()
+        
+        
+    def _store_full_blobs(self):
+        """ Store as many full blobs as possible from the pending data """
+        
+        if self._pending_len >= constants.MAX_BLOB_SIZE:
+            pending_data = "".join(self._pending_data)
+            
+            # Store as many full blobs as possible. The remainder is kept until more data is written.
+            num_full_blobs = len(pending_data) // constants.MAX_BLOB_SIZE
+            for i in range(num_full_blobs):
+                self._store_blob(pending_data[i*constants.MAX_BLOB_SIZE : (i+1)*constants.MAX_BLOB_SIZE])
+                
+            remainder = pending_data[num_full_blobs*constants.MAX_BLOB_SIZE:]
+            self._pending_data = [remainder]
+            self._pending_len = len(remainder)
+            
+            
+    def close(self):
+        """ Store the remaining data in the final blob, and wait for all the puts to complete """
+        
+        if self.closed:
+            return
+            
+        if self._compressor:
+            # Get any data which is still held by the compressor
+            compress_start = time.time()
+            data = self._compressor.flush()
+            self._compressor = None
+            self.compress_duration += time.time() - compress_start
+            self._pending_data.append(data)
+            self._pending_len += len(data)
+            self._store_full_blobs()
+            
+        if self._pending_len or not self.num_blobs:
+            # Always store at least one blob, so that an empty backup can be distinguished from a missing backup
+            self._store_blob("".join(self._pending_data))
+            
+        self._pending_data = []
+        self._pending_len = 0
+        
+        while self._puts_in_progress:
+            self._wait_for_oldest_put()
+        self.closed = True
+        
+        
+    def _store_blob(self, data):
+        """ Encrypt (if required) and store the data in a new TasklistsData blob """
+        
+        if self._aes_encrypt_cipher:
+            encrypt_start = time.time()
+            data = self._aes_encrypt_cipher.encrypt(data)
+            self.encrypt_duration += time.time() - encrypt_start
+            
+        # Limit the number of blobs held in memory by puts which haven't completed yet
+        while len(self._puts_in_progress) >= settings.MAX_BLOB_PUTS_IN_PROGRESS:
+            self._wait_for_oldest_put()
+            
+        tasklist_rec = model.TasklistsData(self._parent_key)
+        tasklist_rec.pickled_tasks_data = data
+        tasklist_rec.idx = self.num_blobs
+        self._puts_in_progress.append(db.put_async(tasklist_rec))
+        
+        self.num_blobs += 1
+        self.num_bytes += len(data)
+        
+        
+    def _wait_for_oldest_put(self):
+        """ Wait for the oldest asynchronous put to complete. Raises any exception raised by the put. """
+        
+        wait_start = time.time()
+        self._puts_in_progress.pop(0).get_result()
+        self.put_wait_duration += time.time() - wait_start
+
+
+# ---------------------------------------------------------------------------------------------
+#   Cached exports
+# ---------------------------------------------------------------------------------------------
+# A finished export file is stored (compressed, and encrypted with the backup's AES key) in a CachedExport 
+# entity and its CachedExportData blobs, so that exporting the same backup in the same format again
+# doesn't need to reassemble, decrypt, unpickle and export the tasks again.
+
+def new_aes_ctr_cipher(aes_key, nonce=''):
+    """ Returns an AES CTR mode cipher, used to encrypt or decrypt data with the backup's AES key.
+    
+        The backup data is encrypted with a counter starting from zero (no nonce). Anything else encrypted 
+        with the same AES key (e.g. a cached export) must use a different random nonce, which forms the start 
+        of the counter block, so that the same AES key stream is never used to encrypt different data.
+    """
+    if nonce:
+        return AES.new(aes_key, AES.MODE_CTR, counter=Counter.new(128 - 8 * len(nonce), prefix=nonce))
+    return AES.new(aes_key, AES.MODE_CTR, counter=Counter.new(128))
+    
+    
+def get_export_cache_key(job_start_timestamp, export_format, options):
+    """ Returns the key name of the CachedExport for exporting a backup in the specified format.
+    
+        arguments:
+          job_start_timestamp   -- The job_start_timestamp of the backup job, which identifies the backup
+          export_format         -- The export format chosen by the user
+          options               -- Tuple of the user's choices which affect the content of the exported file
+          
+        The app version is included, so that files cached by a previous version are not returned
+        after a new version (which may export differently) has been uploaded.
+    """
+    key_str = repr((str(job_start_timestamp), export_format, options, appversion.version))
+    # Datastore key names may not begin with a digit
+    return 'export_' + hashlib.sha1(key_str).hexdigest()
+    
+    
+def _get_cached_exports_parent_key(user_email):
+    return db.Key.from_path(settings.DB_KEY_CACHED_EXPORTS, user_email)
+    
+    
+def _get_cached_export_data_keys(cached_export):
+    """ Returns the keys of the CachedExportData blobs which hold the content of the cached export """
+    return [db.Key.from_path('CachedExportData', 'blob%d' % idx, parent=cached_export.key()) 
+        for idx in range(cached_export.num_blobs)]
+    
+    
+def get_cached_export(user_email, cache_key, aes_key=None):
+    """ Returns a tuple of (CachedExport, file content) if the export has been cached, 
+        or (None, None) if it isn't cached, or the cached export can't be read.
+        
+        arguments:
+          user_email            -- The user's email address
+          cache_key             -- The key returned by get_export_cache_key()
+          aes_key               -- The backup's AES key, or None if the backup is not encrypted
+    """
+    
+    fn_name = "get_cached_export(): "
+    
+    try:
+        cached_export = model.CachedExport.get_by_key_name(cache_key, parent=_get_cached_exports_parent_key(user_email))
+        if not cached_export:
+            return None, None
+            
+        blobs = db.get(_get_cached_export_data_keys(cached_export))
+        if None in blobs:
+            logging.warning("%sCached %s export is incomplete, so not using it", fn_name, cached_export.export_format)
+            return None, None
+        data = ''.join([blob.data for blob in blobs])
+        if cached_export.aes_nonce:
+            if not aes_key:
+                logging.warning("%sCached %s export is encrypted, but there is no AES key", 
+                    fn_name, cached_export.export_format)
+                return None, None
+            data = new_aes_ctr_cipher(aes_key, cached_export.aes_nonce).decrypt(data)
+        content = zlib.decompress(data)
+        
+        # Mark as recently used, so that it is evicted last
+        cached_export.last_used_timestamp = datetime.datetime.now()
+        db.put_async(cached_export)
+        
+        logging.debug("%sFound cached %s export (%d bytes, stored as %d bytes)",
+            fn_name, cached_export.export_format, len(content), cached_export.stored_size)
+        return cached_export, content
+        
+    except Exception as ex: # pylint: disable=broad-except
+        # Not critical; the export will be created from the backup data
+        logging.exception("%sError reading cached export: %s", fn_name, get_exception_msg(ex))
+        return None, None
+    
+    
+def put_cached_export(user_email, cache_key, job_start_timestamp, export_format, content_chunks, # pylint: disable=too-many-arguments,too-many-locals
+                      content_type, content_disposition_prefix, file_extension, aes_key=None):
+    """ Store an export file in the cache, and evict the least recently used cached exports if the user's
+        cached exports exceed the settings.EXPORT_CACHE_MAX_SIZE_PER_USER or EXPORT_CACHE_MAX_ENTRIES_PER_USER
+        limits.
+        
+        The content is compressed one chunk at a time, and is not cached if it is larger than 
+        settings.EXPORT_CACHE_MAX_ENTRY_SIZE after compression. If the backup is encrypted, the cached content 
+        is encrypted with the same AES key (using a random nonce), so the cached file can only be read using 
+        the private key in the user's cookie.
+        
+        arguments:
+          user_email                    -- The user's email address
+          cache_key                     -- The key returned by get_export_cache_key()
+          job_start_timestamp           -- The job_start_timestamp of the backup which was exported
+          export_format                 -- The export format
+          content_chunks                -- Iterable of the (byte string) pieces of the exported file
+          content_type                  -- The Content-Type header value of the exported file
+          content_disposition_prefix    -- The Content-Disposition header value up to (not including) the filename
+          file_extension                -- The extension of the exported filename
+          aes_key                       -- The backup's AES key, or None if the backup is not encrypted
+          
+        Returns True if the export was cached.
+    """
+    
+    fn_name = "put_cached_export(): "
+    
+    try:
+        compressor = zlib.compressobj(settings.BACKUP_DATA_COMPRESSION_LEVEL)
+        compressed_chunks = []
+        compressed_size = 0
+        content_size = 0
+        for chunk in content_chunks:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode('utf-8')
+            content_size += len(chunk)
+            compressed_chunk = compressor.compress(chunk)
+            if compressed_chunk:
+                compressed_chunks.append(compressed_chunk)
+                compressed_size += len(compressed_chunk)
+                if compressed_size > settings.EXPORT_CACHE_MAX_ENTRY_SIZE:
+                    logging.debug("%s%s export is too large to cache", fn_name, export_format)
+                    return False
+        compressed_chunks.append(compressor.flush())
+        data = ''.join(compressed_chunks)
+        compressed_chunks = None
+        if len(data) > settings.EXPORT_CACHE_MAX_ENTRY_SIZE:
+            logging.debug("%s%s export is too large to cache", fn_name, export_format)
+            return False
+            
+        aes_nonce = ''
+        if aes_key:
+            aes_nonce = Random.new().read(8)
+            data = new_aes_ctr_cipher(aes_key, aes_nonce).encrypt(data)
+            
+        cached_export = model.CachedExport(key_name=cache_key, parent=_get_cached_exports_parent_key(user_email))
+        cached_export.job_start_timestamp = job_start_timestamp
+        cached_export.export_format = export_format
+        cached_export.content_type = content_type
+        cached_export.content_disposition_prefix = content_disposition_prefix
+        cached_export.file_extension = file_extension
+        cached_export.stored_size = len(data)
+        cached_export.num_blobs = (len(data) + constants.MAX_BLOB_SIZE - 1) // constants.MAX_BLOB_SIZE
+        cached_export.aes_nonce = aes_nonce
+        cached_export.last_used_timestamp = datetime.datetime.now()
+        
+        # Store the blobs before the CachedExport, so that an incomplete cached export is never found.
+        # Each blob is stored using an asynchronous put (as in TasklistsDataWriter), so that a single RPC 
+        # doesn't have to carry the whole file, and up to settings.MAX_BLOB_PUTS_IN_PROGRESS puts may be 
+        # in progress at once.
+        puts_in_progress = []
+        for idx, blob_key in enumerate(_get_cached_export_data_keys(cached_export)):
+            while len(puts_in_progress) >= settings.MAX_BLOB_PUTS_IN_PROGRESS:
+                puts_in_progress.pop(0).get_result()
+            offset = idx * constants.MAX_BLOB_SIZE
+            puts_in_progress.append(db.put_async(model.CachedExportData(key_name=blob_key.name(), 
+                parent=cached_export.key(), data=db.Blob(data[offset:offset + constants.MAX_BLOB_SIZE]))))
+        for put_in_progress in puts_in_progress:
+            put_in_progress.get_result()
+        cached_export.put()
+        
+        logging.debug("%sCached %s export (%d bytes, stored as %d bytes)", 
+            fn_name, export_format, content_size, len(data))
+        
+        _evict_cached_exports(user_email)
+        return True
+        
+    except Exception as ex: # pylint: disable=broad-except
+        # Not critical; the export will be created again next time
+        logging.exception("%sError caching %s export: %s", fn_name, export_format, get_exception_msg(ex))
+        return False
+    
+    
+def _evict_cached_exports(user_email):
+    """ Delete the least recently used of the user's cached exports, until the user's cached exports are within
+        the settings.EXPORT_CACHE_MAX_SIZE_PER_USER and EXPORT_CACHE_MAX_ENTRIES_PER_USER limits """
+    
+    fn_name = "_evict_cached_exports(): "
+    
+    cached_exports = model.CachedExport.all().ancestor(_get_cached_exports_parent_key(user_email)).fetch(None)
+    cached_exports.sort(key=lambda cached_export: cached_export.last_used_timestamp, reverse=True)
+    
+    keys_to_delete = []
+    total_size = 0
+    num_kept = 0
+    for cached_export in cached_exports:
+        total_size += cached_export.stored_size
+        if (num_kept < settings.EXPORT_CACHE_MAX_ENTRIES_PER_USER and 
+                total_size <= settings.EXPORT_CACHE_MAX_SIZE_PER_USER):
+            num_kept += 1
+        else:
+            keys_to_delete.append(cached_export.key())
+            keys_to_delete.extend(_get_cached_export_data_keys(cached_export))
+            
+    if keys_to_delete:
+        db.delete(keys_to_delete)
+        logging.debug("%sEvicted %d cached exports", fn_name, len(cached_exports) - num_kept)
+    
+    
+def delete_cached_exports(user_email):
+    """ Delete all of the user's cached exports. Called when a new backup is started, because the
+        cached exports are of the previous backup. 
+        
+        Returns the number of cached exports deleted.
+    """
+    
+    cached_exports = model.CachedExport.all().ancestor(_get_cached_exports_parent_key(user_email)).fetch(None)
+    keys_to_delete = []
+    for cached_export in cached_exports:
+        keys_to_delete.append(cached_export.key())
+        keys_to_delete.extend(_get_cached_export_data_keys(cached_export))
+    if keys_to_delete:
+        db.delete(keys_to_delete)
+    return len(cached_exports)
@@ -34,10 +34,9 @@ import os
 import pickle
 import gc
 import time
-import operator
 import datetime
 import base64
-from collections import Counter
+import json
 # from urlparse import urljoin
 
 from Crypto.PublicKey import RSA
@@ -57,7 +56,6 @@ from google.appengine.api import mail_errors # To catch InvalidSenderError
 from google.appengine.api import logservice # To flush logs
 from google.appengine.api import urlfetch
 from google.appengine.api.app_identity import get_application_id
-from google.appengine.ext import db
 from google.appengine.ext.webapp import template
 from google.appengine.runtime import apiproxy_errors
 import webapp2
@@ -71,8 +69,11 @@ import settings # pylint: disable=relative-import
 # appversion.version is set before the upload process to keep the version number consistent
 import appversion # pylint: disable=relative-import
 import host_settings # pylint: disable=relative-import
+# Writes the file-based export formats a row at a time (equivalent to the tasks_template_* templates)
+import export_writers # pylint: disable=relative-import
 # The shared module contains code which is common between tasks-backup.py and worker.py
 import shared # pylint: disable=relative-import
+import retry_policy # pylint: disable=relative-import
 from shared import data_is_encrypted, encryption_keys_are_valid, results_can_be_returned # pylint: disable=relative-import
 from shared import GtbDecryptionError, send_email_to_support, ago_msg, set_cookie, get_exception_msg # pylint: disable=relative-import
 
@@ -112,7 +113,8 @@ auth_decorator = OAuth2Decorator( # pylint: disable=invalid-name
                                  client_secret=host_settings.CLIENT_SECRET,
                                  scope=host_settings.SCOPE,
                                  user_agent=host_settings.USER_AGENT,
-                                 message=AUTH_ERR_MSG)
+                                 message=AUTH_ERR_MSG,
+                                 credentials_cache=shared.credentials_cache)
 
                                  
 # Map the 'html_sort_order' value to a human friendly message
@@ -201,261 +203,12 @@ def sort_tasks(tasklists, sort_order):
         
         
 
-def fix_tasks_order(tasklists): # pylint:disable=too-many-locals,too-many-statements,too-many-branches
-    """ Fix the order of tasks within the 'tasklists' list,
-        as the tasks returned from the Google Tasks server are out of sequence.
-        
-        Reorders tasks in each tasklist so that subtasks appear under
-        the respective parents, and in correct sibling order.
-        
-        Also set each task's 'depth' value.
-    """
+def _get_output_filename_base(export_format, user_email):
+    """ Returns the filename (without the extension) of the exported file """
+    # Filename format is "tasks_FORMAT_EMAILADDR_YYYY-MM-DD.EXT"
+    # CAUTION: Do not include characters that may not be valid on some filesystems (e.g., colon is not valid on Windows)
+    return "tasks_%s_%s_%s" % (export_format, user_email, datetime.datetime.now().strftime("%Y-%m-%d"))
     
-    fn_name = "fix_tasks_order()"
-
-    total_num_subtasks = 0
-    total_num_tasks = 0
-    num_tasklists = 0
-    num_empty_tasklists = 0
-    depth_counter = Counter()
-    
-
-    def process_task(tasks_sorted, tasks_grouped_by_parent_id, task, depth):
-        """ Recursively process tasks and (optional) subtasks.
-        
-            Add task to 'tasks_sorted' list in order, and grouped by parent.
-            Set each task's 'depth' value.
-        """
-        
-        depth_counter[depth] += 1
-        
-        task[u'depth'] = depth
-            
-        tasks_sorted.append(task)
-            
-        # Process tasks for which this ID is the parent
-        task_id = task.get('id', None)
-        list_of_subtasks = tasks_grouped_by_parent_id.get(task_id, None)
-        if list_of_subtasks:
-            # Task has subtasks
-            for subtask in list_of_subtasks:
-                process_task(tasks_sorted, tasks_grouped_by_parent_id, subtask, 
-                             depth + 1)
-
-
-    for tasklist_dict in tasklists: # pylint: disable=too-many-nested-blocks
-        num_tasklists += 1
-        
-        # tasklist_title = tasklist_dict['title']
-        # logging.debug("%s: Fixing '%s'", fn_name, tasklist_title)
-            
-        if 'tasks' not in tasklist_dict:
-            num_empty_tasklists += 1
-            # logging.debug("%s: %s", fn_name, "Empty tasklist: No 'tasks' in tasklist")
-            continue
-            
-        tasks_unsorted = tasklist_dict['tasks']
-            
-        # -----------------------------------
-        # Process all the tasks in a tasklist
-        # -----------------------------------
-        
-        # tasks_unsorted contains tasks in "random" order:
-        #   subtasks may appear in the list before the subtask's parent task
-        
-        # ------------------------
-        # Group tasks by parent ID
-        # ------------------------
-        # Root tasks will (should) have '' parent
-        # JS 2019-06-03; There have been some instances where users have had
-        # no tasks with an empty parent. i.e., no root tasks!
-        # In the most recent example (2019-06-03 06:54:50.026 AEST), 
-        # 'tasks_grouped_by_parent_id' contains 7 non-root parent IDs, and the
-        # user had not exported hidden or deleted tasks, so I do not know
-        # how these could exist. There should have been at least one 
-        # root parent.
-        tasks_grouped_by_parent_id = {} # New tasklist, so start with an empty dict
-        # all_tasks_by_id = {}
-        for task_dict in tasks_unsorted:
-            total_num_tasks += 1
-            parent_id = task_dict.get('parent', '') # Will be '' for root tasks
-            if parent_id is None:
-                # JS 2019-04-04; The spec at
-                #   https://developers.google.com/tasks/v1/reference/tasks#resource
-                # for the 'parent' property says;
-                #   "This field is omitted if it is a top-level task"
-                # Just in case Google sets the parent property to None
-                # for a root task (instead of omitting the property), 
-                # we set parent_id to '' so that root tasks can still be accessed
-                # by the '' key in tasks_grouped_by_parent_id.
-                parent_id = ''
-            if parent_id:
-                # This is a subtask
-                total_num_subtasks += 1
-            if parent_id not in tasks_grouped_by_parent_id:
-                # Creat a new list for 'parent_id'
-                tasks_grouped_by_parent_id[parent_id] = []
-            # Add this task to list of sibling tasks (keyed by parent_id)
-            tasks_grouped_by_parent_id[parent_id].append(task_dict)
-        
-        # --------------------------------------
-        # Sort each group of tasks by 'position'
-        # --------------------------------------
-        #   String indicating the position of the task among its sibling tasks 
-        #   under the same parent task or at the top level. 
-        #   If this string is greater than another task's corresponding position 
-        #   string according to lexicographical ordering, the task is positioned 
-        #   after the other task under the same parent task (or at the top level).    
-        # Each group contains all the siblings below a given parent (or root)
-        for parent_id, list_of_tasks_dicts in tasks_grouped_by_parent_id.iteritems():
-            # Sort all the siblings in 'list_of_tasks' by 'position'
-            list_of_tasks_dicts.sort(key=operator.itemgetter('position'))
-            
-        # ---------------------------------
-        # Create a new sorted list of tasks
-        # ---------------------------------
-        tasks_sorted = []
-
-        if '' not in tasks_grouped_by_parent_id:
-            # ------------------------------
-            # No root tasks in this tasklist
-            # ------------------------------
-            # This can happen if:
-            #   (a) A root-level parent task is marked as completed using a third party app [1], 
-            #   AND
-            #   (b) The user chooses to export without including completed tasks
-            #
-            # [1] It is up to the client as to what happens to subtasks when a parent is marked as completed. 
-            # For example, CalenGoo only marks the parent as 'complete', and doesn't alter the subtasks in any way.
-            # If using the Tasks panel in Gmail or Calendar, marking a parent task as 'complete'
-            # also sets the 'hidden' flag on the parent, and marks all children as 'complete' and 'hidden', 
-            # and removes the 'parent' property from all children. 
-            
-            logging.warning("%s: There are no root tasks in tasklist (no tasks with '' parent ID)", fn_name)
-            logging.warning("%s:     'tasks_grouped_by_parent_id' contains %d non-root parent IDs", 
-                fn_name, len(tasks_grouped_by_parent_id))
-                
-            # TESTING +++
-            # DEBUG: Additional logging to help find why/how we have a tasklist with no root task(s)
-            try:
-                parent_ids = tasks_grouped_by_parent_id.keys()
-                for parent_id, tasks_with_same_parent in tasks_grouped_by_parent_id.iteritems():
-                    logging.info("{}DEBUG: Found {:,} tasks with parent ID '{}'".format(
-                        fn_name,
-                        len(tasks_with_same_parent),
-                        parent_id))
-                        
-                    # Check if any of the tasks in this group of tasks (grouped by parent ID)
-                    # is the parent of another group
-                    for child_task in tasks_with_same_parent:
-                        child_task_id = child_task['id']
-                        child_task_parent_id = child_task.get('parent', '') # Should be '' for root tasks
-                        if child_task_id in parent_ids:
-                            if child_task_parent_id:
-                                logging.info("%sDEBUG: Child task '%s' in group of tasks with parent ID '%s' is a parent, and has a parent '%s'",
-                                    fn_name,
-                                    child_task_id,
-                                    parent_id,
-                                    child_task_parent_id)
-                            else:
-                                logging.info("%sDEBUG: Child task '%s' in group of tasks with parent ID '%s' is a parent",
-                                    fn_name,
-                                    child_task_id,
-                                    parent_id)
-                    # Check if there is a task with ID == parent_id
-                    if not any(d['id'] == parent_id for d in tasks_unsorted):
-                        logging.error("%sDEBUG: %s tasks have parent ID '%s', but no task with that ID exists in this tasklist",
-                            fn_name,
-                            len(tasks_grouped_by_parent_id[parent_id]),
-                            parent_id)
-                    # TODO: Check if a task with that parent task ID exists in another tasklist (should never happen)
-                    
-                    
-            except Exception as ex: # pylint: disable=broad-except
-                logging.exception(fn_name + "Error logging details of tasklist with no root tasks: " + get_exception_msg(ex))
-                
-            # -------------------------------------
-            # KLUDGE: Set 'depth' of all tasks to 0
-            # -------------------------------------
-            logging.warning(fn_name + "No root tasks in tasklist, so setting depth of all tasks to zero")
-            for task in tasklist_dict['tasks']:
-                task['depth'] = 0
-            
-            # TESTING ---
-            
-            continue
-            
-        # Start by processing all root tasks
-        # If a root task has children, process_task() will be called recursively to process the subtasks
-        root_tasks_list = tasks_grouped_by_parent_id['']
-        for root_task in root_tasks_list:
-            process_task(tasks_sorted, tasks_grouped_by_parent_id, root_task, 
-                         depth=0)
-            
-        tasklist_dict['tasks'] = tasks_sorted
-
-    logging.info("%s: %s", fn_name,
-        "Processed {:,} tasks in {:,} tasklists".format(
-            total_num_tasks,
-            num_tasklists))
-    if num_empty_tasklists:
-        logging.info("%s: There were %d empty tasklists", fn_name, num_empty_tasklists)
-        
-    if total_num_tasks:
-        avg_subtasks = total_num_subtasks * 1.0 / total_num_tasks
-    else:
-        # Prevent divide by zero
-        avg_subtasks = 0.0
-        
-    logging.info("%s: %s", fn_name, 
-        "There were {:,} sub-tasks ({:.2%})".format(
-            total_num_subtasks, 
-            avg_subtasks))
-
-    num_tasks_greater_than_depth1 = 0
-    for depth, count in sorted(depth_counter.iteritems()):
-        if depth > 1:
-            num_tasks_greater_than_depth1 += count
-        
-        if total_num_tasks:
-            avg_subtasks = count * 1.0 / total_num_tasks
-        else:
-            # Prevent divide by zero
-            avg_subtasks = 0.0
-        
-        logging.info("%s: %s", fn_name,
-            "    Depth {}: {:>6,}  {:>7.2%}".format(
-            depth, 
-            count,
-            avg_subtasks))
-        
-    if num_tasks_greater_than_depth1:
-        logging.info("%s: %s", fn_name,
-            "    {:,} sub-tasks have depth greater than 1. That is;".format(
-                num_tasks_greater_than_depth1))
-            
-        if total_num_subtasks:
-            avg_subtasks = num_tasks_greater_than_depth1 * 1.0 / total_num_subtasks
-        else:
-            # Prevent divide by zero
-            avg_subtasks = 0.0
-        
-        logging.info("%s: %s", fn_name,
-            "          {:.2%} of all sub-tasks".format(
-                avg_subtasks))
-            
-        if total_num_tasks:
-            avg_subtasks = num_tasks_greater_than_depth1 * 1.0 / total_num_tasks
-        else:
-            # Prevent divide by zeero
-            avg_subtasks = 0.0
-        
-        logging.info("%s: %s", fn_name,
-            "          {:.2%} of all tasks".format(
-                num_tasks_greater_than_depth1 * 1.0 / total_num_tasks))
-
-
-                            
     
 class WelcomeHandler(webapp2.RequestHandler): # pylint: disable=too-few-public-methods
     """ Displays an introductory web page, explaining what the app does and providing link to authorise.
@@ -812,6 +565,12 @@ class StartBackupHandler(webapp2.RequestHandler):
             # NOTE: A cookie is required to store the RSA private key
             # Javascript in main.html only displays a [Start backup] link if cookies are enabled
             
+            # If the previous backup completed, and the user still has the private key for that backup, 
+            # the worker can store the new backup as an incremental layer on top of the previous backup. 
+            # This must be done before the new job record replaces the previous one.
+            prev_tasks_backup_job = tasks_backup_job
+            previous_layers = self._get_previous_layers(prev_tasks_backup_job)
+            
             # ===================================
             #   Create new backup job for user
             # ===================================
@@ -821,11 +580,25 @@ class StartBackupHandler(webapp2.RequestHandler):
             # As per the model, the status of a new job record is
             # constants.ExportJobStatus.TO_BE_STARTED
             tasks_backup_job = model.ProcessTasksJob(key_name=user_email)
+            
+            # The blobs stored by earlier jobs remain until the worker deletes them
+            if prev_tasks_backup_job:
+                tasks_backup_job.num_stored_layers = prev_tasks_backup_job.num_stored_layers
                                     
-            logging.debug("%sGenerating new RSA private and public keys", fn_name)
-            key = RSA.generate(2048)
-            private_key_b64 = base64.b64encode(key.exportKey(format='PEM'))
-            public_key_b64 = base64.b64encode(key.publickey().exportKey(format='PEM'))
+            if previous_layers is None:
+                logging.debug("%sGenerating new RSA private and public keys", fn_name)
+                key = RSA.generate(2048)
+                private_key_b64 = base64.b64encode(key.exportKey(format='PEM'))
+                public_key_b64 = base64.b64encode(key.publickey().exportKey(format='PEM'))
+            else:
+                # Every layer of an incremental backup must be encrypted with the same RSA key, 
+                # so that the user's private key can decrypt all the layers
+                logging.debug("%sReusing RSA keys of previous backup, so that the worker can store the new " +
+                    "backup as layer %d", fn_name, len(previous_layers))
+                private_key_b64 = self.request.cookies.get(constants.RSA_PRIVATE_KEY_COOKIE_NAME, '')
+                public_key_b64 = prev_tasks_backup_job.public_key_b64
+                tasks_backup_job.previous_layers = previous_layers
+                tasks_backup_job.previous_job_start_timestamp = prev_tasks_backup_job.job_start_timestamp
             
             # Save the RSA private key to the RSA_PRIVATE_KEY_COOKIE_NAME cookie
             set_cookie(self, constants.RSA_PRIVATE_KEY_COOKIE_NAME, private_key_b64)
@@ -850,7 +623,7 @@ class StartBackupHandler(webapp2.RequestHandler):
             tasks_backup_job.include_deleted = shared.is_truthy(self.request.get('include_deleted'))
             tasks_backup_job.include_hidden = shared.is_truthy(self.request.get('include_hidden'))
             tasks_backup_job.job_created_timestamp = datetime.datetime.now()
-            tasks_backup_job.put()
+            shared.put_job(tasks_backup_job, user_email)
 
             logging.debug(fn_name + "include_completed = " + str(tasks_backup_job.include_completed) +
                                     ", include_hidden = " + str(tasks_backup_job.include_hidden) +
@@ -869,6 +642,56 @@ class StartBackupHandler(webapp2.RequestHandler):
             logservice.flush()
 
             
+    def _get_previous_layers(self, prev_tasks_backup_job):
+        """ Returns the previous_layers for a new backup job which is to be stored on top of the user's 
+            previous backup, or None if the new backup must be a full backup.
+        
+            The previous backup can only be used if it completed, and the private key in the user's cookie can 
+            decrypt it, so that the user will be able to decrypt (and merge) all the layers of the new backup.
+            No keys are decrypted or passed to the worker; the worker only stores the changes since the
+            previous backup, encrypted with a new AES key.
+        """
+        
+        fn_name = "StartBackupHandler._get_previous_layers(): "
+        
+        if not settings.INCREMENTAL_BACKUPS_ENABLED:
+            return None
+            
+        if not prev_tasks_backup_job:
+            logging.debug("%sNo previous backup job, so worker will perform a full backup", fn_name)
+            return None
+            
+        if prev_tasks_backup_job.status != constants.ExportJobStatus.EXPORT_COMPLETED:
+            logging.debug("%sPrevious backup job status is '%s', so worker will perform a full backup", 
+                fn_name, prev_tasks_backup_job.status)
+            return None
+            
+        if not data_is_encrypted(prev_tasks_backup_job):
+            logging.debug("%sPrevious backup is not encrypted, so worker will perform a full backup", fn_name)
+            return None
+            
+        private_key_b64 = self.request.cookies.get(constants.RSA_PRIVATE_KEY_COOKIE_NAME, '')
+        if not encryption_keys_are_valid(private_key_b64, prev_tasks_backup_job):
+            logging.info("%sPrivate key doesn't match previous backup, so worker will perform a full backup", 
+                fn_name)
+            return None
+            
+        previous_layers = dict(prev_tasks_backup_job.previous_layers or {})
+        if len(previous_layers) + 1 >= settings.INCREMENTAL_BACKUP_MAX_LAYERS:
+            logging.debug("%sPrevious backup has %d layers, so worker will perform a full backup", 
+                fn_name, len(previous_layers) + 1)
+            return None
+            
+        # Add the previous job's own layer
+        previous_layers[len(previous_layers)] = {
+            'job_start_timestamp' : prev_tasks_backup_job.job_start_timestamp,
+            'encrypted_aes_key_b64' : prev_tasks_backup_job.encrypted_aes_key_b64,
+            'data_format' : prev_tasks_backup_job.data_format,
+            'data_compression' : prev_tasks_backup_job.data_compression,
+        }
+        return previous_layers
+            
+            
     @auth_decorator.oauth_required        
     def _start_backup(self, tasks_backup_job): # pylint: disable=too-many-statements
         """Place the backup job request on the taskqueue.
@@ -885,7 +708,7 @@ class StartBackupHandler(webapp2.RequestHandler):
             user_email = user.email()                
             
             tasks_backup_job.job_start_timestamp = datetime.datetime.now()
-            tasks_backup_job.put()
+            shared.put_job(tasks_backup_job, user_email)
             
             # Add the request to the tasks queue, passing in the user's email so that the task can access the
             # database record
@@ -897,9 +720,11 @@ class StartBackupHandler(webapp2.RequestHandler):
                 " queue, for " + str(user_email))
             logservice.flush()
             
-            retry_count = settings.NUM_API_TRIES
-            while retry_count > 0:
-                retry_count = retry_count - 1
+            # The frontend must respond within 60 seconds, so the retries must end by FRONTEND_RETRY_DEADLINE
+            retry = retry_policy.RetryPolicy(settings.API_RETRY_BUDGETS,
+                settings.FRONTEND_RETRY_BASE_DELAY, settings.FRONTEND_RETRY_MAX_DELAY,
+                settings.FRONTEND_RETRY_DEADLINE).new_state()
+            while True:
                 try:
                     tq_q.add(tq_t)
                     break
@@ -908,29 +733,25 @@ class StartBackupHandler(webapp2.RequestHandler):
                     tasks_backup_job.job_progress_timestamp = datetime.datetime.now()
                     tasks_backup_job.message = 'Waiting for server ...'
                     
-                    if retry_count > 0:
+                    # Give taskqueue some time before trying again
+                    sleep_time = retry.next_delay(e)
+                    if sleep_time is not None:
                         
-                        logging.warning(fn_name + "Exception adding job to taskqueue, " +
-                            str(retry_count) + " attempts remaining: "  + get_exception_msg(e))
+                        logging.warning(fn_name + "Exception adding job to taskqueue, retry " +
+                            str(retry.num_retries) + ": "  + get_exception_msg(e))
                         logservice.flush()
                         
-                        # Give taskqueue some time before trying again
-                        if retry_count <= 2:
-                            sleep_time = settings.FRONTEND_API_RETRY_SLEEP_DURATION
-                        else:
-                            sleep_time = 1
-                        
-                        logging.info(fn_name + "Sleeping for " + str(sleep_time) + 
-                            " seconds before retrying")
+                        logging.info(fn_name + "Sleeping for %.1f seconds before retrying", sleep_time)
                         logservice.flush()
                         # Update job_progress_timestamp so that job doesn't time out
                         tasks_backup_job.job_progress_timestamp = datetime.datetime.now()
-                        tasks_backup_job.put()
+                        shared.put_job(tasks_backup_job, user_email)
                         
                         time.sleep(sleep_time)
                         
                     else:
-                        logging.exception(fn_name + "Exception adding job to taskqueue")
+                        logging.exception(fn_name + "Exception adding job to taskqueue. Giving up: " +
+                            retry.give_up_reason)
                         logservice.flush()
                 
                         tasks_backup_job.status = constants.ExportJobStatus.ERROR
@@ -942,7 +763,7 @@ class StartBackupHandler(webapp2.RequestHandler):
                             str(tasks_backup_job.total_progress) + ", msg: '" + 
                             str(tasks_backup_job.message) + "', err msg: '" + str(tasks_backup_job.error_message))
                         logservice.flush()
-                        tasks_backup_job.put()
+                        shared.put_job(tasks_backup_job, user_email)
                         
                         shared.serve_message_page(self, "Error creating tasks export job.",
                             "Please report the following error using the link below",
@@ -974,8 +795,9 @@ class ShowProgressHandler(webapp2.RequestHandler):
     
     @auth_decorator.oauth_required
     def get(self): # pylint: disable=too-many-locals,too-many-branches,too-many-statements
-        """ Display the progress page, which includes a refresh meta-tag to reload this page every 
-            PROGRESS_PAGE_REFRESH_INTERVAL seconds
+        """ Display the progress page. While the job is in progress, the page updates itself from 
+            PROGRESS_JSON_URL (or, if Javascript is disabled, uses a refresh meta-tag to reload this page 
+            every PROGRESS_PAGE_REFRESH_INTERVAL seconds), and reloads this page when the status changes.
         """
         
         fn_name = "ShowProgressHandler.get(): "
@@ -1046,6 +868,10 @@ class ShowProgressHandler(webapp2.RequestHandler):
                 self.redirect(settings.WELCOME_PAGE_URL)
                 return
                 
+            # The worker stores the job progress in memcache more often than it puts the job record,
+            # so use the more recent progress from memcache (if available)
+            shared.apply_job_progress(tasks_backup_job, user_email)
+                
             # Various properties of the job record (tasks_backup_job) are updated at different
             # times by the worker
             # - total_progress is updated when all the tasks in a tasklist have been retrieved.
@@ -1239,6 +1065,12 @@ class ShowProgressHandler(webapp2.RequestHandler):
                                'error_message' : error_message,
                                'job_start_timestamp' : job_start_timestamp,
                                'refresh_interval' : settings.PROGRESS_PAGE_REFRESH_INTERVAL,
+                               'progress_json_url' : settings.PROGRESS_JSON_URL,
+                               'progress_version' : _get_job_progress_version({
+                                    'status' : status, 
+                                    'job_progress_timestamp' : tasks_backup_job.job_progress_timestamp}),
+                               'long_poll_enabled' : (settings.JOB_PROGRESS_MEMCACHE_ENABLED and 
+                                    settings.PROGRESS_JSON_LONG_POLL_TIMEOUT > 0),
                                'large_list_html_warning_limit' : settings.LARGE_LIST_HTML_WARNING_LIMIT,
                                'user_email' : user_email,
                                'display_technical_options' : shared.is_test_user(user_email),
@@ -1266,6 +1098,106 @@ class ShowProgressHandler(webapp2.RequestHandler):
         
 
         
+def _get_job_progress_version(progress):
+    """ Returns a string which changes whenever the worker updates the job progress """
+    return "%s|%s" % (progress['status'], 
+        progress['job_progress_timestamp'].isoformat() if progress['job_progress_timestamp'] else '')
+    
+    
+def _job_appears_stalled(progress):
+    """ Returns True if the job hasn't started within MAX_TIME_ALLOWED_FOR_JOB_TO_START seconds,
+        or if a running job hasn't updated its progress within MAX_JOB_PROGRESS_INTERVAL seconds.
+        
+        The progress page then reloads ShowProgressHandler, which displays the appropriate message.
+    """
+    status = progress['status']
+    if status in constants.ExportJobStatus.STOPPED_VALUES:
+        return False
+    if status == constants.ExportJobStatus.TO_BE_STARTED:
+        job_created_timestamp = progress['job_created_timestamp']
+        return bool(job_created_timestamp and 
+            (datetime.datetime.now() - job_created_timestamp).total_seconds() > 
+                settings.MAX_TIME_ALLOWED_FOR_JOB_TO_START)
+    job_progress_timestamp = progress['job_progress_timestamp']
+    return bool(job_progress_timestamp and
+        (datetime.datetime.now() - job_progress_timestamp).total_seconds() > settings.MAX_JOB_PROGRESS_INTERVAL)
+    
+    
+class ProgressJsonHandler(webapp2.RequestHandler):
+    """ Handler to return the progress of the user's job as JSON, for the progress page.
+    
+        The progress is read from memcache (written by the worker for every page of tasks), and only
+        read from the datastore if the memcache record is not available. This handler does not check
+        for valid encryption keys; when the job stops, or appears to have stalled (including a job which 
+        was never started by the task queue), the progress page reloads ShowProgressHandler, which does 
+        all the checks.
+        
+        If the 'version' parameter is the same as the version of the current progress (i.e., the 
+        progress hasn't changed since the page last received it), the request is held (long-polling) 
+        until the progress changes, or until PROGRESS_JSON_LONG_POLL_TIMEOUT seconds have passed.
+    """
+    
+    def get(self):
+        fn_name = "ProgressJsonHandler.get(): "
+        
+        try:
+            self.response.headers['Content-Type'] = 'application/json'
+            self.response.headers['Cache-Control'] = 'no-cache, no-store'
+            
+            user = users.get_current_user()
+            if not user:
+                # Not using auth_decorator, because the progress page can't follow a redirect to the 
+                # login page from a JSON request
+                self.response.set_status(401)
+                self.response.out.write(json.dumps({'error' : 'Not logged in'}))
+                return
+            
+            user_email = user.email()
+            progress = shared.get_job_progress(user_email)
+            if progress is None:
+                self.response.set_status(404)
+                self.response.out.write(json.dumps({'error' : 'No backup job'}))
+                return
+                
+            prev_version = self.request.get('version')
+            if prev_version and settings.JOB_PROGRESS_MEMCACHE_ENABLED:
+                # Long-poll; wait until the progress changes. The worker updates the memcache record for 
+                # every page of tasks, so polling memcache is cheap. This isn't done if the progress 
+                # is only stored in the datastore, to prevent excessive DB access.
+                poll_end_time = time.time() + settings.PROGRESS_JSON_LONG_POLL_TIMEOUT
+                while (_get_job_progress_version(progress) == prev_version and 
+                        progress['status'] not in constants.ExportJobStatus.STOPPED_VALUES and
+                        not _job_appears_stalled(progress) and
+                        time.time() + settings.PROGRESS_JSON_LONG_POLL_INTERVAL < poll_end_time):
+                    time.sleep(settings.PROGRESS_JSON_LONG_POLL_INTERVAL)
+                    progress = shared.get_job_progress(user_email)
+                    if progress is None:
+                        self.response.set_status(404)
+                        self.response.out.write(json.dumps({'error' : 'No backup job'}))
+                        return
+                
+            job_progress_timestamp = progress['job_progress_timestamp']
+            
+            self.response.out.write(json.dumps({
+                'version' : _get_job_progress_version(progress),
+                'status' : progress['status'],
+                'progress' : progress['total_progress'] + progress['tasklist_progress'],
+                'job_msg' : progress['message'] or '',
+                'error_message' : progress['error_message'] or '',
+                'stopped' : progress['status'] in constants.ExportJobStatus.STOPPED_VALUES,
+                'stalled' : _job_appears_stalled(progress),
+                'job_progress_timestamp' : (
+                    job_progress_timestamp.strftime('%Y-%m-%dT%H:%M:%SZ') if job_progress_timestamp else None),
+            }))
+            
+        except Exception, e: # pylint: disable=broad-except,invalid-name
+            logging.exception(fn_name + "Caught top-level exception")
+            logservice.flush()
+            self.response.set_status(500)
+            self.response.out.write(json.dumps({'error' : get_exception_msg(e)}))
+        
+
+        
 class ReturnResultsHandler(webapp2.RequestHandler):
     """Handler to return results to user in the requested format """
         
@@ -1438,43 +1370,13 @@ class ReturnResultsHandler(webapp2.RequestHandler):
             #logging.debug(fn_name + "Retrieving details for " + str(user_email))
             #logservice.flush()
             
-            tasklists_records = db.GqlQuery("SELECT * "
-                                            "FROM TasklistsData "
-                                            "WHERE ANCESTOR IS :1 "
-                                            "ORDER BY idx ASC",
-                                            db.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, user_email))
-
-            if not tasklists_records or not tasklists_records.count():
-                # There should be at least one record, since we will only execute this function if ProcessTasksJob.status == completed
-                # Possibly user got here by doing a POST without starting a backup request first 
-                # (e.g. page refresh from an old job)
-                logging.error(fn_name + "No data records found for " + str(user_email))
-                
-                # TODO: Display better error to user &/or redirect to allow user to start a backup job
-                logging.debug(fn_name + "<End> due to no data for this user")
-                logservice.flush()
-                
-                # TODO: Display better error page. Perhaps _serve_retry_page ????
-                self.response.set_status(412, "No data for this user. Please retry backup request.")
-                return
-            
-            num_records = tasklists_records.count()
-            
-            pickled_tasklists = ""
-            for tasklists_record in tasklists_records:
-                #logging.debug("Reassembling blob number " + str(tasklists_record.idx))
-                pickled_tasklists += tasklists_record.pickled_tasks_data
-                
-            logging.debug("%sReassembled %s bytes from %s blobs",
-                fn_name,
-                len(pickled_tasklists),
-                num_records)
-                
+            aes_key = None
             if data_is_encrypted(tasks_backup_job):
                 logging.debug("%sTasklist are encrypted", fn_name)
                 try:
                     private_key_b64 = self.request.cookies.get(constants.RSA_PRIVATE_KEY_COOKIE_NAME, '')
-                    aes_decrypt_cipher = shared.get_aes_decrypt_cipher(private_key_b64, tasks_backup_job)
+                    # The AES key is also used to decrypt (or encrypt) the cached export
+                    aes_key = shared.get_aes_key(private_key_b64, tasks_backup_job)
                 except GtbDecryptionError as gde:
                     logging.error("%sEKNV: Unable to create AES decryption cypher using " +
                         "private RSA key from '%s' cookie",
@@ -1488,33 +1390,53 @@ class ReturnResultsHandler(webapp2.RequestHandler):
                     raise GtbDecryptionError("Error creating AES decryption cypher: " +
                         get_exception_msg(ex))
             
-                try:
-                    # Decrypt the encrypted, picked tasklists
-                    pickled_tasklists = aes_decrypt_cipher.decrypt(pickled_tasklists)
-                except Exception as ex:
-                    logging.exception("%sError decrypting encrypted tasks", fn_name)
-                    # The outer GtbDecryptionError exception handler will handle this
-                    raise GtbDecryptionError("Error decrypting encrypted tasks: " +
-                        get_exception_msg(ex))
+            # If the user has already exported this backup in the same format (with the same options),
+            # return the cached file
+            export_cache_key = self._get_export_cache_key(tasks_backup_job)
+            if export_cache_key and self._write_cached_export(user_email, export_cache_key, aes_key):
+                logging.debug(fn_name + "<End> (Returned cached export)")
+                logservice.flush()
+                return
             
-            # Unpickle in a try/except, in case the pickled data is corrupt,
-            # possibly because it was incorrectly decrypted (or decrypted with the wrong AES key).
-            try:
-                tasklists = pickle.loads(pickled_tasklists)
-            except Exception as ex:
-                logging.exception("%sError unpickling pickled tasklists", fn_name)
-                # The outer GtbDecryptionError exception handler will handle this
-                raise GtbDecryptionError("Error unpickling pickled tasklists: " +
-                    get_exception_msg(ex))
+            # Reassemble, decrypt and unpickle the tasklists, and merge the layers of an incremental backup.
+            # This raises GtbDecryptionError if the data is corrupt, possibly because it was 
+            # incorrectly decrypted (or decrypted with the wrong AES key).
+            # The outer GtbDecryptionError exception handler will handle this
+            tasklists = shared.load_backup_tasklists(user_email, tasks_backup_job, aes_key, 
+                self.request.cookies.get(constants.RSA_PRIVATE_KEY_COOKIE_NAME, ''))
+            
+            if tasklists is None:
+                # There should be at least one record, since we will only execute this function if ProcessTasksJob.status == completed
+                # Possibly user got here by doing a POST without starting a backup request first 
+                # (e.g. page refresh from an old job)
+                logging.error(fn_name + "No data records found for " + str(user_email))
                 
-            pickled_tasklists = None # Not needed, so release it
+                # TODO: Display better error to user &/or redirect to allow user to start a backup job
+                logging.debug(fn_name + "<End> due to no data for this user")
+                logservice.flush()
+                
+                # TODO: Display better error page. Perhaps _serve_retry_page ????
+                self.response.set_status(412, "No data for this user. Please retry backup request.")
+                return
             
             # ==========================================================
             # Fix the order of tasks, and add 'depth' value to each task
             # ==========================================================
             # Reorder tasks in each tasklist so that subtasks appear under
-            # the respective parents, and in correct sibling order
-            fix_tasks_order(tasklists)
+            # the respective parents, and in correct sibling order.
+            # The snapshot never changes once the worker has finished, so the worker stores the tasks
+            # already in order. Only backups created before that need to be reordered here.
+            shared.use_precomputed_tasks_order(tasklists)
+            
+            if tasks_backup_job.previous_layers:
+                # The worker can only estimate the number of tasks in an incremental backup
+                num_tasks = sum([len(tasklist_dict.get(u'tasks', [])) for tasklist_dict in tasklists])
+                if num_tasks != total_progress:
+                    logging.debug("%sIncremental backup has %d tasks; worker estimated %d tasks", 
+                        fn_name, num_tasks, total_progress)
+                    total_progress = num_tasks
+                    tasks_backup_job.total_progress = num_tasks
+                    shared.put_job(tasks_backup_job, user_email)
             
               
             # User selected format to export as
@@ -1898,9 +1820,7 @@ class ReturnResultsHandler(webapp2.RequestHandler):
                                'app_version' : appversion.version,
                                'upload_timestamp' : appversion.upload_timestamp}
             
-            # Filename format is "tasks_FORMAT_EMAILADDR_YYYY-MM-DD.EXT"
-            # CAUTION: Do not include characters that may not be valid on some filesystems (e.g., colon is not valid on Windows)
-            output_filename_base = "tasks_%s_%s_%s" % (export_format, user_email, datetime.datetime.now().strftime("%Y-%m-%d"))
+            output_filename_base = _get_output_filename_base(export_format, user_email)
      
             # template file name format "tasks_template_FORMAT.EXT",
             #   where FORMAT = export_format (e.g., 'outlook')
@@ -1924,6 +1844,10 @@ class ReturnResultsHandler(webapp2.RequestHandler):
                 # TODO: Handle invalid export_format nicely - display message to user & go back to main page
                 self.response.out.write("<br /><h2>Unsupported export format: %s</h2>" % export_format)
             tasklists = None
+            template_values = None
+            
+            if export_cache_key:
+                self._cache_export(user_email, export_cache_key, tasks_backup_job, export_format, aes_key)
             #logging.debug(fn_name + "Calling garbage collection")
             gc.collect()
             logging.debug(fn_name + "<End>")
@@ -1979,6 +1903,53 @@ class ReturnResultsHandler(webapp2.RequestHandler):
             logservice.flush()
 
         
+    def _get_export_cache_key(self, tasks_backup_job):
+        """ Returns the key of the cached export for the requested export format and options,
+            or None if the export format is not cached.
+        """
+        if not settings.EXPORT_CACHE_ENABLED:
+            return None
+        export_format = self.request.get('export_format')
+        if export_format not in constants.EXPORT_CACHE_FORMATS:
+            return None
+        # The HTML display options are not used by the cached formats
+        options = (self.request.get('export_using_localtime'), self.request.get('export_offset_hours'))
+        return shared.get_export_cache_key(tasks_backup_job.job_start_timestamp, export_format, options)
+        
+        
+    def _write_cached_export(self, user_email, export_cache_key, aes_key):
+        """ Write the cached export file to the response. Returns False if the export has not been cached. """
+        
+        fn_name = "_write_cached_export(): "
+        
+        cached_export, content = shared.get_cached_export(user_email, export_cache_key, aes_key)
+        if cached_export is None:
+            return False
+            
+        output_filename = shared.convert_unicode_to_str(
+            _get_output_filename_base(cached_export.export_format, user_email) + "." + cached_export.file_extension)
+        self.response.headers["Content-Type"] = str(cached_export.content_type)
+        self.response.headers.add_header(
+            "Content-Disposition", cached_export.content_disposition_prefix + output_filename)
+        logging.debug(fn_name + "Writing cached " + str(cached_export.export_format) + " format")
+        self.response.out.write(content)
+        logservice.flush()
+        return True
+        
+        
+    def _cache_export(self, user_email, export_cache_key, tasks_backup_job, export_format, aes_key): # pylint: disable=too-many-arguments
+        """ Cache the export file which has been written to the response """
+        
+        content_disposition = self.response.headers.get("Content-Disposition", '')
+        content_disposition_prefix, separator, output_filename = content_disposition.partition('filename=')
+        if not separator:
+            # Not a file (e.g. an error page)
+            return
+        shared.put_cached_export(user_email, export_cache_key, tasks_backup_job.job_start_timestamp, export_format,
+            self.response.app_iter, self.response.headers.get("Content-Type"), 
+            content_disposition_prefix + separator, output_filename.rpartition('.')[2], aes_key)
+        
+        
     def _send_email_using_template(self, template_values, export_format, user_email, output_filename_base): # pylint: disable=too-many-locals,too-many-statements
         """ Send an email, formatted according to the specified .txt template file
             Currently supports export_format = 'RTM' (Remember The Milk)
@@ -1998,7 +1969,10 @@ class ReturnResultsHandler(webapp2.RequestHandler):
         template_filename = "tasks_template_%s.txt" % export_format
         
         path = os.path.join(os.path.dirname(__file__), constants.PATH_TO_TEMPLATES, template_filename)
-        email_body = template.render(path, template_values)
+        if settings.USE_NATIVE_EXPORT_WRITERS:
+            email_body = u''.join(export_writers.iter_export(export_format, template_values))
+        else:
+            email_body = template.render(path, template_values)
         
         sender = user_email
 
@@ -2089,6 +2063,19 @@ class ReturnResultsHandler(webapp2.RequestHandler):
         logservice.flush()
 
 
+    def _write_using_template(self, path, template_values, export_format):
+        """ Write the tasks in the specified export format to the response.
+        
+            If USE_NATIVE_EXPORT_WRITERS is True, the output is written a row at a time by the equivalent 
+            writer in export_writers.py, otherwise the template is rendered by Django.
+        """
+        if settings.USE_NATIVE_EXPORT_WRITERS:
+            for row in export_writers.iter_export(export_format, template_values):
+                self.response.out.write(row)
+        else:
+            self.response.out.write(template.render(path, template_values))
+        
+        
     def _write_ics_using_template(self, template_values, export_format, output_filename_base):
         """ Write an ICS file according to the specified .ics template file
             Currently supports export_format = 'ics'
@@ -2109,7 +2096,7 @@ class ReturnResultsHandler(webapp2.RequestHandler):
             logging.debug(fn_name + "TEST: Writing %s format to %s" % (export_format, output_filename))
         else:
             logging.debug(fn_name + "Writing %s format" % export_format)
-        self.response.out.write(template.render(path, template_values))
+        self._write_using_template(path, template_values, export_format)
         logging.debug(fn_name + "<End>")
         logservice.flush()
         
@@ -2136,7 +2123,7 @@ class ReturnResultsHandler(webapp2.RequestHandler):
             logging.debug(fn_name + "TEST: Writing %s format to %s" % (export_format, output_filename))
         else:
             logging.debug(fn_name + "Writing %s format" % export_format)
-        self.response.out.write(template.render(path, template_values))
+        self._write_using_template(path, template_values, export_format)
         logging.debug(fn_name + "<End>")
         logservice.flush()
 
@@ -2165,7 +2152,7 @@ class ReturnResultsHandler(webapp2.RequestHandler):
         # TODO: Output in a manner suitable for downloading from an Android phone
         #       Currently sends source of HTML page as output_filename
         #       Perhaps try Content-Type = "application/octet-stream" ???
-        self.response.out.write(template.render(path, template_values))
+        self._write_using_template(path, template_values, export_format)
         logging.debug(fn_name + "<End>")
         logservice.flush()
 
@@ -2719,5 +2706,6 @@ app = webapp2.WSGIApplication( # pylint: disable=invalid-name
         (settings.RESULTS_URL,         ReturnResultsHandler), # pylint: disable=bad-whitespace
         (settings.START_BACKUP_URL,    StartBackupHandler),   # pylint: disable=bad-whitespace
         (settings.PROGRESS_URL,        ShowProgressHandler),  # pylint: disable=bad-whitespace
+        (settings.PROGRESS_JSON_URL,   ProgressJsonHandler),  # pylint: disable=bad-whitespace
         (auth_decorator.callback_path, auth_decorator.callback_handler()),
     ], debug=False)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for shared.CredentialsCache, using the in-memory memcache from gae_stubs """
+
+import json
+import time
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import shared # pylint: disable=relative-import,wrong-import-position
+
+
+def _credentials_json(user_num, invalid=False):
+    return json.dumps({'access_token' : 'token-%d' % user_num, 'invalid' : invalid})
+
+
+class CredentialsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        gae_stubs.clear_memcache()
+        self._saved_settings = (settings.CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES, settings.CREDENTIALS_CACHE_LOCAL_TTL)
+        settings.CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES = 3
+        settings.CREDENTIALS_CACHE_LOCAL_TTL = 60
+        self.cache = shared.CredentialsCache()
+
+    def tearDown(self):
+        settings.CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES, settings.CREDENTIALS_CACHE_LOCAL_TTL = self._saved_settings
+        gae_stubs.clear_memcache()
+
+    def _locally_cached_keys(self):
+        return list(self.cache._local_cache.keys()) # pylint: disable=protected-access
+
+    def test_get_returns_value_from_either_cache(self):
+        self.cache.set('user1', _credentials_json(1))
+        self.assertEqual(self.cache.get('user1'), _credentials_json(1))
+        # Another instance only has the credentials in memcache, and then caches them locally
+        other_cache = shared.CredentialsCache()
+        self.assertEqual(other_cache.get('user1'), _credentials_json(1))
+        self.assertEqual(list(other_cache._local_cache.keys()), ['user1']) # pylint: disable=protected-access
+        self.assertEqual(self.cache.get('user2'), None)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for user_num in range(1, 4):
+            self.cache.set('user%d' % user_num, _credentials_json(user_num))
+        # Using user1 makes user2 the least recently used
+        self.cache.get('user1')
+        self.cache.set('user4', _credentials_json(4))
+        self.assertEqual(self._locally_cached_keys(), ['user3', 'user1', 'user4'])
+
+        # The evicted credentials are still in memcache, and are cached locally again when they are read
+        gae_stubs.MEMCACHE_AVAILABLE[0] = False
+        self.assertEqual(self.cache.get('user2'), None)
+        gae_stubs.MEMCACHE_AVAILABLE[0] = True
+        self.assertEqual(self.cache.get('user2'), _credentials_json(2))
+        self.assertEqual(self._locally_cached_keys(), ['user1', 'user4', 'user2'])
+
+    def test_never_more_than_max_entries(self):
+        for user_num in range(20):
+            self.cache.set('user%d' % user_num, _credentials_json(user_num))
+            self.assertLessEqual(len(self._locally_cached_keys()), settings.CREDENTIALS_CACHE_LOCAL_MAX_ENTRIES)
+        self.assertEqual(self._locally_cached_keys(), ['user17', 'user18', 'user19'])
+
+    def test_set_replaces_and_refreshes_entry(self):
+        for user_num in range(1, 4):
+            self.cache.set('user%d' % user_num, _credentials_json(user_num))
+        self.cache.set('user1', _credentials_json(11))
+        self.assertEqual(self._locally_cached_keys(), ['user2', 'user3', 'user1'])
+        self.assertEqual(self.cache.get('user1'), _credentials_json(11))
+
+    def test_expired_local_entry_is_read_from_memcache(self):
+        settings.CREDENTIALS_CACHE_LOCAL_TTL = 0.05
+        self.cache.set('user1', _credentials_json(1))
+        time.sleep(0.1)
+        gae_stubs.MEMCACHE_AVAILABLE[0] = False
+        self.assertEqual(self.cache.get('user1'), None)
+        self.assertEqual(self._locally_cached_keys(), [])
+
+    def test_invalid_credentials_are_not_cached_locally(self):
+        self.cache.set('user1', _credentials_json(1))
+        self.cache.set('user1', _credentials_json(1, invalid=True))
+        self.assertEqual(self._locally_cached_keys(), [])
+        self.assertEqual(self.cache.get('user1'), _credentials_json(1, invalid=True))
+        self.assertEqual(self._locally_cached_keys(), [])
+
+    def test_delete(self):
+        self.cache.set('user1', _credentials_json(1))
+        self.cache.delete('user1')
+        self.assertEqual(self.cache.get('user1'), None)
+
+    def test_delete_when_memcache_fails(self):
+        self.cache.set('user1', _credentials_json(1))
+
+        def failing_delete(key, seconds=0, namespace=None): # pylint: disable=unused-argument
+            raise ValueError("Memcache error")
+
+        saved_delete = shared.memcache.delete
+        shared.memcache.delete = failing_delete
+        try:
+            self.cache.delete('user1')
+        finally:
+            shared.memcache.delete = saved_delete
+        self.assertEqual(self._locally_cached_keys(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for storing and reading cached exports (shared), using the in-memory datastore from gae_stubs """
+
+import os
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import constants # pylint: disable=relative-import,wrong-import-position
+import model # pylint: disable=relative-import,wrong-import-position
+import shared # pylint: disable=relative-import,wrong-import-position
+
+
+USER_EMAIL = 'test.user@example.com'
+
+
+class PendingRpc(object): # pylint: disable=too-few-public-methods
+    """ An asynchronous put, which only stores the entity when the result is requested """
+
+    def __init__(self, entity, puts_in_progress):
+        self.entity = entity
+        self.puts_in_progress = puts_in_progress
+        puts_in_progress.append(self)
+
+    def get_result(self):
+        self.puts_in_progress.remove(self)
+        return self.entity.put()
+
+
+class PutCachedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        gae_stubs.clear_datastore()
+        self._saved = (constants.MAX_BLOB_SIZE, settings.EXPORT_CACHE_MAX_ENTRY_SIZE, shared.db.put_async,
+            model.CachedExport.put)
+        # Small blobs, so that the (incompressible) content is stored in several blobs
+        constants.MAX_BLOB_SIZE = 1024
+        settings.EXPORT_CACHE_MAX_ENTRY_SIZE = 100000
+        self.puts_in_progress = []
+        self.max_puts_in_progress = 0
+        # The number of blob puts which hadn't completed when the CachedExport was put
+        self.puts_in_progress_at_cached_export_put = []
+
+        def put_async(entity):
+            rpc = PendingRpc(entity, self.puts_in_progress)
+            self.max_puts_in_progress = max(self.max_puts_in_progress, len(self.puts_in_progress))
+            return rpc
+
+        def put_cached_export(cached_export):
+            self.puts_in_progress_at_cached_export_put.append(len(self.puts_in_progress))
+            return self._saved[3](cached_export)
+
+        shared.db.put_async = put_async
+        model.CachedExport.put = put_cached_export
+
+    def tearDown(self):
+        (constants.MAX_BLOB_SIZE, settings.EXPORT_CACHE_MAX_ENTRY_SIZE, shared.db.put_async,
+            model.CachedExport.put) = self._saved
+        gae_stubs.clear_datastore()
+
+    def _put(self, content_chunks):
+        return shared.put_cached_export(USER_EMAIL, 'export_test', None, 'html', content_chunks, 'text/html',
+            'attachment; filename=', 'html')
+
+    def test_blobs_are_stored_before_cached_export(self):
+        content_chunks = [os.urandom(1000) for _ in range(10)]
+        self.assertTrue(self._put(content_chunks))
+        self.assertEqual(self.max_puts_in_progress, settings.MAX_BLOB_PUTS_IN_PROGRESS)
+        self.assertEqual(self.puts_in_progress_at_cached_export_put, [0])
+
+        shared.db.put_async = self._saved[2]
+        cached_export, content = shared.get_cached_export(USER_EMAIL, 'export_test')
+        self.assertTrue(cached_export.num_blobs > settings.MAX_BLOB_PUTS_IN_PROGRESS)
+        self.assertEqual(content, ''.join(content_chunks))
+
+    def test_export_too_large_to_cache(self):
+        self.assertFalse(self._put([os.urandom(1000) for _ in range(200)]))
+        self.assertEqual(shared.get_cached_export(USER_EMAIL, 'export_test'), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
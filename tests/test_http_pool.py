@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for http_pool.HttpPool """
+
+import time
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import httplib2 # pylint: disable=relative-import,wrong-import-position
+
+import http_pool # pylint: disable=relative-import,wrong-import-position
+
+
+class FakeCredentials(object): # pylint: disable=too-few-public-methods
+    """ Authorises an Http object in the same way as oauth2client's OAuth2Credentials.authorize().
+
+        The new request method records the access token and the method that it wraps, for the tests.
+    """
+
+    def __init__(self, access_token):
+        self.access_token = access_token
+
+    def authorize(self, http):
+        request_orig = http.request
+        access_token = self.access_token
+
+        def new_request(uri, method='GET', body=None, headers=None, *args, **kwargs): # pylint: disable=keyword-arg-before-vararg
+            headers = dict(headers or {})
+            headers['Authorization'] = 'Bearer ' + access_token
+            return request_orig(uri, method, body, headers, *args, **kwargs)
+
+        new_request.access_token = access_token
+        new_request.wrapped_request = request_orig
+        http.request = new_request
+        return http
+
+
+class FakeConnection(object): # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class HttpPoolTest(unittest.TestCase):
+
+    def test_released_http_is_reused(self):
+        pool = http_pool.HttpPool(2, 60)
+        http = pool.acquire()
+        self.assertTrue(isinstance(http, httplib2.Http))
+        pool.release(http)
+        self.assertTrue(pool.acquire() is http)
+        self.assertFalse(pool.acquire() is http)
+
+    def test_released_http_has_no_user_request_wrapper(self):
+        pool = http_pool.HttpPool(2, 60)
+        http = pool.acquire(FakeCredentials('token-for-user-1'))
+        self.assertEqual(http.request.access_token, 'token-for-user-1')
+
+        pool.release(http)
+        # The authorisation for the first user has been removed, so the class's request method is used
+        self.assertNotIn('request', http.__dict__)
+        self.assertEqual(http.request.im_func, httplib2.Http.request.im_func)
+
+        # The next user's authorisation wraps the original request method, not the first user's wrapper
+        reused_http = pool.acquire(FakeCredentials('token-for-user-2'))
+        self.assertTrue(reused_http is http)
+        self.assertEqual(reused_http.request.access_token, 'token-for-user-2')
+        self.assertEqual(reused_http.request.wrapped_request.im_func, httplib2.Http.request.im_func)
+
+    def test_unauthorised_acquire_after_authorised_release(self):
+        pool = http_pool.HttpPool(2, 60)
+        pool.release(pool.acquire(FakeCredentials('token-for-user-1')))
+        http = pool.acquire()
+        self.assertNotIn('request', http.__dict__)
+
+    def test_at_most_max_size_idle_objects_are_kept(self):
+        pool = http_pool.HttpPool(2, 60)
+        https = [pool.acquire() for _ in range(3)]
+        connections = []
+        for http in https:
+            conn = FakeConnection()
+            http.connections['https:www.googleapis.com'] = conn
+            connections.append(conn)
+            pool.release(http)
+        # The third object was closed, because the pool was full
+        self.assertEqual([conn.closed for conn in connections], [False, False, True])
+        self.assertEqual(https[2].connections, {})
+        self.assertTrue(pool.acquire() is https[1])
+        self.assertTrue(pool.acquire() is https[0])
+
+    def test_discarded_http_is_closed(self):
+        pool = http_pool.HttpPool(2, 60)
+        http = pool.acquire()
+        conn = FakeConnection()
+        http.connections['https:www.googleapis.com'] = conn
+        pool.release(http, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertFalse(pool.acquire() is http)
+
+    def test_idle_objects_expire(self):
+        pool = http_pool.HttpPool(2, 0.05)
+        http = pool.acquire()
+        conn = FakeConnection()
+        http.connections['https:www.googleapis.com'] = conn
+        pool.release(http)
+        time.sleep(0.1)
+        self.assertFalse(pool.acquire() is http)
+        self.assertTrue(conn.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
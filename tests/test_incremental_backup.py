@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for incremental backups; the worker's snapshot state and layers, and merging the layers (shared) """
+
+import copy
+import datetime
+import json
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+import synthetic_accounts # pylint: disable=relative-import,wrong-import-position
+import test_worker # pylint: disable=relative-import,wrong-import-position
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import constants # pylint: disable=relative-import,wrong-import-position
+import model # pylint: disable=relative-import,wrong-import-position
+import shared # pylint: disable=relative-import,wrong-import-position
+
+
+# When the previous (full) backup retrieved the tasks. The synthetic tasks were all updated before this.
+FULL_BACKUP_FETCH_TIME = datetime.datetime(2021, 1, 1, 12, 0, 0)
+
+# When the tasks were changed, after the previous backup
+CHANGED_RFC3339 = u'2021-01-02T08:30:00.000Z'
+
+
+def _rfc3339(timestamp):
+    return unicode(timestamp.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+
+
+def _tasklist_resource(api_tasklist, updated=u'2020-12-01T00:00:00.000Z'):
+    """ Returns the tasklist resource (as returned by tasklists.list()) for a synthetic tasklist """
+    return {u'title' : api_tasklist[u'title'], u'id' : api_tasklist[u'id'],
+            u'updated' : updated, u'etag' : u'"etag-%s-%s"' % (api_tasklist[u'id'], updated)}
+
+
+def _summary(tasklists):
+    """ Returns a comparable summary of the tasklists; the title and ID of each tasklist,
+        and the ID, title and deleted flag of each task (which may be in any order after merging)
+    """
+    return [(tasklist[u'id'], tasklist[u'title'],
+             sorted((task[u'id'], task[u'title'], bool(task.get(u'deleted'))) for task in tasklist.get(u'tasks', [])))
+            for tasklist in tasklists]
+
+
+class IncrementalBackupTest(test_worker.WorkerTestCase):
+    """ A full backup of the synthetic 'small' account, followed by an incremental backup of changed tasks.
+
+        The tasklists and tasks are changed between the backups;
+            list00   A task is renamed, a task is deleted, a task is moved to list01, and a task is added
+            list01   Renamed, and receives the task moved from list00
+            list02   Deleted
+            list03   Unchanged
+            list04   New tasklist
+    """
+
+    SETTINGS = dict(test_worker.WorkerTestCase.SETTINGS,
+        INCREMENTAL_BACKUPS_ENABLED=True,
+        SKIP_UNCHANGED_TASKLISTS=True,
+        INCREMENTAL_BACKUP_WATERMARK_MARGIN=300)
+
+    def setUp(self):
+        test_worker.WorkerTestCase.setUp(self)
+        # Round trip through JSON, so that the tasks are separate objects, as returned by the server
+        self.before = json.loads(json.dumps(synthetic_accounts.generate_api_tasklists('small')))
+        self.before_resources = [_tasklist_resource(tasklist) for tasklist in self.before]
+        self.after, self.after_resources = self._change_tasklists()
+
+    def _change_tasklists(self):
+        """ Returns the synthetic tasklists (and their resources) after the changes described above """
+
+        after = copy.deepcopy(self.before)
+        list00, list01, list02, list03 = after
+        parent_ids = set(task.get(u'parent') for task in list00[u'tasks'])
+        leaf_tasks = [task for task in list00[u'tasks']
+            if task[u'id'] not in parent_ids and not task.get(u'deleted') and not task.get(u'hidden')]
+        renamed_task, deleted_task, moved_task = leaf_tasks[:3]
+
+        renamed_task[u'title'] = u'Renamed task'
+        renamed_task[u'updated'] = CHANGED_RFC3339
+        deleted_task[u'deleted'] = True
+        deleted_task[u'updated'] = CHANGED_RFC3339
+        list00[u'tasks'].remove(moved_task)
+        moved_task[u'updated'] = CHANGED_RFC3339
+        moved_task.pop(u'parent', None)
+        list01.setdefault(u'tasks', []).append(moved_task)
+        list00[u'tasks'].append({u'kind' : u'tasks#task', u'id' : u'new-task', u'title' : u'New task',
+            u'status' : u'needsAction', u'position' : u'99999999999999999999', u'updated' : CHANGED_RFC3339,
+            u'selfLink' : u'https://www.googleapis.com/tasks/v1/lists/list00/tasks/new-task'})
+        list01[u'title'] = u'Renamed list'
+        list04 = {u'title' : u'New list', u'id' : u'list04', u'tasks' : [
+            {u'kind' : u'tasks#task', u'id' : u'list04-task', u'title' : u'Task in new list',
+             u'status' : u'needsAction', u'position' : u'00000000000000000000', u'updated' : CHANGED_RFC3339}]}
+
+        after = [list00, list01, list03, list04]
+        after_resources = [_tasklist_resource(list00, CHANGED_RFC3339), _tasklist_resource(list01, CHANGED_RFC3339),
+            self.before_resources[3], _tasklist_resource(list04, CHANGED_RFC3339)]
+        self.changed_task_ids = [renamed_task[u'id'], deleted_task[u'id'], moved_task[u'id'], u'new-task']
+        self.list02_id = list02[u'id']
+        return after, after_resources
+
+    def _backup(self, api_tasklists, tasklist_resources, fetch_time, previous_layers=None, include_deleted=True):
+        """ Runs the worker's retrieval of the tasklists, and saves the snapshot state.
+
+            If previous_layers is set, the snapshot state saved by the previous backup is loaded,
+            so that only the changes are retrieved.
+
+            Returns the worker and the tasklists written by the worker.
+        """
+
+        tasks_svc = test_worker.FakeTasksService(api_tasklists, settings.TASKS_API_MAX_RESULTS)
+        worker_obj = test_worker.new_worker(tasks_svc)
+        job = worker_obj.process_tasks_job
+        job.include_hidden = True
+        job.include_completed = True
+        job.include_deleted = include_deleted
+        is_incremental = False
+        if previous_layers:
+            job.previous_layers = previous_layers
+            job.previous_job_start_timestamp = previous_layers[len(previous_layers) - 1]['job_start_timestamp']
+            job.public_key_b64 = 'public-key'
+            is_incremental = worker_obj._load_previous_snapshot(True, True, include_deleted) # pylint: disable=protected-access
+            self.assertTrue(is_incremental)
+
+        tasks_per_list = worker_obj._get_tasks_in_tasklists(tasklist_resources, # pylint: disable=protected-access
+            True, True, include_deleted)
+        worker_obj._save_snapshot_state(tasklist_resources, tasks_per_list, fetch_time, is_incremental, # pylint: disable=protected-access
+            True, True, include_deleted)
+        return worker_obj, worker_obj._tasklists_writer.tasklists # pylint: disable=protected-access
+
+    def _layers(self, job_start_timestamps):
+        return dict((layer_num, {'job_start_timestamp' : job_start_timestamp})
+            for layer_num, job_start_timestamp in enumerate(job_start_timestamps))
+
+    def _full_then_incremental(self, include_deleted=True):
+        full_worker, full_layer = self._backup(self.before, self.before_resources, FULL_BACKUP_FETCH_TIME,
+            include_deleted=include_deleted)
+        incr_worker, incr_layer = self._backup(self.after, self.after_resources,
+            FULL_BACKUP_FETCH_TIME + datetime.timedelta(days=1),
+            self._layers([full_worker.process_tasks_job.job_start_timestamp]), include_deleted)
+        return full_layer, incr_worker, incr_layer
+
+    def test_snapshot_state_of_full_backup(self):
+        full_worker, _ = self._backup(self.before, self.before_resources, FULL_BACKUP_FETCH_TIME)
+        snapshot_state = model.TasklistsSnapshotState.get_by_key_name(test_worker.USER_EMAIL)
+        job = full_worker.process_tasks_job
+        watermark = _rfc3339(FULL_BACKUP_FETCH_TIME -
+            datetime.timedelta(seconds=settings.INCREMENTAL_BACKUP_WATERMARK_MARGIN))
+        self.assertEqual(snapshot_state.job_start_timestamp, job.job_start_timestamp)
+        self.assertEqual(snapshot_state.full_backup_timestamp, job.job_start_timestamp)
+        self.assertEqual(snapshot_state.num_layers, 1)
+        self.assertEqual((snapshot_state.include_hidden, snapshot_state.include_completed,
+            snapshot_state.include_deleted), (True, True, True))
+        self.assertEqual(snapshot_state.tasklist_watermarks,
+            dict((tasklist[u'id'], watermark) for tasklist in self.before))
+        self.assertEqual(snapshot_state.tasklist_versions, dict((resource[u'id'],
+            (resource[u'updated'], resource[u'etag'])) for resource in self.before_resources))
+        self.assertEqual(snapshot_state.tasklist_num_tasks,
+            dict((tasklist[u'id'], len(tasklist.get(u'tasks', []))) for tasklist in self.before))
+
+    def test_incremental_layer_contains_only_changes(self):
+        _, incr_worker, incr_layer = self._full_then_incremental()
+
+        layer_content = dict((tasklist[u'id'], tasklist.get(constants.TASKLIST_LAYER_CONTENT))
+            for tasklist in incr_layer)
+        self.assertEqual(layer_content, {u'list00' : constants.TASKLIST_CHANGES_ONLY,
+            u'list01' : constants.TASKLIST_CHANGES_ONLY, u'list03' : constants.TASKLIST_UNCHANGED, u'list04' : None})
+        self.assertEqual(incr_worker._reused_tasklist_idxs, [2]) # pylint: disable=protected-access
+
+        # Only the changed tasks (including the deleted task) were retrieved for the tasklists in the
+        # previous backup, using the watermark of the previous backup
+        tasks_by_list = dict((tasklist[u'id'], sorted(task[u'id'] for task in tasklist.get(u'tasks', [])))
+            for tasklist in incr_layer)
+        self.assertEqual(tasks_by_list[u'list00'], sorted(self.changed_task_ids[:2] + [u'new-task']))
+        self.assertEqual(tasks_by_list[u'list01'], [self.changed_task_ids[2]])
+        self.assertEqual(tasks_by_list[u'list03'], [])
+        self.assertEqual(tasks_by_list[u'list04'], [u'list04-task'])
+        requests = incr_worker.tasks_svc.requests
+        self.assertEqual(sorted(request.tasklist_id for request in requests), [u'list00', u'list01', u'list04'])
+        watermark = _rfc3339(FULL_BACKUP_FETCH_TIME -
+            datetime.timedelta(seconds=settings.INCREMENTAL_BACKUP_WATERMARK_MARGIN))
+        for request in requests:
+            if request.tasklist_id == u'list04':
+                self.assertNotIn('updatedMin', request.kwargs)
+            else:
+                self.assertEqual(request.kwargs['updatedMin'], watermark)
+                self.assertTrue(request.kwargs['showDeleted'])
+
+        snapshot_state = model.TasklistsSnapshotState.get_by_key_name(test_worker.USER_EMAIL)
+        self.assertEqual(snapshot_state.num_layers, 2)
+        self.assertEqual(snapshot_state.full_backup_timestamp, incr_worker._prev_full_backup_timestamp) # pylint: disable=protected-access
+        self.assertNotIn(self.list02_id, snapshot_state.tasklist_watermarks)
+
+    def test_merged_layers_match_full_backup(self):
+        for include_deleted in [True, False]:
+            full_layer, _, incr_layer = self._full_then_incremental(include_deleted)
+            merged = shared.merge_backup_layer(full_layer, incr_layer, True, True, include_deleted)
+            _, expected = self._backup(self.after, self.after_resources, FULL_BACKUP_FETCH_TIME,
+                include_deleted=include_deleted)
+            self.assertEqual(_summary(merged), _summary(expected))
+            merged_task_ids = [task[u'id'] for tasklist in merged for task in tasklist.get(u'tasks', [])]
+            # The moved task is only in the tasklist it was moved to
+            self.assertEqual(len(merged_task_ids), len(set(merged_task_ids)))
+            self.assertEqual(self.changed_task_ids[1] in merged_task_ids, include_deleted)
+            # The deleted tasklist has gone, and the renamed tasklist has the new title
+            self.assertEqual([tasklist[u'id'] for tasklist in merged], [u'list00', u'list01', u'list03', u'list04'])
+            self.assertEqual(merged[1][u'title'], u'Renamed list')
+
+    def test_watermark_moved_back(self):
+        # The clock of the instance which ran the second backup was behind, so its watermark is earlier
+        # than the watermark of the previous backup. The earlier watermark must be kept (rather than the
+        # later one), because tasks changed after it may not have been retrieved.
+        full_worker, full_layer = self._backup(self.before, self.before_resources, FULL_BACKUP_FETCH_TIME)
+        earlier_fetch_time = FULL_BACKUP_FETCH_TIME - datetime.timedelta(hours=1)
+        layer_timestamps = [full_worker.process_tasks_job.job_start_timestamp]
+        second_worker, second_layer = self._backup(self.after, self.after_resources, earlier_fetch_time,
+            self._layers(layer_timestamps))
+        snapshot_state = model.TasklistsSnapshotState.get_by_key_name(test_worker.USER_EMAIL)
+        earlier_watermark = _rfc3339(earlier_fetch_time -
+            datetime.timedelta(seconds=settings.INCREMENTAL_BACKUP_WATERMARK_MARGIN))
+        self.assertEqual(set(snapshot_state.tasklist_watermarks.values()), set([earlier_watermark]))
+
+        # The next backup (of tasklists which have been changed again, although none of their tasks have)
+        # retrieves the same changes again, because they are after the earlier watermark. 
+        # This must not duplicate any tasks when the layers are merged.
+        layer_timestamps.append(second_worker.process_tasks_job.job_start_timestamp)
+        third_resources = [_tasklist_resource(tasklist, u'2021-01-03T00:00:00.000Z') for tasklist in self.after]
+        third_worker, third_layer = self._backup(self.after, third_resources, FULL_BACKUP_FETCH_TIME,
+            self._layers(layer_timestamps))
+        self.assertEqual(sorted(task[u'id'] for tasklist in third_layer for task in tasklist.get(u'tasks', [])),
+            sorted(task[u'id'] for tasklist in second_layer for task in tasklist.get(u'tasks', [])))
+        self.assertTrue(all(request.kwargs.get('updatedMin') in (None, earlier_watermark)
+            for request in third_worker.tasks_svc.requests))
+
+        merged = shared.merge_backup_layer(full_layer, second_layer, True, True, True)
+        merged = shared.merge_backup_layer(merged, third_layer, True, True, True)
+        _, expected = self._backup(self.after, self.after_resources, FULL_BACKUP_FETCH_TIME)
+        self.assertEqual(_summary(merged), _summary(expected))
+
+    def test_layer_for_tasklist_not_in_previous_layers(self):
+        _, _, incr_layer = self._full_then_incremental()
+        self.assertRaises(shared.GtbDecryptionError, shared.merge_backup_layer, [], incr_layer, True, True, True)
+
+
+class DeleteAllTasklistsDataTest(unittest.TestCase):
+
+    def setUp(self):
+        gae_stubs.clear_datastore()
+        for layer in range(3):
+            for idx in range(2):
+                model.TasklistsData(parent=shared.get_tasklists_data_parent_key(test_worker.USER_EMAIL, layer),
+                    pickled_tasks_data='blob', idx=idx).put()
+
+    def _num_blobs(self, layer):
+        return model.TasklistsData.all(keys_only=True).ancestor(
+            shared.get_tasklists_data_parent_key(test_worker.USER_EMAIL, layer)).count()
+
+    def test_only_stored_layers_are_deleted(self):
+        num_records, _, _ = shared.delete_all_tasklists_data(test_worker.USER_EMAIL, 2)
+        self.assertEqual(num_records, 4)
+        self.assertEqual([self._num_blobs(layer) for layer in range(3)], [0, 0, 2])
+
+    def test_full_backup_layer_is_always_deleted(self):
+        num_records, _, _ = shared.delete_all_tasklists_data(test_worker.USER_EMAIL, 0)
+        self.assertEqual(num_records, 2)
+        self.assertEqual([self._num_blobs(layer) for layer in range(3)], [0, 2, 2])
+
+
+class TasklistIsUnchangedTest(test_worker.WorkerTestCase):
+
+    SETTINGS = dict(test_worker.WorkerTestCase.SETTINGS, SKIP_UNCHANGED_TASKLISTS=True)
+
+    def setUp(self):
+        test_worker.WorkerTestCase.setUp(self)
+        self.worker_obj = test_worker.new_worker(None)
+        self.resource = {u'title' : u'List', u'id' : u'list00', u'updated' : u'2020-12-01T00:00:00.000Z',
+            u'etag' : u'"etag-1"'}
+        self.worker_obj._tasklist_watermarks = {u'list00' : u'2020-12-01T00:00:00.000Z'} # pylint: disable=protected-access
+        self.worker_obj._previous_tasklist_versions = { # pylint: disable=protected-access
+            u'list00' : (self.resource[u'updated'], self.resource[u'etag'])}
+
+    def _is_unchanged(self, resource):
+        return self.worker_obj._tasklist_is_unchanged(resource) # pylint: disable=protected-access
+
+    def test_same_version_is_unchanged(self):
+        self.assertTrue(self._is_unchanged(self.resource))
+
+    def test_changed_updated_or_etag(self):
+        self.assertFalse(self._is_unchanged(dict(self.resource, updated=u'2020-12-02T00:00:00.000Z')))
+        self.assertFalse(self._is_unchanged(dict(self.resource, etag=u'"etag-2"')))
+
+    def test_renamed_tasklist_is_changed(self):
+        # Renaming a tasklist changes its updated timestamp and etag
+        self.assertFalse(self._is_unchanged(dict(self.resource, title=u'Renamed',
+            updated=u'2020-12-02T00:00:00.000Z', etag=u'"etag-2"')))
+
+    def test_tasklist_not_in_previous_backup(self):
+        self.assertFalse(self._is_unchanged(dict(self.resource, id=u'list01')))
+        self.worker_obj._tasklist_watermarks = {} # pylint: disable=protected-access
+        self.assertFalse(self._is_unchanged(self.resource))
+
+    def test_no_previous_version(self):
+        self.worker_obj._previous_tasklist_versions = {} # pylint: disable=protected-access
+        self.assertFalse(self._is_unchanged(self.resource))
+
+    def test_disabled(self):
+        settings.SKIP_UNCHANGED_TASKLISTS = False
+        self.assertFalse(self._is_unchanged(self.resource))
+
+
+class MergeTasklistChangesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tasklist = synthetic_accounts.generate_tasklists('small')[1]
+        self.tasks = self.tasklist[u'tasks']
+
+    def _changes(self, tasks, title=None):
+        return {u'title' : title or self.tasklist[u'title'], u'id' : self.tasklist[u'id'], u'tasks' : tasks,
+            constants.TASKLIST_LAYER_CONTENT : constants.TASKLIST_CHANGES_ONLY}
+
+    def test_changed_tasks_replace_previous_tasks(self):
+        changed_task = copy.deepcopy(self.tasks[3])
+        changed_task[u'title'] = u'Changed'
+        new_task = copy.deepcopy(self.tasks[0])
+        new_task[u'id'] = u'new-task'
+        merged, num_tasks = shared.merge_tasklist_changes(self.tasklist, self._changes([new_task, changed_task],
+            u'Renamed list'), True, True, True)
+        self.assertEqual(num_tasks, len(self.tasks) + 1)
+        self.assertEqual(merged[u'title'], u'Renamed list')
+        self.assertEqual([task[u'id'] for task in merged[u'tasks']],
+            [task[u'id'] for task in self.tasks] + [u'new-task'])
+        self.assertEqual(merged[u'tasks'][3][u'title'], u'Changed')
+        self.assertNotIn(constants.TASKLIST_NUM_ORDERED_TASKS, merged)
+
+    def test_deleted_task(self):
+        deleted_task = copy.deepcopy(self.tasks[2])
+        deleted_task[u'deleted'] = True
+        for include_deleted in [True, False]:
+            merged, num_tasks = shared.merge_tasklist_changes(self.tasklist, self._changes([deleted_task]),
+                True, True, include_deleted)
+            self.assertEqual(num_tasks, len(self.tasks) if include_deleted else len(self.tasks) - 1)
+            self.assertEqual(deleted_task[u'id'] in [task[u'id'] for task in merged[u'tasks']], include_deleted)
+
+    def test_all_tasks_removed(self):
+        deleted_tasks = []
+        for task in self.tasks:
+            deleted_task = copy.deepcopy(task)
+            deleted_task[u'deleted'] = True
+            deleted_tasks.append(deleted_task)
+        merged, num_tasks = shared.merge_tasklist_changes(self.tasklist, self._changes(deleted_tasks),
+            True, True, False)
+        self.assertEqual(num_tasks, 0)
+        self.assertNotIn(u'tasks', merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
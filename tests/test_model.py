@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for model.TaskRecord """
+
+import datetime
+import pickle
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import model # pylint: disable=relative-import,wrong-import-position
+
+
+def _new_task():
+    return model.TaskRecord.from_api_dict({
+        'kind' : u'tasks#task', 
+        'id' : u'abc', 
+        'title' : u'Buy milk', 
+        'status' : u'completed',
+        'updated' : datetime.datetime(2012, 1, 26, 7, 47, 18), 
+        'updated_RFC3339' : u'2012-01-26T07:47:18.000Z',
+        'selfLink' : u'https://www.googleapis.com/tasks/v1/lists/L1/tasks/abc', 
+        'position' : u'00001',
+        'due' : datetime.date(2012, 1, 30), 
+        'due_RFC3339' : u'2012-01-30T00:00:00.000Z', 
+        'notes' : u'2%', 
+        'custom' : 5,
+    })
+    
+    
+class TaskRecordPickleTest(unittest.TestCase):
+    
+    def test_round_trip(self):
+        task = _new_task()
+        task['depth'] = 2
+        del task['notes']
+        
+        loaded = pickle.loads(pickle.dumps(task, pickle.HIGHEST_PROTOCOL))
+        
+        self.assertEqual(dict(loaded.items()), dict(task.items()))
+        self.assertNotIn('notes', loaded)
+        self.assertEqual(loaded['selfLink'], u'https://www.googleapis.com/tasks/v1/lists/L1/tasks/abc')
+        
+        
+    def test_state_is_version_and_dict_of_set_slots(self):
+        version, state = _new_task().__getstate__()
+        
+        self.assertEqual(version, model.TaskRecord._STATE_VERSION) # pylint: disable=protected-access
+        self.assertEqual(state['title'], u'Buy milk')
+        self.assertEqual(state['_extra'], {'custom' : 5})
+        # Unset fields, and derivable values, are not stored
+        self.assertNotIn('parent', state)
+        self.assertNotIn('_updated_RFC3339', state)
+        
+        
+    def test_unknown_fields_from_later_version_are_kept(self):
+        task = model.TaskRecord()
+        task.__setstate__((2, {'id' : u'abc', 'colour' : u'red', '_new_private_slot' : 1}))
+        
+        self.assertEqual(task['id'], u'abc')
+        self.assertEqual(task['colour'], u'red')
+        self.assertNotIn('_new_private_slot', task)
+        
+        
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for detecting a stalled (or never started) job in the progress JSON (tasks_backup) """
+
+import datetime
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import constants # pylint: disable=relative-import,wrong-import-position
+import tasks_backup # pylint: disable=relative-import,wrong-import-position
+
+
+def _progress(status, created_seconds_ago, progress_seconds_ago=None):
+    now = datetime.datetime.now()
+    return {
+        'status' : status,
+        'job_created_timestamp' : now - datetime.timedelta(seconds=created_seconds_ago),
+        'job_progress_timestamp' : (now - datetime.timedelta(seconds=progress_seconds_ago)
+            if progress_seconds_ago is not None else None),
+    }
+
+
+class JobAppearsStalledTest(unittest.TestCase):
+
+    def test_job_not_started_within_startup_time(self):
+        status = constants.ExportJobStatus.TO_BE_STARTED
+        self.assertFalse(tasks_backup._job_appears_stalled( # pylint: disable=protected-access
+            _progress(status, settings.MAX_TIME_ALLOWED_FOR_JOB_TO_START - 5)))
+        self.assertTrue(tasks_backup._job_appears_stalled( # pylint: disable=protected-access
+            _progress(status, settings.MAX_TIME_ALLOWED_FOR_JOB_TO_START + 5)))
+
+    def test_running_job_without_recent_progress(self):
+        status = constants.ExportJobStatus.BUILDING
+        self.assertFalse(tasks_backup._job_appears_stalled( # pylint: disable=protected-access
+            _progress(status, 3600, settings.MAX_JOB_PROGRESS_INTERVAL - 5)))
+        self.assertTrue(tasks_backup._job_appears_stalled( # pylint: disable=protected-access
+            _progress(status, 3600, settings.MAX_JOB_PROGRESS_INTERVAL + 5)))
+
+    def test_stopped_job_never_stalls(self):
+        for status in constants.ExportJobStatus.STOPPED_VALUES:
+            self.assertFalse(tasks_backup._job_appears_stalled( # pylint: disable=protected-access
+                _progress(status, 86400, 86400)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for rate_limiter, using a fake clock and the in-memory memcache from gae_stubs """
+
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+
+from google.appengine.api import memcache # pylint: disable=wrong-import-position
+
+import rate_limiter # pylint: disable=relative-import,wrong-import-position
+import retry_policy # pylint: disable=relative-import,wrong-import-position
+
+
+class FakeClock(object):
+    """ A clock which only moves when sleep() is called """
+
+    def __init__(self, now=1500000000.25):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _counter(key):
+    return memcache.get(key, namespace=rate_limiter._MEMCACHE_NAMESPACE) or 0 # pylint: disable=protected-access
+
+
+def _window_count(timestamp):
+    return _counter(rate_limiter._window_key(int(timestamp))) # pylint: disable=protected-access
+
+
+def _usage_count(counter, timestamp):
+    return _counter(rate_limiter._minute_usage_key(counter, timestamp)) # pylint: disable=protected-access
+
+
+class LocalTokenBucketTest(unittest.TestCase):
+
+    def test_allows_capacity_then_refills(self):
+        clock = FakeClock()
+        bucket = rate_limiter.LocalTokenBucket(10, clock=clock)
+        self.assertEqual(bucket.try_acquire(6), 0)
+        self.assertEqual(bucket.try_acquire(4), 0)
+        self.assertAlmostEqual(bucket.try_acquire(2), 0.2)
+        clock.sleep(0.2)
+        self.assertEqual(bucket.try_acquire(2), 0)
+
+    def test_denied_attempt_takes_no_tokens(self):
+        clock = FakeClock()
+        bucket = rate_limiter.LocalTokenBucket(10, clock=clock)
+        self.assertEqual(bucket.try_acquire(8), 0)
+        self.assertGreater(bucket.try_acquire(5), 0)
+        self.assertEqual(bucket.try_acquire(2), 0)
+
+    def test_more_than_capacity_is_refused(self):
+        bucket = rate_limiter.LocalTokenBucket(10, clock=FakeClock())
+        self.assertRaises(ValueError, bucket.try_acquire, 11)
+
+
+class MemcacheTokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        gae_stubs.clear_memcache()
+        self.clock = FakeClock()
+        self.bucket = rate_limiter.MemcacheTokenBucket(20, clock=self.clock)
+
+    def tearDown(self):
+        gae_stubs.clear_memcache()
+
+    def test_allows_rate_tokens_per_window(self):
+        self.assertEqual(self.bucket.try_acquire(15), 0)
+        self.assertEqual(self.bucket.try_acquire(5), 0)
+        self.assertAlmostEqual(self.bucket.try_acquire(1), 0.75)
+        self.clock.sleep(0.75)
+        self.assertEqual(self.bucket.try_acquire(20), 0)
+
+    def test_denied_attempts_are_not_counted(self):
+        usage_keys = rate_limiter._usage_keys(rate_limiter._REQUESTS, self.clock()) # pylint: disable=protected-access
+        self.assertEqual(self.bucket.try_acquire(15, usage_keys), 0)
+        for _ in range(3):
+            self.assertGreater(self.bucket.try_acquire(10, usage_keys), 0)
+        self.assertEqual(_window_count(self.clock()), 15)
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, self.clock()), 15) # pylint: disable=protected-access
+        # The tokens that were refused are still available
+        self.assertEqual(self.bucket.try_acquire(5, usage_keys), 0)
+        self.assertEqual(_window_count(self.clock()), 20)
+
+    def test_more_than_rate_is_refused(self):
+        # Previously, the first request in each window was always allowed, however many tokens it needed
+        self.assertRaises(ValueError, self.bucket.try_acquire, 50)
+        self.assertEqual(_window_count(self.clock()), 0)
+
+    def test_memcache_unavailable(self):
+        gae_stubs.MEMCACHE_AVAILABLE[0] = False
+        self.assertRaises(rate_limiter.BucketUnavailableError, self.bucket.try_acquire, 1)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        gae_stubs.clear_memcache()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        gae_stubs.clear_memcache()
+
+    def _new_limiter(self, rate=20, max_wait=10, bucket=None):
+        return rate_limiter.RateLimiter(rate, max_wait, bucket=bucket, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_requests_within_rate_are_not_delayed(self):
+        limiter = self._new_limiter()
+        for _ in range(20):
+            self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, self.clock()), 20) # pylint: disable=protected-access
+
+    def test_request_waits_for_next_window(self):
+        limiter = self._new_limiter()
+        start = self.clock()
+        limiter.acquire(20)
+        self.assertAlmostEqual(limiter.acquire(3), 0.75)
+        self.assertEqual(_window_count(start), 20)
+        self.assertEqual(_window_count(self.clock()), 3)
+        # Each request is counted once, however many attempts were needed
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, start), 23) # pylint: disable=protected-access
+        self.assertEqual(_usage_count(rate_limiter._THROTTLED, start), 3) # pylint: disable=protected-access
+
+    def test_batch_larger_than_rate_is_spread_over_windows(self):
+        limiter = self._new_limiter()
+        start = self.clock()
+        waited = limiter.acquire(50)
+        self.assertAlmostEqual(waited, 1.75)
+        self.assertEqual([_window_count(start + num) for num in range(3)], [20, 20, 10])
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, start), 50) # pylint: disable=protected-access
+
+    def test_max_wait_exceeded_raises_instead_of_sending(self):
+        limiter = self._new_limiter(max_wait=0.5)
+        start = self.clock()
+        limiter.acquire(20)
+        self.assertRaises(rate_limiter.RateLimitExceededError, limiter.acquire)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(_window_count(start), 20)
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, start), 20) # pylint: disable=protected-access
+        # The worker's retry policy backs off before retrying
+        self.assertEqual(retry_policy.classify_error(rate_limiter.RateLimitExceededError()),
+            retry_policy.ErrorClass.RATE_LIMIT)
+
+    def test_local_bucket_as_stand_in(self):
+        limiter = self._new_limiter(rate=10, bucket=rate_limiter.LocalTokenBucket(10, clock=self.clock))
+        self.assertEqual(limiter.acquire(10), 0)
+        self.assertAlmostEqual(limiter.acquire(5), 0.5)
+        self.assertAlmostEqual(limiter.acquire(25), 2.5)
+
+    def test_falls_back_to_local_bucket_when_memcache_unavailable(self):
+        limiter = self._new_limiter()
+        gae_stubs.MEMCACHE_AVAILABLE[0] = False
+        self.assertEqual(limiter.acquire(20), 0)
+        self.assertAlmostEqual(limiter.acquire(10), 0.5)
+        gae_stubs.MEMCACHE_AVAILABLE[0] = True
+        self.assertEqual(limiter.acquire(20), 0)
+        self.assertEqual(_window_count(self.clock()), 20)
+
+    def test_unlimited(self):
+        limiter = self._new_limiter(rate=0)
+        self.assertEqual(limiter.acquire(500), 0)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(_usage_count(rate_limiter._REQUESTS, self.clock()), 500) # pylint: disable=protected-access
+
+
+if __name__ == '__main__':
+    unittest.main()
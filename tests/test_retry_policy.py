@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for retry_policy, using errors which look like apiclient HttpErrors and network errors """
+
+import email.utils
+import random
+import socket
+import threading
+import time
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import retry_policy # pylint: disable=relative-import,wrong-import-position
+from retry_policy import ErrorClass # pylint: disable=relative-import,wrong-import-position
+
+
+class FakeResponse(dict):
+    """ The httplib2 response of an HttpError; a dictionary of the (lower case) headers, with a status """
+
+    def __init__(self, status, headers=None):
+        dict.__init__(self, headers or {})
+        self.status = status
+
+
+class HttpError(Exception):
+    """ Has the same name and attributes as apiclient.errors.HttpError """
+
+    def __init__(self, status, reason='', headers=None):
+        Exception.__init__(self, status, reason)
+        self.resp = FakeResponse(status, headers)
+        self._reason = reason
+
+    def _get_reason(self):
+        return self._reason
+
+
+class DeadlineExceededError(Exception):
+    """ Has the same name as the App Engine urlfetch and runtime DeadlineExceededErrors """
+
+
+class AccessTokenRefreshError(Exception):
+    """ Has the same name as oauth2client.client.AccessTokenRefreshError """
+
+
+class RateLimitExceededError(Exception):
+    """ Has the same name as rate_limiter.RateLimitExceededError """
+
+
+BUDGETS = {
+    ErrorClass.RATE_LIMIT : 5,
+    ErrorClass.SERVER : 3,
+    ErrorClass.NETWORK : 2,
+    ErrorClass.AUTH : 1,
+}
+
+
+def _new_policy(seed=1, **kwargs):
+    return retry_policy.RetryPolicy(BUDGETS, 2, 30, rnd=random.Random(seed), **kwargs)
+
+
+class ClassifyErrorTest(unittest.TestCase):
+
+    def test_http_status(self):
+        self.assertEqual(retry_policy.classify_error(HttpError(429)), ErrorClass.RATE_LIMIT)
+        self.assertEqual(retry_policy.classify_error(HttpError(500)), ErrorClass.SERVER)
+        self.assertEqual(retry_policy.classify_error(HttpError(503)), ErrorClass.SERVER)
+        self.assertEqual(retry_policy.classify_error(HttpError(400)), ErrorClass.CLIENT)
+        self.assertEqual(retry_policy.classify_error(HttpError(404)), ErrorClass.CLIENT)
+
+    def test_403_rate_limit_reasons(self):
+        for reason in ['Rate Limit Exceeded', 'User Rate Limit Exceeded', 'rateLimitExceeded',
+                       'userRateLimitExceeded']:
+            self.assertEqual(retry_policy.classify_error(HttpError(403, reason)), ErrorClass.RATE_LIMIT, reason)
+
+    def test_403_other_reasons(self):
+        for reason in ['Forbidden', 'Daily Limit Exceeded', '']:
+            self.assertEqual(retry_policy.classify_error(HttpError(403, reason)), ErrorClass.CLIENT, reason)
+
+    def test_403_reason_which_cannot_be_read(self):
+        ex = HttpError(403)
+        ex._get_reason = lambda: 1 / 0 # pylint: disable=protected-access
+        self.assertEqual(retry_policy.classify_error(ex), ErrorClass.CLIENT)
+
+    def test_network_error_class_names(self):
+        self.assertEqual(retry_policy.classify_error(DeadlineExceededError()), ErrorClass.NETWORK)
+        self.assertEqual(retry_policy.classify_error(socket.timeout()), ErrorClass.NETWORK)
+        self.assertEqual(retry_policy.classify_error(socket.error()), ErrorClass.NETWORK)
+        self.assertEqual(retry_policy.classify_error(socket.gaierror()), ErrorClass.NETWORK)
+        self.assertEqual(retry_policy.classify_error(IOError()), ErrorClass.NETWORK)
+
+    def test_subclass_of_network_error(self):
+        class UrlfetchTimeout(DeadlineExceededError):
+            pass
+        self.assertEqual(retry_policy.classify_error(UrlfetchTimeout()), ErrorClass.NETWORK)
+
+    def test_other_class_names(self):
+        self.assertEqual(retry_policy.classify_error(AccessTokenRefreshError()), ErrorClass.AUTH)
+        self.assertEqual(retry_policy.classify_error(RateLimitExceededError()), ErrorClass.RATE_LIMIT)
+        self.assertEqual(retry_policy.classify_error(ValueError()), ErrorClass.OTHER)
+
+
+class GetRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(retry_policy.get_retry_after(HttpError(503, headers={'retry-after' : ' 120 '})), 120.0)
+        self.assertEqual(retry_policy.get_retry_after(HttpError(503, headers={'retry-after' : '-5'})), 0.0)
+
+    def test_http_date(self):
+        retry_at = email.utils.formatdate(time.time() + 90, usegmt=True)
+        retry_after = retry_policy.get_retry_after(HttpError(429, headers={'retry-after' : retry_at}))
+        self.assertAlmostEqual(retry_after, 90, delta=2)
+
+    def test_http_date_in_the_past(self):
+        retry_at = email.utils.formatdate(time.time() - 90, usegmt=True)
+        self.assertEqual(retry_policy.get_retry_after(HttpError(429, headers={'retry-after' : retry_at})), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertEqual(retry_policy.get_retry_after(HttpError(503)), None)
+        self.assertEqual(retry_policy.get_retry_after(HttpError(503, headers={'retry-after' : 'soon'})), None)
+        self.assertEqual(retry_policy.get_retry_after(ValueError()), None)
+
+
+class RetryStateTest(unittest.TestCase):
+
+    def test_delays_use_exponential_backoff_with_jitter(self):
+        state = _new_policy().new_state()
+        expected_rnd = random.Random(1)
+        for num_retries, backoff in enumerate([2, 4, 8], 1):
+            delay = state.next_delay(HttpError(503))
+            self.assertEqual(delay, backoff / 2.0 + expected_rnd.uniform(0, backoff / 2.0))
+            self.assertEqual(state.num_retries, num_retries)
+
+    def test_same_seed_gives_same_delays(self):
+        delays = []
+        for _ in range(2):
+            state = _new_policy(seed=42).new_state()
+            delays.append([state.next_delay(HttpError(429)) for _ in range(5)])
+        self.assertEqual(delays[0], delays[1])
+
+    def test_delay_is_limited_by_max_delay(self):
+        policy = retry_policy.RetryPolicy({ErrorClass.SERVER : 20}, 2, 30, rnd=random.Random(1))
+        state = policy.new_state()
+        delays = [state.next_delay(HttpError(500)) for _ in range(20)]
+        self.assertTrue(all(15 <= delay <= 30 for delay in delays[5:]), delays)
+
+    def test_retry_after_is_a_minimum(self):
+        state = _new_policy().new_state()
+        self.assertEqual(state.next_delay(HttpError(429, headers={'retry-after' : '100'})), 100)
+
+    def test_each_error_class_has_its_own_budget(self):
+        state = _new_policy().new_state()
+        for _ in range(BUDGETS[ErrorClass.NETWORK]):
+            self.assertNotEqual(state.next_delay(DeadlineExceededError()), None)
+        self.assertEqual(state.next_delay(DeadlineExceededError()), None)
+        self.assertIn("'network'", state.give_up_reason)
+        # Other classes of errors can still be retried
+        self.assertNotEqual(state.next_delay(HttpError(503)), None)
+        self.assertEqual(state.num_retries, BUDGETS[ErrorClass.NETWORK] + 1)
+
+    def test_errors_without_a_budget_are_not_retried(self):
+        state = _new_policy().new_state()
+        self.assertEqual(state.next_delay(HttpError(404)), None)
+        self.assertEqual(state.next_delay(ValueError()), None)
+        self.assertEqual(state.num_retries, 0)
+
+    def test_deadline(self):
+        policy = _new_policy(deadline_seconds=60)
+        state = policy.new_state()
+        # A short delay is allowed, because it ends before the deadline
+        self.assertNotEqual(state.next_delay(HttpError(503)), None)
+        # A delay which would end after the deadline is not
+        self.assertEqual(state.next_delay(HttpError(429, headers={'retry-after' : '61'})), None)
+        self.assertIn("deadline", state.give_up_reason)
+        # Once the deadline has passed, nothing is retried
+        policy.deadline = time.time() - 1
+        self.assertEqual(state.next_delay(HttpError(503)), None)
+        self.assertEqual(state.num_retries, 1)
+        self.assertEqual(policy.total_retries, 1)
+
+    def test_max_total_retries_is_shared_by_all_operations(self):
+        policy = _new_policy(max_total_retries=3)
+        states = [policy.new_state() for _ in range(2)]
+        self.assertNotEqual(states[0].next_delay(HttpError(503)), None)
+        self.assertNotEqual(states[1].next_delay(HttpError(503)), None)
+        self.assertNotEqual(states[0].next_delay(HttpError(503)), None)
+        self.assertEqual(states[1].next_delay(HttpError(503)), None)
+        self.assertIn("limit of 3 retries", states[1].give_up_reason)
+        self.assertEqual(policy.total_retries, 3)
+
+    def test_max_total_retries_across_threads(self):
+        # Several fetch threads share the policy of the job
+        max_total_retries = 50
+        policy = _new_policy(max_total_retries=max_total_retries)
+        start = threading.Event()
+        # Number of retries allowed in each thread
+        num_allowed = []
+        lock = threading.Lock()
+
+        def retry_repeatedly():
+            allowed = 0
+            start.wait()
+            for _ in range(20):
+                # Each error is for a different operation, so that the per-operation budget is never reached
+                if policy.new_state().next_delay(HttpError(503)) is not None:
+                    allowed += 1
+            with lock:
+                num_allowed.append(allowed)
+
+        threads = [threading.Thread(target=retry_repeatedly) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(num_allowed), max_total_retries)
+        self.assertEqual(policy.total_retries, max_total_retries)
+
+
+if __name__ == '__main__':
+    unittest.main()
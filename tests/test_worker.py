@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Tests for the worker (worker.ProcessTasksWorker); retrieving the tasks, and refreshing the access token """
+
+import copy
+import datetime
+import threading
+import time
+import unittest
+
+import testenv # pylint: disable=relative-import,unused-import
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+import synthetic_accounts # pylint: disable=relative-import,wrong-import-position
+
+import settings # pylint: disable=relative-import,wrong-import-position
+import model # pylint: disable=relative-import,wrong-import-position
+import worker # pylint: disable=relative-import,wrong-import-position
+import retry_policy # pylint: disable=relative-import,wrong-import-position
+import rate_limiter # pylint: disable=relative-import,wrong-import-position
+
+
+USER_EMAIL = u'test.user@example.com'
+
+
+class FakeRequest(object): # pylint: disable=too-few-public-methods
+    """ An (unexecuted) tasks.list() request """
+
+    def __init__(self, service, tasklist_id, page_token, kwargs):
+        self._service = service
+        self.tasklist_id = tasklist_id
+        self.page_token = page_token
+        self.kwargs = kwargs
+
+    def execute(self, http=None):
+        return self._service.execute_list(self, http)
+
+
+class FakeTasksService(object):
+    """ Returns pages of the tasks in api_tasklists (as returned by synthetic_accounts.generate_api_tasklists)
+
+        As with the Tasks API, deleted and hidden tasks are only returned if showDeleted and showHidden are 
+        set, and only tasks updated at or after updatedMin are returned. Each request takes delay seconds. The number of requests which are being executed at the same
+        time (and the threads which executed them) are recorded, so that tests can check how the tasklists
+        were retrieved. A request for failing_tasklist_id raises ValueError.
+    """
+
+    def __init__(self, api_tasklists, page_size, delay=0.0, failing_tasklist_id=None):
+        self._tasks = dict((tasklist[u'id'], tasklist.get(u'tasks', [])) for tasklist in api_tasklists)
+        self._page_size = page_size
+        self._delay = delay
+        self._failing_tasklist_id = failing_tasklist_id
+        self._lock = threading.Lock()
+        self.num_active = 0
+        self.max_active = 0
+        self.thread_names = set()
+        self.requests = []
+
+    def list(self, tasklist, pageToken=None, **kwargs): # pylint: disable=invalid-name
+        return FakeRequest(self, tasklist, pageToken, kwargs)
+
+    @staticmethod
+    def _is_returned(task, kwargs):
+        if task.get(u'deleted') and not kwargs.get('showDeleted'):
+            return False
+        if task.get(u'hidden') and not kwargs.get('showHidden'):
+            return False
+        updated_min = kwargs.get('updatedMin')
+        # RFC-3339 timestamps (in UTC) sort in time order
+        return not updated_min or task[u'updated'] >= updated_min
+
+    def execute_list(self, request, http): # pylint: disable=unused-argument
+        with self._lock:
+            self.num_active += 1
+            self.max_active = max(self.max_active, self.num_active)
+            self.thread_names.add(threading.current_thread().name)
+            self.requests.append(request)
+        try:
+            time.sleep(self._delay)
+            if request.tasklist_id == self._failing_tasklist_id:
+                raise ValueError("Failed to retrieve " + request.tasklist_id)
+            start = int(request.page_token or 0)
+            end = start + self._page_size
+            tasks = [task for task in self._tasks[request.tasklist_id] if self._is_returned(task, request.kwargs)]
+            # The worker converts the tasks in place, so return copies
+            tasks_data = {u'items' : [copy.deepcopy(task) for task in tasks[start:end]]}
+            if end < len(tasks):
+                tasks_data[u'nextPageToken'] = str(end)
+            return tasks_data
+        finally:
+            with self._lock:
+                self.num_active -= 1
+
+
+class FakeTasklistsWriter(object): # pylint: disable=too-few-public-methods
+    """ Keeps the tasklists written by the worker, in the order they were written """
+
+    def __init__(self):
+        self.tasklists = []
+
+    def write_tasklist(self, tasklist_dict):
+        self.tasklists.append(tasklist_dict)
+
+
+class SlowTasklistsWriter(FakeTasklistsWriter): # pylint: disable=too-few-public-methods
+    """ Waits (for up to timeout seconds) while writing the first tasklist, until every tasklist has been
+        requested from tasks_svc. Records whether the other fetch threads requested every tasklist 
+        while the first tasklist was being written.
+    """
+
+    def __init__(self, tasks_svc, tasklist_ids, timeout=2.0):
+        FakeTasklistsWriter.__init__(self)
+        self._tasks_svc = tasks_svc
+        self._tasklist_ids = set(tasklist_ids)
+        self._timeout = timeout
+        self.all_requested_while_writing = None
+
+    def write_tasklist(self, tasklist_dict):
+        if self.all_requested_while_writing is None:
+            end_time = time.time() + self._timeout
+            while time.time() < end_time:
+                if set(request.tasklist_id for request in self._tasks_svc.requests) >= self._tasklist_ids:
+                    break
+                time.sleep(0.01)
+            self.all_requested_while_writing = (
+                set(request.tasklist_id for request in self._tasks_svc.requests) >= self._tasklist_ids)
+        FakeTasklistsWriter.write_tasklist(self, tasklist_dict)
+
+
+def new_worker(tasks_svc):
+    """ Returns a worker which uses tasks_svc, initialised in the same way as ProcessTasksWorker.post() """
+
+    worker_obj = worker.ProcessTasksWorker()
+    worker_obj.prev_progress_timestamp = datetime.datetime.now()
+    worker_obj._job_lock = threading.RLock() # pylint: disable=protected-access
+    worker_obj._writer_lock = threading.Lock() # pylint: disable=protected-access
+    worker_obj._token_refresh_lock = threading.Lock() # pylint: disable=protected-access
+    # Don't retry, so that errors are raised immediately
+    worker_obj._retry_policy = retry_policy.RetryPolicy({}, 0, 0) # pylint: disable=protected-access
+    worker_obj._thread_local = threading.local() # pylint: disable=protected-access
+    worker_obj._tasks_in_progress = {} # pylint: disable=protected-access
+    worker_obj._expected_page_size = settings.TASKS_API_MAX_RESULTS # pylint: disable=protected-access
+    worker_obj._page_size_adapted = False # pylint: disable=protected-access
+    worker_obj._full_page_received = False # pylint: disable=protected-access
+    worker_obj._tasklist_watermarks = {} # pylint: disable=protected-access
+    worker_obj._previous_tasklist_versions = {} # pylint: disable=protected-access
+    worker_obj._previous_tasklist_num_tasks = {} # pylint: disable=protected-access
+    worker_obj._tasks_order_stats = worker.shared.new_tasks_order_stats() # pylint: disable=protected-access
+    worker_obj._tasklists_writer = FakeTasklistsWriter() # pylint: disable=protected-access
+    worker_obj._next_tasklist_idx_to_write = 0 # pylint: disable=protected-access
+
+    worker_obj.user_email = USER_EMAIL
+    worker_obj.tasks_svc = tasks_svc
+    worker_obj.process_tasks_job = model.ProcessTasksJob(key_name=USER_EMAIL)
+    worker_obj.process_tasks_job.total_progress = 0
+    worker_obj.process_tasks_job.job_created_timestamp = datetime.datetime.now()
+    worker_obj.process_tasks_job.job_start_timestamp = datetime.datetime.now()
+    return worker_obj
+
+
+class FakeCredentials(object):
+    """ Credentials whose access token expires at token_expiry (UTC). 
+    
+        refresh() takes refresh_delay seconds, and then sets a new token which expires in an hour. 
+        The Http objects used to refresh the token are recorded.
+    """
+
+    def __init__(self, token_expiry, refresh_delay=0.0, refresh_error=None):
+        self.token_expiry = token_expiry
+        self._refresh_delay = refresh_delay
+        self._refresh_error = refresh_error
+        self.refresh_https = []
+
+    def refresh(self, http):
+        self.refresh_https.append(http)
+        time.sleep(self._refresh_delay)
+        if self._refresh_error:
+            raise self._refresh_error
+        self.token_expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+
+class WorkerTestCase(unittest.TestCase):
+    """ Sets the settings used by the worker tests, and restores them afterwards """
+
+    # { setting name : value used by the tests }
+    SETTINGS = {
+        'WORKER_USE_BATCH_REQUESTS' : False,
+        'WORKER_TASKLIST_FETCH_CONCURRENCY' : 4,
+        'WORKER_PRECOMPUTE_TASKS_ORDER' : True,
+        'TASKS_API_MAX_RESULTS' : 20,
+    }
+
+    def setUp(self):
+        gae_stubs.clear_datastore()
+        gae_stubs.clear_memcache()
+        self._saved_settings = dict((name, getattr(settings, name)) for name in self.SETTINGS)
+        for name, value in self.SETTINGS.items():
+            setattr(settings, name, value)
+        # Don't delay the requests
+        self._saved_rate_limiter = worker._tasks_api_rate_limiter # pylint: disable=protected-access
+        worker._tasks_api_rate_limiter = rate_limiter.RateLimiter(0, 0) # pylint: disable=protected-access
+
+    def tearDown(self):
+        for name, value in self._saved_settings.items():
+            setattr(settings, name, value)
+        worker._tasks_api_rate_limiter = self._saved_rate_limiter # pylint: disable=protected-access
+
+
+class ConcurrentFetchTest(WorkerTestCase):
+    """ Retrieving tasklists in parallel (WORKER_TASKLIST_FETCH_CONCURRENCY, with WORKER_USE_BATCH_REQUESTS False) """
+
+    def setUp(self):
+        WorkerTestCase.setUp(self)
+        self.api_tasklists = synthetic_accounts.generate_api_tasklists('small')
+        # More tasklists than threads, so that each thread retrieves more than one tasklist
+        for list_num in range(len(self.api_tasklists), 10):
+            self.api_tasklists.append({u'title' : u'Extra %d' % list_num, u'id' : u'list%02d' % list_num,
+                u'tasks' : self.api_tasklists[list_num % 3].get(u'tasks', [])[:list_num]})
+        self.tasklists_to_fetch = [{u'title' : tasklist[u'title'], u'id' : tasklist[u'id']}
+            for tasklist in self.api_tasklists]
+
+    def test_tasklists_retrieved_in_parallel_and_written_in_order(self):
+        tasks_svc = FakeTasksService(self.api_tasklists, settings.TASKS_API_MAX_RESULTS, delay=0.02)
+        worker_obj = new_worker(tasks_svc)
+
+        tasks_per_list = worker_obj._get_tasks_in_tasklists(self.tasklists_to_fetch, # pylint: disable=protected-access
+            True, True, True)
+
+        # Every tasklist (and every page of the large tasklist) was retrieved, using the fetch threads
+        self.assertEqual(tasks_per_list, [len(tasklist.get(u'tasks', [])) for tasklist in self.api_tasklists])
+        self.assertEqual(worker_obj.process_tasks_job.total_progress, sum(tasks_per_list))
+        self.assertGreater(tasks_svc.max_active, 1)
+        self.assertLessEqual(tasks_svc.max_active, settings.WORKER_TASKLIST_FETCH_CONCURRENCY)
+        self.assertTrue(all(name.startswith('tasklist-fetch-') for name in tasks_svc.thread_names))
+        self.assertGreater(len(tasks_svc.thread_names), 1)
+
+        # The tasklists are written in the order returned by the server, regardless of which finished first
+        written = worker_obj._tasklists_writer.tasklists # pylint: disable=protected-access
+        self.assertEqual([tasklist[u'id'] for tasklist in written],
+            [tasklist[u'id'] for tasklist in self.api_tasklists])
+        for tasklist, api_tasklist in zip(written, self.api_tasklists):
+            self.assertEqual(sorted(task[u'id'] for task in tasklist.get(u'tasks', [])),
+                sorted(task[u'id'] for task in api_tasklist.get(u'tasks', [])))
+
+    def test_same_result_as_sequential_fetch(self):
+        worker_obj = new_worker(FakeTasksService(self.api_tasklists, settings.TASKS_API_MAX_RESULTS))
+        parallel_tasks_per_list = worker_obj._get_tasks_in_tasklists(self.tasklists_to_fetch, # pylint: disable=protected-access
+            True, True, True)
+        parallel_tasklists = worker_obj._tasklists_writer.tasklists # pylint: disable=protected-access
+        parallel_stats = worker_obj._tasks_order_stats # pylint: disable=protected-access
+
+        settings.WORKER_TASKLIST_FETCH_CONCURRENCY = 1
+        tasks_svc = FakeTasksService(self.api_tasklists, settings.TASKS_API_MAX_RESULTS)
+        worker_obj = new_worker(tasks_svc)
+        sequential_tasks_per_list = worker_obj._get_tasks_in_tasklists(self.tasklists_to_fetch, # pylint: disable=protected-access
+            True, True, True)
+        sequential_tasklists = worker_obj._tasklists_writer.tasklists # pylint: disable=protected-access
+
+        self.assertEqual(tasks_svc.max_active, 1)
+        self.assertEqual(parallel_tasks_per_list, sequential_tasks_per_list)
+        # Each thread orders its tasklists separately, and adds its statistics to the job's statistics
+        self.assertEqual(parallel_stats, worker_obj._tasks_order_stats) # pylint: disable=protected-access
+        self.assertEqual(parallel_stats['num_tasklists'], len(self.api_tasklists))
+        self.assertEqual(parallel_stats['num_tasks'], sum(sequential_tasks_per_list))
+        self.assertEqual(
+            [(tasklist[u'id'], [task[u'id'] for task in tasklist.get(u'tasks', [])]) for tasklist in parallel_tasklists],
+            [(tasklist[u'id'], [task[u'id'] for task in tasklist.get(u'tasks', [])]) for tasklist in sequential_tasklists])
+
+    def test_slow_write_does_not_hold_up_fetch_threads(self):
+        # The large tasklist is last, so that the first tasklist is written while the others are being retrieved
+        api_tasklists = self.api_tasklists[1:] + self.api_tasklists[:1]
+        tasklists_to_fetch = self.tasklists_to_fetch[1:] + self.tasklists_to_fetch[:1]
+        tasks_svc = FakeTasksService(api_tasklists, settings.TASKS_API_MAX_RESULTS, delay=0.01)
+        worker_obj = new_worker(tasks_svc)
+        writer = SlowTasklistsWriter(tasks_svc, [tasklist[u'id'] for tasklist in api_tasklists])
+        worker_obj._tasklists_writer = writer # pylint: disable=protected-access
+
+        worker_obj._get_tasks_in_tasklists(tasklists_to_fetch, True, True, True) # pylint: disable=protected-access
+
+        # The other threads kept retrieving tasklists while the first tasklist was being written
+        self.assertTrue(writer.all_requested_while_writing)
+        self.assertEqual([tasklist[u'id'] for tasklist in writer.tasklists],
+            [tasklist[u'id'] for tasklist in api_tasklists])
+
+    def test_thread_error_is_reraised(self):
+        failing_tasklist_id = self.api_tasklists[2][u'id']
+        tasks_svc = FakeTasksService(self.api_tasklists, settings.TASKS_API_MAX_RESULTS,
+            failing_tasklist_id=failing_tasklist_id)
+        worker_obj = new_worker(tasks_svc)
+
+        with self.assertRaises(ValueError) as context:
+            worker_obj._get_tasks_in_tasklists(self.tasklists_to_fetch, True, True, True) # pylint: disable=protected-access
+        self.assertIn(failing_tasklist_id, str(context.exception))
+        # The tasklists after the failed tasklist are never written
+        written = worker_obj._tasklists_writer.tasklists # pylint: disable=protected-access
+        self.assertNotIn(failing_tasklist_id, [tasklist[u'id'] for tasklist in written])
+        self.assertEqual(worker_obj.process_tasks_job.status, worker.constants.ExportJobStatus.ERROR)
+
+
+    def test_only_failed_thread_discards_its_http(self):
+        failing_tasklist_id = self.api_tasklists[2][u'id']
+        tasks_svc = FakeTasksService(self.api_tasklists, settings.TASKS_API_MAX_RESULTS, delay=0.02,
+            failing_tasklist_id=failing_tasklist_id)
+        worker_obj = new_worker(tasks_svc)
+        releases = []
+        saved_pool = worker._http_pool # pylint: disable=protected-access
+
+        class RecordingPool(object):
+            """ Records whether each thread's Http object was discarded """
+
+            @staticmethod
+            def acquire(credentials=None): # pylint: disable=unused-argument
+                return None
+
+            @staticmethod
+            def release(http, discard=False): # pylint: disable=unused-argument
+                releases.append(discard)
+
+        worker._http_pool = RecordingPool() # pylint: disable=protected-access
+        try:
+            self.assertRaises(ValueError, worker_obj._get_tasks_in_tasklists, # pylint: disable=protected-access
+                self.tasklists_to_fetch, True, True, True)
+        finally:
+            worker._http_pool = saved_pool # pylint: disable=protected-access
+        self.assertEqual(len(releases), settings.WORKER_TASKLIST_FETCH_CONCURRENCY)
+        self.assertEqual(releases.count(True), 1)
+
+
+class TasksListRequestTest(WorkerTestCase):
+    """ The parameters of the tasks.list() requests """
+
+    def setUp(self):
+        WorkerTestCase.setUp(self)
+        self.worker_obj = new_worker(FakeTasksService([], settings.TASKS_API_MAX_RESULTS))
+
+    def _request(self, page_token, updated_min=None):
+        return self.worker_obj._tasks_list_request(u'list00', page_token, # pylint: disable=protected-access
+            False, True, False, updated_min)
+
+    def test_first_and_next_pages(self):
+        request = self._request(None)
+        self.assertEqual((request.tasklist_id, request.page_token), (u'list00', None))
+        self.assertEqual(request.kwargs, {'maxResults' : settings.TASKS_API_MAX_RESULTS,
+            'showHidden' : False, 'showCompleted' : True, 'showDeleted' : False})
+        self.assertEqual(self._request('token').page_token, 'token')
+
+    def test_changes_since_updated_min(self):
+        # All changed tasks are requested, regardless of the options
+        for page_token in [None, 'token']:
+            request = self._request(page_token, u'2021-01-01T00:00:00.000Z')
+            self.assertEqual(request.page_token, page_token)
+            self.assertEqual(request.kwargs, {'maxResults' : settings.TASKS_API_MAX_RESULTS,
+                'updatedMin' : u'2021-01-01T00:00:00.000Z', 
+                'showHidden' : True, 'showCompleted' : True, 'showDeleted' : True})
+
+
+class CheckPageIsFullTest(WorkerTestCase):
+    """ Reporting pages of tasks with a nextPageToken which contain fewer tasks than expected """
+
+    def setUp(self):
+        WorkerTestCase.setUp(self)
+        self.worker_obj = new_worker(None)
+        self.logged = []
+        self._saved_logging = (worker.logging.warning, worker.logging.error)
+        worker.logging.warning = lambda msg, *args: self.logged.append(('warning', args[1:]))
+        worker.logging.error = lambda msg, *args: self.logged.append(('error', args[1:]))
+
+    def tearDown(self):
+        worker.logging.warning, worker.logging.error = self._saved_logging
+        WorkerTestCase.tearDown(self)
+
+    def _check(self, *page_sizes):
+        for num_tasks_in_page in page_sizes:
+            self.worker_obj._check_page_is_full(num_tasks_in_page) # pylint: disable=protected-access
+
+    def test_adapts_to_smaller_server_page_size(self):
+        self._check(10, 10, 10, 9)
+        self.assertEqual(self.logged, [('warning', (settings.TASKS_API_MAX_RESULTS, 10, 10)), ('error', (10, 9))])
+
+    def test_no_adapting_after_full_page(self):
+        self._check(settings.TASKS_API_MAX_RESULTS, 10)
+        self.assertEqual(self.logged, [('error', (settings.TASKS_API_MAX_RESULTS, 10))])
+
+    def test_full_page_after_adapting(self):
+        self._check(10, settings.TASKS_API_MAX_RESULTS, 10)
+        self.assertEqual([level for level, _ in self.logged], ['warning', 'error', 'error'])
+        self.assertEqual(self.logged[2], ('error', (settings.TASKS_API_MAX_RESULTS, 10)))
+
+
+class AccessTokenRefreshTest(WorkerTestCase):
+    """ Refreshing the access token before it expires (WORKER_ACCESS_TOKEN_REFRESH_MARGIN) """
+
+    def _new_worker(self, credentials):
+        worker_obj = new_worker(None)
+        worker_obj.credentials = credentials
+        return worker_obj
+
+    def test_token_which_expires_within_margin_is_refreshed(self):
+        credentials = FakeCredentials(datetime.datetime.utcnow() + 
+            datetime.timedelta(seconds=settings.WORKER_ACCESS_TOKEN_REFRESH_MARGIN - 10))
+        worker_obj = self._new_worker(credentials)
+        worker_obj._refresh_access_token_if_expiring() # pylint: disable=protected-access
+        self.assertEqual(len(credentials.refresh_https), 1)
+        # The refresh request is not sent with an authorised Http object
+        self.assertNotIn('request', credentials.refresh_https[0].__dict__)
+        # The new token doesn't need to be refreshed
+        worker_obj._refresh_access_token_if_expiring() # pylint: disable=protected-access
+        self.assertEqual(len(credentials.refresh_https), 1)
+
+    def test_token_which_does_not_expire_soon_is_not_refreshed(self):
+        for token_expiry in [None, datetime.datetime.utcnow() + 
+                datetime.timedelta(seconds=settings.WORKER_ACCESS_TOKEN_REFRESH_MARGIN + 60)]:
+            credentials = FakeCredentials(token_expiry)
+            self._new_worker(credentials)._refresh_access_token_if_expiring() # pylint: disable=protected-access
+            self.assertEqual(credentials.refresh_https, [])
+
+    def test_only_one_thread_refreshes_the_token(self):
+        credentials = FakeCredentials(datetime.datetime.utcnow() + datetime.timedelta(seconds=30), 
+            refresh_delay=0.05)
+        worker_obj = self._new_worker(credentials)
+        start = threading.Event()
+        errors = []
+
+        def send_request():
+            start.wait()
+            try:
+                worker_obj._refresh_access_token_if_expiring() # pylint: disable=protected-access
+            except Exception as ex: # pylint: disable=broad-except
+                errors.append(ex)
+
+        threads = [threading.Thread(target=send_request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(credentials.refresh_https), 1)
+        self.assertFalse(worker_obj._access_token_is_expiring()) # pylint: disable=protected-access
+
+    def test_failed_refresh_is_raised_and_tried_again(self):
+        token_expiry = datetime.datetime.utcnow() + datetime.timedelta(seconds=30)
+        credentials = FakeCredentials(token_expiry, refresh_error=ValueError("Refresh failed"))
+        worker_obj = self._new_worker(credentials)
+        self.assertRaises(ValueError, worker_obj._refresh_access_token_if_expiring) # pylint: disable=protected-access
+        self.assertEqual(credentials.token_expiry, token_expiry)
+        # The next request tries to refresh the token again
+        credentials._refresh_error = None # pylint: disable=protected-access
+        worker_obj._refresh_access_token_if_expiring() # pylint: disable=protected-access
+        self.assertEqual(len(credentials.refresh_https), 2)
+        # The Http object used by the failed refresh was discarded
+        self.assertFalse(credentials.refresh_https[1] is credentials.refresh_https[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
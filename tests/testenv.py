@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2012  Julie Smith.  All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Sets up the environment for the unit tests, which run outside App Engine using the stand-in modules
+# from benchmarks/gae_stubs.py (and the settings from settings-dummy.py).
+#
+# CAUTION: Every test module must import this module before importing any of the application modules.
+#
+# The app (and therefore the tests) requires Python 2.7. Run from the repository directory;
+#
+#     python -m unittest discover -s tests
+
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+import gae_stubs # pylint: disable=relative-import,wrong-import-position
+gae_stubs.install()
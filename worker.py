@@ -22,12 +22,14 @@
 __author__ = "julie.smith.1999@gmail.com (Julie Smith)"
 
 import logging
-import pickle
+import os
 import datetime
 import time
-import math
 import json
 import base64
+import sys
+import threading
+import Queue
 
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import PKCS1_OAEP
@@ -38,13 +40,13 @@ from Crypto import Random
 from google.appengine.api import urlfetch
 from google.appengine.api import urlfetch_errors
 from google.appengine.api import logservice # To flush logs
-from google.appengine.ext import db
+from google.appengine.api import memcache
 from google.appengine.runtime import apiproxy_errors
 from google.appengine.runtime import DeadlineExceededError
+from google.appengine.ext import db
 
 import webapp2
 
-import httplib2 # pylint: disable=relative-import
 
 # OLD (pre google-api-python-client-gae-1.0)
 # from oauth2client import appengine
@@ -61,6 +63,7 @@ from oauth2client.client import AccessTokenRefreshError # pylint: disable=relati
 
 from apiclient import discovery # pylint: disable=relative-import
 from apiclient import errors as apiclient_errors # pylint: disable=relative-import
+from apiclient.http import BatchHttpRequest # pylint: disable=relative-import
 
 import model # pylint: disable=relative-import
 import settings # pylint: disable=relative-import
@@ -68,6 +71,9 @@ import appversion # appversion.version is set before the upload process to keep
 import shared # Code which is common between tasks-backup.py and worker.py  # pylint: disable=relative-import
 from shared import DailyLimitExceededError # pylint: disable=relative-import
 import constants # pylint: disable=relative-import
+import http_pool # pylint: disable=relative-import
+import retry_policy # pylint: disable=relative-import
+import rate_limiter # pylint: disable=relative-import
 
 
 logservice.AUTOFLUSH_EVERY_SECONDS = 5
@@ -93,6 +99,122 @@ __author__ = "julie.smith.1999@gmail.com (Julie Smith)"
 
 
 
+# ---------------------------------------------------------------------------------------------
+#   Http connection pool
+# ---------------------------------------------------------------------------------------------
+# Idle Http objects (with open connections), shared by all jobs and fetch threads on this instance
+_http_pool = http_pool.HttpPool(settings.WORKER_HTTP_POOL_MAX_SIZE, settings.WORKER_HTTP_POOL_IDLE_TIMEOUT) # pylint: disable=invalid-name
+
+
+
+# ---------------------------------------------------------------------------------------------
+#   Tasks API rate limit
+# ---------------------------------------------------------------------------------------------
+# Limits the rate of Tasks API requests from all workers (on all instances). Every request is sent
+# using ProcessTasksWorker._execute_request(), which waits for the rate limiter.
+_tasks_api_rate_limiter = rate_limiter.RateLimiter(settings.TASKS_API_MAX_REQUESTS_PER_SECOND, # pylint: disable=invalid-name
+    settings.TASKS_API_RATE_LIMIT_MAX_WAIT)
+
+
+
+# ---------------------------------------------------------------------------------------------
+#   Tasks API discovery document
+# ---------------------------------------------------------------------------------------------
+# Parsed discovery documents, cached for the life of the instance
+#   { 'tasks:v1' : (parsed discovery document, datetime when the document was fetched) }
+_discovery_documents = {} # pylint: disable=invalid-name
+
+
+def _fetch_discovery_document(api_name, api_version):
+    """ Returns the discovery document (JSON string) from the discovery service """
+    
+    url = discovery.DISCOVERY_URI.replace('{api}', api_name).replace('{apiVersion}', api_version)
+    result = urlfetch.fetch(url)
+    if result.status_code != 200:
+        raise Exception("Status %s fetching discovery document from %s" % (result.status_code, url))
+    # Check that the document can be used before it is cached
+    document = json.loads(result.content)
+    if 'resources' not in document:
+        raise Exception("Invalid discovery document returned from %s" % url)
+    return result.content
+    
+    
+def _get_discovery_document(api_name, api_version):
+    """ Returns the parsed discovery document for the API.
+    
+        The document is read from (in order)
+            module-level cache
+            memcache
+            datastore
+            discovery service
+            expired copy in datastore (if the document could not be fetched)
+            constants.TASKS_DISCOVERY_DOCUMENT_FALLBACK_FILE (if there is no copy in the datastore)
+        Each cache is updated from the next one, and each copy expires DISCOVERY_DOCUMENT_CACHE_TTL seconds 
+        after it was fetched from the discovery service.
+    """
+    
+    fn_name = "_get_discovery_document(): "
+    
+    doc_id = api_name + ':' + api_version
+    now = datetime.datetime.now()
+    max_age = datetime.timedelta(seconds=settings.DISCOVERY_DOCUMENT_CACHE_TTL)
+    
+    document, fetched_timestamp = _discovery_documents.get(doc_id, (None, None))
+    if document and now - fetched_timestamp < max_age:
+        return document
+        
+    memcache_key = 'discovery:' + doc_id
+    content = None
+    try:
+        content, fetched_timestamp = memcache.get(memcache_key) or (None, None)
+    except Exception as ex: # pylint: disable=broad-except
+        logging.warning("%sUnable to get discovery document from memcache: %s", fn_name, shared.get_exception_msg(ex))
+        
+    if not content or now - fetched_timestamp >= max_age:
+        content = None
+        entity = model.DiscoveryDocument.get_by_key_name(doc_id)
+        if entity and entity.fetched_timestamp and now - entity.fetched_timestamp < max_age:
+            content = entity.content
+            fetched_timestamp = entity.fetched_timestamp
+        else:
+            try:
+                logging.debug("%sFetching '%s' discovery document", fn_name, doc_id)
+                content = _fetch_discovery_document(api_name, api_version)
+                fetched_timestamp = now
+                model.DiscoveryDocument(key_name=doc_id, content=db.Text(content, encoding='utf-8'), 
+                    fetched_timestamp=fetched_timestamp).put()
+            except Exception as ex: # pylint: disable=broad-except
+                if entity:
+                    logging.warning("%sUnable to fetch '%s' discovery document, so using copy fetched at %s: %s", 
+                        fn_name, doc_id, entity.fetched_timestamp, shared.get_exception_msg(ex))
+                    content = entity.content
+                else:
+                    logging.warning("%sUnable to fetch '%s' discovery document, so using %s: %s", 
+                        fn_name, doc_id, constants.TASKS_DISCOVERY_DOCUMENT_FALLBACK_FILE, shared.get_exception_msg(ex))
+                    with open(os.path.join(os.path.dirname(__file__), 
+                            constants.TASKS_DISCOVERY_DOCUMENT_FALLBACK_FILE)) as fallback_file:
+                        content = fallback_file.read()
+                logservice.flush()
+                # Don't cache the old copy, so that the next job tries to fetch the document again
+                return json.loads(content)
+                
+        try:
+            memcache.set(memcache_key, (content, fetched_timestamp), time=settings.DISCOVERY_DOCUMENT_CACHE_TTL)
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%sUnable to store discovery document in memcache: %s", fn_name, shared.get_exception_msg(ex))
+    
+    document = json.loads(content)
+    _discovery_documents[doc_id] = (document, fetched_timestamp)
+    return document
+    
+    
+def _get_tasks_service(http):
+    """ Returns the Tasks API service, built from the cached discovery document (see _get_discovery_document) """
+    
+    return discovery.build_from_document(_get_discovery_document("tasks", "v1"), http=http)
+
+
+
 class ProcessTasksWorker(webapp2.RequestHandler):
     """ Process tasks according to data in the ProcessTasksJob entity """
 
@@ -103,6 +225,95 @@ class ProcessTasksWorker(webapp2.RequestHandler):
     tasks_svc = None
     tasklists_svc = None
     
+    # Used when retrieving tasklists in parallel (see WORKER_TASKLIST_FETCH_CONCURRENCY)
+    #   _job_lock protects process_tasks_job and the progress counters, which are shared by all the fetch threads
+    #   _thread_local holds the authorised Http object used by each fetch thread
+    #   _tasks_in_progress is a dictionary of {tasklist_id : number of tasks retrieved so far}
+    #       for each tasklist which is currently being retrieved
+    _job_lock = None
+    _thread_local = None
+    _tasks_in_progress = None
+    
+    # The number of tasks expected in every page of tasks which has a nextPageToken.
+    # Initially settings.TASKS_API_MAX_RESULTS, but reduced (once) if the server uses a smaller page size.
+    # The page size is never reduced once the server has returned a page of the requested size
+    # (_full_page_received), because the server is then using the requested page size.
+    _expected_page_size = None
+    _page_size_adapted = False
+    _full_page_received = False
+    
+    # Used for incremental backups. The worker never decrypts the previous backup; only the tasks which have 
+    # changed are retrieved, and stored as a new layer of the backup (see shared.merge_backup_layer)
+    #   _tasklist_watermarks is a dictionary of {tasklist_id : RFC-3339 timestamp} of when each tasklist
+    #       in the previous backup was retrieved. Only tasks changed since then need to be retrieved.
+    #   _previous_tasklist_versions is a dictionary of {tasklist_id : (updated, etag)} of each tasklist
+    #       in the previous backup. Tasklists which have the same version are not retrieved again.
+    #   _previous_tasklist_num_tasks is a dictionary of {tasklist_id : number of tasks} of each tasklist
+    #       in the previous backup
+    #   _prev_full_backup_timestamp is when the last full backup was started
+    #   _reused_tasklist_idxs is a list of the positions of the tasklists which were unchanged since the previous backup
+    #   _num_changed_tasks is the number of changed tasks retrieved for tasklists in the previous backup
+    # _tasklist_watermarks is empty when performing a full backup
+    _tasklist_watermarks = None
+    _previous_tasklist_versions = None
+    _previous_tasklist_num_tasks = None
+    _prev_full_backup_timestamp = None
+    _reused_tasklist_idxs = None
+    _num_changed_tasks = 0
+    
+    # Each tasklist is written to _tasklists_writer (a shared.TasklistsDataWriter) as soon as it has been
+    # retrieved, and all the tasklists before it have been written.
+    #   _next_tasklist_idx_to_write is the position of the next tasklist to be written
+    #   _writer_lock is held by the (one) thread which is writing tasklists, so that they are written in order. 
+    #       Writing a tasklist (pickling, compressing, encrypting and storing it) can be slow, so it is not done 
+    #       while holding _job_lock, which every fetch thread needs for every page of tasks.
+    _tasklists_writer = None
+    _next_tasklist_idx_to_write = 0
+    _writer_lock = None
+    
+    # Statistics from putting the tasks in order before they are written (see shared.fix_tasklist_order)
+    _tasks_order_stats = None
+    
+    # Authorised Http object (from _http_pool) used by the Tasks service
+    _http = None
+    
+    # Held while the access token is being refreshed, so that only one fetch thread refreshes the token
+    # (see _refresh_access_token_if_expiring)
+    _token_refresh_lock = None
+    
+    # Decides whether (and when) failed requests to the Tasks API are retried. Shared by all the requests 
+    # of this job, so that the job gives up after WORKER_RETRY_DEADLINE seconds, or after 
+    # WORKER_MAX_RETRIES_PER_JOB retries in total (see retry_policy.py)
+    _retry_policy = None
+    
+    # The first page of tasklists, retrieved when connecting to the Tasks service in post(),
+    # and used as the first page of tasklists in _export_tasks()
+    _first_tasklists_page = None
+    
+    # Time that the job was last put to the datastore. The progress is stored in memcache more often 
+    # (see _put_job_progress)
+    _prev_job_put_timestamp = None
+    
+    def _put_job(self):
+        """ Store the job in the datastore, and its progress in memcache """
+        shared.put_job(self.process_tasks_job, self.user_email)
+        self._prev_job_put_timestamp = datetime.datetime.now()
+        
+        
+    def _put_job_progress(self):
+        """ Store the job progress in memcache.
+        
+            The job is only put to the datastore (as a durable fallback, in case the memcache record is 
+            evicted) if it hasn't been put for JOB_PROGRESS_DATASTORE_INTERVAL seconds.
+        """
+        if (not settings.JOB_PROGRESS_MEMCACHE_ENABLED or not self._prev_job_put_timestamp or
+                (datetime.datetime.now() - self._prev_job_put_timestamp).seconds >= 
+                    settings.JOB_PROGRESS_DATASTORE_INTERVAL):
+            self._put_job()
+        else:
+            shared.set_job_progress(self.process_tasks_job, self.user_email)
+        
+        
     def _log_progress(self, prefix_msg=""):
         fn_name = "_log_progress: "
         
@@ -131,6 +342,18 @@ class ProcessTasksWorker(webapp2.RequestHandler):
 
             self.prev_progress_timestamp = datetime.datetime.now() # pylint: disable=attribute-defined-outside-init
             
+            self._job_lock = threading.RLock()
+            self._writer_lock = threading.Lock()
+            self._token_refresh_lock = threading.Lock()
+            self._retry_policy = retry_policy.RetryPolicy(settings.API_RETRY_BUDGETS,
+                settings.WORKER_RETRY_BASE_DELAY, settings.WORKER_RETRY_MAX_DELAY,
+                settings.WORKER_RETRY_DEADLINE, settings.WORKER_MAX_RETRIES_PER_JOB)
+            self._thread_local = threading.local()
+            self._tasks_in_progress = {}
+            self._expected_page_size = settings.TASKS_API_MAX_RESULTS
+            self._page_size_adapted = False
+            self._full_page_received = False
+            
             self.user_email = self.request.get(settings.TASKS_QUEUE_KEY_NAME)
             
             self.is_test_user = shared.is_test_user(self.user_email)
@@ -197,7 +420,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 self.process_tasks_job.job_start_timestamp = datetime.datetime.now()
                 self.process_tasks_job.message = "Validating background job ..."
                 self._log_progress("Initialising")
-                self.process_tasks_job.put()
+                self._put_job()
 
                 time_since_job_request = datetime.datetime.now() - self.process_tasks_job.job_created_timestamp
                 logging.debug(fn_name + "Starting job that was requested " + str(time_since_job_request.seconds) + 
@@ -213,7 +436,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     self.process_tasks_job.error_message = "Problem with user details. Please restart."
                     self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
                     self._log_progress("No user")
-                    self.process_tasks_job.put()
+                    self._put_job()
                     logging.debug(fn_name + "<End> No user object")
                     return
                       
@@ -221,7 +444,8 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 
                 # DEBUG: 2012-09-16; Trying a different method of retrieving credentials, to see if it
                 # allows retrieveal of credentials for TAFE account
-                self.credentials = StorageByKeyName(CredentialsModel, user.user_id(), 'credentials').get()
+                self.credentials = StorageByKeyName(CredentialsModel, user.user_id(), 'credentials',
+                    cache=shared.credentials_cache).get()
                 
                 if not self.credentials:
                     logging.error(fn_name + "No credentials in DB record for " + str(self.user_email))
@@ -231,7 +455,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     self.process_tasks_job.error_message = "Problem with user credentials. Please restart."
                     self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
                     self._log_progress("No credentials")
-                    self.process_tasks_job.put()
+                    self._put_job()
                     logging.debug(fn_name + "<End> No credentials")
                     return
               
@@ -244,7 +468,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
                     self._log_progress("Credentials invalid")
                     logservice.flush()
-                    self.process_tasks_job.put()
+                    self._put_job()
                     logging.debug(fn_name + "<End> Invalid credentials")
                     return
               
@@ -252,9 +476,8 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     logging.debug(fn_name + "User is test user %s" % self.user_email)
                     logservice.flush()
                     
-                retry_count = settings.NUM_API_TRIES
-                while retry_count > 0:
-                    retry_count = retry_count - 1
+                retry = self._retry_policy.new_state()
+                while True:
                     # Accessing tasklists & tasks services may take some time (especially if retries due to 
                     # DeadlineExceeded), so update progress so that job doesn't stall
                     self._update_progress("Connecting to server ...")  # Update progress so that job doesn't stall
@@ -262,24 +485,31 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                         # ---------------------------------------------------------
                         #       Connect to the tasks and tasklists services
                         # ---------------------------------------------------------
-                        http = httplib2.Http()
-                        http = self.credentials.authorize(http)
-                        service = discovery.build("tasks", "v1", http=http)
+                        # If a previous attempt failed, don't reuse its connections
+                        _http_pool.release(self._http, discard=True)
+                        self._http = _http_pool.acquire(self.credentials)
+                        service = _get_tasks_service(self._http)
                         self.tasklists_svc = service.tasklists() # pylint: disable=no-member
                         self.tasks_svc = service.tasks() # pylint: disable=no-member
 
-                        # This will also throw DailyLimitExceededError BEFORE processing starts if no quota available.
-                        logging.debug(fn_name + "DEBUG: Retrieving dummy list of tasklists, to 'prep' the service")
-                        dummy_list = self.tasklists_svc.list().execute()
+                        # Retrieve the first page of tasklists, to 'prep' the service. 
+                        # This will also throw DailyLimitExceededError BEFORE processing starts if no quota available,
+                        # and is the first authorised request, so an 'invalid_grant' AccessTokenRefreshError
+                        # is handled here (see _handle_general_error).
+                        # The page is used as the first page of tasklists in _export_tasks(), 
+                        # so that the list of tasklists isn't requested twice.
+                        logging.debug(fn_name + "Retrieving first page of tasklists, to 'prep' the service")
+                        self._first_tasklists_page = self._execute_request(
+                            self.tasklists_svc.list(maxResults=settings.TASKS_API_MAX_RESULTS))
                         
                         break # Success, so break out of the retry loop
 
                     except apiclient_errors.HttpError as http_err:
-                        self._handle_http_error(fn_name, http_err, retry_count, 
+                        self._handle_http_error(fn_name, http_err, retry, 
                             "HTTP error making initial connection to Tasks services")
                         
                     except Exception as ex: # pylint: disable=broad-except
-                        self._handle_general_error(fn_name, ex, retry_count, 
+                        self._handle_general_error(fn_name, ex, retry, 
                             "Error making initial connection to Tasks services",
                             first_connect_to_tasks_service=True)
                 
@@ -299,6 +529,11 @@ class ProcessTasksWorker(webapp2.RequestHandler):
             self._report_error("Internal system error: " + exception_msg)
             # The _report_error() should send an email to support, but we send it here just in case
             shared.send_email_to_support("WORKER: caught outer exception", exception_msg)
+            
+        finally:
+            # Return the Http object (and its open connections) to the pool, so it can be used by the next job
+            _http_pool.release(self._http)
+            self._http = None
         
         logging.debug(fn_name + "<End>")
         logservice.flush()
@@ -343,15 +578,15 @@ class ProcessTasksWorker(webapp2.RequestHandler):
             self.process_tasks_job.status = constants.ExportJobStatus.BUILDING
             self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
             self.process_tasks_job.message = 'Retrieving tasks from server ...'
+            # Progress is accumulated as each tasklist is completed, so start from zero 
+            # (the job record may contain progress from a previous attempt at this job)
+            self.process_tasks_job.total_progress = 0
+            self.process_tasks_job.tasklist_progress = 0
             self._log_progress("Building")
-            self.process_tasks_job.put()
-            
-            # This list will contain zero or more tasklist dictionaries, which each contain tasks
-            tasklists = [] 
+            self._put_job()
             
-            total_num_tasklists = 0
-            total_num_tasks = 0
-            tasks_per_list = []
+            # List of the tasklist resources returned by tasklists.list(), in the order returned by the server
+            tasklists_to_fetch = []
             
             # ---------------------------------------
             # Retrieve all the tasklists for the user
@@ -365,24 +600,30 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     logging.debug(fn_name + "calling tasklists.list().execute() to create tasklists list")
                     logservice.flush()
             
-                retry_count = settings.NUM_API_TRIES
-                while retry_count > 0:
-                    retry_count = retry_count - 1
+                retry = self._retry_policy.new_state()
+                while True:
                     try:
                         if next_tasklists_page_token:
-                            tasklists_data = self.tasklists_svc.list(pageToken=next_tasklists_page_token).execute()
+                            tasklists_data = self._execute_request(
+                                self.tasklists_svc.list(pageToken=next_tasklists_page_token,
+                                                        maxResults=settings.TASKS_API_MAX_RESULTS))
+                        elif self._first_tasklists_page is not None:
+                            # Use the first page that was retrieved when the service was prepped in post()
+                            tasklists_data = self._first_tasklists_page
+                            self._first_tasklists_page = None
                         else:
-                            tasklists_data = self.tasklists_svc.list().execute()
+                            tasklists_data = self._execute_request(
+                                self.tasklists_svc.list(maxResults=settings.TASKS_API_MAX_RESULTS))
                             
                         # Successfully retrieved data, so break out of retry loop
                         break
                     
 
                     except apiclient_errors.HttpError as http_err:
-                        self._handle_http_error(fn_name, http_err, retry_count, "Error retrieving list of tasklists")
+                        self._handle_http_error(fn_name, http_err, retry, "Error retrieving list of tasklists")
                         
                     except Exception as ex: # pylint: disable=broad-except
-                        self._handle_general_error(fn_name, ex, retry_count, "Error retrieving list of tasklists")
+                        self._handle_general_error(fn_name, ex, retry, "Error retrieving list of tasklists")
                       
                 if self.is_test_user and settings.DUMP_DATA:
                     logging.debug(fn_name + "tasklists_data ==>")
@@ -407,12 +648,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     # logging.debug(tasklists_list)
 
 
-                # ---------------------------------------
-                # Process all the tasklists for this user
-                # ---------------------------------------
                 for tasklist_data in tasklists_list:
-                    total_num_tasklists = total_num_tasklists + 1
-                  
                     if self.is_test_user and settings.DUMP_DATA:
                         logging.debug(fn_name + "tasklist_data ==>")
                         logging.debug(tasklist_data)
@@ -424,42 +660,14 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                         # u'selfLink': u'https://www.googleapis.com/tasks/v1/users/@me/lists/MDAxNTkzNzU0MzA0NTY0ODMyNjI6MDow',
                         # u'title': u'Default List',
                         # u'updated': u'2012-01-28T07:30:18.000Z'},
-               
-                    tasklist_title = tasklist_data[u'title']
-                    tasklist_id = tasklist_data[u'id']
-                  
-                    if self.is_test_user and settings.DUMP_DATA:
-                        logging.debug(fn_name + "Process all the tasks in " + str(tasklist_title))
-                        logservice.flush()
-                            
-                    # =====================================================
-                    #       Process all the tasks in this task list
-                    # =====================================================
-                    tasklist_dict, num_tasks = self._get_tasks_in_tasklist(tasklist_title, tasklist_id, 
-                        include_hidden, include_completed, include_deleted)
-                    # Track number of tasks per tasklist
-                    tasks_per_list.append(num_tasks)
-                    
-                    total_num_tasks = total_num_tasks + num_tasks
-                    self.process_tasks_job.total_progress = total_num_tasks
-                    self.process_tasks_job.tasklist_progress = 0 # Because total_progress now includes num_tasks for current tasklist
-                    self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
-                    self.process_tasks_job.message = ''
-                    self._log_progress("Processed tasklist")
-                    self.process_tasks_job.put()
-                    
-                    # if self.is_test_user:
-                        # logging.debug(fn_name + "Adding %d tasks to tasklist" % len(tasklist_dict[u'tasks']))
-                        
-                    # Add the data for this tasklist (including all the tasks) into the collection of tasklists
-                    tasklists.append(tasklist_dict)
+                    tasklists_to_fetch.append(tasklist_data)
               
                 # Check if there is another page of tasklists to be retrieved
                 if tasklists_data.has_key('nextPageToken'):
                     # There is another page of tasklists to be retrieved for this user, 
                     # which we'll retrieve next time around the while loop.
                     # This happens if there is more than 1 page of tasklists.
-                    # It seems that each page contains 20 tasklists.
+                    # Each page contains up to TASKS_API_MAX_RESULTS tasklists (20 if maxResults is not set).
                     more_tasklists_data_to_retrieve = True # Go around while loop again
                     next_tasklists_page_token = tasklists_data['nextPageToken']
                     # if self.is_test_user:
@@ -471,47 +679,46 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                   
             # *** end while more_tasks_data_to_retrieve ***
             
-            # ------------------------------------------------------
-            #   Store the data, so we can return it to the user
-            # ------------------------------------------------------
-              
-
-            #   tasklists is a list of tasklist structures
-            #
-            #   structure of tasklist
-            #   { 
-            #       "title" : tasklist.title,        # Name of this tasklist
-            #       "tasks"  : [ task ]              # List of task items in this tasklist
-            #   }
-            #
-            #   structure of task
-            #   {
-            #       "title" : title, # Free text
-            #       "status" : status, # "completed" | "needsAction"
-            #       "id" : id, # Used when determining parent-child relationships
-            #       "parent" : parent, # OPT: ID of the parent of this task (only if this is a sub-task)
-            #       "notes" : notes, # OPT: Free text
-            #       "due" : due, # OPT: Date due, e.g. 2012-01-30T00:00:00.000Z NOTE time = 0
-            #       "updated" : updated, # Timestamp, e.g., 2012-01-26T07:47:18.000Z
-            #       "completed" : completed # Timestamp, e.g., 2012-01-27T10:38:56.000Z
-            #   }
-
+            total_num_tasklists = len(tasklists_to_fetch)
             
-            # Delete existing backup data records
-            tasklist_data_records = model.TasklistsData.gql("WHERE ANCESTOR IS :1",
-                                                        db.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, self.user_email))
-
-            num_records = tasklist_data_records.count()
-            logging.debug(fn_name + "Deleting " + str(num_records) + " old blobs")
-            logservice.flush()
+            # If possible, only retrieve the changes since the previous backup, and store them as a new layer
+            is_incremental = self._load_previous_snapshot(include_hidden, include_completed, include_deleted)
             
-            for tasklists_data_record in tasklist_data_records:
-                tasklists_data_record.delete()
-
+            # Delete existing backup data records. 
+            # This must be done before any of the new tasklists are stored (as each tasklist is retrieved)
+            num_stored_layers = self.process_tasks_job.num_stored_layers
+            if num_stored_layers is None:
+                # Don't know which layers were written, so delete every layer that could have been
+                num_stored_layers = settings.INCREMENTAL_BACKUP_MAX_LAYERS
+            if is_incremental:
+                # Only delete blobs left in this job's layer (e.g., by a previous attempt at this job). 
+                # The previous layers are part of this job's backup.
+                layer = len(self.process_tasks_job.previous_layers)
+                num_records, query_duration, delete_duration = shared.delete_tasklists_data(self.user_email, layer)
+                self.process_tasks_job.num_stored_layers = max(num_stored_layers, layer + 1)
+            else:
+                layer = 0
+                self.process_tasks_job.previous_layers = {}
+                # The snapshot state must be deleted before the data that it describes, so that if this job
+                # fails (and is restarted), the next attempt doesn't use the snapshot for the deleted data
+                self._delete_snapshot_state()
+                num_records, query_duration, delete_duration = shared.delete_all_tasklists_data(
+                    self.user_email, num_stored_layers)
+                self.process_tasks_job.num_stored_layers = 1
+            # The layer must be recorded before any blobs are written to it, so that the next full backup 
+            # deletes them, even if this job fails
+            self._put_job()
+            logging.debug("%sDeleted %d old blobs; keys query took %.3f seconds, delete took %.3f seconds", 
+                fn_name, num_records, query_duration, delete_duration)
             
-            # logging.debug(fn_name + "Pickling tasks data ...")
-            pickled_tasklists = pickle.dumps(tasklists)
+            # Files exported from the previous backup must not be returned for this backup
+            num_cached_exports = shared.delete_cached_exports(self.user_email)
+            if num_cached_exports:
+                logging.debug("%sDeleted %d cached exports of the previous backup", fn_name, num_cached_exports)
+            logservice.flush()
+
             
+            aes_ctr_cipher = None
             if self.process_tasks_job.public_key_b64:
                 try:
                     # Create a random AES encryption key
@@ -532,56 +739,80 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     logging.exception("%sError creating or encrypting AES key", fn_name)
                     self.process_tasks_job.status = constants.ExportJobStatus.ERROR
                     self.process_tasks_job.error_message = "Error creating or encrypting AES key"
-                    self.process_tasks_job.put()
+                    self._put_job()
                     shared.send_email_to_support("WORKER: Error creating or encrypting AES key",
                         shared.get_exception_msg(ex),
                         job_created_timestamp=self.process_tasks_job.job_created_timestamp)
                     logging.debug(fn_name + "<End> (Error creating or encrypting AES key)")
                     return
-                    
-                # Encrypt the data
-                try:
-                    # Encrypt the pickled tasks
-                    logging.debug("%sEncrypting tasks", fn_name)
-                    pickled_tasklists = aes_ctr_cipher.encrypt(pickled_tasklists)
-                    # Store the encrypted AES key in the job record
-                    self.process_tasks_job.encrypted_aes_key_b64 = base64.b64encode(encrypted_aes_key)
-                except Exception as ex: # pylint: disable=broad-except
-                    # TODO: Handle encryption failure
-                    logging.exception("%sError creating or encrypting AES key", fn_name)
-                    self.process_tasks_job.status = constants.ExportJobStatus.ERROR
-                    self.process_tasks_job.error_message = "Error encrypting tasks"
-                    self.process_tasks_job.put()
-                    shared.send_email_to_support("WORKER: Error encrypting tasks",
-                        shared.get_exception_msg(ex),
-                        job_created_timestamp=self.process_tasks_job.job_created_timestamp)
-                    logging.debug(fn_name + "<End> (Error encrypting tasks)")
-                    return
             else:
                 logging.error("%sUnable to encrypt tasks; No public_key_b64", fn_name)
                 
-            # logging.debug(fn_name + "Pickled data size = " + str(len(pickled_tasklists)))
-            data_len = len(pickled_tasklists)
+            # Each tasklist is pickled, encrypted and stored as soon as it (and all the tasklists before it) 
+            # have been retrieved, so that we don't need to hold the entire backup in memory.
+            self._tasklists_writer = shared.TasklistsDataWriter(self.user_email, aes_ctr_cipher, 
+                settings.BACKUP_DATA_COMPRESSION, layer)
+            self._next_tasklist_idx_to_write = 0
+            self._tasks_order_stats = shared.new_tasks_order_stats()
             
-            # Multiply by 1.0 float value so that we can use ceiling to find number of Blobs required
-            num_of_blobs = int(math.ceil(data_len * 1.0 / constants.MAX_BLOB_SIZE))
-            logging.debug(fn_name + "Calculated " + str(num_of_blobs) + " blobs required to store " + 
-                str(data_len) + " bytes")
-            logservice.flush()
+            # Any changes made after this time (allowing for clock differences) will be retrieved by
+            # the next incremental backup
+            fetch_start_time = datetime.datetime.now()
+            
+            # -------------------------------------------------
+            # Retrieve all the tasks in each of the tasklists
+            # -------------------------------------------------
+            # tasks_per_list is the number of tasks in each tasklist, in the same order as tasklists_to_fetch
+            tasks_per_list = self._get_tasks_in_tasklists(tasklists_to_fetch, 
+                include_hidden, include_completed, include_deleted)
+            total_num_tasks = sum(tasks_per_list)
+            
+            # ------------------------------------------------------
+            #   Store the data, so we can return it to the user
+            # ------------------------------------------------------
+              
+
+            #   The stored data is a sequence of tasklist structures
+            #
+            #   structure of tasklist
+            #   { 
+            #       "title" : tasklist.title,        # Name of this tasklist
+            #       "tasks"  : [ task ]              # List of task items in this tasklist
+            #   }
+            #
+            #   structure of task
+            #   {
+            #       "title" : title, # Free text
+            #       "status" : status, # "completed" | "needsAction"
+            #       "id" : id, # Used when determining parent-child relationships
+            #       "parent" : parent, # OPT: ID of the parent of this task (only if this is a sub-task)
+            #       "notes" : notes, # OPT: Free text
+            #       "due" : due, # OPT: Date due, e.g. 2012-01-30T00:00:00.000Z NOTE time = 0
+            #       "updated" : updated, # Timestamp, e.g., 2012-01-26T07:47:18.000Z
+            #       "completed" : completed # Timestamp, e.g., 2012-01-27T10:38:56.000Z
+            #   }
+
             
             try:
-                for i in range(num_of_blobs):
-                    # Write backup data records
-                    tasklist_rec = model.TasklistsData(db.Key.from_path(settings.DB_KEY_TASKS_BACKUP_DATA, self.user_email))
-                    slice_start = int(i*constants.MAX_BLOB_SIZE)
-                    slice_end = int((i+1)*constants.MAX_BLOB_SIZE)
-                    # logging.debug(fn_name + "Creating part " + str(i+1) + " of " + str(num_of_blobs) + 
-                        # " using slice " + str(slice_start) + " to " + str(slice_end))
-                    
-                    pkl_part = pickled_tasklists[slice_start : slice_end]
-                    tasklist_rec.pickled_tasks_data = pkl_part
-                    tasklist_rec.idx = i
-                    tasklist_rec.put()
+                # Store the final (partial) blob
+                self._tasklists_writer.close()
+                logging.debug("%sStored %d tasklists (%d bytes, compressed to %d bytes using '%s') in %d blobs; " +
+                    "compressing took %.3f seconds, encrypting took %.3f seconds, waiting for puts took %.3f seconds", 
+                    fn_name, 
+                    self._tasklists_writer.num_tasklists, self._tasklists_writer.num_uncompressed_bytes, 
+                    self._tasklists_writer.num_bytes, self._tasklists_writer.compression,
+                    self._tasklists_writer.num_blobs, self._tasklists_writer.compress_duration,
+                    self._tasklists_writer.encrypt_duration, self._tasklists_writer.put_wait_duration)
+                logservice.flush()
+                
+                if settings.WORKER_PRECOMPUTE_TASKS_ORDER:
+                    shared.log_tasks_order_stats(self._tasks_order_stats)
+                
+                if aes_ctr_cipher:
+                    # Store the encrypted AES key in the job record
+                    self.process_tasks_job.encrypted_aes_key_b64 = base64.b64encode(encrypted_aes_key)
+                self.process_tasks_job.data_format = self._tasklists_writer.data_format
+                self.process_tasks_job.data_compression = self._tasklists_writer.compression
                     
                 # logging.debug(fn_name + "Marking backup job complete")
                 end_time = datetime.datetime.now()
@@ -589,8 +820,19 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 proc_time_str = str(process_time.seconds) + "." + str(process_time.microseconds)[:3] + " seconds"
                 
                 # Mark backup completed
-                summary_msg = "Retrieved %d tasks from %d tasklists" % (total_num_tasks, total_num_tasklists)
+                if is_incremental:
+                    # The number of tasks is an estimate, which is corrected when the frontend merges the layers
+                    summary_msg = "Retrieved %d changed tasks from %d tasklists" % (
+                        self._num_changed_tasks, total_num_tasklists)
+                else:
+                    summary_msg = "Retrieved %d tasks from %d tasklists" % (total_num_tasks, total_num_tasklists)
                 breakdown_msg = "Tasks per list: " + str(tasks_per_list)
+                if is_incremental:
+                    breakdown_msg += "\n    Incremental backup layer " + str(layer) + \
+                        "; last full backup was started at " + \
+                        str(self._prev_full_backup_timestamp) + \
+                        "\n    " + str(len(self._reused_tasklist_idxs)) + \
+                        " unchanged tasklists: " + str(self._reused_tasklist_idxs)
                 
                 self.process_tasks_job.status = constants.ExportJobStatus.EXPORT_COMPLETED
                 self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
@@ -599,7 +841,10 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     start_time.strftime("%H:%M UTC, %a %d %b %Y")
                 logging.info(fn_name + "COMPLETED: " + summary_msg + " for " + self.user_email + " in " + proc_time_str)
                 logservice.flush()
-                self.process_tasks_job.put()
+                self._put_job()
+                
+                self._save_snapshot_state(tasklists_to_fetch, tasks_per_list, fetch_start_time, is_incremental,
+                    include_hidden, include_completed, include_deleted)
                 
                 try:
                     end_time = datetime.datetime.now()
@@ -643,7 +888,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     shared.get_exception_msg(rtl_ex)
                 self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
                 self._log_progress("apiproxy_errors.RequestTooLargeError")
-                self.process_tasks_job.put()
+                self._put_job()
             
             except Exception as ex: # pylint: disable=broad-except
                 logging.exception(fn_name + "Error putting results in DB")
@@ -654,7 +899,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                     shared.get_exception_msg(ex)
                 self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
                 self._log_progress("Exception")
-                self.process_tasks_job.put()
+                self._put_job()
 
         except urlfetch_errors.DeadlineExceededError, url_dee:
             logging.exception(fn_name + "urlfetch_errors.DeadlineExceededError:")
@@ -665,7 +910,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 shared.get_exception_msg(url_dee)
             self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
             self._log_progress("urlfetch_errors.DeadlineExceededError")
-            self.process_tasks_job.put()
+            self._put_job()
       
         except apiproxy_errors.DeadlineExceededError as api_dee:
             logging.exception(fn_name + "apiproxy_errors.DeadlineExceededError:")
@@ -676,7 +921,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 shared.get_exception_msg(api_dee)
             self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
             self._log_progress("apiproxy_errors.DeadlineExceededError")
-            self.process_tasks_job.put()
+            self._put_job()
         
         except DeadlineExceededError as dee:
             logging.exception(fn_name + "DeadlineExceededError:")
@@ -687,7 +932,7 @@ class ProcessTasksWorker(webapp2.RequestHandler):
                 shared.get_exception_msg(dee)
             self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
             self._log_progress("DeadlineExceededError")
-            self.process_tasks_job.put()
+            self._put_job()
         
         except Exception as ex: # pylint: disable=broad-except
             logging.exception(fn_name + "Exception:") 
@@ -697,16 +942,709 @@ class ProcessTasksWorker(webapp2.RequestHandler):
             self.process_tasks_job.error_message = "System error: " + shared.get_exception_msg(ex)
             self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
             self._log_progress("Exception")
-            self.process_tasks_job.put()
+            self._put_job()
         
 
         logging.debug(fn_name + "<End>")
         logservice.flush()
             
     
+    def _load_previous_snapshot(self, include_hidden, include_completed, include_deleted): # pylint: disable=too-many-return-statements
+        """ Load the state of the user's previous backup, so that only changes need to be retrieved.
+        
+            The frontend sets the job's previous_layers if the previous backup completed, and this job's backup
+            can be stored as a new layer on top of it. The snapshot state is only used if it was saved by the
+            job which stored the last of those layers.
+            
+            Sets self._tasklist_watermarks, self._previous_tasklist_versions and self._previous_tasklist_num_tasks
+            
+            Returns True if an incremental backup can be performed, or False if a full backup must be performed
+        """
+        
+        fn_name = "_load_previous_snapshot(): "
+        
+        self._tasklist_watermarks = {}
+        self._previous_tasklist_versions = {}
+        self._previous_tasklist_num_tasks = {}
+        self._prev_full_backup_timestamp = None
+        self._num_changed_tasks = 0
+        
+        if not settings.INCREMENTAL_BACKUPS_ENABLED:
+            return False
+            
+        previous_layers = self.process_tasks_job.previous_layers or {}
+        if not previous_layers:
+            logging.debug("%sNo previous backup layers, so performing full backup", fn_name)
+            logservice.flush()
+            return False
+            
+        if not self.process_tasks_job.public_key_b64:
+            # The layers can only be merged if every layer is encrypted with the same RSA key
+            logging.debug("%sNo public key, so performing full backup", fn_name)
+            logservice.flush()
+            return False
+            
+        snapshot_state = model.TasklistsSnapshotState.get_by_key_name(self.user_email)
+        if not snapshot_state:
+            logging.debug("%sNo snapshot state for previous backup, so performing full backup", fn_name)
+            logservice.flush()
+            return False
+            
+        # Check that the snapshot state describes the stored layers that this job's layer will be added to.
+        # The stored backup data may not match the snapshot state (e.g., if a later backup failed after 
+        # deleting the data, or if the snapshot state was saved by a different chain of layers)
+        last_layer_start_timestamp = previous_layers[len(previous_layers) - 1]['job_start_timestamp']
+        if (snapshot_state.job_start_timestamp != self.process_tasks_job.previous_job_start_timestamp or
+                snapshot_state.job_start_timestamp != last_layer_start_timestamp or
+                snapshot_state.num_layers != len(previous_layers)):
+            logging.info("%sSnapshot state is for job started at %s with %d layers, " +
+                "but previous job was started at %s with %d layers, so performing full backup",
+                fn_name, snapshot_state.job_start_timestamp, snapshot_state.num_layers, 
+                self.process_tasks_job.previous_job_start_timestamp, len(previous_layers))
+            logservice.flush()
+            return False
+            
+        if (snapshot_state.include_completed != include_completed or
+                snapshot_state.include_deleted != include_deleted or
+                snapshot_state.include_hidden != include_hidden):
+            logging.debug("%sPrevious backup used different options, so performing full backup", fn_name)
+            logservice.flush()
+            return False
+            
+        if not snapshot_state.full_backup_timestamp:
+            return False
+        hrs_since_full_backup = (datetime.datetime.now() - snapshot_state.full_backup_timestamp).total_seconds() / 3600.0
+        if hrs_since_full_backup > settings.INCREMENTAL_BACKUP_MAX_AGE_HOURS:
+            logging.info("%sLast full backup was %.1f hours ago, so performing full backup", 
+                fn_name, hrs_since_full_backup)
+            logservice.flush()
+            return False
+            
+        self._tasklist_watermarks = snapshot_state.tasklist_watermarks or {}
+        self._previous_tasklist_versions = snapshot_state.tasklist_versions or {}
+        self._previous_tasklist_num_tasks = snapshot_state.tasklist_num_tasks or {}
+        self._prev_full_backup_timestamp = snapshot_state.full_backup_timestamp
+        
+        logging.info("%sPerforming incremental backup as layer %d, using %d tasklists from backup started at %s",
+            fn_name, len(previous_layers), len(self._tasklist_watermarks), snapshot_state.job_start_timestamp)
+        logservice.flush()
+        return True
+        
+        
+    def _delete_snapshot_state(self):
+        """ Delete the user's snapshot state, before the backup data that it describes is deleted """
+        
+        fn_name = "_delete_snapshot_state(): "
+        
+        if not settings.INCREMENTAL_BACKUPS_ENABLED:
+            return
+            
+        try:
+            db.delete(db.Key.from_path(model.TasklistsSnapshotState.kind(), self.user_email))
+        except Exception: # pylint: disable=broad-except
+            # If the snapshot state can't be deleted, the backup data must not be deleted
+            logging.exception("%sError deleting snapshot state", fn_name)
+            logservice.flush()
+            raise
+            
+            
+    def _tasklist_is_unchanged(self, tasklist_data):
+        """ Returns True if the tasklist hasn't changed since the previous backup.
+        
+            The 'updated' timestamp and etag of the tasklist resource (as returned by tasklists.list()) 
+            are compared with the values stored when the previous backup was created.
+            
+            Always returns False when performing a full backup.
+        """
+        
+        if not settings.SKIP_UNCHANGED_TASKLISTS:
+            return False
+            
+        tasklist_id = tasklist_data[u'id']
+        if tasklist_id not in self._tasklist_watermarks:
+            return False
+            
+        prev_version = self._previous_tasklist_versions.get(tasklist_id)
+        if not prev_version:
+            return False
+        
+        return prev_version == self._get_tasklist_version(tasklist_data)
+        
+        
+    @staticmethod
+    def _get_tasklist_version(tasklist_data):
+        """ Returns a tuple of (updated, etag) which changes whenever the tasklist is changed """
+        return (tasklist_data.get(u'updated'), tasklist_data.get(u'etag'))
+        
+        
+    def _save_snapshot_state(self, tasklists_to_fetch, tasks_per_list, fetch_start_time, is_incremental, # pylint: disable=too-many-arguments
+                             include_hidden, include_completed, include_deleted):
+        """ Save the details needed for the next backup to be an incremental backup """
+        
+        fn_name = "_save_snapshot_state(): "
+        
+        if not settings.INCREMENTAL_BACKUPS_ENABLED:
+            return
+            
+        try:
+            watermark = (fetch_start_time - 
+                datetime.timedelta(seconds=settings.INCREMENTAL_BACKUP_WATERMARK_MARGIN)).strftime(
+                    "%Y-%m-%dT%H:%M:%S.000Z")
+            
+            snapshot_state = model.TasklistsSnapshotState(key_name=self.user_email)
+            snapshot_state.job_start_timestamp = self.process_tasks_job.job_start_timestamp
+            if is_incremental:
+                snapshot_state.full_backup_timestamp = self._prev_full_backup_timestamp
+            else:
+                snapshot_state.full_backup_timestamp = self.process_tasks_job.job_start_timestamp
+            snapshot_state.include_completed = include_completed
+            snapshot_state.include_deleted = include_deleted
+            snapshot_state.include_hidden = include_hidden
+            snapshot_state.data_format = self.process_tasks_job.data_format
+            snapshot_state.data_compression = self.process_tasks_job.data_compression
+            snapshot_state.tasklist_watermarks = dict(
+                (tasklist_data[u'id'], watermark) for tasklist_data in tasklists_to_fetch)
+            snapshot_state.tasklist_versions = dict(
+                (tasklist_data[u'id'], self._get_tasklist_version(tasklist_data)) for tasklist_data in tasklists_to_fetch)
+            snapshot_state.tasklist_num_tasks = dict(
+                (tasklist_data[u'id'], num_tasks) for tasklist_data, num_tasks in zip(tasklists_to_fetch, tasks_per_list))
+            snapshot_state.num_layers = len(self.process_tasks_job.previous_layers or {}) + 1
+            snapshot_state.put()
+            
+        except Exception: # pylint: disable=broad-except
+            # Not critical; the next backup will be a full backup
+            logging.exception("%sError saving snapshot state", fn_name)
+            logservice.flush()
+            
+            
+    def _get_tasks_in_tasklists(self, tasklists_to_fetch, include_hidden, include_completed, include_deleted):
+        """ Returns all the tasks in all the tasklists in tasklists_to_fetch
+        
+            When performing an incremental backup, tasklists which haven't changed since the previous backup
+            are not retrieved; they are stored as constants.TASKLIST_UNCHANGED, so that the frontend uses
+            the tasks from the previous layers. Only the changed tasks are retrieved for the other tasklists 
+            which were in the previous backup (see _finish_tasklist).
+            
+            If settings.WORKER_USE_BATCH_REQUESTS is True, the pages of tasks are retrieved using batch requests,
+            which are sent one at a time (settings.WORKER_TASKLIST_FETCH_CONCURRENCY is not used).
+            Otherwise, up to settings.WORKER_TASKLIST_FETCH_CONCURRENCY tasklists are retrieved in parallel.
+            
+            arguments:
+              tasklists_to_fetch       -- List of tasklist resources, as returned by tasklists.list()
+              include_hidden           -- If true, include hidden tasks in the backup
+              include_completed        -- If true, include completed tasks in the backup
+              include_deleted          -- If true, include deleted tasks in the backup
+              
+            Each tasklist is written to self._tasklists_writer (in the same order as tasklists_to_fetch)
+            as soon as it, and all the tasklists before it, have been retrieved.
+              
+            returns a list of the number of tasks in each tasklist, in the same order as tasklists_to_fetch
+        """
+        fn_name = "_get_tasks_in_tasklists(): "
+        
+        # Results are stored by position, so that the order of the tasklists in the backup
+        # matches the order returned by the server, regardless of which thread finishes first.
+        results = [None] * len(tasklists_to_fetch)
+        
+        # List of (idx, tasklist_data) for the tasklists that need to be retrieved from the server
+        tasklists_to_retrieve = []
+        
+        reused_tasklist_idxs = []
+        for idx, tasklist_data in enumerate(tasklists_to_fetch):
+            if self._tasklist_is_unchanged(tasklist_data):
+                # The frontend uses the tasks from the previous layers of the backup
+                tasklist_id = tasklist_data[u'id']
+                tasklist_dict = {
+                    u'title' : tasklist_data[u'title'],
+                    u'id' : tasklist_id,
+                    constants.TASKLIST_LAYER_CONTENT : constants.TASKLIST_UNCHANGED,
+                }
+                num_tasks = self._previous_tasklist_num_tasks.get(tasklist_id, 0)
+                self._store_result(idx, tasklist_dict, num_tasks, results)
+                self._tasklist_fetch_completed(tasklist_id, num_tasks)
+                reused_tasklist_idxs.append(idx)
+            else:
+                tasklists_to_retrieve.append((idx, tasklist_data))
+                
+        if reused_tasklist_idxs:
+            # Record which tasklists were unchanged, by position, so that we don't log any personal data
+            logging.info("%s%d tasklists are unchanged since previous backup: %s", 
+                fn_name, len(reused_tasklist_idxs), reused_tasklist_idxs)
+            if self.is_test_user:
+                logging.debug("%sUnchanged tasklists: %s", fn_name, 
+                    [tasklists_to_fetch[idx][u'title'] for idx in reused_tasklist_idxs])
+            logservice.flush()
+        self._reused_tasklist_idxs = reused_tasklist_idxs
+        
+        num_tasklists = len(tasklists_to_retrieve)
+        num_threads = min(settings.WORKER_TASKLIST_FETCH_CONCURRENCY, num_tasklists)
+        
+        if settings.WORKER_USE_BATCH_REQUESTS and num_tasklists > 1:
+            # -----------------------------------------------------
+            #   Retrieve pages from many tasklists in each request
+            # -----------------------------------------------------
+            self._get_tasks_in_tasklists_using_batches(tasklists_to_retrieve, results,
+                include_hidden, include_completed, include_deleted)
+            
+        elif num_threads <= 1:
+            # -----------------------------------------------------
+            #   Retrieve each tasklist, one after another
+            # -----------------------------------------------------
+            for idx, tasklist_data in tasklists_to_retrieve:
+                self._fetch_tasklist_into_results(idx, tasklist_data, results,
+                    include_hidden, include_completed, include_deleted)
+        
+        else:
+            # -----------------------------------------------------
+            #   Retrieve up to num_threads tasklists in parallel
+            # -----------------------------------------------------
+            logging.debug("%sRetrieving %d tasklists using %d threads", fn_name, num_tasklists, num_threads)
+            logservice.flush()
+            
+            work_queue = Queue.Queue()
+            for idx, tasklist_data in tasklists_to_retrieve:
+                work_queue.put((idx, tasklist_data))
+                
+            # If any thread fails, it stores sys.exc_info() here and sets stop_event, 
+            # so that the other threads don't start retrieving any more tasklists
+            thread_errors = []
+            stop_event = threading.Event()
+            
+            threads = []
+            for thread_num in range(num_threads):
+                thread = threading.Thread(target=self._tasklist_fetch_thread,
+                    name="tasklist-fetch-%d" % thread_num,
+                    args=(work_queue, results, thread_errors, stop_event,
+                          include_hidden, include_completed, include_deleted))
+                thread.start()
+                threads.append(thread)
+                
+            for thread in threads:
+                thread.join()
+                
+            if thread_errors:
+                # Re-raise the first error in this (the request) thread, with the original traceback,
+                # so that it is handled by the same exception handlers as the sequential fetch
+                exc_type, exc_value, exc_traceback = thread_errors[0]
+                logging.warning("%s%d of %d threads failed. Re-raising first error: %s",
+                    fn_name, len(thread_errors), num_threads, shared.get_exception_msg(exc_value))
+                logservice.flush()
+                raise exc_type, exc_value, exc_traceback
+        
+        if self._next_tasklist_idx_to_write != len(results):
+            # Should never happen, because every tasklist is either stored or an exception is raised
+            raise Exception("Only %d of %d tasklists were written" % 
+                (self._next_tasklist_idx_to_write, len(results)))
+        
+        tasks_per_list = [num_tasks for _, num_tasks in results]
+        return tasks_per_list
+        
+        
+    def _get_tasks_in_tasklists_using_batches(self, tasklists_to_retrieve, results, # pylint: disable=too-many-arguments,too-many-locals
+                                              include_hidden, include_completed, include_deleted):
+        """ Retrieve all the tasks in all the tasklists, using batch requests.
+        
+            The first page of every tasklist is requested in the first batch (or first few batches, 
+            if there are more than settings.WORKER_MAX_REQUESTS_PER_BATCH tasklists). Tasklists which 
+            have more pages are requested in subsequent batches, using the nextPageToken from the
+            previous page, until all the pages of all the tasklists have been retrieved.
+            
+            tasklists_to_retrieve is a list of (idx, tasklist_data), where tasklist_data is a tasklist resource 
+            as returned by tasklists.list(). The tasklist dictionary and number of tasks for each tasklist 
+            are stored in results[idx]
+        """
+        fn_name = "_get_tasks_in_tasklists_using_batches(): "
+        
+        # Details of each tasklist which still has at least one page of tasks to be retrieved, indexed
+        # by the position of the tasklist in results. Each tasklist has its own retry state,
+        # so that one failing tasklist doesn't use up the retries for the other tasklists.
+        pending = {}
+        for idx, tasklist_data in tasklists_to_retrieve:
+            pending[idx] = {
+                'tasklist_dict' : {u'title' : tasklist_data[u'title'], u'id' : tasklist_data[u'id']},
+                'num_tasks' : 0,
+                'page_token' : None,
+                'updated_min' : self._tasklist_watermarks.get(tasklist_data[u'id']),
+                'retry' : self._retry_policy.new_state()
+            }
+            
+        # Each request in a batch counts towards the rate limit, so a batch can't be larger than the limit
+        max_requests_per_batch = settings.WORKER_MAX_REQUESTS_PER_BATCH
+        if settings.TASKS_API_MAX_REQUESTS_PER_SECOND > 0:
+            max_requests_per_batch = max(1, min(max_requests_per_batch, int(settings.TASKS_API_MAX_REQUESTS_PER_SECOND)))
+            
+        batch_num = 0
+        while pending:
+            pending_idxs = sorted(pending.keys())
+            for start_idx in range(0, len(pending_idxs), max_requests_per_batch):
+                batch_idxs = pending_idxs[start_idx : start_idx + max_requests_per_batch]
+                batch_num = batch_num + 1
+                logging.debug("%sBatch %d: Requesting a page of tasks from each of %d tasklists",
+                    fn_name, batch_num, len(batch_idxs))
+                logservice.flush()
+                
+                responses = self._execute_batch_of_tasks_list_requests(batch_idxs, pending, 
+                    include_hidden, include_completed, include_deleted)
+                    
+                failed_idxs = []
+                for idx in batch_idxs:
+                    state = pending[idx]
+                    tasks_data, http_err = responses[idx]
+                    
+                    if http_err is not None:
+                        # The request for this tasklist failed, but the rest of the batch may have succeeded,
+                        # so only this tasklist's page is requested again in the next batch.
+                        failed_idxs.append(idx)
+                        continue
+                    
+                    state['num_tasks'] = state['num_tasks'] + self._add_page_of_tasks(state['tasklist_dict'], tasks_data)
+                    tasklist_id = state['tasklist_dict'][u'id']
+                    
+                    if tasks_data.has_key('nextPageToken'):
+                        # There is another page of tasks to be retrieved for this tasklist, 
+                        # which we'll retrieve in the next batch
+                        state['page_token'] = tasks_data['nextPageToken']
+                        state['retry'] = self._retry_policy.new_state()
+                        self._tasklist_fetch_progress(tasklist_id, state['num_tasks'])
+                    else:
+                        # This is the last (or only) page of results for this tasklist
+                        del pending[idx]
+                        self._finish_tasklist(idx, state['tasklist_dict'], state['num_tasks'], results)
+                        
+                if failed_idxs:
+                    # Handle the error for each failed tasklist. This logs the error, and raises the error 
+                    # if that tasklist has no retries left. All the failed tasklists will be retried in 
+                    # the same (next) batch, so we only wait once, for the longest of their retry delays.
+                    logging.info("%sBatch %d: Requests for %d of %d tasklists failed",
+                        fn_name, batch_num, len(failed_idxs), len(batch_idxs))
+                    logservice.flush()
+                    retry_delay = 0
+                    for failed_idx in failed_idxs:
+                        retry_delay = max(retry_delay, 
+                            self._handle_http_error(fn_name, responses[failed_idx][1], pending[failed_idx]['retry'],
+                                "Error retrieving list of tasks", sleep=False))
+                    self._sleep_before_retry(fn_name, retry_delay)
+                        
+        logging.debug("%sRetrieved all pages from %d tasklists using %d batch requests",
+            fn_name, len(tasklists_to_retrieve), batch_num)
+        logservice.flush()
+        
+        
+    def _execute_batch_of_tasks_list_requests(self, batch_idxs, pending, # pylint: disable=too-many-arguments
+                                              include_hidden, include_completed, include_deleted):
+        """ Send a single batch request containing a tasks.list() request for each of the tasklists in batch_idxs
+        
+            returns a dictionary of {idx : (tasks_data, http_err)} 
+                where tasks_data is the page of tasks returned for that tasklist (None if http_err is set),
+                and http_err is the apiclient HttpError for that request (None if the request succeeded)
+        """
+        fn_name = "_execute_batch_of_tasks_list_requests(): "
+        
+        responses = {}
+        
+        def _store_response(request_id, response, exception):
+            responses[int(request_id)] = (response, exception)
+            
+        retry = self._retry_policy.new_state()
+        while True:
+            responses.clear()
+            try:
+                batch = BatchHttpRequest(callback=_store_response, batch_uri=settings.TASKS_API_BATCH_URI)
+                for idx in batch_idxs:
+                    state = pending[idx]
+                    batch.add(self._tasks_list_request(state['tasklist_dict'][u'id'], state['page_token'],
+                        include_hidden, include_completed, include_deleted, state['updated_min']), 
+                        request_id=str(idx))
+                batch_start_time = time.time()
+                self._execute_request(batch, num_requests=len(batch_idxs))
+                logging.debug("%sRetrieved %d pages of tasks in %.3f seconds",
+                    fn_name, len(batch_idxs), time.time() - batch_start_time)
+                    
+                # Succeeded, so break out of the retry loop
+                break
+                
+            except apiclient_errors.HttpError as http_err:
+                # The batch request as a whole failed
+                self._handle_http_error(fn_name, http_err, retry, "Error retrieving batch of lists of tasks")
+                
+            except Exception as ex: # pylint: disable=broad-except
+                self._handle_general_error(fn_name, ex, retry, "Error retrieving batch of lists of tasks")
+                
+        return responses
+        
+        
+    def _tasklist_fetch_thread(self, work_queue, results, thread_errors, stop_event, # pylint: disable=too-many-arguments
+                               include_hidden, include_completed, include_deleted):
+        """ Retrieve tasklists from work_queue until the queue is empty, or another thread has failed """
+        
+        fn_name = "_tasklist_fetch_thread(): "
+        
+        this_thread_failed = False
+        try:
+            # httplib2.Http is not thread safe, so each thread uses its own authorised Http object.
+            # The credentials object is shared, so a token refresh in any thread is used by all threads.
+            self._thread_local.http = _http_pool.acquire(self.credentials)
+            
+            while not stop_event.is_set():
+                try:
+                    idx, tasklist_data = work_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                    
+                self._fetch_tasklist_into_results(idx, tasklist_data, results,
+                    include_hidden, include_completed, include_deleted)
+                    
+        except Exception as ex: # pylint: disable=broad-except
+            logging.warning("%s%s failed: %s", fn_name, threading.current_thread().name, 
+                shared.get_exception_msg(ex))
+            logservice.flush()
+            this_thread_failed = True
+            thread_errors.append(sys.exc_info())
+            stop_event.set()
+            
+        finally:
+            # Don't reuse the connections if this thread failed. The connections of threads which were
+            # stopped because another thread failed are still usable.
+            _http_pool.release(getattr(self._thread_local, 'http', None), discard=this_thread_failed)
+            self._thread_local.http = None
+        
+        
+    def _fetch_tasklist_into_results(self, idx, tasklist_data, results, # pylint: disable=too-many-arguments
+                                     include_hidden, include_completed, include_deleted):
+        """ Retrieve all the tasks in a single tasklist, store in results[idx], and update progress """
+        
+        fn_name = "_fetch_tasklist_into_results(): "
+        
+        tasklist_title = tasklist_data[u'title']
+        tasklist_id = tasklist_data[u'id']
+      
+        if self.is_test_user and settings.DUMP_DATA:
+            logging.debug(fn_name + "Process all the tasks in " + str(tasklist_title))
+            logservice.flush()
+                
+        # =====================================================
+        #       Process all the tasks in this task list
+        # =====================================================
+        tasklist_dict, num_tasks = self._get_tasks_in_tasklist(tasklist_title, tasklist_id, 
+            include_hidden, include_completed, include_deleted, self._tasklist_watermarks.get(tasklist_id))
+        
+        self._finish_tasklist(idx, tasklist_dict, num_tasks, results)
+        
+        
+    def _finish_tasklist(self, idx, tasklist_dict, num_tasks, results):
+        """ Store a completely retrieved tasklist in results[idx], and update progress.
+        
+            If only the changes were retrieved for this tasklist (incremental backup), the tasklist is stored
+            as constants.TASKLIST_CHANGES_ONLY, so that the frontend merges the changes into the tasklist 
+            from the previous layers of the backup. The number of tasks is then an estimate, because a
+            changed task can't be told apart from a new task without the previous backup's tasks.
+        """
+        
+        tasklist_id = tasklist_dict[u'id']
+        
+        if tasklist_id in self._tasklist_watermarks:
+            tasklist_dict[constants.TASKLIST_LAYER_CONTENT] = constants.TASKLIST_CHANGES_ONLY
+            job = self.process_tasks_job
+            num_included = len([task for task in tasklist_dict.get(u'tasks', []) 
+                if shared.task_is_included(task, job.include_hidden, job.include_completed, job.include_deleted)])
+            with self._job_lock:
+                self._num_changed_tasks += num_tasks
+            # Assume that included tasks are new, and excluded tasks were removed
+            num_excluded = num_tasks - num_included
+            num_tasks = max(0, self._previous_tasklist_num_tasks.get(tasklist_id, 0) + num_included - num_excluded)
+            
+        self._store_result(idx, tasklist_dict, num_tasks, results)
+        
+        self._tasklist_fetch_completed(tasklist_id, num_tasks)
+        
+        
+    def _store_result(self, idx, tasklist_dict, num_tasks, results):
+        """ Store the tasklist in results[idx], then write all the tasklists which can now be written in order.
+        
+            Tasklists may be completed in any order (when retrieved in parallel), but must be written in the
+            same order as they were returned by the server. Once a tasklist has been written, only the 
+            number of tasks is kept in results, so that the tasklist can be released.
+            
+            If settings.WORKER_PRECOMPUTE_TASKS_ORDER is True, the tasks are put in hierarchy order first, 
+            so that the frontend doesn't need to do it for every export. Tasks which can't be reached from a 
+            root task are kept (after the ordered tasks), so that they are still available when the changes
+            in later incremental backup layers are merged. Tasklists which only contain changes (or no tasks)
+            are put in order by the frontend, after the layers have been merged.
+        """
+        
+        if (settings.WORKER_PRECOMPUTE_TASKS_ORDER and 
+                constants.TASKLIST_NUM_ORDERED_TASKS not in tasklist_dict and
+                constants.TASKLIST_LAYER_CONTENT not in tasklist_dict):
+            # Ordered outside _job_lock, so that other fetch threads aren't held up. The statistics for this
+            # tasklist are then added to the statistics shared by all the fetch threads.
+            stats = shared.new_tasks_order_stats()
+            shared.fix_tasklist_order(tasklist_dict, stats, keep_unreachable_tasks=True)
+            with self._job_lock:
+                shared.add_tasks_order_stats(self._tasks_order_stats, stats)
+                
+        with self._job_lock:
+            results[idx] = (tasklist_dict, num_tasks)
+            if not self._is_next_tasklist_ready_to_write(results):
+                # An earlier tasklist is still being retrieved; this tasklist will be written after that one
+                return
+            if not self._writer_lock.acquire(False):
+                # Another thread is writing tasklists, and it will also write this tasklist
+                return
+            
+        # This thread writes every tasklist which is ready, in order, until there are none left.
+        # _writer_lock is only released while holding _job_lock, so a tasklist which is stored while
+        # this thread is writing is always written, either by this thread or by the thread which stored it.
+        try:
+            while True:
+                with self._job_lock:
+                    tasklist_dicts_to_write = []
+                    while self._is_next_tasklist_ready_to_write(results):
+                        next_tasklist_dict, next_num_tasks = results[self._next_tasklist_idx_to_write]
+                        tasklist_dicts_to_write.append(next_tasklist_dict)
+                        results[self._next_tasklist_idx_to_write] = (None, next_num_tasks)
+                        self._next_tasklist_idx_to_write += 1
+                    if not tasklist_dicts_to_write:
+                        self._writer_lock.release()
+                        return
+                for next_tasklist_dict in tasklist_dicts_to_write:
+                    self._tasklists_writer.write_tasklist(next_tasklist_dict)
+        except: # pylint: disable=bare-except
+            # Let another thread write the remaining tasklists (although the job will normally fail)
+            self._writer_lock.release()
+            raise
+                    
+                    
+    def _is_next_tasklist_ready_to_write(self, results):
+        """ Returns True if the next tasklist to be written has been retrieved. Must be called with _job_lock held. """
+        return (self._next_tasklist_idx_to_write < len(results) and 
+            results[self._next_tasklist_idx_to_write] is not None)
+        
+        
+    def _execute_request(self, request, num_requests=1):
+        """ Execute an apiclient HttpRequest, using this thread's authorised Http object (if any) 
+        
+            Every Tasks API request is sent using this method, so that the rate of requests from all 
+            workers is limited by _tasks_api_rate_limiter. 
+            num_requests is the number of requests in a BatchHttpRequest, because each request in a
+            batch counts against the quota.
+            
+            Raises rate_limiter.RateLimitExceededError (without sending the request) if the request would 
+            have to wait too long. The caller's retry loop handles it as a rate limit error.
+        """
+        
+        self._refresh_access_token_if_expiring()
+        _tasks_api_rate_limiter.acquire(num_requests)
+        return request.execute(http=getattr(self._thread_local, 'http', None))
+        
+        
+    def _access_token_is_expiring(self):
+        """ Returns True if the access token expires within WORKER_ACCESS_TOKEN_REFRESH_MARGIN seconds """
+        
+        token_expiry = self.credentials.token_expiry
+        if not token_expiry:
+            # Token doesn't expire (or expiry is unknown), so rely on the refresh after a 401
+            return False
+        return (datetime.datetime.utcnow() + 
+            datetime.timedelta(seconds=settings.WORKER_ACCESS_TOKEN_REFRESH_MARGIN) >= token_expiry)
+        
+        
+    def _refresh_access_token_if_expiring(self):
+        """ Refresh the access token before it expires, so that requests don't fail with 401.
+        
+            Without this, the first request after the token expires fails with a 401, and then the 
+            credentials are refreshed and the request is retried (and sometimes the refresh fails with 
+            AccessTokenRefreshError, and the worker sleeps before retrying; see _handle_general_error).
+            
+            Only one thread refreshes the token; the other fetch threads wait for that refresh, and then 
+            use the new token, because all threads share the same credentials object.
+            The refreshed credentials are stored (and cached) by the credentials' StorageByKeyName.
+            
+            Raises AccessTokenRefreshError if the refresh fails, which is handled by the caller's 
+            retry loop in the same way as a failed refresh after a 401.
+        """
+        
+        fn_name = "_refresh_access_token_if_expiring(): "
+        
+        if not self.credentials or not self._access_token_is_expiring():
+            return
+            
+        with self._token_refresh_lock:
+            # Another thread may have refreshed the token while this thread was waiting for the lock
+            if not self._access_token_is_expiring():
+                return
+                
+            logging.info("%sRefreshing access token which expires at %s UTC", 
+                fn_name, self.credentials.token_expiry)
+            logservice.flush()
+            # The refresh request must not be sent using an authorised Http object, because that would 
+            # send the old token, and would try to refresh again if the refresh request failed with 401
+            http = _http_pool.acquire()
+            refreshed = False
+            try:
+                self.credentials.refresh(http)
+                refreshed = True
+            finally:
+                _http_pool.release(http, discard=not refreshed)
+            logging.debug("%sAccess token refreshed; new token expires at %s UTC", 
+                fn_name, self.credentials.token_expiry)
+        
+        
+    def _tasklist_fetch_progress(self, tasklist_id, num_tasks):
+        """ Record the number of tasks retrieved so far from a tasklist which is still being retrieved.
+        
+            If JOB_PROGRESS_MEMCACHE_ENABLED, the progress is stored in memcache for every page, 
+            and the job record is put at most once every JOB_PROGRESS_DATASTORE_INTERVAL seconds. 
+            Otherwise the job record is updated at most once every PROGRESS_UPDATE_INTERVAL seconds.
+            This prevents excessive DB access which could exceed quota.
+        """
+        fn_name = "_tasklist_fetch_progress(): "
+        
+        with self._job_lock:
+            self._tasks_in_progress[tasklist_id] = num_tasks
+            
+            interval_elapsed = ((datetime.datetime.now() - self.prev_progress_timestamp).seconds > 
+                settings.PROGRESS_UPDATE_INTERVAL)
+            
+            if interval_elapsed or settings.JOB_PROGRESS_MEMCACHE_ENABLED:
+                # tasklist_progress is the number of tasks retrieved so far from all the tasklists which 
+                # are currently being retrieved (total_progress only includes completed tasklists)
+                self.process_tasks_job.tasklist_progress = sum(self._tasks_in_progress.values())
+                self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
+                self.process_tasks_job.message = ''
+                # Progress is stored in memcache for every page, but the job is only put to the 
+                # datastore every JOB_PROGRESS_DATASTORE_INTERVAL seconds
+                self._put_job_progress()
+                
+            if interval_elapsed:
+                logging.debug("%sProcessed page of tasks. Updated job; status = '%s', tasklist progress = %d, total progress = %d",
+                    fn_name,
+                    self.process_tasks_job.status,
+                    self.process_tasks_job.tasklist_progress,
+                    self.process_tasks_job.total_progress,
+                    )
+                logservice.flush()
+                self.prev_progress_timestamp = datetime.datetime.now() # pylint: disable=attribute-defined-outside-init
+            
+            
+    def _tasklist_fetch_completed(self, tasklist_id, num_tasks):
+        """ Add the tasks from a completely retrieved tasklist to the total progress, and update the job record """
+        
+        with self._job_lock:
+            self._tasks_in_progress.pop(tasklist_id, None)
+            
+            self.process_tasks_job.total_progress = self.process_tasks_job.total_progress + num_tasks
+            # Because total_progress now includes num_tasks for this tasklist
+            self.process_tasks_job.tasklist_progress = sum(self._tasks_in_progress.values())
+            self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
+            self.process_tasks_job.message = ''
+            self._log_progress("Processed tasklist")
+            self._put_job_progress()
+            self.prev_progress_timestamp = datetime.datetime.now() # pylint: disable=attribute-defined-outside-init
+            
+    
     def _get_tasks_in_tasklist(self, # pylint: disable=too-many-arguments,too-many-locals,too-many-branches,too-many-statements
                                tasklist_title, tasklist_id, 
-                               include_hidden, include_completed, include_deleted):
+                               include_hidden, include_completed, include_deleted, updated_min=None):
         """ Returns all the tasks in the tasklist 
         
             arguments:
@@ -716,6 +1654,8 @@ class ProcessTasksWorker(webapp2.RequestHandler):
               include_hidden           -- If true, include hidden tasks in the backup
               include_completed        -- If true, include completed tasks in the backup
               include_deleted          -- If true, include deleted tasks in the backup
+              updated_min              -- OPT: If set, only return tasks changed at or after this 
+                                          RFC-3339 timestamp (see _tasks_list_request())
               
             returns a tuple;
               two-element dictionary;
@@ -735,9 +1675,6 @@ class ProcessTasksWorker(webapp2.RequestHandler):
         more_tasks_data_to_retrieve = True
         next_tasks_page_token = None
         
-        # Keep track of when last updated, to prevent excessive DB access which could exceed quota
-        prev_progress_timestamp = datetime.datetime.now()
-        
         if self.is_test_user and settings.DUMP_DATA:
             logging.debug(fn_name +
                               "TEST: include_completed = " + str(include_completed) +
@@ -750,100 +1687,29 @@ class ProcessTasksWorker(webapp2.RequestHandler):
         # ---------------------------------------------------------------------------
         while more_tasks_data_to_retrieve:
         
-            retry_count = settings.NUM_API_TRIES
-            while retry_count > 0:
-                retry_count = retry_count - 1
+            page_latency = None
+            retry = self._retry_policy.new_state()
+            while True:
                 tasks_data = {}
                 try:
-                    # Retrieve a page of (up to 100) tasks
-                    if next_tasks_page_token:
-                        # Get the next page of results
-                        # This happens if there are more than 100 tasks in the list
-                        # See http://code.google.com/apis/tasks/v1/using.html#api_params
-                        #     "Maximum allowable value: maxResults=100"
-                        tasks_data = self.tasks_svc.list(tasklist=tasklist_id, 
-                                                         pageToken=next_tasks_page_token, 
-                                                         showHidden=include_hidden, 
-                                                         showCompleted=include_completed, 
-                                                         showDeleted=include_deleted).execute()
-                    else:
-                        # Get the first (or only) page of results for this tasklist
-                        tasks_data = self.tasks_svc.list(tasklist=tasklist_id, 
-                                                         showHidden=include_hidden, 
-                                                         showCompleted=include_completed, 
-                                                         showDeleted=include_deleted).execute()
+                    # Retrieve a page of (up to TASKS_API_MAX_RESULTS) tasks
+                    page_start_time = time.time()
+                    tasks_data = self._execute_request(self._tasks_list_request(tasklist_id, next_tasks_page_token, 
+                        include_hidden, include_completed, include_deleted, updated_min))
+                    page_latency = time.time() - page_start_time
                             
                     # Succeeded, so break out of the retry loop
                     break
                 
                 except apiclient_errors.HttpError as http_err:
                     tasks_data = {}
-                    self._handle_http_error(fn_name, http_err, retry_count, "Error retrieving list of tasks")
+                    self._handle_http_error(fn_name, http_err, retry, "Error retrieving list of tasks")
                     
                 except Exception as ex: # pylint: disable=broad-except
                     tasks_data = {}
-                    self._handle_general_error(fn_name, ex, retry_count, "Error retrieving list of tasks")
+                    self._handle_general_error(fn_name, ex, retry, "Error retrieving list of tasks")
           
-            if self.is_test_user and settings.DUMP_DATA:
-                logging.debug(fn_name + "tasks_data ==>")
-                logging.debug(tasks_data)
-            
-            if not tasks_data:
-                logging.error(fn_name + "No tasks data for " + self.user_email)
-            
-            if not tasks_data.has_key(u'items'):
-                # When using the Google Tasks webpage at https://mail.google.com/tasks/canvas, there will always
-                # be at least one task in any tasklist, because when deleting the last task, a new blank task is
-                # automatically created.
-                # However, a third-party app (e.g., Calengoo on Android) CAN delete all the tasks in a task list,
-                # which results in a tasklist without an 'items' element.
-                logging.debug(fn_name + "No tasks in tasklist")
-                logservice.flush()
-            else:
-                try:
-                    tasks = tasks_data[u'items'] # Store all the tasks (List of Dict)                    
-                except Exception as ex: # pylint: disable=broad-except
-                    logging.exception(fn_name, "Exception extracting items from tasks_data: " + 
-                      shared.get_exception_msg(ex))
-                    #logging.error(tasks_data)
-                    logservice.flush()
-                    raise ex
-                
-                # if self.is_test_user and settings.DUMP_DATA:
-                    # logging.debug(fn_name + "tasks ==>")
-                    # logging.debug(tasks)
-                    # logservice.flush()
-                
-                for task in tasks:
-                    num_tasks = num_tasks + 1
-                    
-                    # TODO: Investigate if including this will cause memory to be exceeded for very large tasks list
-                    # Store original RFC-3339 timestamps (used for raw2 export format)
-                    if task.has_key('due'):
-                        task['due_RFC3339'] = task['due']
-                    if task.has_key('updated'):
-                        task['updated_RFC3339'] = task['updated']
-                    if task.has_key('completed'):
-                        task['completed_RFC3339'] = task['completed']
-                    
-                    # Converts the RFC-3339 string returned by the server to a date or datetime object  
-                    # so that other methods (such as Django templates) can display a custom formatted date
-                    shared.set_timestamp(task, u'due', date_only=True)
-                    shared.set_timestamp(task, u'updated')
-                    shared.set_timestamp(task, u'completed')
-                    
-                if tasklist_dict.has_key(u'tasks'):
-                    # This is the n'th page of task data for this tasklist, so extend the existing list of tasks
-                    tasklist_dict[u'tasks'].extend(tasks)
-                else:
-                    # This is the first (or only) list of task for this tasklist
-                    tasklist_dict[u'tasks'] = tasks
-                
-                # if self.is_test_user:
-                    # logging.debug(fn_name + "Adding %d items for %s" % (len(tasks), tasklist_title))
-                # else:
-                    # logging.debug(fn_name + "Adding %d items to tasklist" % len(tasks))
-            
+            num_tasks = num_tasks + self._add_page_of_tasks(tasklist_dict, tasks_data, page_latency)
             
             # ---------------------------------------------------------------------
             # Check if there is another page of data (more tasks for this tasklist)
@@ -851,49 +1717,14 @@ class ProcessTasksWorker(webapp2.RequestHandler):
             if tasks_data.has_key('nextPageToken'):
                 # There is another page of tasks to be retrieved for this tasklist, 
                 # which we'll retrieve next time around the while loop.
-                # This happens if there are more than 100 tasks in the list
-                # See http://code.google.com/apis/tasks/v1/using.html#api_params
-                #     "Maximum allowable value: maxResults=100"
+                # This happens if there are more than TASKS_API_MAX_RESULTS tasks in the list
                 more_tasks_data_to_retrieve = True # Go around while loop again
                 next_tasks_page_token = tasks_data['nextPageToken']
                 # if self.is_test_user:
                     # logging.debug(fn_name + "There is (at least) one more page of data to be retrieved")
                   
                 # More than one page, so update progress
-                if (datetime.datetime.now() - prev_progress_timestamp).seconds > settings.PROGRESS_UPDATE_INTERVAL:
-                    self.process_tasks_job.tasklist_progress = num_tasks
-                    self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
-                    self.process_tasks_job.message = ''
-                    logging.debug("%sProcessed page of tasks. Updated job; status = '%s', tasklist progress = %d, total progress = %d",
-                        fn_name,
-                        self.process_tasks_job.status,
-                        self.process_tasks_job.tasklist_progress,
-                        self.process_tasks_job.total_progress,
-                        )
-                    logservice.flush()
-                    self.process_tasks_job.put()
-                    prev_progress_timestamp = datetime.datetime.now()
-                    
-
-                # TESTING +++
-                # JS 2019-06-03; A user had 8 of 10 tasklists not return all the tasks.
-                #   Tasks per list: [21, 152, 25, 267, 74, 20, 34, 81, 65, 243]     Successful
-                #   Tasks per list: [21,  75,  9,  28, 49, 20,  7, 53, 63,  43]     Failed
-                #                        ---  --  ---  --      --  --  --  ---
-                #                         77  16  239  25      27  28   2  200      Missing tasks
-                #
-                # There is a nextPageToken, so this page should be "full".
-                # According to https://developers.google.com/tasks/v1/reference/tasks/list,
-                # 20 tasks are returned for each page (unless 'maxResults' is set).
-                try:
-                    num_tasks_in_page = len(tasks)
-                    if num_tasks_in_page != 20:
-                        logging.error("%sDEBUG: Expected a 'full' page of 20 tasks, but got %d tasks",
-                            fn_name, num_tasks_in_page)
-                except: # pylint: disable=bare-except
-                    pass
-                # TESTING ---
-                    
+                self._tasklist_fetch_progress(tasklist_id, num_tasks)
                     
             else:
                 # This is the last (or only) page of results (list of tasks) for this task lists
@@ -910,7 +1741,228 @@ class ProcessTasksWorker(webapp2.RequestHandler):
         return tasklist_dict, num_tasks
 
 
-    def _handle_http_error(self, fn_name, ex, retry_count, err_msg):
+    def _tasks_list_request(self, tasklist_id, page_token, # pylint: disable=too-many-arguments
+                            include_hidden, include_completed, include_deleted, updated_min=None):
+        """ Returns an (unexecuted) tasks.list() request for one page of tasks in the specified tasklist 
+        
+            If updated_min is set, the request only returns tasks which have changed at or after that time.
+            All changed tasks are returned (including deleted, hidden and completed tasks), so that
+            shared.merge_tasklist_changes() can remove tasks that should no longer be in the backup.
+        """
+        
+        # If maxResults is not specified, the server returns pages of 20 tasks,
+        # so we request the largest allowable page size to minimise the number of requests.
+        # See http://code.google.com/apis/tasks/v1/using.html#api_params
+        #     "Maximum allowable value: maxResults=100"
+        list_kwargs = {
+            'tasklist' : tasklist_id,
+            'maxResults' : settings.TASKS_API_MAX_RESULTS,
+            'showHidden' : include_hidden,
+            'showCompleted' : include_completed,
+            'showDeleted' : include_deleted,
+        }
+        if page_token:
+            # Get the next page of results
+            # This happens if there are more than TASKS_API_MAX_RESULTS tasks in the list
+            list_kwargs['pageToken'] = page_token
+        if updated_min:
+            list_kwargs['updatedMin'] = updated_min
+            list_kwargs['showHidden'] = True
+            list_kwargs['showCompleted'] = True
+            list_kwargs['showDeleted'] = True
+            
+        return self.tasks_svc.list(**list_kwargs)
+        
+        
+    def _add_page_of_tasks(self, tasklist_dict, tasks_data, page_latency=None):
+        """ Add the tasks from one page of tasks.list() results to tasklist_dict[u'tasks']
+        
+            The RFC-3339 timestamps in each task are converted to date/datetime objects.
+            
+            arguments:
+              tasklist_dict            -- Tasklist dictionary, as returned by _get_tasks_in_tasklist()
+              tasks_data               -- A page of results returned by tasks.list()
+              page_latency             -- OPT: Number of seconds taken to retrieve the page (for logging)
+              
+            returns the number of tasks in the page
+        """
+        fn_name = "_add_page_of_tasks(): "
+        
+        num_tasks_in_page = 0
+        
+        if self.is_test_user and settings.DUMP_DATA:
+            logging.debug(fn_name + "tasks_data ==>")
+            logging.debug(tasks_data)
+        
+        if not tasks_data:
+            logging.error(fn_name + "No tasks data for " + self.user_email)
+        
+        if not tasks_data.has_key(u'items'):
+            # When using the Google Tasks webpage at https://mail.google.com/tasks/canvas, there will always
+            # be at least one task in any tasklist, because when deleting the last task, a new blank task is
+            # automatically created.
+            # However, a third-party app (e.g., Calengoo on Android) CAN delete all the tasks in a task list,
+            # which results in a tasklist without an 'items' element.
+            logging.debug(fn_name + "No tasks in tasklist")
+            logservice.flush()
+        else:
+            try:
+                tasks = tasks_data[u'items'] # Store all the tasks (List of Dict)                    
+            except Exception as ex: # pylint: disable=broad-except
+                logging.exception(fn_name, "Exception extracting items from tasks_data: " + 
+                  shared.get_exception_msg(ex))
+                #logging.error(tasks_data)
+                logservice.flush()
+                raise ex
+            
+            # if self.is_test_user and settings.DUMP_DATA:
+                # logging.debug(fn_name + "tasks ==>")
+                # logging.debug(tasks)
+                # logservice.flush()
+            
+            for task in tasks:
+                num_tasks_in_page = num_tasks_in_page + 1
+                
+                # Store original RFC-3339 timestamps (used for raw2 export format)
+                # These are only kept by the TaskRecord if they can't be derived from the converted timestamps
+                if task.has_key('due'):
+                    task['due_RFC3339'] = task['due']
+                if task.has_key('updated'):
+                    task['updated_RFC3339'] = task['updated']
+                if task.has_key('completed'):
+                    task['completed_RFC3339'] = task['completed']
+                
+            # Convert the RFC-3339 strings returned by the server to date or datetime objects  
+            # so that other methods (such as Django templates) can display a custom formatted date
+            shared.set_timestamps(tasks)
+                
+            # Replace the task dictionaries returned by the server with compact task records, 
+            # to reduce the amount of memory needed for very large tasks lists.
+            # Values which are the same for many tasks (e.g. the start of selfLink) are shared between the task 
+            # records in the page, so they are only stored (and pickled) once per page.
+            shared_values = {}
+            tasks = [model.TaskRecord.from_api_dict(task, shared_values) for task in tasks]
+                
+            if tasklist_dict.has_key(u'tasks'):
+                # This is the n'th page of task data for this tasklist, so extend the existing list of tasks
+                tasklist_dict[u'tasks'].extend(tasks)
+            else:
+                # This is the first (or only) list of task for this tasklist
+                tasklist_dict[u'tasks'] = tasks
+        
+        if page_latency is None:
+            logging.debug("%sPage contains %d tasks", fn_name, num_tasks_in_page)
+        else:
+            logging.debug("%sPage contains %d tasks, retrieved in %.3f seconds", 
+                fn_name, num_tasks_in_page, page_latency)
+        
+        if tasks_data.has_key('nextPageToken'):
+            self._check_page_is_full(num_tasks_in_page)
+            
+        return num_tasks_in_page
+        
+        
+    def _check_page_is_full(self, num_tasks_in_page):
+        """ Check that a page of tasks which has a nextPageToken contains the expected number of tasks.
+        
+            JS 2019-06-03; A user had 8 of 10 tasklists not return all the tasks.
+              Tasks per list: [21, 152, 25, 267, 74, 20, 34, 81, 65, 243]     Successful
+              Tasks per list: [21,  75,  9,  28, 49, 20,  7, 53, 63,  43]     Failed
+                                   ---  --  ---  --      --  --  --  ---
+                                    77  16  239  25      27  28   2  200      Missing tasks
+            
+            If there is a nextPageToken, the page should be "full"; i.e., it should contain
+            settings.TASKS_API_MAX_RESULTS tasks (the maxResults that was requested).
+            
+            However, the server may use a smaller maximum page size than we requested. If all the 
+            pages are the same (smaller) size, that is the server's page size, so we adapt to that
+            and only report pages which are smaller than the server's page size. We only adapt if the
+            server has never returned a page of the requested size, and if the server returns a page of 
+            the requested size after we have adapted, the page that we adapted to is reported.
+        """
+        fn_name = "_check_page_is_full(): "
+        
+        with self._job_lock:
+            if num_tasks_in_page >= settings.TASKS_API_MAX_RESULTS:
+                self._full_page_received = True
+                if self._expected_page_size >= settings.TASKS_API_MAX_RESULTS:
+                    return
+                # The server is using the requested page size, so the page that we adapted to was short
+                short_page_size = self._expected_page_size
+                self._expected_page_size = settings.TASKS_API_MAX_RESULTS
+                logging.error("%sServer returned a page of %d tasks, so the earlier page of %d tasks " +
+                    "was not a 'full' page", fn_name, num_tasks_in_page, short_page_size)
+                logservice.flush()
+                return
+                
+            if num_tasks_in_page >= self._expected_page_size:
+                return
+                
+            if not self._page_size_adapted and not self._full_page_received:
+                # This is the first short page, so assume that the server is using a smaller page size
+                logging.warning("%sRequested pages of %d tasks, but server returned a page of %d tasks. " +
+                    "Expecting pages of %d tasks from now on.",
+                    fn_name, settings.TASKS_API_MAX_RESULTS, num_tasks_in_page, num_tasks_in_page)
+                logservice.flush()
+                self._expected_page_size = num_tasks_in_page
+                self._page_size_adapted = True
+                return
+                
+            expected_page_size = self._expected_page_size
+                
+        logging.error("%sExpected a 'full' page of %d tasks, but got %d tasks",
+            fn_name, expected_page_size, num_tasks_in_page)
+        logservice.flush()
+        
+        
+    def _give_up(self, fn_name, ex, retry, err_msg, is_http_error=False):
+        """ Log the error, report it to the user, and raise it. Called when the retry policy says that
+            the failed request should not be retried.
+        """
+        logging.exception(fn_name + ("HttpError: " if is_http_error else "Error: ") + err_msg + " for " + self.user_email + 
+            ": " + shared.get_exception_msg(ex) + "\n" +
+            "Giving up after " + str(retry.num_retries + 1) + " attempts: " + retry.give_up_reason)
+            
+        if is_http_error:
+            # Try logging the content of the HTTP response, 
+            # in case it contains useful info to help debug the error
+            try:
+                try:
+                    parsed_json = json.loads(ex.content)
+                    logging.info(fn_name + "HTTP error content as JSON =\n{}".format(
+                        json.dumps(parsed_json, indent=4)))
+                except: # pylint: disable=bare-except
+                    logging.info(fn_name + "HTTP error content = '{}'".format(
+                        ex.content))
+            except: # pylint: disable=bare-except
+                pass
+                
+        logservice.flush()
+        self._report_error(err_msg)
+        raise ex
+        
+        
+    def _sleep_before_retry(self, fn_name, delay):
+        """ Wait for delay seconds before retrying a failed request """
+        if delay <= 0:
+            return
+        logging.debug("%sSleeping for %.1f seconds before retrying", fn_name, delay)
+        logservice.flush()
+        if delay > settings.PROGRESS_UPDATE_INTERVAL:
+            # Keep updating the progress, so that the job doesn't appear to have stalled
+            self.sleep_with_updates(int(round(delay)))
+        else:
+            time.sleep(delay)
+            
+            
+    def _handle_http_error(self, fn_name, ex, retry, err_msg, sleep=True):
+        """ Handle an HttpError from a request which may be retried.
+        
+            retry is the retry_policy.RetryState of the request.
+            
+            Raises the error if the request should not be retried. Otherwise, waits (unless sleep is False)
+            before the request is retried, and returns the number of seconds to wait.
+        """
         self._update_progress(force=True)
         
         # TODO: Find a reliable way to detect daily limit exceeded that doesn't rely on text
@@ -920,127 +1972,105 @@ class ProcessTasksWorker(webapp2.RequestHandler):
             logservice.flush()
             raise DailyLimitExceededError()
             
-        if retry_count == settings.NUM_API_TRIES-1 and ex and ex.resp and ex.resp.status == 503:
+        delay = retry.next_delay(ex)
+        if delay is None:
+            self._give_up(fn_name, ex, retry, err_msg, is_http_error=True)
+            
+        if retry.num_retries == 1 and ex and ex.resp and ex.resp.status == 503:
             # Log first 503 as an Info level, because 
             #   (a) There are a frequent 503 errors
             #   (b) Almost all 503 errors recover after a single retry
             logging.info(fn_name + "HttpError: " + err_msg + " for " + self.user_email + 
                 ": " + shared.get_exception_msg(ex) + 
-                "\nFirst attempt, so logged as info. " + str(retry_count) + " attempts remaining")
-            logservice.flush()
+                "\nFirst attempt, so logged as info. Retrying in %.1f seconds" % delay)
         else:
-            if retry_count > 0:
-                logging.warning(fn_name + "HttpError: " + err_msg + " for " + self.user_email + 
-                    ": " + shared.get_exception_msg(ex) + "\n" +
-                    str(retry_count) + " attempts remaining")
-                logservice.flush()
-            else:
-                logging.exception(fn_name + "HttpError: " + err_msg + " for " + self.user_email + 
-                    ": " + shared.get_exception_msg(ex) + "\n" +
-                    "Giving up after " +  str(settings.NUM_API_TRIES) + " attempts")
-                    
-                # Try logging the content of the HTTP response, 
-                # in case it contains useful info to help debug the error
-                try:
-                    try:
-                        parsed_json = json.loads(ex.content)
-                        logging.info(fn_name + "HTTP error content as JSON =\n{}".format(
-                            json.dumps(parsed_json, indent=4)))
-                    except: # pylint: disable=bare-except
-                        logging.info(fn_name + "HTTP error content = '{}'".format(
-                            ex.content))
-                except: # pylint: disable=bare-except
-                    pass
-                    
-                logservice.flush()
-                self._report_error(err_msg)
-                raise ex
+            logging.warning(fn_name + "HttpError: " + err_msg + " for " + self.user_email + 
+                ": " + shared.get_exception_msg(ex) + "\n" +
+                "Retry %d, in %.1f seconds" % (retry.num_retries, delay))
+        logservice.flush()
 
-        # Last chances - sleep to give the server some extra time before re-requesting
-        if retry_count <= 2:
-            logging.debug(fn_name + "Giving server an extra chance; Sleeping for " + 
-                str(settings.WORKER_API_RETRY_SLEEP_DURATION) + 
-                " seconds before retrying")
-            logservice.flush()
-            time.sleep(settings.WORKER_API_RETRY_SLEEP_DURATION)
+        if sleep:
+            self._sleep_before_retry(fn_name, delay)
+        return delay
             
             
-    def _handle_general_error(self, fn_name, ex, retry_count, err_msg, first_connect_to_tasks_service=False):
-        """
+    def _handle_general_error(self, fn_name, ex, retry, err_msg, first_connect_to_tasks_service=False):
+        """ Handle an error (other than HttpError) from a request which may be retried.
+        
+            retry is the retry_policy.RetryState of the request.
+            
+            Raises the error if the request should not be retried. Otherwise, waits before the request 
+            is retried.
+            
             first_connect_to_tasks_service should only be set to True in the exception handler
             for the first connection (to prep the service)
         """
         self._update_progress(force=True)
-        if retry_count > 0:
-            if isinstance(ex, AccessTokenRefreshError):
-                # Log first 'n' AccessTokenRefreshError as Info, because they are reasonably common,
-                # and the system usually continues normally after the 2nd instance of
-                # "new_request: Refreshing due to a 401"
-                # Occassionally, the system seems to need a 3rd attempt 
-                # (i.e., success after waiting 45 seconds)
-                if first_connect_to_tasks_service:
-                    # This is the first attempt at connecting to the Tasks service for this worker.
-                    # If the user has not previously authorised access to Tasks, the user will be
-                    # presented with a several page approval flow, which could take some time.
-                    # If the worker attempts to access the Tasks before then, we get 'invalid_grant'.                    
-                    # We sleep to allow the user to complete the approval process.
-                    if retry_count > 1:
-                        # We start with shorter sleeps, in case the user finishes quickly
-                        sleep_duration = settings.WORKER_INVALID_GRANT_SLEEP_DURATION / retry_count
-                    else:
-                        # Last chance, so sleep for the full WORKER_INVALID_GRANT_SLEEP_DURATION seconds
-                        sleep_duration = settings.WORKER_INVALID_GRANT_SLEEP_DURATION
-                    logging.info("%s%s: %s for %s (not yet an error)\n" +
-                        "%s attempts remaining. Sleeping for %s seconds",
-                        fn_name,
-                        shared.get_exception_msg(ex),
-                        err_msg,
-                        self.user_email,                        
-                        retry_count,
-                        sleep_duration)
-                    self.sleep_with_updates(sleep_duration)
-                    logging.info("%sRetrying after sleeping for %s seconds", 
-                        fn_name, sleep_duration)
-                    return
-                    
-                logging.info(fn_name + 
-                    "Access Token Refresh Error: " + err_msg + " for " + self.user_email + 
-                    " (not yet an error). " + str(retry_count) + " attempts remaining: " + 
-                    shared.get_exception_msg(ex))
-            else:
-                logging.warning(fn_name + "Error: " + err_msg + " for " + self.user_email + 
-                    ": " + shared.get_exception_msg(ex) + "\n" +
-                    str(retry_count) + " attempts remaining")
-            logservice.flush()
+        
+        delay = retry.next_delay(ex)
+        if delay is None:
+            self._give_up(fn_name, ex, retry, err_msg)
+            
+        if isinstance(ex, AccessTokenRefreshError):
+            # Log first 'n' AccessTokenRefreshError as Info, because they are reasonably common,
+            # and the system usually continues normally after the 2nd instance of
+            # "new_request: Refreshing due to a 401"
+            # Occassionally, the system seems to need a 3rd attempt 
+            # (i.e., success after waiting 45 seconds)
+            if first_connect_to_tasks_service:
+                # This is the first attempt at connecting to the Tasks service for this worker.
+                # If the user has not previously authorised access to Tasks, the user will be
+                # presented with a several page approval flow, which could take some time.
+                # If the worker attempts to access the Tasks before then, we get 'invalid_grant'.                    
+                # We sleep to allow the user to complete the approval process.
+                retries_remaining = retry.remaining(retry_policy.ErrorClass.AUTH)
+                if retries_remaining > 0:
+                    # We start with shorter sleeps, in case the user finishes quickly
+                    sleep_duration = settings.WORKER_INVALID_GRANT_SLEEP_DURATION / (retries_remaining + 1)
+                else:
+                    # Last chance, so sleep for the full WORKER_INVALID_GRANT_SLEEP_DURATION seconds
+                    sleep_duration = settings.WORKER_INVALID_GRANT_SLEEP_DURATION
+                sleep_duration = max(sleep_duration, delay)
+                logging.info("%s%s: %s for %s (not yet an error)\n" +
+                    "%s retries remaining. Sleeping for %s seconds",
+                    fn_name,
+                    shared.get_exception_msg(ex),
+                    err_msg,
+                    self.user_email,                        
+                    retries_remaining,
+                    sleep_duration)
+                self.sleep_with_updates(int(round(sleep_duration)))
+                logging.info("%sRetrying after sleeping for %s seconds", 
+                    fn_name, sleep_duration)
+                return
+                
+            logging.info(fn_name + 
+                "Access Token Refresh Error: " + err_msg + " for " + self.user_email + 
+                " (not yet an error). Retry %d, in %.1f seconds: " % (retry.num_retries, delay) + 
+                shared.get_exception_msg(ex))
         else:
-            logging.exception(fn_name + "Error: " + err_msg + " for " + self.user_email + 
+            logging.warning(fn_name + "Error: " + err_msg + " for " + self.user_email + 
                 ": " + shared.get_exception_msg(ex) + "\n" +
-                "Giving up after " + str(settings.NUM_API_TRIES) + " attempts")
-            logservice.flush()
-            self._report_error(err_msg)
-            raise ex
-
-        # Last chances - sleep to give the server some extra time before re-requesting
-        if retry_count <= 2:
-            logging.debug(fn_name + "Giving server an extra chance; Sleeping for " + 
-                str(settings.WORKER_API_RETRY_SLEEP_DURATION) + 
-                " seconds before retrying")
-            logservice.flush()
-            time.sleep(settings.WORKER_API_RETRY_SLEEP_DURATION)
-            logging.info("%sRetrying after sleeping for %s seconds", 
-                        fn_name, settings.WORKER_API_RETRY_SLEEP_DURATION)
+                "Retry %d, in %.1f seconds" % (retry.num_retries, delay))
+        logservice.flush()
+
+        self._sleep_before_retry(fn_name, delay)
             
 
     def _update_progress(self, msg=None, force=False):
         """ Update progress so that job doesn't stall """
         
-        if force or (datetime.datetime.now() - self.prev_progress_timestamp).seconds > settings.PROGRESS_UPDATE_INTERVAL:
-            if msg:
-                self.process_tasks_job.message = msg
-            self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
-            self._log_progress("Update progress")
-            self.process_tasks_job.put()
-            self.prev_progress_timestamp = datetime.datetime.now() # pylint: disable=attribute-defined-outside-init
+        with self._job_lock:
+            if force or (datetime.datetime.now() - self.prev_progress_timestamp).seconds > settings.PROGRESS_UPDATE_INTERVAL:
+                if msg:
+                    self.process_tasks_job.message = msg
+                self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
+                self._log_progress("Update progress")
+                if force:
+                    self._put_job()
+                else:
+                    self._put_job_progress()
+                self.prev_progress_timestamp = datetime.datetime.now() # pylint: disable=attribute-defined-outside-init
         
 
     def _report_error(self, err_msg):
@@ -1048,24 +2078,25 @@ class ProcessTasksWorker(webapp2.RequestHandler):
         
         fn_name = "_report_error(): "
         
-        self.process_tasks_job.status = constants.ExportJobStatus.ERROR
-        self.process_tasks_job.message = ''
+        with self._job_lock:
+            self.process_tasks_job.status = constants.ExportJobStatus.ERROR
+            self.process_tasks_job.message = ''
 
-        if self.process_tasks_job.error_message:
-            logging.warning(fn_name + "Existing error: " + self.process_tasks_job.error_message)
+            if self.process_tasks_job.error_message:
+                logging.warning(fn_name + "Existing error: " + self.process_tasks_job.error_message)
+                logservice.flush()
+                self.process_tasks_job.error_message += "; " + err_msg
+            else:
+                self.process_tasks_job.error_message = err_msg
+                
+            logging.warning(fn_name + "Reporting error for " + self.user_email + ": " + 
+                self.process_tasks_job.error_message)
             logservice.flush()
-            self.process_tasks_job.error_message += "; " + err_msg
-        else:
-            self.process_tasks_job.error_message = err_msg
-            
-        logging.warning(fn_name + "Reporting error for " + self.user_email + ": " + 
-            self.process_tasks_job.error_message)
-        logservice.flush()
-            
-        self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
-        self.process_tasks_job.put()
                 
-        self._log_progress("Error")
+            self.process_tasks_job.job_progress_timestamp = datetime.datetime.now()
+            self._put_job()
+                    
+            self._log_progress("Error")
         
         if self.process_tasks_job:
             shared.send_email_to_support("WORKER: Error msg to user", 